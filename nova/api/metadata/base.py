@@ -16,6 +16,9 @@
 
 """Instance Metadata information."""
 
+import collections
+import functools
+import hashlib
 import os
 import posixpath
 
@@ -41,6 +44,7 @@ from nova import network
 from nova.network.security_group import openstack_driver
 from nova import objects
 from nova.objects import virt_device_metadata as metadata_obj
+from nova import stats
 from nova import utils
 from nova.virt import netutils
 
@@ -97,6 +101,13 @@ MIME_TYPE_APPLICATION_JSON = "application/json"
 
 LOG = logging.getLogger(__name__)
 
+# The maximum number of network infos whose sections are kept in memory
+NETWORK_CACHE_SIZE = 1000
+
+# The durations of the builds of the sections of the instance metadata, by
+# section
+section_timings = collections.defaultdict(stats.Histogram)
+
 
 class InvalidMetadataVersion(Exception):
     pass
@@ -106,15 +117,88 @@ class InvalidMetadataPath(Exception):
     pass
 
 
+class NetworkSectionCache(object):
+    """A bounded cache of the sections of the instance metadata rendered from
+    the network info of the instances, keyed by a digest of the network info.
+
+    The network info of an instance only changes when its info cache is
+    updated, so the sections rendered from it are reused by the metadata of
+    the instance until then, and by the metadata of any instance with the
+    same network info. The least recently used entries are evicted first.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict()
+
+    @staticmethod
+    def key(network_info):
+        # NOTE: the template is rendered from the file it names, so its path
+        # is part of the key
+        data = jsonutils.dumps([network_info,
+                                CONF.injected_network_template])
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            return None
+        self._entries[key] = value
+        return value
+
+    def set(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+_NETWORK_CACHE = NetworkSectionCache(NETWORK_CACHE_SIZE)
+
+
+def _section(func):
+    """Decorates a method building a section of the instance metadata into a
+    property building it on its first access.
+
+    The section is then kept with the metadata, which is what the metadata
+    request handler caches.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def get_section(self):
+        try:
+            return self._sections[name]
+        except KeyError:
+            pass
+        with timeutils.StopWatch() as timer:
+            value = func(self)
+        section_timings[name].add(timer.elapsed())
+        LOG.debug('Built the %(section)s section of the metadata in '
+                  '%(elapsed).3f seconds', {'section': name,
+                                            'elapsed': timer.elapsed()},
+                  instance=self.instance)
+        self._sections[name] = value
+        return value
+
+    return property(get_section)
+
+
 class InstanceMetadata(object):
     """Instance metadata."""
 
     def __init__(self, instance, address=None, content=None, extra_md=None,
                  network_info=None, vd_driver=None, network_metadata=None,
                  request_context=None):
-        """Creation of this object should basically cover all time consuming
-        collection.  Methods after that should not cause time delays due to
-        network operations or lengthy cpu operations.
+        """Creation of this object only collects what is cheap to get. The
+        sections needing network operations or lengthy cpu operations, such
+        as the security groups, the block device mappings, the network
+        sections and the vendordata, are built on their first access and
+        kept with the object.
 
         The user should then get a single instance and make multiple method
         calls on it.
@@ -122,8 +206,6 @@ class InstanceMetadata(object):
         if not content:
             content = []
 
-        ctxt = context.get_admin_context()
-
         # NOTE(danms): Sanitize the instance to limit the amount of stuff
         # inside that may not pickle well (i.e. context). We also touch
         # some of the things we'll lazy load later to make sure we keep their
@@ -141,11 +223,8 @@ class InstanceMetadata(object):
 
         self.availability_zone = instance.get('availability_zone')
 
-        secgroup_api = openstack_driver.get_openstack_security_group_driver()
-        self.security_groups = secgroup_api.get_instance_security_groups(
-            ctxt, instance)
-
-        self.mappings = _format_instance_mapping(ctxt, instance)
+        # The sections of the metadata already built, by name
+        self._sections = {}
 
         if instance.user_data is not None:
             self.userdata_raw = base64.decode_as_bytes(instance.user_data)
@@ -161,62 +240,121 @@ class InstanceMetadata(object):
 
         self.uuid = instance.uuid
 
-        self.content = {}
-        self.files = []
-
         # get network info, and the rendered network template
         if network_info is None:
             network_info = instance.info_cache.network_info
+        self.network_info = network_info
 
-        # expose network metadata
-        if network_metadata is None:
-            self.network_metadata = netutils.get_network_metadata(network_info)
-        else:
-            self.network_metadata = network_metadata
+        # expose network metadata, which is rendered from the network info
+        # unless supplied
+        self._network_metadata = network_metadata
+
+        # 'content' is passed in from the configdrive code in
+        # nova/virt/libvirt/driver.py.  That's how we get the injected files
+        # (personalities) in. AFAIK they're not stored in the db at all,
+        # so are not available later (web service metadata time).
+        self.injected_files = content
 
-        self.ip_info = \
-                ec2utils.get_ip_info_for_instance_from_nw_info(network_info)
+        self.vd_driver = vd_driver
+        self.request_context = request_context
 
-        self.network_config = None
-        cfg = netutils.get_injected_network_template(network_info)
+        self.route_configuration = None
+
+    @_section
+    def security_groups(self):
+        secgroup_api = openstack_driver.get_openstack_security_group_driver()
+        return secgroup_api.get_instance_security_groups(
+            context.get_admin_context(), self.instance)
+
+    @_section
+    def mappings(self):
+        return _format_instance_mapping(context.get_admin_context(),
+                                        self.instance)
+
+    @_section
+    def network_sections(self):
+        """Returns a dict of the sections rendered from the network info."""
+        key = _NETWORK_CACHE.key(self.network_info)
+        sections = _NETWORK_CACHE.get(key)
+        if sections is None:
+            sections = {
+                'network_metadata': netutils.get_network_metadata(
+                    self.network_info),
+                'ip_info': ec2utils.get_ip_info_for_instance_from_nw_info(
+                    self.network_info),
+                'network_template': netutils.get_injected_network_template(
+                    self.network_info)}
+            _NETWORK_CACHE.set(key, sections)
+        return sections
+
+    @property
+    def network_metadata(self):
+        if self._network_metadata is not None:
+            return self._network_metadata
+        return self.network_sections['network_metadata']
+
+    @property
+    def ip_info(self):
+        return self.network_sections['ip_info']
+
+    @_section
+    def content_sections(self):
+        """Returns a dict of the content, the files and the network config
+        of the metadata.
+        """
+        sections = {'content': {}, 'files': [], 'network_config': None}
+        content = sections['content']
 
+        cfg = self.network_sections['network_template']
         if cfg:
-            key = "%04i" % len(self.content)
-            self.content[key] = cfg
-            self.network_config = {"name": "network_config",
+            key = "%04i" % len(content)
+            content[key] = cfg
+            sections['network_config'] = {"name": "network_config",
                 'content_path': "/%s/%s" % (CONTENT_DIR, key)}
 
-        # 'content' is passed in from the configdrive code in
-        # nova/virt/libvirt/driver.py.  That's how we get the injected files
-        # (personalities) in. AFAIK they're not stored in the db at all,
-        # so are not available later (web service metadata time).
-        for (path, contents) in content:
-            key = "%04i" % len(self.content)
-            self.files.append({'path': path,
+        for (path, contents) in self.injected_files:
+            key = "%04i" % len(content)
+            sections['files'].append({'path': path,
                 'content_path': "/%s/%s" % (CONTENT_DIR, key)})
-            self.content[key] = contents
+            content[key] = contents
+        return sections
 
-        if vd_driver is None:
+    @property
+    def content(self):
+        return self.content_sections['content']
+
+    @property
+    def files(self):
+        return self.content_sections['files']
+
+    @property
+    def network_config(self):
+        return self.content_sections['network_config']
+
+    @_section
+    def vddriver(self):
+        if self.vd_driver is None:
             vdclass = importutils.import_class(CONF.vendordata_driver)
         else:
-            vdclass = vd_driver
+            vdclass = self.vd_driver
 
-        self.vddriver = vdclass(instance=instance, address=address,
-                                extra_md=extra_md, network_info=network_info)
-
-        self.route_configuration = None
+        return vdclass(instance=self.instance, address=self.address,
+                       extra_md=self.extra_md, network_info=self.network_info)
 
+    @_section
+    def vendordata_providers(self):
         # NOTE(mikal): the decision to not pass extra_md here like we
         # do to the StaticJSON driver is deliberate. extra_md will
         # contain the admin password for the instance, and we shouldn't
         # pass that to external services.
-        self.vendordata_providers = {
+        return {
             'StaticJSON': vendordata_json.JsonFileVendorData(
-                instance=instance, address=address,
-                extra_md=extra_md, network_info=network_info),
+                instance=self.instance, address=self.address,
+                extra_md=self.extra_md, network_info=self.network_info),
             'DynamicJSON': vendordata_dynamic.DynamicVendorData(
-                instance=instance, address=address,
-                network_info=network_info, context=request_context)
+                instance=self.instance, address=self.address,
+                network_info=self.network_info,
+                context=self.request_context)
         }
 
     def _route_configuration(self):
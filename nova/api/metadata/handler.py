@@ -18,6 +18,7 @@
 import hashlib
 import hmac
 import os
+import weakref
 
 from oslo_log import log as logging
 from oslo_utils import encodeutils
@@ -45,6 +46,9 @@ class MetadataRequestHandler(wsgi.Application):
     def __init__(self):
         self._cache = cache_utils.get_client(
                 expiration_time=CONF.api.metadata_cache_expiration)
+        # The cache keys of the metadata built by the requests in progress,
+        # which are cached once their request built the sections it needed
+        self._pending = weakref.WeakKeyDictionary()
         if (CONF.neutron.service_metadata_proxy and
             not CONF.neutron.metadata_proxy_shared_secret):
             LOG.warning("metadata_proxy_shared_secret is not configured, "
@@ -67,7 +71,7 @@ class MetadataRequestHandler(wsgi.Application):
             return None
 
         if CONF.api.metadata_cache_expiration > 0:
-            self._cache.set(cache_key, data)
+            self._pending[data] = cache_key
 
         return data
 
@@ -84,7 +88,7 @@ class MetadataRequestHandler(wsgi.Application):
             return None
 
         if CONF.api.metadata_cache_expiration > 0:
-            self._cache.set(cache_key, data)
+            self._pending[data] = cache_key
 
         return data
 
@@ -116,6 +120,10 @@ class MetadataRequestHandler(wsgi.Application):
             data = meta_data.lookup(req.path_info)
         except base.InvalidMetadataPath:
             raise webob.exc.HTTPNotFound()
+        finally:
+            cache_key = self._pending.pop(meta_data, None)
+            if cache_key is not None:
+                self._cache.set(cache_key, meta_data)
 
         if callable(data):
             return data(req, meta_data)
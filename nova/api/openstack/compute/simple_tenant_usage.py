@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import datetime
 
 import iso8601
@@ -30,6 +31,7 @@ from nova import context as nova_context
 from nova import exception
 from nova.i18n import _
 from nova import objects
+from nova.objects import instance_usage_rollup
 from nova.policies import simple_tenant_usage as stu_policies
 
 CONF = nova.conf.CONF
@@ -219,6 +221,91 @@ class SimpleTenantUsageController(wsgi.Controller):
 
         return list(rval.values()), all_server_usages
 
+    @staticmethod
+    def _unrolled_periods(period_start, period_stop, rolled_up):
+        """Split a period into the parts which are not rolled up.
+
+        :param rolled_up: set of the starts of the rolled up days
+        :returns: list of (start, stop) tuples
+        """
+        periods = []
+        start = period_start
+        day = period_start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if day < period_start:
+            day += instance_usage_rollup.ROLLUP_PERIOD
+        while day + instance_usage_rollup.ROLLUP_PERIOD <= period_stop:
+            if day in rolled_up:
+                if start < day:
+                    periods.append((start, day))
+                start = day + instance_usage_rollup.ROLLUP_PERIOD
+            day += instance_usage_rollup.ROLLUP_PERIOD
+        if start < period_stop:
+            periods.append((start, period_stop))
+        return periods
+
+    def _tenant_usages_from_rollups(self, context, period_start,
+                                    period_stop):
+        """Compute the usage totals of all tenants for a period.
+
+        The usage of the whole days of the period which are rolled up in a
+        cell is read from the rollups of that cell, and only the instances
+        active during the rest of the period are loaded.
+        """
+        usages = collections.defaultdict(lambda: {
+            'total_local_gb_usage': 0, 'total_vcpus_usage': 0,
+            'total_memory_mb_usage': 0, 'total_hours': 0})
+        first_day = period_start.replace(hour=0, minute=0, second=0,
+                                         microsecond=0)
+        if first_day < period_start:
+            first_day += instance_usage_rollup.ROLLUP_PERIOD
+        last_day = period_stop.replace(hour=0, minute=0, second=0,
+                                       microsecond=0)
+        flavors = {}
+        cells = objects.CellMappingList.get_all(context)
+        for cell in cells:
+            with nova_context.target_cell(context, cell) as cctxt:
+                rollups = []
+                if first_day < last_day:
+                    rollups = (
+                        objects.InstanceUsageRollupList.get_by_window(
+                            cctxt, first_day, last_day))
+                rolled_up = set(rollup.period_start for rollup in rollups
+                                if rollup.project_id is None)
+                for rollup in rollups:
+                    if rollup.project_id is None:
+                        continue
+                    usage = usages[rollup.project_id]
+                    usage['total_local_gb_usage'] += rollup.local_gb_hours
+                    usage['total_vcpus_usage'] += rollup.vcpus_hours
+                    usage['total_memory_mb_usage'] += rollup.memory_mb_hours
+                    usage['total_hours'] += rollup.hours
+
+                for start, stop in self._unrolled_periods(
+                        period_start, period_stop, rolled_up):
+                    instances = (
+                        objects.InstanceList.get_active_by_window_joined(
+                            cctxt, start, stop, expected_attrs=['flavor']))
+                    for instance in instances:
+                        hours = self._hours_for(instance, start, stop)
+                        if not hours:
+                            continue
+                        flavor = self._get_flavor(cctxt, instance, flavors)
+                        if not flavor:
+                            continue
+                        usage = usages[instance.project_id]
+                        usage['total_local_gb_usage'] += (
+                            (flavor.root_gb + flavor.ephemeral_gb) * hours)
+                        usage['total_vcpus_usage'] += flavor.vcpus * hours
+                        usage['total_memory_mb_usage'] += (
+                            flavor.memory_mb * hours)
+                        usage['total_hours'] += hours
+
+        for tenant_id, usage in usages.items():
+            usage['tenant_id'] = tenant_id
+            usage['start'] = timeutils.normalize_time(period_start)
+            usage['stop'] = timeutils.normalize_time(period_stop)
+        return list(usages.values())
+
     def _parse_datetime(self, dtstr):
         if not dtstr:
             value = timeutils.utcnow()
@@ -299,6 +386,13 @@ class SimpleTenantUsageController(wsgi.Controller):
         if period_stop > now:
             period_stop = now
 
+        # NOTE: The rollups hold the usage of the tenants, not of their
+        # instances, so they cannot be paged by instance like the responses
+        # of the 2.40 microversion.
+        if CONF.api.use_usage_rollups and not detailed and not links:
+            return {'tenant_usages': self._tenant_usages_from_rollups(
+                context, period_start, period_stop)}
+
         marker = None
         limit = CONF.api.max_limit
         if links:
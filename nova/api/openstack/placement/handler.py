@@ -100,6 +100,9 @@ ROUTE_DECLARATIONS = {
     '/resource_providers/{uuid}/allocations': {
         'GET': allocation.list_for_resource_provider,
     },
+    '/allocations': {
+        'POST': allocation.set_allocations_for_consumers,
+    },
     '/allocations/{consumer_uuid}': {
         'GET': allocation.list_for_consumer,
         'PUT': allocation.set_allocations,
@@ -82,6 +82,19 @@ ALLOCATION_SCHEMA_V1_8['properties']['user_id'] = {'type': 'string',
                                                    'maxLength': 255}
 ALLOCATION_SCHEMA_V1_8['required'].extend(['project_id', 'user_id'])
 
+# POST /allocations sets the allocations of several consumers, keyed by their
+# UUIDs. An empty list of allocations removes the allocations of a consumer.
+CONSUMER_ALLOCATION_SCHEMA_V1_12 = copy.deepcopy(ALLOCATION_SCHEMA_V1_8)
+del CONSUMER_ALLOCATION_SCHEMA_V1_12['properties']['allocations']['minItems']
+POST_ALLOCATIONS_SCHEMA_V1_12 = {
+    "type": "object",
+    "minProperties": 1,
+    "patternProperties": {
+        "^[0-9a-fA-F-]{36}$": CONSUMER_ALLOCATION_SCHEMA_V1_12
+    },
+    "additionalProperties": False
+}
+
 
 def _allocations_dict(allocations, key_fetcher, resource_provider=None):
     """Turn allocations into a dict of resources keyed by key_fetcher."""
@@ -209,16 +222,14 @@ def list_for_resource_provider(req):
     return req.response
 
 
-def _set_allocations(req, schema):
-    context = req.environ['placement.context']
-    consumer_uuid = util.wsgi_path_item(req.environ, 'consumer_uuid')
-    data = util.extract_json(req.body, schema)
-    allocation_data = data['allocations']
-
+def _new_allocations(context, consumer_uuid, data):
+    """Create new Allocation objects for the allocations of a consumer in
+    the body of a request.
+    """
     # If the body includes an allocation for a resource provider
     # that does not exist, raise a 400.
     allocation_objects = []
-    for allocation in allocation_data:
+    for allocation in data['allocations']:
         resource_provider_uuid = allocation['resource_provider']['uuid']
 
         try:
@@ -240,7 +251,10 @@ def _set_allocations(req, schema):
                 user_id=data.get('user_id'),
                 used=resources[resource_class])
             allocation_objects.append(allocation)
+    return allocation_objects
 
+
+def _create_allocations(context, allocation_objects, consumer_uuid):
     allocations = rp_obj.AllocationList(
         context, objects=allocation_objects)
 
@@ -263,6 +277,16 @@ def _set_allocations(req, schema):
             _('Inventory changed while attempting to allocate: %(error)s') %
             {'error': exc})
 
+
+def _set_allocations(req, schema):
+    context = req.environ['placement.context']
+    consumer_uuid = util.wsgi_path_item(req.environ, 'consumer_uuid')
+    data = util.extract_json(req.body, schema)
+
+    _create_allocations(context,
+                        _new_allocations(context, consumer_uuid, data),
+                        consumer_uuid)
+
     req.response.status = 204
     req.response.content_type = None
     return req.response
@@ -282,6 +306,45 @@ def set_allocations(req):
     return _set_allocations(req, ALLOCATION_SCHEMA_V1_8)
 
 
+@wsgi_wrapper.PlacementWsgify
+@microversion.version_handler('1.12')
+@util.require_content('application/json')
+def set_allocations_for_consumers(req):
+    """Set the allocations of several consumers at once.
+
+    The allocations of all the consumers are written in a single transaction,
+    checking the capacity and incrementing the generation of each resource
+    provider once, so either all of them are written or none is.
+    """
+    context = req.environ['placement.context']
+    data = util.extract_json(req.body, POST_ALLOCATIONS_SCHEMA_V1_12)
+
+    allocation_objects = []
+    for consumer_uuid, consumer_data in data.items():
+        if consumer_data['allocations']:
+            allocation_objects.extend(
+                _new_allocations(context, consumer_uuid, consumer_data))
+            continue
+        # An allocation of zero removes the existing allocation of a
+        # resource class from a resource provider
+        current_allocations = rp_obj.AllocationList.get_all_by_consumer_id(
+            context, consumer_uuid)
+        for allocation in current_allocations:
+            allocation_objects.append(rp_obj.Allocation(
+                resource_provider=allocation.resource_provider,
+                consumer_id=consumer_uuid,
+                resource_class=allocation.resource_class,
+                used=0))
+
+    if allocation_objects:
+        _create_allocations(context, allocation_objects,
+                            ', '.join(sorted(data)))
+
+    req.response.status = 204
+    req.response.content_type = None
+    return req.response
+
+
 @wsgi_wrapper.PlacementWsgify
 def delete_allocations(req):
     context = req.environ['placement.context']
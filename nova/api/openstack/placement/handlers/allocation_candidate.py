@@ -13,6 +13,7 @@
 """Placement API handlers for getting allocation candidates."""
 
 import collections
+import copy
 
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
@@ -44,6 +45,47 @@ _GET_SCHEMA_1_10 = {
     "additionalProperties": False,
 }
 
+# Add the 'required' query string parameter, a comma-separated list of the
+# names of the traits the providers must have, or must not have when prefixed
+# with '!'
+_GET_SCHEMA_1_13 = copy.deepcopy(_GET_SCHEMA_1_10)
+_GET_SCHEMA_1_13['properties']['required'] = {
+    "type": "string"
+}
+
+
+def _normalize_required_qs_param(qs):
+    """Given the value of the 'required' query string parameter, returns a
+    tuple of the set of the names of the required traits and of the set of
+    the names of the forbidden traits.
+
+    The expected format of the required parameter looks like so:
+
+        $TRAIT_NAME,!$TRAIT_NAME
+
+    :raises `webob.exc.HTTPBadRequest` if the parameter's value isn't in the
+            expected format.
+    """
+    required = set()
+    forbidden = set()
+    for name in qs.split(','):
+        name = name.strip()
+        traits = required
+        if name.startswith('!'):
+            name = name[1:]
+            traits = forbidden
+        if not name:
+            msg = _('Badly formed required parameter. Expected required '
+                    'query string parameter in form: '
+                    '?required=HW_CPU_X86_AVX,!CUSTOM_MAGIC. Got: "%s".')
+            raise webob.exc.HTTPBadRequest(msg % qs)
+        traits.add(name)
+    conflicting = required & forbidden
+    if conflicting:
+        msg = _('Traits %s are both required and forbidden.')
+        raise webob.exc.HTTPBadRequest(msg % ', '.join(sorted(conflicting)))
+    return required, forbidden
+
 
 def _transform_allocation_requests(alloc_reqs):
     """Turn supplied list of AllocationRequest objects into a list of dicts of
@@ -89,9 +131,10 @@ def _transform_allocation_requests(alloc_reqs):
     return results
 
 
-def _transform_provider_summaries(p_sums):
+def _transform_provider_summaries(p_sums, include_traits=False):
     """Turn supplied list of ProviderSummary objects into a dict, keyed by
-    resource provider UUID, of dicts of provider and inventory information.
+    resource provider UUID, of dicts of provider and inventory information,
+    and of the names of the traits of the provider if include_traits is True.
 
     {
        RP_UUID_1: {
@@ -120,19 +163,23 @@ def _transform_provider_summaries(p_sums):
        }
     }
     """
-    return {
-        ps.resource_provider.uuid: {
+    summaries = {}
+    for ps in p_sums:
+        summary = {
             'resources': {
                 psr.resource_class: {
                     'capacity': psr.capacity,
                     'used': psr.used,
                 } for psr in ps.resources
             }
-        } for ps in p_sums
-    }
+        }
+        if include_traits:
+            summary['traits'] = sorted(trait.name for trait in ps.traits)
+        summaries[ps.resource_provider.uuid] = summary
+    return summaries
 
 
-def _transform_allocation_candidates(alloc_cands):
+def _transform_allocation_candidates(alloc_cands, include_traits=False):
     """Turn supplied AllocationCandidates object into a dict containing
     allocation requests and provider summaries.
 
@@ -142,7 +189,8 @@ def _transform_allocation_candidates(alloc_cands):
     }
     """
     a_reqs = _transform_allocation_requests(alloc_cands.allocation_requests)
-    p_sums = _transform_provider_summaries(alloc_cands.provider_summaries)
+    p_sums = _transform_provider_summaries(alloc_cands.provider_summaries,
+                                           include_traits=include_traits)
     return {
         'allocation_requests': a_reqs,
         'provider_summaries': p_sums,
@@ -160,23 +208,39 @@ def list_allocation_candidates(req):
     a collection of allocation requests and provider summaries
     """
     context = req.environ['placement.context']
+    want_version = req.environ[microversion.MICROVERSION_ENVIRON]
     schema = _GET_SCHEMA_1_10
+    if want_version >= (1, 13):
+        schema = _GET_SCHEMA_1_13
     util.validate_query_params(req, schema)
+    # The traits of the providers are only returned since 1.13
+    include_traits = want_version >= (1, 13)
 
     resources = util.normalize_resources_qs_param(req.GET['resources'])
     filters = {
         'resources': resources,
     }
+    if 'required' in req.GET:
+        required, forbidden = _normalize_required_qs_param(
+            req.GET['required'])
+        filters['required_traits'] = required
+        filters['forbidden_traits'] = forbidden
 
     try:
-        cands = rp_obj.AllocationCandidates.get_by_filters(context, filters)
+        cands = rp_obj.AllocationCandidates.get_by_filters(
+            context, filters, include_traits=include_traits)
     except exception.ResourceClassNotFound as exc:
         raise webob.exc.HTTPBadRequest(
             _('Invalid resource class in resources parameter: %(error)s') %
             {'error': exc})
+    except exception.TraitNotFound as exc:
+        raise webob.exc.HTTPBadRequest(
+            _('Invalid trait in required parameter: %(error)s') %
+            {'error': exc})
 
     response = req.response
-    trx_cands = _transform_allocation_candidates(cands)
+    trx_cands = _transform_allocation_candidates(
+        cands, include_traits=include_traits)
     json_data = jsonutils.dumps(trx_cands)
     response.body = encodeutils.to_utf8(json_data)
     response.content_type = 'application/json'
@@ -49,6 +49,9 @@ VERSIONS = [
     '1.9',  # Adds GET /usages
     '1.10',  # Adds GET /allocation_candidates resource endpoint
     '1.11',  # Adds 'allocations' link to the GET /resource_providers response
+    '1.12',  # Adds POST /allocations to set allocations of several consumers
+    '1.13',  # Adds 'required' query parameter to GET /allocation_candidates
+             # and traits to its provider summaries
 ]
 
 
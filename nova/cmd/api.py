@@ -31,6 +31,7 @@ from nova import config
 from nova import exception
 from nova import objects
 from nova import service
+from nova import service_clients
 from nova import utils
 from nova import version
 
@@ -50,6 +51,8 @@ def main():
     log = logging.getLogger(__name__)
 
     gmr.TextGuruMeditation.setup_autorun(version, conf=CONF)
+    gmr.TextGuruMeditation.register_section(
+        'Service Clients', service_clients.report)
 
     launcher = service.process_launcher()
     started = 0
@@ -26,6 +26,7 @@ import nova.conf
 from nova import config
 from nova import objects
 from nova import service
+from nova import service_clients
 from nova import utils
 from nova import version
 
@@ -44,6 +45,8 @@ def main():
     objects.Service.enable_min_version_cache()
 
     gmr.TextGuruMeditation.setup_autorun(version, conf=CONF)
+    gmr.TextGuruMeditation.register_section(
+        'Service Clients', service_clients.report)
 
     should_use_ssl = 'osapi_compute' in CONF.enabled_ssl_apis
     server = service.WSGIService('osapi_compute', use_ssl=should_use_ssl)
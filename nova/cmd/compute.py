@@ -33,6 +33,7 @@ from nova import config
 from nova import objects
 from nova.objects import base as objects_base
 from nova import service
+from nova import service_clients
 from nova import utils
 from nova import version
 
@@ -57,5 +58,10 @@ def main():
     objects.Service.enable_min_version_cache()
     server = service.Service.create(binary='nova-compute',
                                     topic=compute_rpcapi.RPC_TOPIC)
+    if server.manager.periodic_executor is not None:
+        gmr.TextGuruMeditation.register_section(
+            'Periodic Tasks', server.manager.periodic_executor.report)
+    gmr.TextGuruMeditation.register_section(
+        'Service Clients', service_clients.report)
     service.serve(server)
     service.wait()
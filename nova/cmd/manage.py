@@ -69,6 +69,7 @@ from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_utils import encodeutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 import prettytable
 import six
@@ -92,6 +93,7 @@ from nova.objects import build_request as build_request_obj
 from nova.objects import host_mapping as host_mapping_obj
 from nova.objects import instance as instance_obj
 from nova.objects import instance_group as instance_group_obj
+from nova.objects import instance_usage_rollup as rollup_obj
 from nova.objects import keypair as keypair_obj
 from nova.objects import quotas as quotas_obj
 from nova.objects import request_spec
@@ -702,6 +704,28 @@ class DbCommands(object):
         else:
             print(encodeutils.safe_encode(pt.get_string()).decode())
 
+    @staticmethod
+    def _print_throughput(table_to_rows, table_to_elapsed, rows_label):
+        """Print the number of rows processed per table, with the number of
+        rows processed per second.
+
+        :param table_to_rows: `dict` of the number of rows per table
+        :param table_to_elapsed: `dict` of the seconds spent on each table
+        :param rows_label: header label for the number of rows column
+        """
+        pt = prettytable.PrettyTable([_('Table'), rows_label,
+                                      _('Rows per Second')])
+        pt.align = 'l'
+        for table, rows in sorted(table_to_rows.items()):
+            elapsed = table_to_elapsed.get(table)
+            rate = int(rows / max(elapsed, 0.001)) if elapsed else '-'
+            pt.add_row([table, rows, rate])
+
+        if six.PY2:
+            print(encodeutils.safe_encode(pt.get_string()))
+        else:
+            print(encodeutils.safe_encode(pt.get_string()).decode())
+
     @args('--version', metavar='<version>', help=argparse.SUPPRESS)
     @args('--local_cell', action='store_true',
           help='Only sync db in the local cell: do not attempt to fan-out'
@@ -769,11 +793,13 @@ Error: %s""") % six.text_type(e))
             return 2
 
         table_to_rows_archived = {}
+        table_to_elapsed = {}
         if until_complete and verbose:
             sys.stdout.write(_('Archiving') + '..')  # noqa
         while True:
             try:
-                run = db.archive_deleted_rows(max_rows)
+                run = db.archive_deleted_rows(max_rows,
+                                              elapsed=table_to_elapsed)
             except KeyboardInterrupt:
                 run = {}
                 if until_complete and verbose:
@@ -792,13 +818,121 @@ Error: %s""") % six.text_type(e))
                 sys.stdout.write('.')
         if verbose:
             if table_to_rows_archived:
-                self._print_dict(table_to_rows_archived, _('Table'),
-                                 dict_value=_('Number of Rows Archived'))
+                self._print_throughput(table_to_rows_archived,
+                                       table_to_elapsed,
+                                       _('Number of Rows Archived'))
             else:
                 print(_('Nothing was archived.'))
         # NOTE(danms): Return nonzero if we archived something
         return int(bool(table_to_rows_archived))
 
+    @args('--before', metavar='<date>', dest='before',
+          help='Purge rows archived before this date, in ISO 8601 format, '
+               'for example 2017-12-31 or 2017-12-31T12:00:00Z.')
+    @args('--all', action='store_true', dest='purge_all', default=False,
+          help='Purge all rows from the shadow tables.')
+    @args('--max_rows', type=int, metavar='<number>', default=1000,
+          help='Maximum number of rows to delete from a table at once')
+    @args('--verbose', action='store_true', dest='verbose', default=False,
+          help='Print how many rows were purged per table.')
+    def purge(self, before=None, purge_all=False, max_rows=1000,
+              verbose=False):
+        """Delete archived rows from the shadow tables.
+
+        The rows of each table are deleted in batches of up to max_rows
+        rows. Returns 0 if nothing was purged, 1 if some number of rows were
+        purged, 2 if the arguments are invalid.
+        """
+        if bool(before) == purge_all:
+            print(_('Exactly one of --before or --all is required'))
+            return 2
+        max_rows = int(max_rows)
+        if max_rows < 1:
+            print(_("Must supply a positive value for max_rows"))
+            return 2
+        if max_rows > db.MAX_INT:
+            print(_('max rows must be <= %(max_value)d') %
+                  {'max_value': db.MAX_INT})
+            return 2
+        if before:
+            try:
+                before = timeutils.normalize_time(
+                    timeutils.parse_isotime(before))
+            except ValueError as e:
+                print(_('Invalid value for --before: %s') % e)
+                return 2
+
+        table_to_elapsed = {}
+        table_to_rows_purged = db.purge_shadow_tables(
+            before=before, max_rows=max_rows, elapsed=table_to_elapsed)
+        if verbose:
+            if table_to_rows_purged:
+                self._print_throughput(table_to_rows_purged,
+                                       table_to_elapsed,
+                                       _('Number of Rows Purged'))
+            else:
+                print(_('Nothing was purged.'))
+        return int(bool(table_to_rows_purged))
+
+    @args('--start', metavar='<date>', dest='start',
+          help='First day to roll up, in YYYY-MM-DD format. Defaults to the '
+               'day after the last rolled up day or, if no day was rolled '
+               'up yet, to the day the first instance was launched.')
+    @args('--max-days', type=int, metavar='<number>', dest='max_days',
+          help='Maximum number of days to roll up in this run.')
+    @args('--verbose', action='store_true', dest='verbose', default=False,
+          help='Print the usage totals of each rolled up day.')
+    def rollup_usage(self, start=None, max_days=None, verbose=False):
+        """Roll up the usage of the instances per day, project and flavor.
+
+        Only the days which are over are rolled up, and rolling up a day again
+        replaces its rollups, so this can safely be run from cron, typically
+        shortly after midnight UTC.
+
+        Returns 0 if there was nothing to roll up, 1 if some days were rolled
+        up, 2 if the arguments are invalid.
+        """
+        if max_days is not None and max_days <= 0:
+            print(_('Must supply a positive value for max_days'))
+            return 2
+        if start:
+            try:
+                day = timeutils.parse_strtime(start, '%Y-%m-%d')
+            except ValueError as e:
+                print(_('Invalid value for --start: %s') % e)
+                return 2
+        else:
+            ctxt = context.get_admin_context()
+            last_day = db.instance_usage_rollup_get_last_period_start(ctxt)
+            if last_day is not None:
+                day = last_day + rollup_obj.ROLLUP_PERIOD
+            else:
+                day = db.instance_get_earliest_launched_at(ctxt)
+                if day is None:
+                    if verbose:
+                        print(_('Nothing to roll up.'))
+                    return 0
+            day = day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        today = timeutils.utcnow().replace(hour=0, minute=0, second=0,
+                                           microsecond=0)
+        days = 0
+        while (day + rollup_obj.ROLLUP_PERIOD <= today and
+               (max_days is None or days < max_days)):
+            rollups = objects.InstanceUsageRollupList.rollup_day(
+                context.get_admin_context(), day)
+            if verbose:
+                totals = [r for r in rollups if r.project_id is None][0]
+                print(_('%(day)s: %(instances)d instances, %(hours).2f '
+                        'hours') % {'day': day.strftime('%Y-%m-%d'),
+                                    'instances': totals.instances,
+                                    'hours': totals.hours})
+            day += rollup_obj.ROLLUP_PERIOD
+            days += 1
+        if verbose and not days:
+            print(_('Nothing to roll up.'))
+        return int(bool(days))
+
     @args('--delete', action='store_true', dest='delete',
           help='If specified, automatically delete any records found where '
                'instance_uuid is NULL.')
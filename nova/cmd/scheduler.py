@@ -26,6 +26,7 @@ import nova.conf
 from nova import config
 from nova import objects
 from nova.scheduler import rpcapi as scheduler_rpcapi
+from nova.scheduler import stats as scheduler_stats
 from nova import service
 from nova import utils
 from nova import version
@@ -42,6 +43,9 @@ def main():
     objects.Service.enable_min_version_cache()
 
     gmr.TextGuruMeditation.setup_autorun(version, conf=CONF)
+    if CONF.scheduler.trace_sample_rate:
+        gmr.TextGuruMeditation.register_section(
+            'Scheduling Stats', scheduler_stats.STATS.report)
 
     server = service.Service.create(binary='nova-scheduler',
                                     topic=scheduler_rpcapi.RPC_TOPIC)
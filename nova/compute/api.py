@@ -3155,6 +3155,12 @@ class API(base.Base):
         # resource consumption for this operation is written to the database
         # by compute.
         scheduler_hint = {'filter_properties': filter_properties}
+
+        # The console of the instance is moved or restarted, so its tokens,
+        # and their remembered validations, must not be used anymore
+        self.consoleauth_rpcapi.delete_tokens_for_instance(
+            context, instance.uuid)
+
         self.compute_task_api.resize_instance(context, instance,
                 extra_instance_updates, scheduler_hint=scheduler_hint,
                 flavor=new_instance_type,
@@ -3939,6 +3945,9 @@ class API(base.Base):
         compute_utils.notify_about_instance_usage(
             self.notifier, context, instance, "evacuate")
 
+        self.consoleauth_rpcapi.delete_tokens_for_instance(
+            context, instance.uuid)
+
         try:
             request_spec = objects.RequestSpec.get_by_instance_uuid(
                 context, instance.uuid)
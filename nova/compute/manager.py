@@ -36,6 +36,7 @@ import traceback
 
 from cinderclient import exceptions as cinder_exception
 from cursive import exception as cursive_exception
+import eventlet
 import eventlet.event
 from eventlet import greenthread
 import eventlet.semaphore
@@ -58,6 +59,7 @@ from nova.cells import rpcapi as cells_rpcapi
 from nova import compute
 from nova.compute import build_results
 from nova.compute import claims
+from nova.compute import periodic
 from nova.compute import power_state
 from nova.compute import resource_tracker
 from nova.compute import rpcapi as compute_rpcapi
@@ -534,6 +536,12 @@ class ComputeManager(manager.Manager):
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
 
+        self.periodic_executor = None
+        if CONF.compute.periodic_task_workers:
+            self.periodic_executor = periodic.PeriodicTaskExecutor(
+                self, CONF.compute.periodic_task_workers,
+                jitter=CONF.compute.periodic_task_jitter)
+
         # NOTE(russellb) Load the driver last.  It may call back into the
         # compute manager via the virtapi, so we want it to be fully
         # initialized before that happens.
@@ -1050,13 +1058,38 @@ class ComputeManager(manager.Manager):
         return retry_reboot, reboot_type
 
     def handle_lifecycle_event(self, event):
-        LOG.info("VM %(state)s (Lifecycle Event)",
-                 {'state': event.get_name()},
-                 instance_uuid=event.get_instance_uuid())
         context = nova.context.get_admin_context(read_deleted='yes')
         instance = objects.Instance.get_by_uuid(context,
                                                 event.get_instance_uuid(),
                                                 expected_attrs=[])
+        self._handle_lifecycle_event(context, instance, event)
+
+    def _handle_lifecycle_events(self, events):
+        """Handle a batch of lifecycle events with a single DB query."""
+        context = nova.context.get_admin_context(read_deleted='yes')
+        uuids = [event.get_instance_uuid() for event in events]
+        instances = objects.InstanceList.get_by_filters(
+            context, {'uuid': uuids}, expected_attrs=[])
+        instances = {instance.uuid: instance for instance in instances}
+        for event in events:
+            instance = instances.get(event.get_instance_uuid())
+            try:
+                if instance is None:
+                    raise exception.InstanceNotFound(
+                        instance_id=event.get_instance_uuid())
+                self._handle_lifecycle_event(context, instance, event)
+            except exception.InstanceNotFound:
+                # NOTE: The instance may also be deleted while the event is
+                # being handled, in which case refreshing it raises too.
+                LOG.debug("Event %s arrived for non-existent instance. The "
+                          "instance was probably deleted.", event)
+            except Exception:
+                LOG.exception("Error handling lifecycle event %s", event)
+
+    def _handle_lifecycle_event(self, context, instance, event):
+        LOG.info("VM %(state)s (Lifecycle Event)",
+                 {'state': event.get_name()},
+                 instance_uuid=event.get_instance_uuid())
         vm_power_state = None
         if event.get_transition() == virtevent.EVENT_LIFECYCLE_STOPPED:
             vm_power_state = power_state.SHUTDOWN
@@ -1091,7 +1124,16 @@ class ComputeManager(manager.Manager):
                                             vm_power_state)
 
     def handle_events(self, event):
-        if isinstance(event, virtevent.LifecycleEvent):
+        if isinstance(event, list):
+            lifecycle_events = []
+            for ev in event:
+                if isinstance(ev, virtevent.LifecycleEvent):
+                    lifecycle_events.append(ev)
+                else:
+                    LOG.debug("Ignoring event %s", ev)
+            if lifecycle_events:
+                self._handle_lifecycle_events(lifecycle_events)
+        elif isinstance(event, virtevent.LifecycleEvent):
             try:
                 self.handle_lifecycle_event(event)
             except exception.InstanceNotFound:
@@ -1166,6 +1208,13 @@ class ComputeManager(manager.Manager):
                 # _sync_scheduler_instance_info periodic task will.
                 self._update_scheduler_instance_info(context, instances)
 
+    def periodic_tasks(self, context, raise_on_error=False):
+        """Tasks to be run at a periodic interval."""
+        if self.periodic_executor is None:
+            return super(ComputeManager, self).periodic_tasks(
+                context, raise_on_error=raise_on_error)
+        return self.periodic_executor.run_periodic_tasks(context)
+
     def cleanup_host(self):
         self.driver.register_event_listener(None)
         self.instance_events.cancel_all_events()
@@ -6564,6 +6613,7 @@ class ComputeManager(manager.Manager):
                 LOG.exception('Periodic task failed to offload instance.',
                               instance=instance)
 
+    @periodic.priority(periodic.LOW)
     @periodic_task.periodic_task
     def _instance_usage_audit(self, context):
         if not CONF.instance_usage_audit:
@@ -6756,6 +6806,7 @@ class ComputeManager(manager.Manager):
 
         self._update_volume_usage_cache(context, vol_usages)
 
+    @periodic.priority(periodic.HIGH)
     @periodic_task.periodic_task(spacing=CONF.sync_power_state_interval,
                                  run_immediately=True)
     def _sync_power_states(self, context):
@@ -7055,6 +7106,7 @@ class ComputeManager(manager.Manager):
             LOG.exception("Error updating resources for node %(node)s.",
                           {'node': nodename})
 
+    @periodic.priority(periodic.HIGH)
     @periodic_task.periodic_task(spacing=CONF.update_resources_interval)
     def update_available_resource(self, context, startup=False):
         """See driver.get_available_resource()
@@ -7071,8 +7123,31 @@ class ComputeManager(manager.Manager):
                                                             use_slave=True,
                                                             startup=startup)
         nodenames = set(self.driver.get_available_nodes())
-        for nodename in nodenames:
-            self.update_available_resource_for_node(context, nodename)
+        # Update the nodes whose resources changed since their last update
+        # first, so that a pass taking longer than the interval of this task
+        # does not delay them.
+        changed_nodes = self._get_resource_tracker().changed_nodes
+        ordered_nodenames = sorted(nodenames,
+                                   key=lambda n: n not in changed_nodes)
+        start = time.time()
+        workers = CONF.compute.resource_update_workers
+        if workers > 1 and len(nodenames) > 1:
+            pool = eventlet.GreenPool(workers)
+            for nodename in ordered_nodenames:
+                pool.spawn_n(self.update_available_resource_for_node,
+                             context, nodename)
+            pool.waitall()
+        else:
+            for nodename in ordered_nodenames:
+                self.update_available_resource_for_node(context, nodename)
+        duration = time.time() - start
+        interval = (CONF.update_resources_interval or
+                    periodic_task.DEFAULT_INTERVAL)
+        log = LOG.warning if duration > interval > 0 else LOG.debug
+        log("Updated the resources of %(nodes)d nodes in %(duration).2f "
+            "seconds (%(rate).1f nodes per second).",
+            {'nodes': len(nodenames), 'duration': duration,
+             'rate': len(nodenames) / duration if duration else 0})
 
         # Delete orphan compute node not reported by driver but still in db
         for cn in compute_nodes_in_db:
@@ -7104,6 +7179,7 @@ class ComputeManager(manager.Manager):
                 LOG.error("No compute node record for host %s", self.host)
             return []
 
+    @periodic.priority(periodic.LOW)
     @periodic_task.periodic_task(
         spacing=CONF.running_deleted_instance_poll_interval)
     def _cleanup_running_deleted_instances(self, context):
@@ -7399,6 +7475,7 @@ class ComputeManager(manager.Manager):
             else:
                 self._process_instance_event(instance, event)
 
+    @periodic.priority(periodic.LOW)
     @periodic_task.periodic_task(spacing=CONF.image_cache_manager_interval,
                                  external_process_ok=True)
     def _run_image_cache_manager_pass(self, context):
@@ -7424,6 +7501,7 @@ class ComputeManager(manager.Manager):
 
         self.driver.manage_image_cache(context, filtered_instances)
 
+    @periodic.priority(periodic.LOW)
     @periodic_task.periodic_task(spacing=CONF.instance_delete_interval)
     def _run_pending_deletes(self, context):
         """Retry any pending instance file deletes."""
@@ -7462,6 +7540,7 @@ class ComputeManager(manager.Manager):
                 with utils.temporary_mutation(context, read_deleted='yes'):
                     instance.save()
 
+    @periodic.priority(periodic.LOW)
     @periodic_task.periodic_task(spacing=CONF.instance_delete_interval)
     def _cleanup_incomplete_migrations(self, context):
         """Delete instance files on failed resize/revert-resize operation
@@ -0,0 +1,209 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Concurrent execution of the periodic tasks of a manager.
+
+By default oslo.service runs the periodic tasks of a manager one after the
+other, so a slow task (an image cache manager pass on a busy host, for
+example) delays every other task, including the ones reporting resources
+and syncing power states. The PeriodicTaskExecutor runs due tasks in a pool
+of greenthreads instead, starting higher priority tasks first, never
+running two instances of the same task at once, and keeping per-task
+statistics.
+"""
+
+import random
+import time
+
+import eventlet
+from oslo_log import log as logging
+from oslo_reports.models import with_default_views as mwdv
+from oslo_service import periodic_task
+from oslo_utils import reflection
+
+LOG = logging.getLogger(__name__)
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+PRIORITY_NAMES = {HIGH: 'high', NORMAL: 'normal', LOW: 'low'}
+
+# How long to wait before trying again to start a due task which could not
+# be started because no worker was available for it.
+_RETRY_INTERVAL = 1
+
+
+def priority(value):
+    """Decorator setting the priority class of a periodic task.
+
+    Tasks without a priority are NORMAL. When more tasks are due than there
+    are workers available, higher priority tasks are started first, and LOW
+    priority tasks are never allowed to occupy more than half of the
+    workers. With a single worker, LOW priority tasks may occupy it, but are
+    only started when no higher priority task is due.
+    """
+    def decorator(f):
+        f._periodic_priority = value
+        return f
+    return decorator
+
+
+class TaskStats(object):
+    """Statistics about the runs of a single periodic task."""
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self.running = False
+        self.last_start = None
+        self.last_duration = None
+        self.max_duration = None
+
+    def to_dict(self):
+        return {'priority': PRIORITY_NAMES[self.priority],
+                'runs': self.runs,
+                'errors': self.errors,
+                'overruns': self.overruns,
+                'running': self.running,
+                'last_start': self.last_start,
+                'last_duration': self.last_duration,
+                'max_duration': self.max_duration}
+
+
+class PeriodicTaskExecutor(object):
+    """Run the periodic tasks of a manager concurrently.
+
+    :param manager: an oslo_service.periodic_task.PeriodicTasks instance
+    :param workers: maximum number of tasks running at the same time
+    :param jitter: maximum number of seconds by which to randomly delay the
+                   start of each task
+    """
+
+    def __init__(self, manager, workers, jitter=0):
+        self.manager = manager
+        self.workers = workers
+        self.jitter = jitter
+        self._pool = eventlet.GreenPool(workers)
+        # NOTE: LOW priority tasks must be able to run with a single worker,
+        # so they are allowed to occupy it, after the higher priority tasks.
+        self._limits = {LOW: max(1, workers // 2)}
+        self._running = {HIGH: 0, NORMAL: 0, LOW: 0}
+        # The number of workers reserved for tasks waiting for their jitter
+        # delay to pass, which do not occupy the pool while they wait.
+        self._delayed = 0
+        self.stats = {}
+        for task_name, task in manager._periodic_tasks:
+            self.stats[task_name] = TaskStats(
+                getattr(task, '_periodic_priority', NORMAL))
+
+    def _can_start(self, priority):
+        if self._pool.free() <= self._delayed:
+            return False
+        limit = self._limits.get(priority)
+        return limit is None or self._running[priority] < limit
+
+    def _start_delayed(self, context, task_name, task):
+        self._delayed -= 1
+        self._pool.spawn_n(self._run_task, context, task_name, task)
+
+    def _run_task(self, context, task_name, task):
+        stats = self.stats[task_name]
+        full_task_name = '.'.join(
+            [reflection.get_class_name(self.manager, fully_qualified=False),
+             task_name])
+        LOG.debug("Running periodic task %(full_task_name)s",
+                  {"full_task_name": full_task_name})
+        stats.last_start = time.time()
+        try:
+            task(self.manager, context)
+        except Exception:
+            stats.errors += 1
+            LOG.exception("Error during %(full_task_name)s",
+                          {"full_task_name": full_task_name})
+        finally:
+            duration = time.time() - stats.last_start
+            stats.runs += 1
+            stats.last_duration = duration
+            stats.max_duration = max(stats.max_duration or 0, duration)
+            stats.running = False
+            self._running[stats.priority] -= 1
+
+    def run_periodic_tasks(self, context):
+        """Start the periodic tasks which are due.
+
+        This does not wait for the tasks to complete.
+
+        :returns: the number of seconds until a task is next due
+        """
+        manager = self.manager
+        idle_for = periodic_task.DEFAULT_INTERVAL
+        now = time.time()
+        due = []
+        for task_name, task in manager._periodic_tasks:
+            if (task._periodic_external_ok and
+                    not manager.conf.run_external_periodic_tasks):
+                continue
+
+            spacing = manager._periodic_spacing[task_name]
+            last_run = manager._periodic_last_run[task_name]
+            idle_for = min(idle_for, spacing)
+            if last_run is not None:
+                delta = last_run + spacing - now
+                if delta > 0:
+                    idle_for = min(idle_for, delta)
+                    continue
+
+            stats = self.stats[task_name]
+            if stats.running:
+                # The previous run took longer than the spacing of the task,
+                # so skip this run rather than queue another one behind it.
+                stats.overruns += 1
+                manager._periodic_last_run[task_name] = now
+                LOG.warning("Periodic task %(task)s is still running from "
+                            "a previous run and has overrun its spacing of "
+                            "%(spacing)ds; skipping this run.",
+                            {'task': task_name, 'spacing': spacing})
+                continue
+            due.append((stats.priority, task_name, task))
+
+        for priority, task_name, task in sorted(due, key=lambda t: t[0]):
+            if not self._can_start(priority):
+                idle_for = min(idle_for, _RETRY_INTERVAL)
+                continue
+            manager._periodic_last_run[task_name] = now
+            stats = self.stats[task_name]
+            stats.running = True
+            self._running[priority] += 1
+            delay = random.uniform(0, self.jitter) if self.jitter else 0
+            if delay:
+                # NOTE: Sleeping in a worker would keep other due tasks
+                # from using it, so only reserve the worker until the task
+                # is spawned in the pool once the delay has passed.
+                self._delayed += 1
+                eventlet.spawn_after(delay, self._start_delayed, context,
+                                     task_name, task)
+            else:
+                self._pool.spawn_n(self._run_task, context, task_name, task)
+
+        return idle_for
+
+    def get_stats(self):
+        """Return the statistics of every task, keyed by task name."""
+        return {task_name: stats.to_dict()
+                for task_name, stats in self.stats.items()}
+
+    def report(self):
+        """Guru Meditation Report section generator for the task stats."""
+        return mwdv.ModelWithDefaultViews(data=self.get_stats())
@@ -20,6 +20,8 @@ model.
 """
 import collections
 import copy
+import functools
+import time
 
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
@@ -50,6 +52,35 @@ CONF = nova.conf.CONF
 LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
 
+# Compute node fields which are maintained by the resource tracker from the
+# instances and migrations on the node, rather than reported by the virt
+# driver.
+_USAGE_FIELDS = ('vcpus_used', 'memory_mb_used', 'local_gb_used')
+
+
+def _semaphore_timed(f):
+    """Record how long the decorated method held the resource semaphore.
+
+    This must be applied below utils.synchronized() so that only the time
+    spent holding the semaphore is measured.
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return f(self, *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            counters = self.semaphore_stats[f.__name__]
+            counters['count'] += 1
+            counters['total'] += elapsed
+            counters['max'] = max(counters['max'], elapsed)
+    return wrapper
+
+
+def _new_semaphore_stat():
+    return {'count': 0, 'total': 0.0, 'max': 0.0}
+
 
 def _instance_in_resize_state(instance):
     """Returns True if the instance is in one of the resizing states.
@@ -147,6 +178,13 @@ class ResourceTracker(object):
         self.ram_allocation_ratio = CONF.ram_allocation_ratio
         self.cpu_allocation_ratio = CONF.cpu_allocation_ratio
         self.disk_allocation_ratio = CONF.disk_allocation_ratio
+        # Time of the last full usage audit, keyed by nodename
+        self.last_audit = {}
+        # Nodes whose resources changed since they were last updated by
+        # update_available_resource
+        self.changed_nodes = set()
+        # Time spent holding COMPUTE_RESOURCE_SEMAPHORE, keyed by method
+        self.semaphore_stats = collections.defaultdict(_new_semaphore_stat)
 
     def get_node_uuid(self, nodename):
         try:
@@ -155,6 +193,7 @@ class ResourceTracker(object):
             raise exception.ComputeHostNotFound(host=nodename)
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    @_semaphore_timed
     def instance_claim(self, context, instance, nodename, limits=None):
         """Indicate that some resources are needed for an upcoming compute
         instance build operation.
@@ -237,6 +276,7 @@ class ResourceTracker(object):
         return claim
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    @_semaphore_timed
     def rebuild_claim(self, context, instance, nodename, limits=None,
                       image_meta=None, migration=None):
         """Create a claim for a rebuild operation."""
@@ -246,6 +286,7 @@ class ResourceTracker(object):
                                 limits=limits, image_meta=image_meta)
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    @_semaphore_timed
     def resize_claim(self, context, instance, instance_type, nodename,
                      migration, image_meta=None, limits=None):
         """Create a claim for a resize or cold-migration move."""
@@ -415,6 +456,7 @@ class ResourceTracker(object):
         instance.save()
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    @_semaphore_timed
     def abort_instance_claim(self, context, instance, nodename):
         """Remove usage from the given instance."""
         self._update_usage_from_instance(context, instance, nodename,
@@ -438,6 +480,7 @@ class ResourceTracker(object):
                 self.compute_nodes[nodename].pci_device_pools = dev_pools_obj
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    @_semaphore_timed
     def drop_move_claim(self, context, instance, nodename,
                         instance_type=None, prefix='new_'):
         # Remove usage for an incoming/outgoing migration on the destination
@@ -473,6 +516,7 @@ class ResourceTracker(object):
             self._update(ctxt, self.compute_nodes[nodename])
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    @_semaphore_timed
     def update_usage(self, context, instance, nodename):
         """Update the resource usage and stats after a change in an
         instance
@@ -631,6 +675,67 @@ class ResourceTracker(object):
         self._report_hypervisor_resource_view(resources)
 
         self._update_available_resource(context, resources)
+        self.changed_nodes.discard(nodename)
+        self._report_semaphore_stats()
+
+    def _report_semaphore_stats(self):
+        """Log and reset the time spent holding the resource semaphore."""
+        for name, counters in sorted(self.semaphore_stats.items()):
+            LOG.debug("Held %(sem)s in %(name)s %(count)d times for "
+                      "%(total).3fs (max %(max).3fs)",
+                      dict(counters, sem=COMPUTE_RESOURCE_SEMAPHORE,
+                           name=name))
+        self.semaphore_stats.clear()
+
+    def _audit_due(self, nodename):
+        """Check whether resource usage of a node needs a full audit."""
+        interval = CONF.resource_audit_interval
+        if not interval or nodename not in self.last_audit:
+            return True
+        return time.time() - self.last_audit[nodename] >= interval
+
+    def _refresh_hypervisor_resources(self, context, resources):
+        """Refresh the values reported by the virt driver for a node,
+        keeping the usage maintained by claims since the last audit.
+        """
+        nodename = resources['hypervisor_hostname']
+        if self.disabled(nodename):
+            return
+
+        LOG.debug("Skipping audit of resource usage for %(host)s "
+                  "(node: %(node)s), last audit %(age)ds ago",
+                  {'host': self.host, 'node': nodename,
+                   'age': time.time() - self.last_audit[nodename]})
+        cn = self.compute_nodes[nodename]
+        # NOTE: numa_topology is left alone as it also carries the usage
+        # of the pinned CPUs and memory pages of instances.
+        cn.update_from_virt_driver(
+            {key: value for key, value in resources.items()
+             if key not in _USAGE_FIELDS + ('numa_topology',)})
+        cn.free_ram_mb = cn.memory_mb - cn.memory_mb_used
+        cn.free_disk_gb = cn.local_gb - cn.local_gb_used
+
+        self._report_final_resource_view(nodename)
+
+        metrics = self._get_host_metrics(context, nodename)
+        cn.metrics = jsonutils.dumps(metrics)
+
+        self._update(context, cn)
+
+    def _report_usage_drift(self, nodename, expected):
+        """Log any difference between the usage maintained incrementally
+        since the last audit and the usage found by the audit.
+        """
+        cn = self.compute_nodes[nodename]
+        drift = {key: (value, getattr(cn, key))
+                 for key, value in expected.items()
+                 if value != getattr(cn, key)}
+        if drift:
+            LOG.warning("Resource usage of %(host)s (node: %(node)s) "
+                        "drifted since the last audit (tracked, audited): "
+                        "%(drift)s",
+                        {'host': self.host, 'node': nodename,
+                         'drift': drift})
 
     def _pair_instances_to_migrations(self, migrations, instances):
         instance_by_uuid = {inst.uuid: inst for inst in instances}
@@ -650,14 +755,25 @@ class ResourceTracker(object):
                           {'uuid': migration.instance_uuid})
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    @_semaphore_timed
     def _update_available_resource(self, context, resources):
+        nodename = resources['hypervisor_hostname']
+        if not self._audit_due(nodename):
+            self._refresh_hypervisor_resources(context, resources)
+            return
+
+        # Remember the usage maintained by claims since the last audit so
+        # that we can report whether it drifted from the audited usage.
+        expected = None
+        if CONF.resource_audit_interval and nodename in self.compute_nodes:
+            cn = self.compute_nodes[nodename]
+            expected = {key: getattr(cn, key) for key in _USAGE_FIELDS
+                        if cn.obj_attr_is_set(key)}
 
         # initialize the compute node object, creating it
         # if it does not already exist.
         self._init_compute_node(context, resources)
 
-        nodename = resources['hypervisor_hostname']
-
         # if we could not init the compute node the tracker will be
         # disabled and we should quit now
         if self.disabled(nodename):
@@ -710,6 +826,10 @@ class ResourceTracker(object):
         LOG.debug('Compute_service record updated for %(host)s:%(node)s',
                   {'host': self.host, 'node': nodename})
 
+        if expected is not None:
+            self._report_usage_drift(nodename, expected)
+        self.last_audit[nodename] = time.time()
+
     def _get_compute_node(self, context, nodename):
         """Returns compute node for the host and nodename."""
         try:
@@ -807,6 +927,7 @@ class ResourceTracker(object):
         if not self._resource_change(compute_node):
             return
         nodename = compute_node.hypervisor_hostname
+        self.changed_nodes.add(nodename)
         compute_node.save()
         # Persist the stats to the Scheduler
         try:
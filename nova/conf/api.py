@@ -228,6 +228,30 @@ osapi_opts = [
         help="""
 As a query can potentially return many thousands of items, you can limit the
 maximum number of items in a single response by setting this option.
+"""),
+    cfg.BoolOpt("use_usage_rollups",
+        default=False,
+        help="""
+Answer non-detailed os-simple-tenant-usage list requests from usage rollups.
+
+By default the usage of all tenants is computed by loading every instance
+which was active during the requested period from every cell, which can take
+a very long time for long periods on large deployments. When this option is
+enabled, the usage of the whole days of the period which have been rolled up
+by ``nova-manage db rollup_usage`` is read from the rollups of each cell, and
+only the instances active during the rest of the period, typically the
+current day, are loaded. ``nova-manage db rollup_usage`` must then be run
+daily, for example from cron, against every cell database.
+
+Responses computed from rollups include the usage of all the instances
+active during the period rather than only the first ``max_limit`` ones.
+Detailed requests, requests for a single tenant and requests using
+microversion 2.40 or later, whose responses are paginated by instance, are
+always computed from the instances.
+
+Related options:
+
+* ``max_limit``
 """),
     cfg.StrOpt("compute_link_prefix",
         deprecated_group="DEFAULT",
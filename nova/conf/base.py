@@ -60,6 +60,39 @@ entry.
     cfg.StrOpt(
         'tempdir',
         help='Explicitly specify the temporary working directory.'),
+    cfg.IntOpt(
+        'service_discovery_cache_ttl',
+        default=300,
+        min=0,
+        help="""
+Number of seconds the endpoints and the versions discovered from the other
+services are remembered.
+
+Nova discovers the endpoint of the image service when ``[glance]api_servers``
+is not set, and the maximum microversion of the volume service before the
+calls needing a microversion, such as the creation of the attachments of the
+volumes. These discoveries are then reused until they are older than this
+many seconds, so a service upgraded to a new version is seen after at most
+this delay.
+
+Possible values:
+
+* 0: Disables the cache, every discovery queries the service
+* Any positive integer in seconds
+"""),
+    cfg.IntOpt(
+        'service_connection_pool_size',
+        default=10,
+        min=1,
+        help="""
+Maximum number of idle connections kept alive to each endpoint of the volume,
+image and network services.
+
+The connections to these services are pooled per endpoint and reused by the
+later requests. More connections are opened when more requests are in
+progress at once, and closed once their request is done if this many
+connections are already idle.
+"""),
     cfg.BoolOpt(
         'monkey_patch',
         default=False,
@@ -242,6 +242,22 @@ Possible values:
 Related options:
 
 * ``compute_driver``: Only the libvirt driver uses this option.
+"""),
+    cfg.BoolOpt('inspect_image_headers',
+        default=True,
+        help="""
+Read local disk image headers directly instead of running ``qemu-img info``.
+
+When enabled, information about qcow2 images, and about images which are
+already known to be raw, is read from the image file by the compute service
+itself rather than by forking a ``qemu-img info`` process. Images in any
+other format, or qcow2 images using features such as encryption, internal
+snapshots or external data files, are always inspected with ``qemu-img``.
+
+Possible values:
+
+* True: Inspect supported image headers in-process
+* False: Always run ``qemu-img info``
 """),
 # NOTE(yamahata): ListOpt won't work because the command may include a comma.
 # For example:
@@ -636,6 +652,78 @@ Possible values:
 
 * Any positive integer representing a build failure count.
 * Zero to never auto-disable.
+"""),
+    cfg.IntOpt('periodic_task_workers',
+        default=0,
+        min=0,
+        help="""
+Number of periodic tasks which may run concurrently.
+
+By default the periodic tasks of nova-compute run one after the other, so a
+slow task (an image cache manager pass or a pending deletes cleanup on a busy
+host, for example) delays all the others, including the resource tracker
+update and the power state sync. When this option is set, due tasks are run
+concurrently in a pool of this many greenthreads instead. Resource reporting
+and power state sync are started first, low priority housekeeping tasks
+never occupy more than half of the workers, and a task is never started again
+while a previous run of it is still in progress. With a single worker, low
+priority tasks may occupy it, but only when no higher priority task is due.
+
+Statistics about each task (runs, errors, overruns and durations) are
+included in the Guru Meditation Report when this option is set.
+
+Possible values:
+
+* 0: Run periodic tasks sequentially (default).
+* Any positive integer: Maximum number of periodic tasks running at once.
+
+Related options:
+
+* ``[compute] periodic_task_jitter``
+"""),
+    cfg.IntOpt('periodic_task_jitter',
+        default=0,
+        min=0,
+        help="""
+Maximum number of seconds by which to randomly delay each periodic task.
+
+Spreading the start of periodic tasks avoids every compute host in a
+deployment calling the conductor and placement services at the same moment.
+Only used when ``[compute] periodic_task_workers`` is set.
+
+Possible values:
+
+* 0: Start due tasks immediately (default).
+* Any positive integer: Upper bound, in seconds, of the random delay.
+
+Related options:
+
+* ``[compute] periodic_task_workers``
+"""),
+    cfg.IntOpt('resource_update_workers',
+        default=1,
+        min=1,
+        help="""
+Number of compute nodes whose resources are updated concurrently.
+
+Compute drivers managing many nodes, like the ironic and vmwareapi drivers,
+report the resources of each node separately, and by default the periodic
+resource update handles the nodes one after the other, which can take longer
+than ``update_resources_interval`` with thousands of nodes. When this option
+is greater than 1, up to this many nodes are updated concurrently, which
+overlaps the calls to the hypervisor, the database and the placement service
+for different nodes. Nodes whose resources changed since their last update
+are always updated first. Changes to the resource usage of the host are
+still serialized by the resource tracker.
+
+Possible values:
+
+* 1: Update the nodes one after the other (default).
+* Any integer greater than 1: Maximum number of nodes updated at once.
+
+Related options:
+
+* ``update_resources_interval``
 """),
 ]
 
@@ -870,6 +958,31 @@ Possible values:
 * 0: Will run at the default periodic interval.
 * Any value < 0: Disables the option.
 * Any positive integer in seconds.
+"""),
+    cfg.IntOpt('resource_audit_interval',
+        default=0,
+        min=0,
+        help="""
+Interval between full audits of compute resource usage.
+
+By default, every run of the update_available_resources periodic task
+recalculates the resource usage of each compute node from scratch, from
+the instances and migrations on the node, while holding the lock which
+instance claims also need. When this option is set to a positive value,
+resource usage is instead maintained incrementally by instance claims,
+move claims and instance state changes, and the periodic task only
+refreshes the values reported by the hypervisor. A full audit, which
+reports any difference from the incrementally maintained usage, is then
+only done once this many seconds have passed since the previous one.
+
+Possible values:
+
+* 0: Do a full audit on every run of the periodic task.
+* Any positive integer in seconds.
+
+Related options:
+
+* ``update_resources_interval``
 """)
 ]
 
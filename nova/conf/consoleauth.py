@@ -32,7 +32,29 @@ The lifetime of a console auth token.
 A console auth token is used in authorizing console access for a user.
 Once the auth token time to live count has elapsed, the token is
 considered expired.  Expired tokens are then deleted.
-""")
+"""),
+    cfg.IntOpt('validation_cache_ttl',
+        default=0,
+        min=0,
+        help="""
+The number of seconds during which the validation of a console auth token is
+remembered.
+
+When a token is checked, its instance is looked up and the compute host of
+the instance is asked whether the console port of the token is still the one
+of the instance. When this is set, the result is remembered for this number
+of seconds, along with the other tokens of the same console of the instance,
+so that the reconnections of the console clients within this time do not look
+up the instance nor call the compute host again. The remembered validations
+are dropped when the instance is deleted, rebuilt, resized, migrated or
+evacuated. A console port released by a stopped or rebooted instance may be
+accepted during this time.
+
+Possible values:
+
+* 0: Validate the tokens on every check (default)
+* Any positive integer representing the number of seconds
+"""),
 ]
 
 
@@ -873,6 +873,22 @@ Possible values:
 Related options:
 
 * iptables_top_regex
+"""),
+    cfg.BoolOpt("iptables_differential_apply",
+        default=True,
+        deprecated_for_removal=True,
+        deprecated_since="17.0.0",
+        deprecated_reason="""
+nova-network is deprecated, as are any related configuration options.
+""",
+        help="""
+When only the rules of the chains created by nova changed, restore only these
+chains with ``iptables-restore --noflush`` instead of restoring all the
+iptables rules of the host.
+
+Restoring all the rules takes longer on hosts having many iptables rules, such
+as hosts running many instances with security groups, and the whole ruleset is
+still restored whenever any other rule managed by nova changed.
 """),
     cfg.StrOpt("iptables_drop_action",
         default="DROP",
@@ -1181,6 +1197,31 @@ Related options:
 * ``firewall_driver``: This must be set to
   ``nova.virt.libvirt.firewall.IptablesFirewallDriver`` to ensure the
   libvirt firewall driver is enabled.
+"""),
+    cfg.BoolOpt('enable_ipset',
+        default=False,
+        deprecated_for_removal=True,
+        deprecated_since='17.0.0',
+        deprecated_reason="""
+nova-network is deprecated, as are any related configuration options.
+""",
+        help="""
+Use ipsets for the security group rules granting access to the members of
+another security group.
+
+When enabled, each such security group is mapped to an ipset of the fixed IPs
+of its members, and the security group rule matches the ipset, instead of
+being expanded into one iptables rule per member. A member joining or leaving
+the security group then only updates the ipset, instead of the iptables rules
+of every instance granting it access. This requires the ``ipset`` command on
+the compute hosts.
+
+This option only applies when using the ``nova-network`` service with the
+iptables firewall drivers, except the XenAPI one.
+
+Related options:
+
+* ``firewall_driver``
 """),
 ]
 
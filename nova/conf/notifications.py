@@ -123,7 +123,69 @@ If enabled, include block device information in the versioned notification
 payload. Sending block device information is disabled by default as providing
 that information can incur some overhead on the system since the information
 may need to be loaded from the database.
-""")
+"""),
+    cfg.BoolOpt(
+        'async_emit',
+        default=False,
+        help="""
+If enabled, notifications are put on a bounded in-process queue and sent to
+the messaging service by a background greenthread, so that the time spent
+building the payload of instance update notifications and sending
+notifications to the message broker is no longer spent on the API and compute
+request paths. Services which are not monkey patched by eventlet, such as
+nova-api running under a WSGI server, use a native thread instead.
+
+Notifications still queued when the service is killed are lost.
+
+Related options:
+
+* async_queue_size
+* async_queue_overflow
+* async_batch_size
+"""),
+    cfg.IntOpt(
+        'async_queue_size',
+        default=1000,
+        min=1,
+        help="""
+Maximum number of notifications waiting to be sent when ``async_emit`` is
+enabled.
+
+Related options:
+
+* async_emit
+* async_queue_overflow
+"""),
+    cfg.StrOpt(
+        'async_queue_overflow',
+        default='block',
+        choices=[
+            ('block', 'Wait for room in the queue, which slows the emitters '
+                      'down to the rate at which notifications can be sent'),
+            ('drop', 'Drop the notification and log a warning'),
+        ],
+        help="""
+What to do with a notification emitted while the queue of notifications
+waiting to be sent is full, when ``async_emit`` is enabled.
+
+Related options:
+
+* async_emit
+* async_queue_size
+"""),
+    cfg.IntOpt(
+        'async_batch_size',
+        default=50,
+        min=1,
+        help="""
+Maximum number of queued notifications sent in a row by the background
+greenthread before it yields to other greenthreads, when ``async_emit`` is
+enabled.
+
+Related options:
+
+* async_emit
+"""),
 ]
 
 
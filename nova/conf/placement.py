@@ -49,7 +49,63 @@ Possible values:
         help="""
 Endpoint interface for this node. This is used when picking the URL in the
 service catalog.
-""")
+"""),
+    cfg.BoolOpt(
+        'capacity_index',
+        default=False,
+        help="""
+Enable the in-memory capacity index of the placement API service.
+
+When enabled, each placement API process keeps the inventories and usages of
+all the resource providers in memory, and uses them to find the allocation
+candidates instead of querying the database. Only the generations of the
+providers found are read from the database, and the providers written by
+another process since they were loaded are refreshed before answering. The
+index is reloaded every ``capacity_index_resync_interval`` seconds. Requests
+involving resources shared via aggregates are always answered from the
+database.
+
+This option is only used by the placement API service.
+
+Related options:
+
+* capacity_index_resync_interval
+"""),
+    cfg.IntOpt(
+        'capacity_index_resync_interval',
+        default=10,
+        min=1,
+        help="""
+Number of seconds after which the capacity index of the placement API service
+is reloaded from the database.
+
+The resource providers created by another process, and the ones whose
+allocations were deleted by another process, are only found as allocation
+candidates once the index is reloaded, so a shorter interval finds them
+sooner, at the cost of loading all the resource providers more often.
+
+This option is only used by the placement API service.
+
+Related options:
+
+* capacity_index
+"""),
+    cfg.IntOpt(
+        'lookup_cache_check_interval',
+        default=10,
+        min=0,
+        help="""
+Number of seconds after which the caches of the resource classes and traits of
+each placement API process are checked against the database.
+
+The caches map the names of the custom resource classes and of the traits to
+their internal IDs. They are always checked when a name or ID they do not hold
+is looked up, so this interval bounds how long a resource class or trait
+renamed or deleted by another process is still seen by this process. Setting
+it to 0 checks the caches on every lookup.
+
+This option is only used by the placement API service.
+"""),
 ]
 
 deprecated_opts = {
@@ -122,6 +122,36 @@ enabled, where others may prefer to manually discover hosts when one
 is added to avoid any overhead from constantly checking. If enabled,
 every time this runs, we will select any unmapped hosts out of each
 cell database on every run.
+"""),
+    cfg.FloatOpt("trace_sample_rate",
+                 default=0.0,
+                 min=0.0,
+                 max=1.0,
+                 help="""
+Fraction of the scheduling requests to trace.
+
+The scheduler records how long each step of the scheduling of a traced request
+takes: the allocation candidates query to the Placement service, the loading
+of the host states, each filter and weigher, and the resource claims. These
+durations are aggregated into histograms, which are included in the Guru
+Meditation Report of the scheduler and can be logged periodically, see
+``trace_report_interval``.
+
+Possible values:
+
+* 0.0 (the default) to disable tracing.
+* A value between 0.0 and 1.0, such as 0.01 to trace one request out of a
+  hundred, which keeps the overhead low on busy schedulers.
+* 1.0 to trace all the requests.
+"""),
+    cfg.IntOpt("trace_report_interval",
+               default=-1,
+               min=-1,
+               help="""
+Interval in seconds between the logs of the scheduling trace statistics.
+
+If negative (the default), the statistics are not logged. This is only
+useful if ``trace_sample_rate`` is set.
 """),
 ]
 
@@ -22,7 +22,6 @@ import socket
 import sys
 
 from oslo_log import log as logging
-import six
 from six.moves import http_cookies as Cookie
 import six.moves.urllib.parse as urlparse
 import websockify
@@ -48,7 +47,7 @@ class TenantSock(object):
 
     def __init__(self, reqhandler):
         self.reqhandler = reqhandler
-        self.queue = []
+        self.queue = bytearray()
 
     def recv(self, cnt):
         # NB(sross): it's ok to block here because we know
@@ -58,28 +57,21 @@ class TenantSock(object):
             new_frames, closed = self.reqhandler.recv_frames()
             # flatten frames onto queue
             for frame in new_frames:
-                # The socket returns (byte) strings in Python 2...
-                if six.PY2:
-                    self.queue.extend(frame)
-                # ...and integers in Python 3. For the Python 3 case, we need
-                # to convert these to characters using 'chr' and then, as this
-                # returns unicode, convert the result to byte strings.
-                else:
-                    self.queue.extend(
-                        [six.binary_type(chr(c), 'ascii') for c in frame])
+                self.queue.extend(frame)
 
             if closed:
                 break
 
-        popped = self.queue[0:cnt]
-        del self.queue[0:cnt]
-        return b''.join(popped)
+        popped = bytes(self.queue[:cnt])
+        del self.queue[:cnt]
+        return popped
 
     def sendall(self, data):
         self.reqhandler.send_frames([data])
 
     def finish_up(self):
-        self.reqhandler.send_frames([b''.join([self.queue])])
+        self.reqhandler.send_frames([bytes(self.queue)])
+        del self.queue[:]
 
     def close(self):
         self.finish_up()
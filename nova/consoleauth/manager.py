@@ -16,11 +16,14 @@
 
 """Auth Components for Consoles."""
 
+import collections
 import time
 
 from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_serialization import jsonutils
+from oslo_service import periodic_task
+from oslo_utils import timeutils
 
 from nova import cache_utils
 from nova.cells import rpcapi as cells_rpcapi
@@ -29,12 +32,16 @@ import nova.conf
 from nova import context as nova_context
 from nova import manager
 from nova import objects
+from nova import stats
 
 
 LOG = logging.getLogger(__name__)
 
 CONF = nova.conf.CONF
 
+# The fields of a token identifying the console it gives access to
+_CONSOLE_FIELDS = ('host', 'port', 'console_type', 'internal_access_path')
+
 
 class ConsoleAuthManager(manager.Manager):
     """Manages token based authentication."""
@@ -48,6 +55,11 @@ class ConsoleAuthManager(manager.Manager):
         self._mc_instance = None
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
+        # Durations of check_token, keyed by outcome: 'cached' when the
+        # remembered validation of the token was used, 'validated' or
+        # 'invalid' when the token was validated, and 'unknown' when it did
+        # not exist or had expired
+        self.check_token_timings = collections.defaultdict(stats.Histogram)
 
     @property
     def mc(self):
@@ -104,6 +116,42 @@ class ConsoleAuthManager(manager.Manager):
         LOG.info("Received Token: %(token)s, %(token_dict)s",
                  {'token': token, 'token_dict': token_dict})
 
+    @staticmethod
+    def _validation_key(token):
+        return ('validated-%s' % token).encode('UTF-8')
+
+    def _is_validated(self, token):
+        """Returns whether the token was validated less than
+        [consoleauth]validation_cache_ttl seconds ago.
+        """
+        ttl = CONF.consoleauth.validation_cache_ttl
+        if not ttl:
+            return False
+        validated_at = self.mc.get(self._validation_key(token['token']))
+        return (validated_at is not None and
+                timeutils.utcnow_ts(microsecond=True) - validated_at < ttl)
+
+    def _remember_validation(self, token):
+        """Remembers the validation of a token, and of the other tokens of
+        the same console of the instance, which it applies to as well.
+        """
+        if not CONF.consoleauth.validation_cache_ttl:
+            return
+        validated_at = timeutils.utcnow_ts(microsecond=True)
+        # NOTE: the validations are kept in the cache of the tokens, under
+        # their own keys, so that they expire with the tokens at the latest,
+        # without resetting the expiration of the tokens
+        tokens = self._get_tokens_for_instance(token['instance_uuid'])
+        token_strs = self.mc.get_multi(
+            [tok.encode('UTF-8') for tok in tokens])
+        for tok, token_str in zip(tokens, token_strs):
+            if token_str is None:
+                continue
+            other = jsonutils.loads(token_str)
+            if all(other.get(field) == token.get(field)
+                   for field in _CONSOLE_FIELDS):
+                self.mc.set(self._validation_key(tok), validated_at)
+
     def _validate_token(self, context, token):
         instance_uuid = token['instance_uuid']
         if instance_uuid is None:
@@ -128,17 +176,41 @@ class ConsoleAuthManager(manager.Manager):
                 token['console_type'])
 
     def check_token(self, context, token):
-        token_str = self.mc.get(token.encode('UTF-8'))
-        token_valid = (token_str is not None)
-        LOG.info("Checking Token: %(token)s, %(token_valid)s",
-                 {'token': token, 'token_valid': token_valid})
-        if token_valid:
-            token = jsonutils.loads(token_str)
-            if self._validate_token(context, token):
-                return token
+        timer = timeutils.StopWatch().start()
+        outcome = 'unknown'
+        try:
+            token_str = self.mc.get(token.encode('UTF-8'))
+            token_valid = (token_str is not None)
+            LOG.info("Checking Token: %(token)s, %(token_valid)s",
+                     {'token': token, 'token_valid': token_valid})
+            if token_valid:
+                token = jsonutils.loads(token_str)
+                if self._is_validated(token):
+                    outcome = 'cached'
+                    return token
+                outcome = 'invalid'
+                if self._validate_token(context, token):
+                    outcome = 'validated'
+                    self._remember_validation(token)
+                    return token
+        finally:
+            elapsed = timer.elapsed()
+            self.check_token_timings[outcome].add(elapsed)
+            LOG.debug("Checked token in %(ms).3fms: %(outcome)s",
+                      {'ms': elapsed * 1000, 'outcome': outcome})
 
     def delete_tokens_for_instance(self, context, instance_uuid):
         tokens = self._get_tokens_for_instance(instance_uuid)
         self.mc.delete_multi(
                 [tok.encode('UTF-8') for tok in tokens])
+        if CONF.consoleauth.validation_cache_ttl:
+            self.mc.delete_multi(
+                [self._validation_key(tok) for tok in tokens])
         self.mc_instance.delete(instance_uuid.encode('UTF-8'))
+
+    @periodic_task.periodic_task(spacing=600)
+    def _report_check_token_stats(self, context):
+        timings = {outcome: histogram.to_dict()
+                   for outcome, histogram in self.check_token_timings.items()}
+        if timings:
+            LOG.info('Token check statistics: %s', timings)
@@ -143,13 +143,16 @@ def service_get_all_by_topic(context, topic):
     return IMPL.service_get_all_by_topic(context, topic)
 
 
-def service_get_all_by_binary(context, binary, include_disabled=False):
+def service_get_all_by_binary(context, binary, include_disabled=False,
+                              hosts=None):
     """Get services for a given binary.
 
-    Includes disabled services if 'include_disabled' parameter is True
+    Includes disabled services if 'include_disabled' parameter is True.
+    Only returns the services of the given hosts if 'hosts' is not None.
     """
     return IMPL.service_get_all_by_binary(context, binary,
-                                          include_disabled=include_disabled)
+                                          include_disabled=include_disabled,
+                                          hosts=hosts)
 
 
 def service_get_all_computes_by_hv_type(context, hv_type,
@@ -2046,10 +2049,41 @@ def task_log_get(context, task_name, period_beginning,
 ####################
 
 
-def archive_deleted_rows(max_rows=None):
+def instance_usage_rollup_get_all(context, begin, end, project_id=None):
+    """Get the usage rollups of the days starting in [begin, end).
+
+    If project_id is specified, only the rollups of that project are
+    returned, along with the totals rows of all projects which tell which
+    days are rolled up.
+    """
+    return IMPL.instance_usage_rollup_get_all(context, begin, end,
+                                              project_id=project_id)
+
+
+def instance_usage_rollup_replace(context, period_start, values):
+    """Replace the usage rollups of the day starting at period_start."""
+    return IMPL.instance_usage_rollup_replace(context, period_start, values)
+
+
+def instance_usage_rollup_get_last_period_start(context):
+    """Get the start of the last rolled up day, or None."""
+    return IMPL.instance_usage_rollup_get_last_period_start(context)
+
+
+def instance_get_earliest_launched_at(context):
+    """Get the launch time of the first instance ever launched, or None."""
+    return IMPL.instance_get_earliest_launched_at(context)
+
+
+####################
+
+
+def archive_deleted_rows(max_rows=None, elapsed=None):
     """Move up to max_rows rows from production tables to corresponding shadow
     tables.
 
+    :param elapsed: optional dict to which the time spent archiving each
+                    table, in seconds, is added
     :returns: dict that maps table name to number of rows archived from that
               table, for example:
 
@@ -2062,7 +2096,23 @@ def archive_deleted_rows(max_rows=None):
         }
 
     """
-    return IMPL.archive_deleted_rows(max_rows=max_rows)
+    return IMPL.archive_deleted_rows(max_rows=max_rows, elapsed=elapsed)
+
+
+def purge_shadow_tables(before=None, max_rows=None, elapsed=None):
+    """Delete archived rows from the shadow tables.
+
+    :param before: only delete rows older than this datetime, or all rows
+                   if None
+    :param max_rows: maximum number of rows deleted from a table in a single
+                     statement, or None for no limit
+    :param elapsed: optional dict to which the time spent purging each
+                    shadow table, in seconds, is added
+    :returns: dict that maps shadow table name to number of rows deleted
+              from that table
+    """
+    return IMPL.purge_shadow_tables(before=before, max_rows=max_rows,
+                                    elapsed=elapsed)
 
 
 def pcidevice_online_data_migration(context, max_count):
@@ -23,6 +23,7 @@ import datetime
 import functools
 import inspect
 import sys
+import time
 
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
@@ -528,11 +529,16 @@ def service_get_by_host_and_topic(context, host, topic):
 
 
 @pick_context_manager_reader
-def service_get_all_by_binary(context, binary, include_disabled=False):
+def service_get_all_by_binary(context, binary, include_disabled=False,
+                              hosts=None):
+    if hosts is not None and not hosts:
+        return []
     query = model_query(context, models.Service, read_deleted="no").\
                     filter_by(binary=binary)
     if not include_disabled:
         query = query.filter_by(disabled=False)
+    if hosts is not None:
+        query = query.filter(models.Service.host.in_(hosts))
     return query.all()
 
 
@@ -6452,6 +6458,117 @@ def task_log_end_task(context, task_name, period_beginning, period_ending,
 ##################
 
 
+@pick_context_manager_reader
+def instance_usage_rollup_get_all(context, begin, end, project_id=None):
+    query = context.session.query(models.InstanceUsageRollup).\
+        filter(models.InstanceUsageRollup.period_start >= begin).\
+        filter(models.InstanceUsageRollup.period_start < end)
+    if project_id is not None:
+        # Always return the totals rows, which tell which days are rolled up
+        query = query.filter(or_(
+            models.InstanceUsageRollup.project_id == project_id,
+            models.InstanceUsageRollup.project_id == null()))
+    return query.all()
+
+
+@pick_context_manager_writer
+def instance_usage_rollup_replace(context, period_start, values):
+    context.session.query(models.InstanceUsageRollup).\
+        filter_by(period_start=period_start).\
+        delete(synchronize_session=False)
+    rollups = []
+    for value in values:
+        rollup = models.InstanceUsageRollup()
+        rollup.update(value)
+        rollup.period_start = period_start
+        context.session.add(rollup)
+        rollups.append(rollup)
+    context.session.flush()
+    return rollups
+
+
+@pick_context_manager_reader
+def instance_usage_rollup_get_last_period_start(context):
+    return context.session.query(
+        func.max(models.InstanceUsageRollup.period_start)).scalar()
+
+
+@pick_context_manager_reader
+def instance_get_earliest_launched_at(context):
+    return model_query(context, models.Instance,
+                       (func.min(models.Instance.launched_at),),
+                       read_deleted='yes').scalar()
+
+
+##################
+
+
+# Names of the tables to archive, leaf tables first, and the shadow tables
+# corresponding to them. The schema is only reflected once per process.
+_ARCHIVE_TABLENAMES = None
+_SHADOW_TABLES = {}
+_SHADOW_METADATA = MetaData()
+
+
+def _get_archive_tablenames():
+    """Return the names of the tables to archive, leaf tables first."""
+    global _ARCHIVE_TABLENAMES
+    if _ARCHIVE_TABLENAMES is None:
+        meta = MetaData(get_engine(use_slave=True))
+        meta.reflect()
+        # Reverse sort the tables so we get the leaf nodes first for
+        # processing. Skip the special sqlalchemy-migrate migrate_version
+        # table and any shadow tables.
+        _ARCHIVE_TABLENAMES = [
+            table.name for table in reversed(meta.sorted_tables)
+            if not (table.name == 'migrate_version' or
+                    table.name.startswith(_SHADOW_TABLE_PREFIX))]
+    return _ARCHIVE_TABLENAMES
+
+
+def _get_shadow_table(engine, tablename):
+    """Return the shadow table of a table, or None if it has none."""
+    if tablename not in _SHADOW_TABLES:
+        try:
+            shadow_table = Table(_SHADOW_TABLE_PREFIX + tablename,
+                                 _SHADOW_METADATA, autoload=True,
+                                 autoload_with=engine)
+        except NoSuchTableError:
+            shadow_table = None
+        _SHADOW_TABLES[tablename] = shadow_table
+    return _SHADOW_TABLES[tablename]
+
+
+def _archive_upper_bound(conn, column, whereclause, max_rows):
+    """Return the key of the last of the next max_rows rows to process.
+
+    Working on the rows matching whereclause up to that key, rather than
+    repeating the same ORDER BY/LIMIT query in every statement, keeps each
+    statement of a batch to a bounded range of the primary key.
+
+    :returns: the key, or None if no rows match
+    """
+    batch = sql.select([column]).where(whereclause).order_by(column).\
+        limit(max_rows).alias('batch')
+    return conn.execute(
+        sql.select([func.max(batch.c[column.name])])).scalar()
+
+
+def _mark_deleted_if_instance_deleted(conn, table, whereclause, max_rows):
+    """Soft-delete up to max_rows rows belonging to deleted instances.
+
+    :param whereclause: selects the rows of table belonging to deleted
+                        instances
+    """
+    not_deleted = and_(table.c.deleted == table.c.deleted.default.arg,
+                       whereclause)
+    with conn.begin():
+        upper = _archive_upper_bound(conn, table.c.id, not_deleted, max_rows)
+        if upper is not None:
+            conn.execute(table.update().values(deleted=table.c.id).
+                         where(and_(not_deleted, table.c.id <= upper)))
+
+
 def _archive_if_instance_deleted(table, shadow_table, instances, conn,
                                  max_rows):
     """Look for records that pertain to deleted instances, but may not be
@@ -6462,25 +6579,22 @@ def _archive_if_instance_deleted(table, shadow_table, instances, conn,
     Logic is: if I have a column called instance_uuid, and that instance
     is deleted, then I can be deleted.
     """
-    query_insert = shadow_table.insert(inline=True).\
-        from_select(
-            [c.name for c in table.c],
-            sql.select(
-                [table],
-                and_(instances.c.deleted != instances.c.deleted.default.arg,
-                     instances.c.uuid == table.c.instance_uuid)).
-            order_by(table.c.id).limit(max_rows))
-
-    query_delete = sql.select(
-        [table.c.id],
-        and_(instances.c.deleted != instances.c.deleted.default.arg,
-             instances.c.uuid == table.c.instance_uuid)).\
-        order_by(table.c.id).limit(max_rows)
-    delete_statement = DeleteFromSelect(table, query_delete,
-                                        table.c.id)
+    instance_deleted = and_(
+        instances.c.deleted != instances.c.deleted.default.arg,
+        instances.c.uuid == table.c.instance_uuid)
 
     try:
         with conn.begin():
+            upper = _archive_upper_bound(conn, table.c.id, instance_deleted,
+                                         max_rows)
+            if upper is None:
+                return 0
+            batch = and_(instance_deleted, table.c.id <= upper)
+            query_insert = shadow_table.insert(inline=True).\
+                from_select([c.name for c in table.c],
+                            sql.select([table], batch))
+            delete_statement = DeleteFromSelect(
+                table, sql.select([table.c.id], batch), table.c.id)
             conn.execute(query_insert)
             result_delete = conn.execute(delete_statement)
             return result_delete.rowcount
@@ -6499,19 +6613,15 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
     """
     engine = get_engine()
     conn = engine.connect()
-    metadata = MetaData()
-    metadata.bind = engine
     # NOTE(tdurakov): table metadata should be received
     # from models, not db tables. Default value specified by SoftDeleteMixin
     # is known only by models, not DB layer.
     # IMPORTANT: please do not change source of metadata information for table.
     table = models.BASE.metadata.tables[tablename]
 
-    shadow_tablename = _SHADOW_TABLE_PREFIX + tablename
     rows_archived = 0
-    try:
-        shadow_table = Table(shadow_tablename, metadata, autoload=True)
-    except NoSuchTableError:
+    shadow_table = _get_shadow_table(engine, tablename)
+    if shadow_table is None:
         # No corresponding shadow table; skip it.
         return rows_archived
 
@@ -6521,8 +6631,6 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
         column = table.c.domain
     else:
         column = table.c.id
-    # NOTE(guochbo): Use DeleteFromSelect to avoid
-    # database's limit of maximum parameter in one SQL statement.
     deleted_column = table.c.deleted
     columns = [c.name for c in table.c]
 
@@ -6532,14 +6640,15 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
     # NOTE(takashin): The record in table migrations should be
     # soft deleted when the instance is deleted.
     # This is just for upgrading.
+    # Only as many rows as can be archived by this call are soft-deleted,
+    # so that the UPDATE does not lock every row of every deleted instance.
     if tablename in ("instance_actions", "migrations"):
         instances = models.BASE.metadata.tables["instances"]
         deleted_instances = sql.select([instances.c.uuid]).\
             where(instances.c.deleted != instances.c.deleted.default.arg)
-        update_statement = table.update().values(deleted=table.c.id).\
-            where(table.c.instance_uuid.in_(deleted_instances))
-
-        conn.execute(update_statement)
+        _mark_deleted_if_instance_deleted(
+            conn, table, table.c.instance_uuid.in_(deleted_instances),
+            max_rows)
 
     elif tablename == "instance_actions_events":
         # NOTE(clecomte): we have to grab all the relation from
@@ -6551,28 +6660,21 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
             where(instances.c.deleted != instances.c.deleted.default.arg)
         deleted_actions = sql.select([instance_actions.c.id]).\
             where(instance_actions.c.instance_uuid.in_(deleted_instances))
+        _mark_deleted_if_instance_deleted(
+            conn, table, table.c.action_id.in_(deleted_actions), max_rows)
 
-        update_statement = table.update().values(deleted=table.c.id).\
-            where(table.c.action_id.in_(deleted_actions))
-
-        conn.execute(update_statement)
-
-    insert = shadow_table.insert(inline=True).\
-        from_select(columns,
-                    sql.select([table],
-                               deleted_column != deleted_column.default.arg).
-                    order_by(column).limit(max_rows))
-    query_delete = sql.select([column],
-                          deleted_column != deleted_column.default.arg).\
-                          order_by(column).limit(max_rows)
-
-    delete_statement = DeleteFromSelect(table, query_delete, column)
+    deleted = deleted_column != deleted_column.default.arg
     try:
         # Group the insert and delete in a transaction.
         with conn.begin():
-            conn.execute(insert)
-            result_delete = conn.execute(delete_statement)
-        rows_archived = result_delete.rowcount
+            upper = _archive_upper_bound(conn, column, deleted, max_rows)
+            if upper is not None:
+                batch = and_(deleted, column <= upper)
+                insert = shadow_table.insert(inline=True).\
+                    from_select(columns, sql.select([table], batch))
+                conn.execute(insert)
+                result_delete = conn.execute(table.delete().where(batch))
+                rows_archived = result_delete.rowcount
     except db_exc.DBReferenceError as ex:
         # A foreign key constraint keeps us from deleting some of
         # these rows until we clean up a dependent table.  Just
@@ -6592,10 +6694,12 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
     return rows_archived
 
 
-def archive_deleted_rows(max_rows=None):
+def archive_deleted_rows(max_rows=None, elapsed=None):
     """Move up to max_rows rows from production tables to the corresponding
     shadow tables.
 
+    :param elapsed: optional dict to which the time spent archiving each
+                    table, in seconds, is added
     :returns: dict that maps table name to number of rows archived from that
               table, for example:
 
@@ -6610,27 +6714,117 @@ def archive_deleted_rows(max_rows=None):
     """
     table_to_rows_archived = {}
     total_rows_archived = 0
-    meta = MetaData(get_engine(use_slave=True))
-    meta.reflect()
-    # Reverse sort the tables so we get the leaf nodes first for processing.
-    for table in reversed(meta.sorted_tables):
-        tablename = table.name
-        # skip the special sqlalchemy-migrate migrate_version table and any
-        # shadow tables
-        if (tablename == 'migrate_version' or
-                tablename.startswith(_SHADOW_TABLE_PREFIX)):
-            continue
+    for tablename in _get_archive_tablenames():
+        start = time.time()
         rows_archived = _archive_deleted_rows_for_table(
             tablename, max_rows=max_rows - total_rows_archived)
         total_rows_archived += rows_archived
         # Only report results for tables that had updates.
         if rows_archived:
+            table_elapsed = time.time() - start
+            LOG.info("Archived %(rows)d rows from table %(tablename)s in "
+                     "%(elapsed).2f seconds (%(rate)d rows/s)",
+                     {'rows': rows_archived, 'tablename': tablename,
+                      'elapsed': table_elapsed,
+                      'rate': rows_archived / max(table_elapsed, 0.001)})
             table_to_rows_archived[tablename] = rows_archived
+            if elapsed is not None:
+                elapsed[tablename] = elapsed.get(tablename, 0) + table_elapsed
         if total_rows_archived >= max_rows:
             break
     return table_to_rows_archived
 
 
+def _purge_shadow_table(conn, shadow_table, whereclause, max_rows):
+    """Delete the rows of a shadow table matching whereclause, in batches of
+    up to max_rows rows ordered by their key, each in its own transaction.
+
+    :param whereclause: selects the rows to delete, or None for all rows
+    :param max_rows: maximum number of rows deleted by each statement, or
+                     None to delete all the rows in a single statement
+    :returns: number of rows deleted
+    """
+    if max_rows is None:
+        delete = shadow_table.delete()
+        if whereclause is not None:
+            delete = delete.where(whereclause)
+        return conn.execute(delete).rowcount
+
+    if 'id' in shadow_table.c:
+        column = shadow_table.c.id
+    else:
+        # NOTE: See _archive_deleted_rows_for_table() about dns_domains.
+        column = shadow_table.c.domain
+    if whereclause is None:
+        whereclause = true()
+    rows_deleted = 0
+    while True:
+        with conn.begin():
+            upper = _archive_upper_bound(conn, column, whereclause, max_rows)
+            if upper is None:
+                return rows_deleted
+            rows_deleted += conn.execute(shadow_table.delete().where(
+                and_(whereclause, column <= upper))).rowcount
+
+
+def purge_shadow_tables(before=None, max_rows=None, elapsed=None):
+    """Delete archived rows from the shadow tables.
+
+    Rows are deleted based on the time they were deleted from the
+    production tables, falling back to the time they were last updated or
+    created for tables without a deleted_at column, and for rows which
+    were archived without being soft-deleted first.
+
+    :param before: only delete rows older than this datetime, or all rows
+                   if None
+    :param max_rows: maximum number of rows deleted from a table in a single
+                     statement, or None for no limit
+    :param elapsed: optional dict to which the time spent purging each
+                    shadow table, in seconds, is added
+    :returns: dict that maps shadow table name to number of rows deleted
+              from that table
+    """
+    engine = get_engine()
+    conn = engine.connect()
+    table_to_rows_deleted = {}
+    for tablename in _get_archive_tablenames():
+        shadow_table = _get_shadow_table(engine, tablename)
+        if shadow_table is None:
+            continue
+        older = None
+        if before is not None:
+            for name in ('deleted_at', 'updated_at', 'created_at'):
+                if name in shadow_table.c:
+                    column = shadow_table.c[name]
+                    break
+            else:
+                LOG.warning("Unable to purge table %s because it has no "
+                            "timestamp column", shadow_table.name)
+                continue
+            older = column < before
+            if column.name != 'created_at' and 'created_at' in shadow_table.c:
+                # NOTE: Some rows, like instance actions and their events,
+                # are archived without ever being formally deleted, so their
+                # deleted_at is not set.
+                older = or_(older, and_(column == null(),
+                                        shadow_table.c.created_at < before))
+        start = time.time()
+        rows_deleted = _purge_shadow_table(conn, shadow_table, older,
+                                           max_rows)
+        if rows_deleted:
+            table_elapsed = time.time() - start
+            LOG.info("Purged %(rows)d rows from table %(tablename)s in "
+                     "%(elapsed).2f seconds (%(rate)d rows/s)",
+                     {'rows': rows_deleted, 'tablename': shadow_table.name,
+                      'elapsed': table_elapsed,
+                      'rate': rows_deleted / max(table_elapsed, 0.001)})
+            table_to_rows_deleted[shadow_table.name] = rows_deleted
+            if elapsed is not None:
+                elapsed[shadow_table.name] = (
+                    elapsed.get(shadow_table.name, 0) + table_elapsed)
+    return table_to_rows_deleted
+
+
 @pick_context_manager_writer
 def service_uuids_online_data_migration(context, max_count):
     from nova.objects import service
@@ -0,0 +1,328 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+import os_traits
+from oslo_concurrency import lockutils
+from oslo_log import log as logging
+from oslo_utils import timeutils
+import six
+import sqlalchemy as sa
+from sqlalchemy import sql
+
+import nova.conf
+from nova.db.sqlalchemy import api as db_api
+from nova.db.sqlalchemy import api_models as models
+
+CONF = nova.conf.CONF
+LOG = logging.getLogger(__name__)
+
+_ALLOC_TBL = models.Allocation.__table__
+_INV_TBL = models.Inventory.__table__
+_RP_TBL = models.ResourceProvider.__table__
+_RP_TRAIT_TBL = models.ResourceProviderTrait.__table__
+_TRAIT_TBL = models.Trait.__table__
+_LOCKNAME = 'capacity_index'
+
+# The inventory of a resource class of a provider, with the sum of its
+# allocations
+Capacity = collections.namedtuple(
+    'Capacity', ['total', 'reserved', 'allocation_ratio', 'min_unit',
+                 'max_unit', 'step_size', 'used'])
+
+
+@db_api.api_context_manager.reader
+def _get_generations(ctx, rp_ids):
+    """Returns a dict, keyed by internal ID, of the generations of the
+    supplied resource providers which still exist.
+    """
+    sel = sa.select([_RP_TBL.c.id, _RP_TBL.c.generation]).where(
+        _RP_TBL.c.id.in_(rp_ids))
+    return dict(ctx.session.execute(sel).fetchall())
+
+
+@db_api.api_context_manager.reader
+def _get_providers(ctx, rp_ids=None):
+    """Returns the providers, the providers sharing their resources, the
+    traits, the inventories and the usages of all the resource providers, or
+    of the supplied ones.
+
+    :param rp_ids: Internal IDs of the providers to get, or None for all of
+                   them
+    :returns: A tuple of the providers, the set of the sharing providers, the
+              traits, the inventories, and a dict keyed by provider and
+              resource class ID of the sum of the allocations
+    """
+    conn = ctx.session.connection()
+
+    def _where(sel, column):
+        if rp_ids is None:
+            return sel
+        return sel.where(column.in_(rp_ids))
+
+    sel = _where(sa.select([_RP_TBL.c.id, _RP_TBL.c.uuid,
+                            _RP_TBL.c.generation]), _RP_TBL.c.id)
+    providers = conn.execute(sel).fetchall()
+
+    join = sa.join(_RP_TRAIT_TBL, _TRAIT_TBL, sa.and_(
+        _RP_TRAIT_TBL.c.trait_id == _TRAIT_TBL.c.id,
+        _TRAIT_TBL.c.name == six.text_type(
+            os_traits.MISC_SHARES_VIA_AGGREGATE)))
+    sel = _where(sa.select([_RP_TRAIT_TBL.c.resource_provider_id]),
+                 _RP_TRAIT_TBL.c.resource_provider_id).select_from(join)
+    sharing = set(r[0] for r in conn.execute(sel))
+
+    sel = _where(sa.select([_RP_TRAIT_TBL.c.resource_provider_id,
+                            _RP_TRAIT_TBL.c.trait_id]),
+                 _RP_TRAIT_TBL.c.resource_provider_id)
+    traits = conn.execute(sel).fetchall()
+
+    sel = _where(sa.select([_INV_TBL.c.resource_provider_id,
+                            _INV_TBL.c.resource_class_id,
+                            _INV_TBL.c.total,
+                            _INV_TBL.c.reserved,
+                            _INV_TBL.c.allocation_ratio,
+                            _INV_TBL.c.min_unit,
+                            _INV_TBL.c.max_unit,
+                            _INV_TBL.c.step_size]),
+                 _INV_TBL.c.resource_provider_id)
+    inventories = conn.execute(sel).fetchall()
+
+    sel = _where(sa.select([_ALLOC_TBL.c.resource_provider_id,
+                            _ALLOC_TBL.c.resource_class_id,
+                            sql.func.sum(_ALLOC_TBL.c.used)]),
+                 _ALLOC_TBL.c.resource_provider_id)
+    sel = sel.group_by(_ALLOC_TBL.c.resource_provider_id,
+                       _ALLOC_TBL.c.resource_class_id)
+    usages = {(r[0], r[1]): int(r[2]) for r in conn.execute(sel)}
+
+    return providers, sharing, traits, inventories, usages
+
+
+class CapacityIndex(object):
+    """An in-memory index of the inventories and usages of the resource
+    providers, used to find the providers having the capacity for a request
+    without querying the database.
+
+    The index is loaded from the database every
+    [placement]capacity_index_resync_interval seconds, and the providers
+    written by this process are refreshed after each write. Between two
+    loads, the generations of the providers found for a request are checked
+    against the database, and the providers written by another process since
+    they were loaded are refreshed before answering.
+
+    The database is only queried outside of the lock of the index, so that a
+    load or a refresh does not hold up the requests answered from the index.
+    """
+
+    def __init__(self):
+        self.loaded_at = None
+        # Whether the index is being loaded
+        self.loading = False
+        # The number of times the index was loaded or refreshed
+        self.updates = 0
+        # Dict, keyed by provider internal ID, of its UUID and generation
+        self.providers = {}
+        # Set of the IDs of the providers sharing their resources with the
+        # providers of their aggregates
+        self.sharing = set()
+        # Dict, keyed by trait ID, of the set of the IDs of the providers
+        # having the trait
+        self.traits = collections.defaultdict(set)
+        # Dict, keyed by resource class ID, of dicts of the Capacity of each
+        # provider having an inventory of the resource class, keyed by
+        # provider ID
+        self.capacities = collections.defaultdict(dict)
+
+    def clear(self):
+        with lockutils.lock(_LOCKNAME):
+            self.loaded_at = None
+            self.providers = {}
+            self.sharing = set()
+            self.traits = collections.defaultdict(set)
+            self.capacities = collections.defaultdict(dict)
+
+    def _add(self, providers, sharing, traits, inventories, usages):
+        for rp_id, rp_uuid, generation in providers:
+            self.providers[rp_id] = (rp_uuid, generation)
+        self.sharing |= sharing
+        for rp_id, trait_id in traits:
+            self.traits[trait_id].add(rp_id)
+        for (rp_id, rc_id, total, reserved, allocation_ratio, min_unit,
+                max_unit, step_size) in inventories:
+            self.capacities[rc_id][rp_id] = Capacity(
+                total, reserved, allocation_ratio, min_unit, max_unit,
+                step_size, usages.get((rp_id, rc_id), 0))
+
+    def _remove(self, rp_ids):
+        for rp_id in rp_ids:
+            self.providers.pop(rp_id, None)
+            self.sharing.discard(rp_id)
+            for rp_ids_with_trait in self.traits.values():
+                rp_ids_with_trait.discard(rp_id)
+            for capacities in self.capacities.values():
+                capacities.pop(rp_id, None)
+
+    def _load(self, ctx):
+        """Loads the index, unless another thread is already loading it."""
+        with lockutils.lock(_LOCKNAME):
+            if self.loading or not (
+                    self.loaded_at is None or timeutils.is_older_than(
+                        self.loaded_at,
+                        CONF.placement.capacity_index_resync_interval)):
+                return
+            self.loading = True
+        try:
+            start = timeutils.utcnow()
+            index = CapacityIndex()
+            index._add(*_get_providers(ctx))
+            with lockutils.lock(_LOCKNAME):
+                self.providers = index.providers
+                self.sharing = index.sharing
+                self.traits = index.traits
+                self.capacities = index.capacities
+                self.loaded_at = start
+                self.updates += 1
+        finally:
+            self.loading = False
+        LOG.debug("Loaded the capacity index of %d resource providers",
+                  len(index.providers))
+
+    def refresh_providers(self, ctx, rp_ids):
+        """Reloads the supplied providers, once they have been written to.
+
+        :param rp_ids: Internal IDs of the providers to reload
+        """
+        if self.loaded_at is None:
+            return
+        rows = _get_providers(ctx, rp_ids)
+        with lockutils.lock(_LOCKNAME):
+            self._remove(rp_ids)
+            self._add(*rows)
+            self.updates += 1
+
+    def _find_roots(self, resources, required_trait_ids,
+                    forbidden_trait_ids):
+        """Returns the IDs of the providers having the capacity for all the
+        requested resources, or None if the index cannot answer.
+        """
+        capacities = [(self.capacities.get(rc_id, {}), amount)
+                      for rc_id, amount in resources.items()]
+        for rc_capacities, amount in capacities:
+            if any(rp_id in rc_capacities for rp_id in self.sharing):
+                # The resource may be shared via an aggregate, which the
+                # index does not know about
+                return None
+
+        # Scan the providers of the least provided resource class, or the
+        # providers having all the required traits if there are fewer
+        capacities.sort(key=lambda c: len(c[0]))
+        scanned = capacities[0][0]
+        with_traits = None
+        if required_trait_ids:
+            # Intersect the providers of each required trait, starting with
+            # the smallest set
+            trait_rp_ids = sorted((self.traits.get(trait_id, set())
+                                   for trait_id in required_trait_ids),
+                                  key=len)
+            with_traits = trait_rp_ids[0].intersection(*trait_rp_ids[1:])
+            if len(with_traits) < len(scanned):
+                scanned = with_traits
+        forbidden = set()
+        for trait_id in forbidden_trait_ids:
+            forbidden |= self.traits.get(trait_id, set())
+        return [rp_id for rp_id in scanned
+                if rp_id not in forbidden and
+                (with_traits is None or rp_id in with_traits) and
+                all(_has_capacity(rc_capacities.get(rp_id), amount)
+                    for rc_capacities, amount in capacities)]
+
+    def get_candidates(self, ctx, resources, required_trait_ids=(),
+                       forbidden_trait_ids=()):
+        """Returns the providers having the capacity for all the requested
+        resources, or None if the index cannot answer and the database must
+        be queried.
+
+        The generations of the providers found are checked against the
+        database, so that the providers written by another process are
+        refreshed and checked again. The allocations of a consumer are
+        deleted without incrementing the generation of their providers
+        though, so the providers freed by another process are only found
+        once the index is reloaded.
+
+        :param resources: Dict keyed by resource class integer ID of requested
+                          amounts of that resource
+        :param required_trait_ids: IDs of the traits the providers must have
+        :param forbidden_trait_ids: IDs of the traits the providers must not
+                                    have
+        :returns: A tuple of the IDs of the matching providers, and of a list
+                  of dicts of the inventory and usage of each requested
+                  resource class of these providers, in the format of the
+                  rows returned by _get_usages_by_provider_and_rc()
+        """
+        self._load(ctx)
+        with lockutils.lock(_LOCKNAME):
+            if self.loaded_at is None:
+                # The index is being loaded for the first time
+                return None
+            roots = self._find_roots(resources, required_trait_ids,
+                                     forbidden_trait_ids)
+            if roots is None:
+                return None
+            if not roots:
+                return [], []
+            generations = {rp_id: self.providers[rp_id][1]
+                           for rp_id in roots}
+            updates = self.updates
+
+        current = _get_generations(ctx, roots)
+        stale = [rp_id for rp_id, generation in generations.items()
+                 if current.get(rp_id) != generation]
+        if stale:
+            LOG.debug("Refreshing %d resource providers written by another "
+                      "process in the capacity index", len(stale))
+            self.refresh_providers(ctx, stale)
+
+        with lockutils.lock(_LOCKNAME):
+            if self.updates != updates:
+                # Find the providers again from the refreshed index. Only
+                # providers loaded since the generations were checked may
+                # have changed.
+                roots = self._find_roots(resources, required_trait_ids,
+                                         forbidden_trait_ids)
+                if roots is None:
+                    return None
+            usages = []
+            for rp_id in roots:
+                rp_uuid = self.providers[rp_id][0]
+                for rc_id in resources:
+                    capacity = self.capacities[rc_id][rp_id]
+                    usages.append({
+                        'resource_provider_id': rp_id,
+                        'resource_provider_uuid': rp_uuid,
+                        'resource_class_id': rc_id,
+                        'total': capacity.total,
+                        'reserved': capacity.reserved,
+                        'allocation_ratio': capacity.allocation_ratio,
+                        'used': capacity.used,
+                    })
+            return roots, usages
+
+
+def _has_capacity(capacity, amount):
+    return (capacity is not None and
+            capacity.used + amount <= (
+                (capacity.total - capacity.reserved) *
+                capacity.allocation_ratio) and
+            capacity.min_unit <= amount <= capacity.max_unit and
+            amount % capacity.step_size == 0)
@@ -0,0 +1,162 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_concurrency import lockutils
+from oslo_log import log as logging
+from oslo_utils import timeutils
+import six
+import sqlalchemy as sa
+from sqlalchemy import sql
+
+import nova.conf
+from nova.db.sqlalchemy import api as db_api
+from nova.db.sqlalchemy import api_models as models
+from nova import exception
+
+CONF = nova.conf.CONF
+LOG = logging.getLogger(__name__)
+
+_TRAIT_TBL = models.Trait.__table__
+
+
+@db_api.api_context_manager.reader
+def _get_checksum(ctx, table):
+    """Returns the number of rows of the supplied table, their maximum ID and
+    the times of their last creation and update.
+
+    The creations and updates of a row set its created_at and updated_at
+    columns, so the checksum changes when any row is created, deleted or
+    renamed, even if the database reuses the ID of a deleted row.
+    """
+    with db_api.api_context_manager.reader.connection.using(ctx) as conn:
+        sel = sa.select([sql.func.count(table.c.id),
+                         sql.func.max(table.c.id),
+                         sql.func.max(table.c.created_at),
+                         sql.func.max(table.c.updated_at)])
+        return tuple(conn.execute(sel).fetchone())
+
+
+@db_api.api_context_manager.reader
+def _get_all(ctx, table):
+    with db_api.api_context_manager.reader.connection.using(ctx) as conn:
+        sel = sa.select([table.c.id, table.c.name])
+        return conn.execute(sel).fetchall()
+
+
+class LookupCache(object):
+    """A cache of the integer IDs and string names of the rows of a table,
+    such as the custom resource classes or the traits.
+
+    The cache is loaded from the database on the first lookup. It is then
+    checked against the checksum of the table at most every
+    [placement]lookup_cache_check_interval seconds, and when a name or ID it
+    does not hold is looked up, so that the rows created, deleted or renamed
+    by other processes are seen without reloading the table on every miss.
+    """
+
+    # The table holding the id and name columns to cache
+    TABLE = None
+
+    def __init__(self, ctx):
+        """Initialize the cache of identifiers.
+
+        :param ctx: `nova.context.RequestContext` from which we can grab a
+                    `SQLAlchemy.Connection` object to use for any DB lookups.
+        """
+        self.ctx = ctx
+        self.id_cache = {}
+        self.str_cache = {}
+        self.checksum = None
+        self.checked_at = None
+        # The number of names or IDs found in the cache, of those not found
+        # in it, and of the loads of the cache
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._lockname = '%s_cache' % self.TABLE.name
+
+    def clear(self):
+        with lockutils.lock(self._lockname):
+            self.id_cache = {}
+            self.str_cache = {}
+            self.checksum = None
+            self.checked_at = None
+
+    def _not_found(self, key):
+        """Returns the exception to raise when a name or ID does not exist."""
+        raise NotImplementedError()
+
+    def _load(self, checksum):
+        res = _get_all(self.ctx, self.TABLE)
+        self.id_cache = {r[1]: r[0] for r in res}
+        self.str_cache = {r[0]: r[1] for r in res}
+        self.checksum = checksum
+        self.loads += 1
+        LOG.debug("Loaded the %(table)s cache: %(hits)d hits, %(misses)d "
+                  "misses and %(loads)d loads so far",
+                  {'table': self.TABLE.name, 'hits': self.hits,
+                   'misses': self.misses, 'loads': self.loads})
+
+    def _check(self):
+        """Reloads the cache if the table changed since it was loaded."""
+        checksum = _get_checksum(self.ctx, self.TABLE)
+        self.checked_at = timeutils.utcnow()
+        if checksum != self.checksum:
+            self._load(checksum)
+
+    def _lookup(self, keys, cache_name):
+        """Returns a dict of the values of the supplied names or IDs.
+
+        :param keys: Iterable of the names or IDs to look up
+        :param cache_name: 'id_cache' to look up the IDs of names, or
+                           'str_cache' to look up the names of IDs
+        :raises: the exception returned by _not_found() if any of the keys
+                 does not exist
+        """
+        keys = set(keys)
+        with lockutils.lock(self._lockname):
+            checked = False
+            if (self.checked_at is None or timeutils.is_older_than(
+                    self.checked_at,
+                    CONF.placement.lookup_cache_check_interval)):
+                self._check()
+                checked = True
+            missing = [key for key in keys
+                       if key not in getattr(self, cache_name)]
+            self.hits += len(keys) - len(missing)
+            if missing:
+                self.misses += len(missing)
+                if not checked:
+                    self._check()
+            cache = getattr(self, cache_name)
+            for key in keys:
+                if key not in cache:
+                    raise self._not_found(key)
+            return {key: cache[key] for key in keys}
+
+
+class TraitCache(LookupCache):
+    """A cache of integer and string lookup values for traits."""
+
+    TABLE = _TRAIT_TBL
+
+    def _not_found(self, key):
+        return exception.TraitNotFound(name=key)
+
+    def ids_from_names(self, names):
+        """Given trait names, returns a dict of the integer codes of the
+        traits, keyed by name.
+
+        :raises `exception.TraitNotFound` if any of the traits does not exist
+        """
+        return self._lookup(
+            (six.text_type(name) for name in names), 'id_cache')
@@ -0,0 +1,45 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Float
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import String
+from sqlalchemy import Table
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    rollups = Table('instance_usage_rollups', meta,
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime),
+        Column('id', Integer, primary_key=True, nullable=False),
+        Column('period_start', DateTime, nullable=False),
+        Column('project_id', String(255)),
+        Column('flavorid', String(255)),
+        Column('instances', Integer, nullable=False),
+        Column('hours', Float, nullable=False),
+        Column('vcpus_hours', Float, nullable=False),
+        Column('memory_mb_hours', Float, nullable=False),
+        Column('local_gb_hours', Float, nullable=False),
+        Index('instance_usage_rollups_period_start_project_id_idx',
+              'period_start', 'project_id'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8'
+    )
+
+    rollups.create(checkfirst=True)
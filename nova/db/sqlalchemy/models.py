@@ -1599,3 +1599,27 @@ class ConsoleAuthToken(BASE, NovaBase):
                     'Instance.deleted == 0)',
         foreign_keys=instance_uuid
     )
+
+
+class InstanceUsageRollup(BASE, NovaBase):
+    """Represents the usage of the instances of one flavor of a project
+    during one day.
+
+    The row of a day with a NULL project_id and flavorid holds the totals
+    of all projects for that day, and marks the day as rolled up.
+    """
+
+    __tablename__ = 'instance_usage_rollups'
+    __table_args__ = (
+        Index('instance_usage_rollups_period_start_project_id_idx',
+              'period_start', 'project_id'),
+    )
+    id = Column(Integer, primary_key=True, nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    project_id = Column(String(255))
+    flavorid = Column(String(255))
+    instances = Column(Integer, nullable=False)
+    hours = Column(Float, nullable=False)
+    vcpus_hours = Column(Float, nullable=False)
+    memory_mb_hours = Column(Float, nullable=False)
+    local_gb_hours = Column(Float, nullable=False)
@@ -10,17 +10,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from oslo_concurrency import lockutils
 import six
-import sqlalchemy as sa
 
-from nova.db.sqlalchemy import api as db_api
 from nova.db.sqlalchemy import api_models as models
+from nova.db.sqlalchemy import lookup_cache
 from nova import exception
 from nova.objects import fields
 
 _RC_TBL = models.ResourceClass.__table__
-_LOCKNAME = 'rc_cache'
 
 
 def raise_if_custom_resource_class_pre_v1_1(rc):
@@ -40,42 +37,18 @@ def raise_if_custom_resource_class_pre_v1_1(rc):
             raise ValueError
 
 
-@db_api.api_context_manager.reader
-def _refresh_from_db(ctx, cache):
-    """Grabs all custom resource classes from the DB table and populates the
-    supplied cache object's internal integer and string identifier dicts.
-
-    :param cache: ResourceClassCache object to refresh.
-    """
-    with db_api.api_context_manager.reader.connection.using(ctx) as conn:
-        sel = sa.select([_RC_TBL.c.id, _RC_TBL.c.name])
-        res = conn.execute(sel).fetchall()
-        cache.id_cache = {r[1]: r[0] for r in res}
-        cache.str_cache = {r[0]: r[1] for r in res}
-
-
-class ResourceClassCache(object):
+class ResourceClassCache(lookup_cache.LookupCache):
     """A cache of integer and string lookup values for resource classes."""
 
+    TABLE = _RC_TBL
+
     # List of dict of all standard resource classes, where every list item
     # have a form {'id': <ID>, 'name': <NAME>}
     STANDARDS = [{'id': fields.ResourceClass.STANDARD.index(s), 'name': s}
                  for s in fields.ResourceClass.STANDARD]
 
-    def __init__(self, ctx):
-        """Initialize the cache of resource class identifiers.
-
-        :param ctx: `nova.context.RequestContext` from which we can grab a
-                    `SQLAlchemy.Connection` object to use for any DB lookups.
-        """
-        self.ctx = ctx
-        self.id_cache = {}
-        self.str_cache = {}
-
-    def clear(self):
-        with lockutils.lock(_LOCKNAME):
-            self.id_cache = {}
-            self.str_cache = {}
+    def _not_found(self, key):
+        return exception.ResourceClassNotFound(resource_class=key)
 
     def id_from_string(self, rc_str):
         """Given a string representation of a resource class -- e.g. "DISK_GB"
@@ -94,18 +67,28 @@ class ResourceClassCache(object):
         :raises `exception.ResourceClassNotFound` if rc_str cannot be found in
                 either the standard classes or the DB.
         """
-        # First check the standard resource classes
-        if rc_str in fields.ResourceClass.STANDARD:
-            return fields.ResourceClass.STANDARD.index(rc_str)
-
-        with lockutils.lock(_LOCKNAME):
-            if rc_str in self.id_cache:
-                return self.id_cache[rc_str]
-            # Otherwise, check the database table
-            _refresh_from_db(self.ctx, self)
-            if rc_str in self.id_cache:
-                return self.id_cache[rc_str]
-            raise exception.ResourceClassNotFound(resource_class=rc_str)
+        return self.ids_from_strings([rc_str])[rc_str]
+
+    def ids_from_strings(self, rc_strs):
+        """The batch version of the id_from_string() method. Given string
+        representations of resource classes, returns a dict of their integer
+        codes, keyed by string, looking up all the custom resource classes
+        missing from the cache at once.
+
+        :raises `exception.ResourceClassNotFound` if any of rc_strs cannot be
+                found in either the standard classes or the DB.
+        """
+        ids = {}
+        custom = []
+        for rc_str in rc_strs:
+            # First check the standard resource classes
+            if rc_str in fields.ResourceClass.STANDARD:
+                ids[rc_str] = fields.ResourceClass.STANDARD.index(rc_str)
+            else:
+                custom.append(rc_str)
+        if custom:
+            ids.update(self._lookup(custom, 'id_cache'))
+        return ids
 
     def string_from_id(self, rc_id):
         """The reverse of the id_from_string() method. Given a supplied numeric
@@ -128,12 +111,4 @@ class ResourceClassCache(object):
         except IndexError:
             pass
 
-        with lockutils.lock(_LOCKNAME):
-            if rc_id in self.str_cache:
-                return self.str_cache[rc_id]
-
-            # Otherwise, check the database table
-            _refresh_from_db(self.ctx, self)
-            if rc_id in self.str_cache:
-                return self.str_cache[rc_id]
-            raise exception.ResourceClassNotFound(resource_class=rc_id)
+        return self._lookup([rc_id], 'str_cache')[rc_id]
@@ -18,6 +18,7 @@ Filter support
 """
 
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
 from nova.i18n import _LI
 from nova import loadables
@@ -65,7 +66,13 @@ class BaseFilterHandler(loadables.BaseLoader):
     This class should be subclassed where one needs to use filters.
     """
 
-    def get_filtered_objects(self, filters, objs, spec_obj, index=0):
+    def get_filtered_objects(self, filters, objs, spec_obj, index=0,
+                             trace=None):
+        """Returns the objects that pass all the filters.
+
+        If a trace is given, the duration of each filter, with the number of
+        objects it got and kept, is added to it.
+        """
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
         # Track the hosts as they are removed. The 'full_filter_results' list
@@ -82,12 +89,17 @@ class BaseFilterHandler(loadables.BaseLoader):
             if filter_.run_filter_for_index(index):
                 cls_name = filter_.__class__.__name__
                 start_count = len(list_objs)
+                if trace is not None:
+                    timer = timeutils.StopWatch().start()
                 objs = filter_.filter_all(list_objs, spec_obj)
                 if objs is None:
                     LOG.debug("Filter %s says to stop filtering", cls_name)
                     return
                 list_objs = list(objs)
                 end_count = len(list_objs)
+                if trace is not None:
+                    trace.add('filter.%s' % cls_name, timer.elapsed(),
+                              start_count, end_count)
                 part_filter_results.append(log_msg % {"cls_name": cls_name,
                         "start": start_count, "end": end_count})
                 if list_objs:
@@ -32,7 +32,6 @@ from cursive import signature_utils
 import glanceclient
 import glanceclient.exc
 from glanceclient.v2 import schemas
-from keystoneauth1 import loading as ks_loading
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
@@ -47,6 +46,7 @@ import nova.image.download as image_xfers
 from nova import objects
 from nova.objects import fields
 from nova import service_auth
+from nova import service_clients
 from nova import utils
 
 
@@ -60,8 +60,8 @@ def _glanceclient_from_endpoint(context, endpoint, version):
     global _SESSION
 
     if not _SESSION:
-        _SESSION = ks_loading.load_session_from_conf_options(
-            CONF, nova.conf.glance.glance_group.name)
+        _SESSION = service_clients.load_session(
+            nova.conf.glance.glance_group.name)
 
     auth = service_auth.get_auth_plugin(context)
 
@@ -117,17 +117,26 @@ def get_api_servers():
         api_servers = CONF.glance.api_servers
         random.shuffle(api_servers)
     else:
-        # TODO(efried): Plumb in a reasonable auth from callers' contexts
-        ksa_adap = utils.get_ksa_adapter(
+        api_servers = [service_clients.discover(
             nova.conf.glance.DEFAULT_SERVICE_TYPE,
-            min_version='2.0', max_version='2.latest')
-        # TODO(efried): Use ksa_adap.get_endpoint() when bug #1707995 is fixed.
-        api_servers = [ksa_adap.endpoint_override or
-                       ksa_adap.get_endpoint_data().catalog_url]
+            (CONF.glance.region_name, tuple(CONF.glance.valid_interfaces),
+             CONF.glance.endpoint_override),
+            _discover_api_server)]
 
     return itertools.cycle(api_servers)
 
 
+def _discover_api_server():
+    """Returns the endpoint of the image service from the catalog."""
+    # TODO(efried): Plumb in a reasonable auth from callers' contexts
+    ksa_adap = utils.get_ksa_adapter(
+        nova.conf.glance.DEFAULT_SERVICE_TYPE,
+        min_version='2.0', max_version='2.latest')
+    # TODO(efried): Use ksa_adap.get_endpoint() when bug #1707995 is fixed.
+    return (ksa_adap.endpoint_override or
+            ksa_adap.get_endpoint_data().catalog_url)
+
+
 class GlanceClientWrapper(object):
     """Glance client wrapper class that implements retries."""
 
@@ -147,11 +156,15 @@ class GlanceClientWrapper(object):
         return _glanceclient_from_endpoint(context, endpoint, version)
 
     def _create_onetime_client(self, context, version):
-        """Create a client that will be used for one call."""
+        """Create a client that will be used for one call, or reuse the one
+        created for the same context and server.
+        """
         if self.api_servers is None:
             self.api_servers = get_api_servers()
-        self.api_server = next(self.api_servers)
-        return _glanceclient_from_endpoint(context, self.api_server, version)
+        api_server = self.api_server = next(self.api_servers)
+        return service_clients.get_client(
+            context, 'image', (api_server, version),
+            lambda: _glanceclient_from_endpoint(context, api_server, version))
 
     def call(self, context, version, method, *args, **kwargs):
         """Call a glance client method.  If we get a connection error,
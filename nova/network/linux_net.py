@@ -18,6 +18,7 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import collections
 import inspect
 import os
 import re
@@ -227,12 +228,11 @@ class IptablesTable(object):
 
     def empty_chain(self, chain, wrap=True):
         """Remove all rules from a chain."""
-        chained_rules = [rule for rule in self.rules
-                              if rule.chain == chain and rule.wrap == wrap]
-        if chained_rules:
+        num_rules = len(self.rules)
+        self.rules = [rule for rule in self.rules
+                      if rule.chain != chain or rule.wrap != wrap]
+        if len(self.rules) < num_rules:
             self.dirty = True
-        for rule in chained_rules:
-            self.rules.remove(rule)
 
 
 class IptablesManager(object):
@@ -354,6 +354,10 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        If CONF.iptables_differential_apply is set and only the rules of our
+        wrapped chains changed, only these chains are restored, without
+        flushing the other chains.
+
         """
         s = [('iptables', self.ipv4)]
         if CONF.use_ipv6:
@@ -364,14 +368,36 @@ class IptablesManager(object):
                                                 run_as_root=True,
                                                 attempts=5)
             all_lines = all_tables.split('\n')
+            changed_lines = []
+            differential = CONF.iptables_differential_apply
             for table_name, table in tables.items():
                 start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                        all_lines[start:end], table, table_name)
+                current_lines = all_lines[start:end]
+                new_lines = self._modify_rules(current_lines, table,
+                                               table_name)
+                all_lines[start:end] = new_lines
                 table.dirty = False
-            self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
-                         process_input=six.b('\n'.join(all_lines)),
-                         attempts=5)
+                if differential:
+                    changed_chains = _find_changed_chains(current_lines,
+                                                          new_lines)
+                    if changed_chains is None:
+                        differential = False
+                    elif changed_chains:
+                        changed_lines += _get_chains_lines(
+                            new_lines, table_name, changed_chains)
+            if not differential:
+                self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
+                             process_input=six.b('\n'.join(all_lines)),
+                             attempts=5)
+            elif changed_lines:
+                self.execute('%s-restore' % (cmd,), '-c', '--noflush',
+                             run_as_root=True,
+                             process_input=six.b(
+                                 '\n'.join(changed_lines + [''])),
+                             attempts=5)
+            else:
+                LOG.debug("Skipping %s-restore due to lack of changed rules",
+                          cmd)
         LOG.debug("IPTablesManager.apply completed with success")
 
     def _find_table(self, lines, table_name):
@@ -407,20 +433,12 @@ class IptablesManager(object):
         bottom_rules = []
 
         if CONF.iptables_top_regex:
-            regex = re.compile(CONF.iptables_top_regex)
-            temp_filter = [line for line in new_filter if regex.search(line)]
-            for rule_str in temp_filter:
-                new_filter = [s for s in new_filter
-                              if s.strip() != rule_str.strip()]
-            top_rules = temp_filter
+            top_rules, new_filter = _extract_lines(
+                new_filter, CONF.iptables_top_regex)
 
         if CONF.iptables_bottom_regex:
-            regex = re.compile(CONF.iptables_bottom_regex)
-            temp_filter = [line for line in new_filter if regex.search(line)]
-            for rule_str in temp_filter:
-                new_filter = [s for s in new_filter
-                              if s.strip() != rule_str.strip()]
-            bottom_rules = temp_filter
+            bottom_rules, new_filter = _extract_lines(
+                new_filter, CONF.iptables_bottom_regex)
 
         seen_chains = False
         rules_index = 0
@@ -435,8 +453,16 @@ class IptablesManager(object):
         if not seen_chains:
             rules_index = 2
 
+        # Index the current lines by their rule, without their
+        # [packet:byte] counts, so that the top rules are looked up in
+        # constant time
+        line_indexes = {}
+        for index, line in enumerate(new_filter):
+            line_indexes.setdefault(_strip_counts(line), []).append(index)
+
         our_rules = top_rules
         bot_rules = []
+        top_indexes = set()
         for rule in rules:
             rule_str = str(rule)
             if rule.top:
@@ -448,23 +474,11 @@ class IptablesManager(object):
                 # [packet:byte] counts and replace it with [0:0], so let's
                 # go look for a duplicate, and over-ride our table rule if
                 # found.
-
-                # ignore [packet:byte] counts at beginning of line
-                if rule_str.startswith('['):
-                    rule_str = rule_str.split(']', 1)[1]
-                dup_filter = [s for s in new_filter
-                              if rule_str.strip() in s.strip()]
-
-                new_filter = [s for s in new_filter
-                              if rule_str.strip() not in s.strip()]
-                # if no duplicates, use original rule
-                if dup_filter:
-                    # grab the last entry, if there is one
-                    dup = list(dup_filter)[-1]
-                    rule_str = str(dup)
-                else:
-                    rule_str = str(rule)
-                rule_str.strip()
+                dup_indexes = line_indexes.get(_strip_counts(rule_str))
+                if dup_indexes:
+                    top_indexes.update(dup_indexes)
+                    # grab the last entry
+                    rule_str = new_filter[dup_indexes[-1]]
 
                 our_rules += [rule_str]
             else:
@@ -472,7 +486,11 @@ class IptablesManager(object):
 
         our_rules += bot_rules
 
-        new_filter = list(new_filter)
+        if top_indexes:
+            rules_index -= len([index for index in top_indexes
+                                if index < rules_index])
+            new_filter = [line for index, line in enumerate(new_filter)
+                          if index not in top_indexes]
         new_filter[rules_index:rules_index] = our_rules
 
         new_filter[rules_index:rules_index] = [':%s - [0:0]' % (name,)
@@ -486,16 +504,19 @@ class IptablesManager(object):
         seen_lines = set()
 
         def _weed_out_duplicates(line):
-            # ignore [packet:byte] counts at beginning of lines
-            if line.startswith('['):
-                line = line.split(']', 1)[1]
-            line = line.strip()
+            line = _strip_counts(line)
             if line in seen_lines:
                 return False
             else:
                 seen_lines.add(line)
                 return True
 
+        # Hash the chains and rules to remove, ignoring the [packet:byte]
+        # counts at the beginning of the rules
+        remove_chain_names = set(remove_chains)
+        remove_rule_strs = set(_strip_counts(str(rule))
+                               for rule in remove_rules)
+
         def _weed_out_removes(line):
             # We need to find exact matches here
             if line.startswith(':'):
@@ -504,23 +525,15 @@ class IptablesManager(object):
                 line = line.split(':')[1]
                 line = line.split('- [')[0]
                 line = line.strip()
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
+                if line in remove_chain_names:
+                    remove_chain_names.remove(line)
+                    return False
             elif line.startswith('['):
                 # it's a rule
-                # ignore [packet:byte] counts at beginning of lines
-                line = line.split(']', 1)[1]
-                line = line.strip()
-                for rule in remove_rules:
-                    # ignore [packet:byte] counts at beginning of rules
-                    rule_str = str(rule)
-                    rule_str = rule_str.split(' ', 1)[1]
-                    rule_str = rule_str.strip()
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                line = _strip_counts(line)
+                if line in remove_rule_strs:
+                    remove_rule_strs.remove(line)
+                    return False
 
             # Leave it alone
             return True
@@ -537,12 +550,177 @@ class IptablesManager(object):
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
         return new_filter
 
 
+def _strip_counts(line):
+    """Returns an iptables line without the [packet:byte] counts at its
+    beginning, if any, and without its surrounding whitespace.
+    """
+    if line.startswith('['):
+        line = line.split(']', 1)[1]
+    return line.strip()
+
+
+def _get_rule_chain(line):
+    """Returns the chain of the supplied rule, without its [packet:byte]
+    counts, or None if the line is not a rule.
+    """
+    if not line.startswith('-A '):
+        return None
+    return line.split(' ', 2)[1]
+
+
+def _split_table(lines):
+    """Returns the chains declared in the lines of a table, without their
+    counts, and the rules of each chain, keyed by chain name, without their
+    [packet:byte] counts.
+    """
+    chains = set()
+    chain_rules = collections.defaultdict(list)
+    for line in lines:
+        if line.startswith('['):
+            line = line.split(']', 1)[1].strip()
+            if line.startswith('-A '):
+                chain_rules[line.split(' ', 2)[1]].append(line)
+        elif line.startswith(':'):
+            chains.add(line.rsplit(' [', 1)[0].strip())
+        elif line.startswith('-A '):
+            line = line.strip()
+            chain_rules[line.split(' ', 2)[1]].append(line)
+    return chains, chain_rules
+
+
+def _find_changed_chains(current_lines, new_lines):
+    """Returns the names of our wrapped chains whose rules differ between
+    the current and the new lines of a table, or None if the table changed
+    otherwise, for instance if chains were added or removed, or if the rules
+    of another chain changed, in which case the whole table must be
+    restored.
+
+    The order of the rules only matters within each chain, since
+    iptables-save lists the rules chain by chain.
+    """
+    current_chains, current_rules = _split_table(current_lines)
+    new_chains, new_rules = _split_table(new_lines)
+    if current_chains != new_chains:
+        return None
+    changed_chains = set()
+    for chain in set(current_rules) | set(new_rules):
+        if current_rules.get(chain) != new_rules.get(chain):
+            if not chain.startswith('%s-' % binary_name):
+                return None
+            changed_chains.add(chain)
+    return changed_chains
+
+
+def _get_chains_lines(lines, table_name, chains):
+    """Returns the iptables-restore --noflush input replacing the rules of
+    the supplied chains of a table by the ones in its lines.
+    """
+    # Declaring an existing chain flushes it when the tables are not flushed
+    chains_lines = ['*%s' % table_name]
+    chains_lines += [':%s - [0:0]' % chain for chain in sorted(chains)]
+    snippets = ['-A %s ' % chain for chain in chains]
+    chains_lines += [line for line in lines
+                     if any(snippet in line for snippet in snippets) and
+                     _get_rule_chain(_strip_counts(line)) in chains]
+    chains_lines.append('COMMIT')
+    return chains_lines
+
+
+def _extract_lines(lines, regex):
+    """Splits the supplied lines into the lines matching the regex, and the
+    other lines, leaving out the lines identical to a matching line.
+    """
+    regex = re.compile(regex)
+    matching = [line for line in lines if regex.search(line)]
+    matching_strs = set(line.strip() for line in matching)
+    others = [line for line in lines if line.strip() not in matching_strs]
+    return matching, others
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    Keeps the members of the IP sets created by this component of Nova, so
+    that only the members added or removed since the previous update of a set
+    are written.
+
+    Like the chains of IptablesManager, the names of the sets are wrapped to
+    be unique for the component creating them: a set named 'sg1-v4' created
+    by nova-compute is actually named 'nova-compute-sg1-v4'.
+
+    """
+
+    def __init__(self, execute=None):
+        if not execute:
+            self.execute = _execute
+        else:
+            self.execute = execute
+        # Dict, keyed by wrapped set name, of the set of its members
+        self.sets = {}
+
+    def _restore(self, lines):
+        self.execute('ipset', '-exist', 'restore',
+                     process_input=six.b('\n'.join(lines + [''])),
+                     run_as_root=True)
+
+    @utils.synchronized('ipset', external=True)
+    def set_members(self, name, members, family='inet'):
+        """Sets the members of a set, creating it if needed.
+
+        :param name: The name of the set, which is wrapped
+        :param members: Iterable of the IP addresses of the members
+        :param family: 'inet' for a set of IPv4 addresses, or 'inet6' for a
+                       set of IPv6 addresses
+        :returns: The wrapped name of the set
+        """
+        name = '%s-%s' % (binary_name, name)
+        members = set(members)
+        current = self.sets.get(name)
+        if current is None:
+            # The set may have been left with other members by a previous
+            # run, so fill a temporary set and swap it with the set, so that
+            # its members are replaced atomically
+            tmp_name = '%s-swap' % binary_name
+            create = 'create %%s hash:ip family %s' % family
+            self._restore([create % name, create % tmp_name,
+                           'flush %s' % tmp_name] +
+                          ['add %s %s' % (tmp_name, member)
+                           for member in sorted(members)])
+            self.execute('ipset', 'swap', tmp_name, name, run_as_root=True)
+            self.execute('ipset', 'destroy', tmp_name, run_as_root=True)
+        else:
+            lines = ['add %s %s' % (name, member)
+                     for member in sorted(members - current)]
+            lines += ['del %s %s' % (name, member)
+                      for member in sorted(current - members)]
+            if lines:
+                self._restore(lines)
+        self.sets[name] = members
+        return name
+
+    @utils.synchronized('ipset', external=True)
+    def destroy_unused(self, used_names):
+        """Destroys the sets which are not in use anymore.
+
+        :param used_names: Iterable of the wrapped names of the sets still
+                           referenced by iptables rules
+        """
+        for name in set(self.sets) - set(used_names):
+            try:
+                self.execute('ipset', 'destroy', name, run_as_root=True)
+            except processutils.ProcessExecutionError:
+                # Keep it, to destroy it with the next unused sets
+                LOG.warning('Failed to destroy the unused ipset %s', name,
+                            exc_info=True)
+            else:
+                del self.sets[name]
+
+
 # NOTE(jkoelker) This is just a nice little stub point since mocking
 #                builtins with mox is a nightmare
 def write_to_file(file, data, mode='w'):
@@ -41,6 +41,7 @@ from nova.pci import whitelist as pci_whitelist
 from nova.policies import servers as servers_policies
 from nova import profiler
 from nova import service_auth
+from nova import service_clients
 
 CONF = nova.conf.CONF
 
@@ -143,8 +144,8 @@ def get_client(context, admin=False):
     auth_plugin = None
 
     if not _SESSION:
-        _SESSION = ks_loading.load_session_from_conf_options(
-            CONF, nova.conf.neutron.NEUTRON_GROUP)
+        _SESSION = service_clients.load_session(
+            nova.conf.neutron.NEUTRON_GROUP)
 
     if admin or (context.is_admin and not context.auth_token):
         if not _ADMIN_AUTH:
@@ -208,7 +208,20 @@ def send_instance_update_notification(context, instance, old_vm_state=None,
     """Send 'compute.instance.update' notification to inform observers
     about instance state changes.
     """
-
+    # NOTE: Building the payload may hit the database, so it is left to the
+    # thread sending the notifications when they are sent asynchronously,
+    # which is given a copy of the instance as it may have changed by then.
+    rpc.send_notification(_send_instance_update_notification, context,
+                          instance, old_vm_state=old_vm_state,
+                          old_task_state=old_task_state,
+                          new_vm_state=new_vm_state,
+                          new_task_state=new_task_state, service=service,
+                          host=host, old_display_name=old_display_name)
+
+
+def _send_instance_update_notification(context, instance, old_vm_state,
+        old_task_state, new_vm_state, new_task_state, service, host,
+        old_display_name):
     payload = info_from_instance(context, instance, None, None)
 
     # determine how we'll report states
@@ -49,6 +49,7 @@ def register_all():
     __import__('nova.objects.instance_mapping')
     __import__('nova.objects.instance_numa_topology')
     __import__('nova.objects.instance_pci_requests')
+    __import__('nova.objects.instance_usage_rollup')
     __import__('nova.objects.keypair')
     __import__('nova.objects.migrate_data')
     __import__('nova.objects.virt_device_metadata')
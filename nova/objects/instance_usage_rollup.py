@@ -0,0 +1,184 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import datetime
+
+import iso8601
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from nova import db
+from nova import exception
+from nova import objects
+from nova.objects import base
+from nova.objects import fields
+from nova import utils
+
+LOG = logging.getLogger(__name__)
+
+ROLLUP_PERIOD = datetime.timedelta(days=1)
+
+_USAGE_FIELDS = ('instances', 'hours', 'vcpus_hours', 'memory_mb_hours',
+                 'local_gb_hours')
+
+
+def usage_hours(instance, period_start, period_stop):
+    """Return the number of hours an instance was running during a period.
+
+    This matches how the os-simple-tenant-usage API charges instances: from
+    the time they were launched to the time they were terminated.
+    """
+    launched_at = instance.launched_at
+    terminated_at = instance.terminated_at
+    if launched_at is None or launched_at > period_stop:
+        return 0
+    if terminated_at is not None and terminated_at < period_start:
+        return 0
+    start = max(launched_at, period_start)
+    stop = min(terminated_at, period_stop) if terminated_at else period_stop
+    return (stop - start).total_seconds() / 3600.0
+
+
+@base.NovaObjectRegistry.register
+class InstanceUsageRollup(base.NovaTimestampObject, base.NovaObject):
+    """The usage of the instances of one flavor of a project during a day.
+
+    The rollup of a day with no project_id and flavorid holds the totals of
+    all the projects, and its presence marks the day as rolled up.
+    """
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    fields = {
+        'id': fields.IntegerField(read_only=True),
+        'period_start': fields.DateTimeField(),
+        'project_id': fields.StringField(nullable=True),
+        'flavorid': fields.StringField(nullable=True),
+        'instances': fields.IntegerField(),
+        'hours': fields.FloatField(),
+        'vcpus_hours': fields.FloatField(),
+        'memory_mb_hours': fields.FloatField(),
+        'local_gb_hours': fields.FloatField(),
+        }
+
+    @staticmethod
+    def _from_db_object(context, rollup, db_rollup):
+        for field in rollup.fields:
+            setattr(rollup, field, db_rollup[field])
+        rollup._context = context
+        rollup.obj_reset_changes()
+        return rollup
+
+
+@base.NovaObjectRegistry.register
+class InstanceUsageRollupList(base.ObjectListBase, base.NovaObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+    fields = {
+        'objects': fields.ListOfObjectsField('InstanceUsageRollup'),
+    }
+
+    @base.remotable_classmethod
+    def _get_by_window(cls, context, begin, end, project_id=None):
+        # NOTE: Convert the timestamp strings back to the timezone-naive UTC
+        # datetimes stored in the database.
+        begin = timeutils.normalize_time(timeutils.parse_isotime(begin))
+        end = timeutils.normalize_time(timeutils.parse_isotime(end))
+        db_rollups = db.instance_usage_rollup_get_all(
+            context, begin, end, project_id=project_id)
+        return base.obj_make_list(context, cls(context), InstanceUsageRollup,
+                                  db_rollups)
+
+    @classmethod
+    def get_by_window(cls, context, begin, end, project_id=None):
+        """Get the rollups of the days starting in [begin, end).
+
+        :param context: nova request context
+        :param begin: datetime for the start of the time window
+        :param end: datetime for the end of the time window
+        :param project_id: only return the rollups of this project, and the
+                           totals rollups of all projects
+        :returns: InstanceUsageRollupList
+        """
+        return cls._get_by_window(context, utils.isotime(begin),
+                                  utils.isotime(end), project_id=project_id)
+
+    @base.remotable_classmethod
+    def _rollup_day(cls, context, period_start):
+        period_start = timeutils.normalize_time(
+            timeutils.parse_isotime(period_start))
+        period_stop = period_start + ROLLUP_PERIOD
+        instances = objects.InstanceList.get_active_by_window_joined(
+            context, period_start, period_stop, expected_attrs=['flavor'])
+
+        # NOTE: Instance datetime fields are timezone-aware.
+        aware_start = period_start.replace(tzinfo=iso8601.UTC)
+        aware_stop = period_stop.replace(tzinfo=iso8601.UTC)
+        flavors = {}
+        rollups = collections.defaultdict(
+            lambda: dict.fromkeys(_USAGE_FIELDS, 0))
+        # The totals are always stored, as they mark the day as rolled up
+        totals = rollups[(None, None)]
+        for instance in instances:
+            hours = usage_hours(instance, aware_start, aware_stop)
+            if not hours:
+                continue
+            flavor = cls._get_flavor(context, instance, flavors)
+            if flavor is None:
+                LOG.warning("Not rolling up the usage of instance %s, "
+                            "whose flavor cannot be found.", instance.uuid)
+                continue
+            for rollup in (rollups[(instance.project_id, flavor.flavorid)],
+                           totals):
+                rollup['instances'] += 1
+                rollup['hours'] += hours
+                rollup['vcpus_hours'] += flavor.vcpus * hours
+                rollup['memory_mb_hours'] += flavor.memory_mb * hours
+                rollup['local_gb_hours'] += (
+                    (flavor.root_gb + flavor.ephemeral_gb) * hours)
+
+        values = []
+        for (project_id, flavorid), usage in rollups.items():
+            usage.update(project_id=project_id, flavorid=flavorid)
+            values.append(usage)
+        db_rollups = db.instance_usage_rollup_replace(context, period_start,
+                                                      values)
+        return base.obj_make_list(context, cls(context), InstanceUsageRollup,
+                                  db_rollups)
+
+    @staticmethod
+    def _get_flavor(context, instance, flavors):
+        try:
+            return instance.get_flavor()
+        except exception.NotFound:
+            pass
+        # NOTE: Instances deleted before flavors were stored with them
+        # only have the id of their flavor.
+        flavor_id = instance.instance_type_id
+        if flavor_id not in flavors:
+            try:
+                flavors[flavor_id] = objects.Flavor.get_by_id(context,
+                                                              flavor_id)
+            except exception.FlavorNotFound:
+                flavors[flavor_id] = None
+        return flavors[flavor_id]
+
+    @classmethod
+    def rollup_day(cls, context, period_start):
+        """Compute and store the rollups of a day, replacing any existing.
+
+        :param context: nova request context
+        :param period_start: datetime for the midnight UTC starting the day
+        :returns: InstanceUsageRollupList of the stored rollups
+        """
+        return cls._rollup_day(context, utils.isotime(period_start))
@@ -29,8 +29,11 @@ from sqlalchemy import func
 from sqlalchemy import sql
 from sqlalchemy.sql import null
 
+import nova.conf
 from nova.db.sqlalchemy import api as db_api
 from nova.db.sqlalchemy import api_models as models
+from nova.db.sqlalchemy import capacity_index
+from nova.db.sqlalchemy import lookup_cache
 from nova.db.sqlalchemy import resource_class_cache as rc_cache
 from nova import exception
 from nova.i18n import _
@@ -49,9 +52,12 @@ _PROJECT_TBL = models.Project.__table__
 _USER_TBL = models.User.__table__
 _CONSUMER_TBL = models.Consumer.__table__
 _RC_CACHE = None
+_TRAIT_CACHE = None
 _TRAIT_LOCK = 'trait_sync'
 _TRAITS_SYNCED = False
+_CAPACITY_INDEX = capacity_index.CapacityIndex()
 
+CONF = nova.conf.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -69,6 +75,19 @@ def _ensure_rc_cache(ctx):
     _RC_CACHE = rc_cache.ResourceClassCache(ctx)
 
 
+def _ensure_trait_cache(ctx):
+    """Ensures that a singleton trait cache has been created in the module's
+    scope.
+
+    :param ctx: `nova.context.RequestContext` that may be used to grab a DB
+                connection.
+    """
+    global _TRAIT_CACHE
+    if _TRAIT_CACHE is not None:
+        return
+    _TRAIT_CACHE = lookup_cache.TraitCache(ctx)
+
+
 @db_api.api_context_manager.writer
 def _trait_sync(ctx):
     """Sync the os_traits symbols to the database.
@@ -353,8 +372,8 @@ def _set_inventory(context, rp, inv_list):
     conn = context.session.connection()
 
     existing_resources = _get_current_inventory_resources(conn, rp)
-    these_resources = set([_RC_CACHE.id_from_string(r.resource_class)
-                           for r in inv_list.objects])
+    these_resources = set(_RC_CACHE.ids_from_strings(
+        [r.resource_class for r in inv_list.objects]).values())
 
     # Determine which resources we should be adding, deleting and/or
     # updating in the resource provider's inventory by comparing sets
@@ -589,9 +608,11 @@ class ResourceProvider(base.NovaObject):
         updates = self.obj_get_changes()
         db_rp = self._create_in_db(self._context, updates)
         self._from_db_object(self._context, self, db_rp)
+        self._refresh_capacity_index()
 
     def destroy(self):
         self._delete(self._context, self.id)
+        self._refresh_capacity_index()
 
     def save(self):
         updates = self.obj_get_changes()
@@ -619,11 +640,13 @@ class ResourceProvider(base.NovaObject):
         """
         _add_inventory(self._context, self, inventory)
         self.obj_reset_changes()
+        self._refresh_capacity_index()
 
     def delete_inventory(self, resource_class):
         """Delete Inventory of provided resource_class."""
         _delete_inventory(self._context, self, resource_class)
         self.obj_reset_changes()
+        self._refresh_capacity_index()
 
     def set_inventory(self, inv_list):
         """Set all resource provider Inventory to be the provided list."""
@@ -633,6 +656,7 @@ class ResourceProvider(base.NovaObject):
                         'capacity for %(resource)s',
                         {'uuid': uuid, 'resource': rclass})
         self.obj_reset_changes()
+        self._refresh_capacity_index()
 
     def update_inventory(self, inventory):
         """Update one existing Inventory of the same resource class.
@@ -645,6 +669,14 @@ class ResourceProvider(base.NovaObject):
                         'capacity for %(resource)s',
                         {'uuid': uuid, 'resource': rclass})
         self.obj_reset_changes()
+        self._refresh_capacity_index()
+
+    def _refresh_capacity_index(self):
+        """Refreshes the provider in the capacity index, if it is enabled,
+        once it has been written to.
+        """
+        if CONF.placement.capacity_index:
+            _CAPACITY_INDEX.refresh_providers(self._context, [self.id])
 
     def get_aggregates(self):
         """Get the aggregate uuids associated with this resource provider."""
@@ -667,6 +699,7 @@ class ResourceProvider(base.NovaObject):
         """
         _set_traits(self._context, self, traits)
         self.obj_reset_changes()
+        self._refresh_capacity_index()
 
     @staticmethod
     @db_api.api_context_manager.writer
@@ -835,13 +868,60 @@ def _get_providers_with_shared_capacity(ctx, rc_id, amount):
 
 
 @db_api.api_context_manager.reader
-def _get_all_with_shared(ctx, resources):
+def _get_traits_by_provider_ids(ctx, rp_ids):
+    """Returns a dict, keyed by internal provider ID, of lists of dicts of
+    the ID and name of the traits of the supplied providers.
+
+    :param rp_ids: Internal IDs of the providers
+    """
+    join = sa.join(_RP_TRAIT_TBL, _TRAIT_TBL,
+                   _RP_TRAIT_TBL.c.trait_id == _TRAIT_TBL.c.id)
+    sel = sa.select([_RP_TRAIT_TBL.c.resource_provider_id, _TRAIT_TBL.c.id,
+                     _TRAIT_TBL.c.name]).select_from(join).where(
+        _RP_TRAIT_TBL.c.resource_provider_id.in_(rp_ids))
+    traits = collections.defaultdict(list)
+    for rp_id, trait_id, name in ctx.session.execute(sel):
+        traits[rp_id].append({'id': trait_id, 'name': name})
+    return traits
+
+
+def _get_trait_conds(rp_id_col, required_trait_ids, forbidden_trait_ids):
+    """Returns a list of WHERE conditions winnowing the providers whose ID is
+    in the supplied column to those having all the required traits and none
+    of the forbidden ones.
+
+    The conditions are subqueries on the resource_provider_traits table,
+    whose primary key starts with the trait ID, so the database intersects
+    the providers of each trait before looking at their inventories.
+    """
+    conds = []
+    if required_trait_ids:
+        sel = sa.select([_RP_TRAIT_TBL.c.resource_provider_id]).where(
+            _RP_TRAIT_TBL.c.trait_id.in_(required_trait_ids)).group_by(
+            _RP_TRAIT_TBL.c.resource_provider_id).having(
+            sql.func.count(_RP_TRAIT_TBL.c.trait_id) ==
+            len(required_trait_ids))
+        conds.append(rp_id_col.in_(sel))
+    if forbidden_trait_ids:
+        sel = sa.select([_RP_TRAIT_TBL.c.resource_provider_id]).where(
+            _RP_TRAIT_TBL.c.trait_id.in_(forbidden_trait_ids))
+        conds.append(~rp_id_col.in_(sel))
+    return conds
+
+
+@db_api.api_context_manager.reader
+def _get_all_with_shared(ctx, resources, required_trait_ids=None,
+                         forbidden_trait_ids=None):
     """Uses some more advanced SQL to find providers that either have the
     requested resources "locally" or are associated with a provider that shares
     those requested resources.
 
     :param resources: Dict keyed by resource class integer ID of requested
                       amounts of that resource
+    :param required_trait_ids: Set of internal IDs of the traits the providers
+                               must have
+    :param forbidden_trait_ids: Set of internal IDs of the traits the
+                                providers must not have
     """
     # NOTE(jaypipes): The SQL we generate here depends on which resource
     # classes have providers that share that resource via an aggregate.
@@ -1186,6 +1266,11 @@ def _get_all_with_shared(ctx, resources):
             )
             join_chain = sharing_join
 
+    # The traits only apply to the providers having the resources or sharing
+    # them, not to the providers sharing their resources
+    where_conds.extend(_get_trait_conds(rpt.c.id, required_trait_ids,
+                                        forbidden_trait_ids))
+
     sel = sel.select_from(join_chain)
     sel = sel.where(sa.and_(*where_conds))
     sel = sel.group_by(rpt.c.id)
@@ -1226,7 +1311,8 @@ class ResourceProviderList(base.ObjectListBase, base.NovaObject):
         resources = filters.pop('resources', {})
         # NOTE(sbauza): We want to key the dict by the resource class IDs
         # and we want to make sure those class names aren't incorrect.
-        resources = {_RC_CACHE.id_from_string(r_name): amount
+        rc_ids = _RC_CACHE.ids_from_strings(resources)
+        resources = {rc_ids[r_name]: amount
                      for r_name, amount in resources.items()}
         query = context.session.query(models.ResourceProvider)
         if name:
@@ -1498,6 +1584,16 @@ def _delete_allocations_for_consumer(ctx, consumer_id):
     ctx.session.execute(del_sql)
 
 
+@db_api.api_context_manager.reader
+def _get_provider_ids_by_consumers(ctx, consumer_ids):
+    """Returns the set of the internal IDs of the providers having
+    allocations of the supplied consumers.
+    """
+    sel = sa.select([_ALLOC_TBL.c.resource_provider_id]).where(
+        _ALLOC_TBL.c.consumer_id.in_(consumer_ids))
+    return set(r[0] for r in ctx.session.execute(sel))
+
+
 def _check_capacity_exceeded(conn, allocs):
     """Checks to see if the supplied allocation records would result in any of
     the inventories involved having their capacity exceeded.
@@ -1541,8 +1637,8 @@ def _check_capacity_exceeded(conn, allocs):
     #
     # We then take the results of the above and determine if any of the
     # inventory will have its capacity exceeded.
-    rc_ids = set([_RC_CACHE.id_from_string(a.resource_class)
-                       for a in allocs])
+    rc_ids = set(_RC_CACHE.ids_from_strings(
+        [a.resource_class for a in allocs]).values())
     provider_uuids = set([a.resource_provider.uuid for a in allocs])
 
     usage = sa.select([_ALLOC_TBL.c.resource_provider_id,
@@ -1599,6 +1695,10 @@ def _check_capacity_exceeded(conn, allocs):
                 resource_provider=provider_str)
 
     res_providers = {}
+    # The amounts already needed by the previous allocations of the same
+    # resource class on the same provider, when writing the allocations of
+    # several consumers at once
+    needed_by_key = collections.Counter()
     for alloc in allocs:
         rc_id = _RC_CACHE.id_from_string(alloc.resource_class)
         rp_uuid = alloc.resource_provider.uuid
@@ -1635,7 +1735,8 @@ def _check_capacity_exceeded(conn, allocs):
                 resource_provider=rp_uuid)
 
         # usage["used"] can be returned as None
-        used = usage['used'] or 0
+        used = (usage['used'] or 0) + needed_by_key[key]
+        needed_by_key[key] += amount_needed
         capacity = (usage['total'] - usage['reserved']) * allocation_ratio
         if capacity < (used + amount_needed):
             LOG.warning(
@@ -1884,15 +1985,29 @@ class AllocationList(base.ObjectListBase, base.NovaObject):
 
     def create_all(self):
         """Create the supplied allocations."""
+        rp_ids = None
+        if CONF.placement.capacity_index:
+            rp_ids = set(alloc.resource_provider.id for alloc in self.objects)
+            # The existing allocations of the consumers are replaced, which
+            # frees the resources of their providers as well
+            rp_ids |= _get_provider_ids_by_consumers(
+                self._context,
+                set(alloc.consumer_id for alloc in self.objects))
         # TODO(jaypipes): Retry the allocation writes on
         # ConcurrentUpdateDetected
         self._set_allocations(self._context, self.objects)
+        if rp_ids is not None:
+            _CAPACITY_INDEX.refresh_providers(self._context, rp_ids)
 
     def delete_all(self):
         # Allocations can only have a single consumer, so take advantage of
         # that fact and do an efficient batch delete
         consumer_uuid = self.objects[0].consumer_id
         _delete_allocations_for_consumer(self._context, consumer_uuid)
+        if CONF.placement.capacity_index:
+            _CAPACITY_INDEX.refresh_providers(
+                self._context,
+                set(alloc.resource_provider.id for alloc in self.objects))
 
     def __repr__(self):
         strings = [repr(x) for x in self.objects]
@@ -2259,6 +2374,8 @@ class Trait(base.NovaObject):
                                               reason='ID attribute not found')
 
         self._destroy_in_db(self._context, self.id, self.name)
+        if _TRAIT_CACHE is not None:
+            _TRAIT_CACHE.clear()
 
 
 @base.NovaObjectRegistry.register_if(False)
@@ -2443,7 +2560,7 @@ class AllocationCandidates(base.NovaObject):
     }
 
     @classmethod
-    def get_by_filters(cls, context, filters):
+    def get_by_filters(cls, context, filters, include_traits=True):
         """Returns an AllocationCandidates object containing all resource
         providers matching a set of supplied resource constraints, with a set
         of allocation requests constructed from that list of resource
@@ -2458,9 +2575,24 @@ class AllocationCandidates(base.NovaObject):
                          requested or be associated via aggregate to a provider
                          that shares this resource and has capacity for the
                          requested amount.
+            'required_traits': A set of names of traits that the provider
+                               having the resources, or having them shared
+                               with it, must have. The traits of the
+                               providers sharing their resources are not
+                               considered.
+            'forbidden_traits': A set of names of traits that the provider
+                                must not have.
+        :param include_traits: Whether to fill in the traits of the provider
+                               summaries
+        :raises: TraitNotFound if any of the traits does not exist
         """
         _ensure_rc_cache(context)
-        alloc_reqs, provider_summaries = cls._get_by_filters(context, filters)
+        if (filters.get('required_traits') or
+                filters.get('forbidden_traits')):
+            _ensure_trait_sync(context)
+            _ensure_trait_cache(context)
+        alloc_reqs, provider_summaries = cls._get_by_filters(
+            context, filters, include_traits)
         return cls(
             context,
             allocation_requests=alloc_reqs,
@@ -2471,7 +2603,7 @@ class AllocationCandidates(base.NovaObject):
     # minimize the complexity of this method.
     @staticmethod
     @db_api.api_context_manager.reader
-    def _get_by_filters(context, filters):
+    def _get_by_filters(context, filters, include_traits):
         # We first get the list of "root providers" that either have the
         # requested resources or are associated with the providers that
         # share one or more of the requested resource(s)
@@ -2480,39 +2612,65 @@ class AllocationCandidates(base.NovaObject):
             raise ValueError(_("Supply a resources collection in filters."))
 
         # Transform resource string names to internal integer IDs
+        rc_ids = _RC_CACHE.ids_from_strings(resources)
         resources = {
-            _RC_CACHE.id_from_string(key): value
+            rc_ids[key]: value
             for key, value in resources.items()
         }
-
-        roots = [r[0] for r in _get_all_with_shared(context, resources)]
-
-        if not roots:
-            return [], []
-
-        # Contains a set of resource provider IDs for each resource class
-        # requested
-        sharing_providers = {
-            rc_id: _get_providers_with_shared_capacity(context, rc_id, amount)
-            for rc_id, amount in resources.items()
-        }
-        # We need to grab usage information for all the providers identified as
-        # potentially fulfilling part of the resource request. This includes
-        # "root providers" returned from _get_all_with_shared() as well as all
-        # the providers of shared resources. Here, we simply grab a unique set
-        # of all those resource provider internal IDs by set union'ing them
-        # together
-        all_rp_ids = set(roots)
-        for rps in sharing_providers.values():
-            all_rp_ids |= set(rps)
-
-        # Grab usage summaries for each provider (local or sharing) and
-        # resource class requested
-        usages = _get_usages_by_provider_and_rc(
-            context,
-            all_rp_ids,
-            list(resources.keys()),
-        )
+        # And the trait names too
+        required_traits = filters.get('required_traits') or set()
+        forbidden_traits = filters.get('forbidden_traits') or set()
+        trait_ids = {}
+        if required_traits or forbidden_traits:
+            trait_ids = _TRAIT_CACHE.ids_from_names(
+                required_traits | forbidden_traits)
+        required_trait_ids = set(trait_ids[six.text_type(name)]
+                                 for name in required_traits)
+        forbidden_trait_ids = set(trait_ids[six.text_type(name)]
+                                  for name in forbidden_traits)
+
+        candidates = None
+        if CONF.placement.capacity_index:
+            # The capacity index only finds the providers having all the
+            # requested resources locally, along with their usages
+            candidates = _CAPACITY_INDEX.get_candidates(
+                context, resources, required_trait_ids, forbidden_trait_ids)
+        if candidates is not None:
+            roots, usages = candidates
+            if not roots:
+                return [], []
+            sharing_providers = {rc_id: [] for rc_id in resources}
+        else:
+            roots = [r[0] for r in _get_all_with_shared(
+                context, resources, required_trait_ids, forbidden_trait_ids)]
+
+            if not roots:
+                return [], []
+
+            # Contains a set of resource provider IDs for each resource class
+            # requested
+            sharing_providers = {
+                rc_id: _get_providers_with_shared_capacity(
+                    context, rc_id, amount)
+                for rc_id, amount in resources.items()
+            }
+            # We need to grab usage information for all the providers
+            # identified as potentially fulfilling part of the resource
+            # request. This includes "root providers" returned from
+            # _get_all_with_shared() as well as all the providers of shared
+            # resources. Here, we simply grab a unique set of all those
+            # resource provider internal IDs by set union'ing them together
+            all_rp_ids = set(roots)
+            for rps in sharing_providers.values():
+                all_rp_ids |= set(rps)
+
+            # Grab usage summaries for each provider (local or sharing) and
+            # resource class requested
+            usages = _get_usages_by_provider_and_rc(
+                context,
+                all_rp_ids,
+                list(resources.keys()),
+            )
 
         # Build up a dict, keyed by internal resource provider ID, of usage
         # information from which we will then build both allocation request and
@@ -2533,7 +2691,6 @@ class AllocationCandidates(base.NovaObject):
                 summary = {
                     'uuid': u_rp_uuid,
                     'resources': {},
-                    # TODO(jaypipes): Fill in the provider's traits...
                     'traits': [],
                 }
                 summaries[u_rp_id] = summary
@@ -2542,6 +2699,12 @@ class AllocationCandidates(base.NovaObject):
                 'used': used,
             }
 
+        # Fill in the traits of each provider
+        if summaries and include_traits:
+            traits = _get_traits_by_provider_ids(context, list(summaries))
+            for rp_id, rp_traits in traits.items():
+                summaries[rp_id]['traits'] = rp_traits
+
         # Next, build up a list of allocation requests. These allocation
         # requests are AllocationRequest objects, containing resource provider
         # UUIDs, resource class names and amounts to consume from that resource
@@ -2682,6 +2845,8 @@ class AllocationCandidates(base.NovaObject):
                     uuid=rp_uuid,
                 ),
                 resources=rps_resources,
+                traits=[Trait(context, **trait)
+                        for trait in summary['traits']],
             )
             summary_objs.append(summary_obj)
 
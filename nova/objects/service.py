@@ -475,7 +475,8 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
     # Version 1.17: Service version 1.19
     # Version 1.18: Added include_disabled parameter to get_by_binary()
     # Version 1.19: Added get_all_computes_by_hv_type()
-    VERSION = '1.19'
+    # Version 1.20: Added get_by_hosts_and_binary()
+    VERSION = '1.20'
 
     fields = {
         'objects': fields.ListOfObjectsField('Service'),
@@ -496,6 +497,14 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.Service,
                                   db_services)
 
+    @base.remotable_classmethod
+    def get_by_hosts_and_binary(cls, context, hosts, binary,
+                                include_disabled=False):
+        db_services = db.service_get_all_by_binary(
+            context, binary, include_disabled=include_disabled, hosts=hosts)
+        return base.obj_make_list(context, cls(context), objects.Service,
+                                  db_services)
+
     @base.remotable_classmethod
     def get_by_host(cls, context, host):
         db_services = db.service_get_all_by_host(context, host)
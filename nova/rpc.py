@@ -26,13 +26,20 @@ __all__ = [
 ]
 
 import functools
+import os
 
+import eventlet
+from eventlet import patcher
+import eventlet.queue
 from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_messaging.rpc import dispatcher
+from oslo_reports import guru_meditation_report as gmr
+from oslo_reports.models import with_default_views as mwdv
 from oslo_serialization import jsonutils
 from oslo_service import periodic_task
 from oslo_utils import importutils
+import six
 
 import nova.conf
 import nova.context
@@ -41,6 +48,9 @@ from nova.i18n import _
 
 profiler = importutils.try_import("osprofiler.profiler")
 
+native_threading = patcher.original("threading")
+native_Queue = patcher.original("Queue" if six.PY2 else "queue")
+
 
 CONF = nova.conf.CONF
 
@@ -50,6 +60,10 @@ TRANSPORT = None
 LEGACY_NOTIFIER = None
 NOTIFICATION_TRANSPORT = None
 NOTIFIER = None
+NOTIFICATION_QUEUE = None
+# Whether the Notification Queue section of the Guru Meditation Report has
+# been registered.
+_NOTIFICATION_QUEUE_REPORTED = False
 
 ALLOWED_EXMODS = [
     nova.exception.__name__,
@@ -59,6 +73,7 @@ EXTRA_EXMODS = []
 
 def init(conf):
     global TRANSPORT, NOTIFICATION_TRANSPORT, LEGACY_NOTIFIER, NOTIFIER
+    global NOTIFICATION_QUEUE, _NOTIFICATION_QUEUE_REPORTED
     exmods = get_allowed_exmods()
     TRANSPORT = create_transport(get_transport_url())
     NOTIFICATION_TRANSPORT = messaging.get_notification_transport(
@@ -84,14 +99,27 @@ def init(conf):
             NOTIFICATION_TRANSPORT,
             serializer=serializer,
             topics=conf.notifications.versioned_notifications_topics)
+    if conf.notifications.async_emit:
+        NOTIFICATION_QUEUE = NotificationQueue(
+            conf.notifications.async_queue_size,
+            overflow=conf.notifications.async_queue_overflow,
+            batch_size=conf.notifications.async_batch_size)
+        if not _NOTIFICATION_QUEUE_REPORTED:
+            gmr.TextGuruMeditation.register_section(
+                'Notification Queue', report_notification_queue)
+            _NOTIFICATION_QUEUE_REPORTED = True
 
 
 def cleanup():
     global TRANSPORT, NOTIFICATION_TRANSPORT, LEGACY_NOTIFIER, NOTIFIER
+    global NOTIFICATION_QUEUE
     assert TRANSPORT is not None
     assert NOTIFICATION_TRANSPORT is not None
     assert LEGACY_NOTIFIER is not None
     assert NOTIFIER is not None
+    if NOTIFICATION_QUEUE is not None:
+        NOTIFICATION_QUEUE.flush()
+        NOTIFICATION_QUEUE = None
     TRANSPORT.cleanup()
     NOTIFICATION_TRANSPORT.cleanup()
     TRANSPORT = NOTIFICATION_TRANSPORT = LEGACY_NOTIFIER = NOTIFIER = None
@@ -206,13 +234,39 @@ def get_notifier(service, host=None, publisher_id=None):
     assert LEGACY_NOTIFIER is not None
     if not publisher_id:
         publisher_id = "%s.%s" % (service, host or CONF.host)
-    return LegacyValidatingNotifier(
-            LEGACY_NOTIFIER.prepare(publisher_id=publisher_id))
+    notifier = LEGACY_NOTIFIER.prepare(publisher_id=publisher_id)
+    if NOTIFICATION_QUEUE is not None:
+        notifier = AsyncNotifier(notifier, NOTIFICATION_QUEUE)
+    return LegacyValidatingNotifier(notifier)
 
 
 def get_versioned_notifier(publisher_id):
     assert NOTIFIER is not None
-    return NOTIFIER.prepare(publisher_id=publisher_id)
+    notifier = NOTIFIER.prepare(publisher_id=publisher_id)
+    if NOTIFICATION_QUEUE is not None:
+        notifier = AsyncNotifier(notifier, NOTIFICATION_QUEUE)
+    return notifier
+
+
+def send_notification(send, *args, **kwargs):
+    """Call a function sending notifications.
+
+    When asynchronous notifications are enabled the function is called by the
+    thread sending the queued notifications, so the work it does to build
+    their payload is not done by the caller either.
+    """
+    if NOTIFICATION_QUEUE is None:
+        send(*args, **kwargs)
+    else:
+        NOTIFICATION_QUEUE.put(send, *args, **kwargs)
+
+
+def report_notification_queue():
+    """Guru Meditation Report section generator for the notification queue.
+    """
+    if NOTIFICATION_QUEUE is None:
+        return mwdv.ModelWithDefaultViews(data={})
+    return NOTIFICATION_QUEUE.report()
 
 
 def if_notifications_enabled(f):
@@ -396,6 +450,171 @@ class LegacyValidatingNotifier(object):
         getattr(self.notifier, priority)(ctxt, event_type, payload)
 
 
+class NotificationQueue(object):
+    """Bounded queue of notifications sent by a background thread.
+
+    Notifications are queued as calls to the functions doing the actual
+    sending. The thread is a greenthread when the process is monkey patched
+    by eventlet, and a native thread otherwise, as in nova-api running under
+    a WSGI server, where a greenthread would never be scheduled.
+
+    :param size: maximum number of queued notifications
+    :param overflow: 'block' to wait for room in the queue when it is full,
+                     'drop' to drop the notification
+    :param batch_size: maximum number of notifications sent in a row before
+                       yielding to other greenthreads
+    """
+
+    def __init__(self, size, overflow='block', batch_size=50):
+        self.size = size
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self._green = patcher.is_monkey_patched('thread')
+        if self._green:
+            self._queue_module = eventlet.queue
+            self._queue = eventlet.queue.LightQueue(size)
+        else:
+            self._queue_module = native_Queue
+            self._queue = native_Queue.Queue(size)
+        self._worker = None
+        self._worker_lock = native_threading.Lock()
+        self._pid = None
+        self._overflowing = False
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _ensure_worker(self):
+        # NOTE: The queue is created before the API services fork their
+        # workers, so the thread is started by the process using it.
+        pid = os.getpid()
+        if self._worker is not None and self._pid == pid:
+            return
+        with self._worker_lock:
+            if self._worker is not None and self._pid == pid:
+                return
+            if self._green:
+                self._worker = eventlet.spawn(self._run)
+            else:
+                worker = native_threading.Thread(target=self._run,
+                                                 name='notification-queue')
+                worker.daemon = True
+                worker.start()
+                self._worker = worker
+            self._pid = pid
+
+    def _in_worker(self):
+        if self._green:
+            return eventlet.getcurrent() is self._worker
+        return native_threading.current_thread() is self._worker
+
+    def _drop(self):
+        self.dropped += 1
+        if not self._overflowing:
+            self._overflowing = True
+            LOG.warning('The notification queue is full, dropping '
+                        'notifications.')
+
+    @staticmethod
+    def _copy(arg):
+        # NovaObjects may have changed by the time the call is made.
+        return arg.obj_clone() if hasattr(arg, 'obj_clone') else arg
+
+    def _call(self, send, args, kwargs):
+        return functools.partial(
+            send, *[self._copy(arg) for arg in args],
+            **{name: self._copy(arg) for name, arg in kwargs.items()})
+
+    def put(self, send, *args, **kwargs):
+        """Queue a call to a function sending notifications.
+
+        Arguments with an obj_clone() method, such as NovaObjects, are copied
+        only if the call is queued.
+        """
+        if self._in_worker():
+            # Notifications emitted while sending a queued one cannot wait
+            # for the queue to be drained.
+            self._send(functools.partial(send, *args, **kwargs))
+            return
+        self._ensure_worker()
+        if self.overflow == 'drop':
+            # Check for room first so nothing is copied for a dropped call.
+            if self._queue.full():
+                self._drop()
+                return
+            try:
+                self._queue.put_nowait(self._call(send, args, kwargs))
+            except self._queue_module.Full:
+                self._drop()
+                return
+            self._overflowing = False
+        else:
+            self._queue.put(self._call(send, args, kwargs))
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _send(self, send):
+        try:
+            send()
+        except Exception:
+            self.errors += 1
+            LOG.exception('Failed to send notification')
+        else:
+            self.sent += 1
+
+    def _run(self):
+        while True:
+            self._send(self._queue.get())
+            for _i in range(self.batch_size - 1):
+                try:
+                    send = self._queue.get_nowait()
+                except self._queue_module.Empty:
+                    break
+                self._send(send)
+            if self._green:
+                eventlet.sleep(0)
+
+    def flush(self):
+        """Send the queued notifications from the calling thread."""
+        while True:
+            try:
+                send = self._queue.get_nowait()
+            except self._queue_module.Empty:
+                return
+            self._send(send)
+
+    def get_stats(self):
+        return {'size': self.size,
+                'depth': self._queue.qsize(),
+                'max_depth': self.max_depth,
+                'sent': self.sent,
+                'dropped': self.dropped,
+                'errors': self.errors}
+
+    def report(self):
+        """Guru Meditation Report section generator for the queue stats."""
+        return mwdv.ModelWithDefaultViews(data=self.get_stats())
+
+
+class AsyncNotifier(object):
+    """Wraps an oslo.messaging Notifier to queue the notifications."""
+
+    def __init__(self, notifier, queue):
+        self.notifier = notifier
+        self.queue = queue
+        for priority in ['audit', 'debug', 'info', 'warn', 'warning',
+                         'error', 'critical', 'sample']:
+            setattr(self, priority,
+                    functools.partial(self._notify, priority))
+
+    def _notify(self, priority, ctxt, event_type, payload):
+        self.queue.put(getattr(self.notifier, priority), ctxt, event_type,
+                       payload)
+
+    def __getattr__(self, name):
+        return getattr(self.notifier, name)
+
+
 class ClientRouter(periodic_task.PeriodicTasks):
     """Creates RPC clients that honor the context's RPC transport
     or provides a default.
@@ -1028,6 +1028,58 @@ class SchedulerReportClient(object):
                  'text': r.text})
         return r.status_code == 204
 
+    @safe_connect
+    def claim_resources_for_consumers(self, alloc_requests, project_id,
+                                      user_id, attempt=0):
+        """Creates allocation records for several new consumers against
+        the supplied resource providers, in a single request.
+
+        The allocations of all the consumers are created atomically, so
+        either all of them are created or none is. Unlike claim_resources(),
+        this does not check for existing allocations of the consumers, so it
+        must not be used for move operations.
+
+        :note: This method will attempt to retry a claim that fails with a
+        concurrent update up to 3 times
+
+        :param alloc_requests: Dict, keyed by consumer UUID, of the JSON
+                               bodies that would be sent to the placement's
+                               PUT /allocations API for each consumer
+        :param project_id: The project_id associated with the allocations.
+        :param user_id: The user_id associated with the allocations.
+        :param attempt: The attempt at claiming these allocation_requests
+                        (used in recursive retries)
+        :returns: True if the allocations were created, False otherwise.
+        """
+        payload = {}
+        for consumer_uuid, alloc_request in alloc_requests.items():
+            payload[consumer_uuid] = copy.deepcopy(alloc_request)
+            payload[consumer_uuid]['project_id'] = project_id
+            payload[consumer_uuid]['user_id'] = user_id
+        r = self.post('/allocations', payload, version='1.12')
+        if r.status_code == 406:
+            # The placement service is older than the scheduler, the claims
+            # will be made one consumer at a time
+            LOG.debug("The placement API does not support claiming resources "
+                      "for several consumers in a single request.")
+            return False
+        if r.status_code != 204:
+            if attempt < 3 and 'concurrently updated' in r.text:
+                LOG.debug("Another process changed the resource providers "
+                          "involved in our claim attempt for consumers %s. "
+                          "Retrying claim, attempt: %s",
+                          ', '.join(alloc_requests), (attempt + 1))
+                return self.claim_resources_for_consumers(
+                    alloc_requests, project_id, user_id,
+                    attempt=(attempt + 1))
+            LOG.warning(
+                'Unable to submit allocations for instances '
+                '%(uuids)s (%(code)i %(text)s)',
+                {'uuids': ', '.join(alloc_requests),
+                 'code': r.status_code,
+                 'text': r.text})
+        return r.status_code == 204
+
     @safe_connect
     def remove_provider_from_instance_allocation(self, consumer_uuid, rp_uuid,
                                                  user_id, project_id,
@@ -30,6 +30,7 @@ from nova.i18n import _
 from nova import rpc
 from nova.scheduler import client
 from nova.scheduler import driver
+from nova.scheduler import stats as scheduler_stats
 
 CONF = nova.conf.CONF
 LOG = logging.getLogger(__name__)
@@ -160,8 +161,9 @@ class FilterScheduler(driver.Scheduler):
         # Note: remember, we are using an iterator here. So only
         # traverse this list once. This can bite you if the hosts
         # are being scanned in a filter or weighing function.
-        hosts = self._get_all_host_states(elevated, spec_obj,
-            provider_summaries)
+        with scheduler_stats.timed('host_states'):
+            hosts = self._get_all_host_states(elevated, spec_obj,
+                provider_summaries)
 
         # NOTE(sbauza): The RequestSpec.num_instances field contains the number
         # of instances created when the RequestSpec was used to first boot some
@@ -199,6 +201,28 @@ class FilterScheduler(driver.Scheduler):
             return self._legacy_find_hosts(num_instances, spec_obj, hosts,
                     num_to_return, include_alternates)
 
+        if num_instances > 1:
+            # When booting several instances, their hosts are selected first,
+            # and their resources are then claimed in a single request to the
+            # placement API. Move operations only involve a single instance.
+            # The host states are iterated again if the batch claim fails.
+            hosts = list(hosts)
+            selections_to_return = self._schedule_in_batch(
+                elevated, spec_obj, instance_uuids, hosts,
+                alloc_reqs_by_rp_uuid, num_to_return)
+            if selections_to_return is not None:
+                return selections_to_return
+
+        return self._schedule_one_at_a_time(
+            elevated, spec_obj, instance_uuids, hosts, alloc_reqs_by_rp_uuid,
+            num_to_return)
+
+    def _schedule_one_at_a_time(self, ctx, spec_obj, instance_uuids, hosts,
+                                alloc_reqs_by_rp_uuid, num_to_return):
+        """Selects a host for each instance and claims its resources against
+        the host before selecting the host of the next instance. Returns the
+        list of the claimed hosts and their alternates for each instance.
+        """
         # A list of the instance UUIDs that were successfully claimed against
         # in the placement API. If we are not able to successfully claim for
         # all involved instances, we use this list to remove those allocations
@@ -208,7 +232,7 @@ class FilterScheduler(driver.Scheduler):
         # The list of hosts that have been selected (and claimed).
         claimed_hosts = []
 
-        for num in range(num_instances):
+        for num, instance_uuid in enumerate(instance_uuids):
             hosts = self._get_sorted_hosts(spec_obj, hosts, num)
             if not hosts:
                 # NOTE(jaypipes): If we get here, that means not all instances
@@ -218,24 +242,8 @@ class FilterScheduler(driver.Scheduler):
                 self._cleanup_allocations(claimed_instance_uuids)
                 break
 
-            instance_uuid = instance_uuids[num]
-            # Attempt to claim the resources against one or more resource
-            # providers, looping over the sorted list of possible hosts
-            # looking for an allocation_request that contains that host's
-            # resource provider UUID
-            claimed_host = None
-            for host in hosts:
-                cn_uuid = host.uuid
-                if cn_uuid not in alloc_reqs_by_rp_uuid:
-                    LOG.debug("Found host state %s that wasn't in "
-                              "allocation_requests. Skipping.", cn_uuid)
-                    continue
-
-                alloc_reqs = alloc_reqs_by_rp_uuid[cn_uuid]
-                if self._claim_resources(elevated, spec_obj, instance_uuid,
-                        alloc_reqs):
-                    claimed_host = host
-                    break
+            claimed_host = self._claim_first_host(
+                ctx, spec_obj, instance_uuid, hosts, alloc_reqs_by_rp_uuid)
 
             if claimed_host is None:
                 # We weren't able to claim resources in the placement API
@@ -260,6 +268,110 @@ class FilterScheduler(driver.Scheduler):
             claimed_hosts, spec_obj, hosts, num, num_to_return)
         return selections_to_return
 
+    def _schedule_in_batch(self, ctx, spec_obj, instance_uuids, hosts,
+                           alloc_reqs_by_rp_uuid, num_to_return):
+        """Selects a host for each instance, then claims the resources of all
+        the instances against their hosts in a single request to the
+        placement API. Returns the list of the claimed hosts and their
+        alternates for each instance, an empty list if no host could be
+        selected for an instance, or None if the batch claim failed.
+
+        The hosts are not consumed until their resources are claimed. Copies
+        of the selected hosts are consumed instead for the selection of the
+        next instances, so that the hosts are left untouched if the batch
+        claim fails and the hosts must be selected again.
+        """
+        group_hosts = None
+        if spec_obj.instance_group is not None:
+            group_hosts = list(spec_obj.instance_group.hosts)
+        # The hosts selected for the instances, and the original host of each
+        # consumed copy
+        selected_hosts = []
+        originals = {}
+
+        for num in range(len(instance_uuids)):
+            hosts = self._get_sorted_hosts(spec_obj, hosts, num)
+            selected_host = next((host for host in hosts
+                                  if host.uuid in alloc_reqs_by_rp_uuid),
+                                 None)
+            if selected_host is None:
+                LOG.debug("Unable to find a host to claim against.")
+                self._reset_instance_group_hosts(spec_obj, group_hosts)
+                return []
+            if selected_host not in originals:
+                host_copy = selected_host.copy()
+                originals[host_copy] = selected_host
+                hosts = [host_copy if host is selected_host else host
+                         for host in hosts]
+                selected_host = host_copy
+            selected_hosts.append(selected_host)
+            self._consume_selected_host(selected_host, spec_obj)
+
+        selected_hosts = [originals[host] for host in selected_hosts]
+        if not self._claim_resources_in_batch(ctx, spec_obj, instance_uuids,
+                                              selected_hosts,
+                                              alloc_reqs_by_rp_uuid):
+            self._reset_instance_group_hosts(spec_obj, group_hosts)
+            return None
+
+        hosts = [originals.get(host, host) for host in hosts]
+        return self._get_alternate_hosts(selected_hosts, spec_obj, hosts, num,
+                                         num_to_return)
+
+    @staticmethod
+    def _reset_instance_group_hosts(spec_obj, group_hosts):
+        if group_hosts is not None:
+            spec_obj.instance_group.hosts = group_hosts
+            spec_obj.instance_group.obj_reset_changes(['hosts'])
+
+    def _claim_first_host(self, ctx, spec_obj, instance_uuid, hosts,
+                          alloc_reqs_by_rp_uuid):
+        """Attempts to claim the resources of an instance against one or more
+        resource providers, looping over the sorted list of possible hosts
+        looking for an allocation_request that contains that host's resource
+        provider UUID. Returns the claimed host, or None if no claim was
+        successful.
+        """
+        for host in hosts:
+            cn_uuid = host.uuid
+            if cn_uuid not in alloc_reqs_by_rp_uuid:
+                LOG.debug("Found host state %s that wasn't in "
+                          "allocation_requests. Skipping.", cn_uuid)
+                continue
+
+            alloc_reqs = alloc_reqs_by_rp_uuid[cn_uuid]
+            with scheduler_stats.timed('claim'):
+                claimed = self._claim_resources(ctx, spec_obj,
+                                                instance_uuid, alloc_reqs)
+            if claimed:
+                return host
+
+    def _claim_resources_in_batch(self, ctx, spec_obj, instance_uuids,
+                                  selected_hosts, alloc_reqs_by_rp_uuid):
+        """Claims the resources of several new instances against the hosts
+        selected for them in a single request to the placement API, and
+        consumes the hosts if the claim succeeds. Returns True if the
+        resources of all the instances were claimed, False otherwise, in which
+        case no allocation is left behind.
+        """
+        LOG.debug("Attempting to claim resources in the placement API for "
+                  "instances %s", instance_uuids)
+        # NOTE: See _claim_resources() about the user_id and the choice of
+        # the first allocation_request.
+        alloc_reqs = {
+            instance_uuid: alloc_reqs_by_rp_uuid[host.uuid][0]
+            for instance_uuid, host in zip(instance_uuids, selected_hosts)}
+        with scheduler_stats.timed('claim'):
+            claimed = self.placement_client.claim_resources_for_consumers(
+                alloc_reqs, spec_obj.project_id, ctx.user_id)
+        if not claimed:
+            LOG.debug("Unable to claim the resources of the instances in a "
+                      "single request, claiming them one at a time.")
+            return False
+        for host in selected_hosts:
+            host.consume_from_request(spec_obj)
+        return True
+
     def _cleanup_allocations(self, instance_uuids):
         """Removes allocations for the supplied instance UUIDs."""
         if not instance_uuids:
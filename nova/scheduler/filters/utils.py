@@ -24,26 +24,68 @@ from nova.i18n import _LI
 LOG = logging.getLogger(__name__)
 
 
+class AggregateMetadata(object):
+    """Index of the metadata of the aggregates a host belongs to.
+
+    The lookups done by the aggregate filters are computed once and then
+    memoized, so that a host manager can share one index across all the
+    scheduling requests until the aggregates of the host change.
+    The returned sets are frozen and the returned dicts are copies, so that
+    the callers cannot modify the index.
+    """
+
+    def __init__(self, aggregates):
+        self.aggregates = aggregates
+        self._values = {}
+        self._metadata = {}
+
+    def values_from_key(self, key_name):
+        """Returns a set of the values of a metadata key."""
+        try:
+            return self._values[key_name]
+        except KeyError:
+            values = frozenset(aggr.metadata[key_name]
+                               for aggr in self.aggregates
+                               if key_name in aggr.metadata)
+            self._values[key_name] = values
+            return values
+
+    def metadata_by_key(self, key=None):
+        """Returns a dict of the split metadata values of the aggregates
+        having a metadata key, or of all the aggregates if no key is given.
+        """
+        try:
+            metadata = self._metadata[key]
+        except KeyError:
+            values = collections.defaultdict(set)
+            for aggr in self.aggregates:
+                if key is None or key in aggr.metadata:
+                    for k, v in aggr.metadata.items():
+                        values[k].update(x.strip() for x in v.split(','))
+            metadata = {k: frozenset(v) for k, v in values.items()}
+            self._metadata[key] = metadata
+        return collections.defaultdict(set, metadata)
+
+
+def _get_aggregate_metadata(host_state):
+    index = getattr(host_state, 'aggregates_metadata', None)
+    # NOTE: Only trust the index if it was built from the aggregates the
+    # host state currently has, otherwise index them for this lookup only.
+    if index is None or index.aggregates is not host_state.aggregates:
+        index = AggregateMetadata(host_state.aggregates)
+    return index
+
+
 def aggregate_values_from_key(host_state, key_name):
     """Returns a set of values based on a metadata key for a specific host."""
-    aggrlist = host_state.aggregates
-    return {aggr.metadata[key_name]
-              for aggr in aggrlist
-              if key_name in aggr.metadata
-              }
+    return _get_aggregate_metadata(host_state).values_from_key(key_name)
 
 
 def aggregate_metadata_get_by_host(host_state, key=None):
     """Returns a dict of all metadata based on a metadata key for a specific
     host. If the key is not provided, returns a dict of all metadata.
     """
-    aggrlist = host_state.aggregates
-    metadata = collections.defaultdict(set)
-    for aggr in aggrlist:
-        if key is None or key in aggr.metadata:
-            for k, v in aggr.metadata.items():
-                metadata[k].update(x.strip() for x in v.split(','))
-    return metadata
+    return _get_aggregate_metadata(host_state).metadata_by_key(key)
 
 
 def validate_num_values(vals, default=None, cast_to=int, based_on=min):
@@ -18,6 +18,7 @@ Manage hosts in the current zone.
 """
 
 import collections
+import copy
 import functools
 import time
 try:
@@ -38,6 +39,9 @@ from nova.i18n import _LI, _LW
 from nova import objects
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
+from nova.scheduler.filters import utils as filters_utils
+from nova.scheduler import stats as scheduler_stats
+from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
 from nova import utils
 from nova.virt import hardware
@@ -144,6 +148,8 @@ class HostState(object):
 
         # List of aggregates the host belongs to
         self.aggregates = []
+        # Index of the metadata of those aggregates, used by the filters
+        self.aggregates_metadata = None
 
         # Instances on this host
         self.instances = {}
@@ -257,6 +263,16 @@ class HostState(object):
         self.ram_allocation_ratio = compute.ram_allocation_ratio
         self.disk_allocation_ratio = compute.disk_allocation_ratio
 
+    def copy(self):
+        """Returns a copy of the host state, which can be consumed without
+        consuming the host state itself.
+        """
+        host_copy = copy.copy(self)
+        # The PCI device pools are the only resources updated in place when
+        # a host state is consumed
+        host_copy.pci_stats = copy.deepcopy(self.pci_stats)
+        return host_copy
+
     def consume_from_request(self, spec_obj):
         """Incrementally update host state from a RequestSpec object."""
 
@@ -357,11 +373,17 @@ class HostManager(object):
         # Dict of set of aggregate IDs keyed by the name of the host belonging
         # to those aggregates
         self.host_aggregates_map = collections.defaultdict(set)
+        # Dict of the indexed metadata of the aggregates of a host, keyed by
+        # the name of the host and built on demand
+        self.host_aggregates_metadata = {}
         self._init_aggregates()
         self.track_instance_changes = (
                 CONF.filter_scheduler.track_instance_changes)
         # Dict of instances and status, keyed by host
         self._instance_info = {}
+        # Number of instance info messages received from the compute nodes,
+        # and of instance lists re-created from the database, keyed by kind
+        self.instance_info_stats = collections.Counter()
         if self.track_instance_changes:
             self._init_instance_info()
 
@@ -388,12 +410,14 @@ class HostManager(object):
         self.aggs_by_id[aggregate.id] = aggregate
         for host in aggregate.hosts:
             self.host_aggregates_map[host].add(aggregate.id)
+            self.host_aggregates_metadata.pop(host, None)
         # Refreshing the mapping dict to remove all hosts that are no longer
         # part of the aggregate
         for host in self.host_aggregates_map:
             if (aggregate.id in self.host_aggregates_map[host]
                     and host not in aggregate.hosts):
                 self.host_aggregates_map[host].remove(aggregate.id)
+                self.host_aggregates_metadata.pop(host, None)
 
     def delete_aggregate(self, aggregate):
         """Deletes internal HostManager information about a specific aggregate.
@@ -403,6 +427,7 @@ class HostManager(object):
         for host in self.host_aggregates_map:
             if aggregate.id in self.host_aggregates_map[host]:
                 self.host_aggregates_map[host].remove(aggregate.id)
+                self.host_aggregates_metadata.pop(host, None)
 
     def _init_instance_info(self, computes_by_cell=None):
         """Creates the initial view of instances for all hosts.
@@ -586,12 +611,12 @@ class HostManager(object):
             hosts = six.itervalues(name_to_cls_map)
 
         return self.filter_handler.get_filtered_objects(self.enabled_filters,
-                hosts, spec_obj, index)
+                hosts, spec_obj, index, trace=scheduler_stats.get_trace())
 
     def get_weighed_hosts(self, hosts, spec_obj):
         """Weigh the hosts."""
         return self.weight_handler.get_weighed_objects(self.weighers,
-                hosts, spec_obj)
+                hosts, spec_obj, trace=scheduler_stats.get_trace())
 
     def _get_computes_for_cells(self, context, cells, compute_uuids=None):
         """Get a tuple of compute node and service information.
@@ -606,27 +631,50 @@ class HostManager(object):
 
         Returns a tuple (compute_nodes, services) where:
          - compute_nodes is cell-uuid keyed dict of compute node lists
-         - services is a dict of services indexed by hostname
+         - services is a dict of services indexed by hostname. When
+           compute_uuids is not None, it only holds the services of the hosts
+           of the returned compute nodes.
         """
 
         compute_nodes = collections.defaultdict(list)
         services = {}
+        if compute_uuids is not None:
+            # Only look for the compute nodes which were not found yet
+            compute_uuids = set(compute_uuids)
         for cell in cells:
+            if compute_uuids is not None and not compute_uuids:
+                # NOTE: All the candidates were found in the previous cells,
+                # there is nothing to load from the remaining ones.
+                LOG.debug('Skipping cell %(cell)s with no candidate compute '
+                          'nodes left', {'cell': cell.identity})
+                continue
             LOG.debug('Getting compute nodes and services for cell %(cell)s',
                       {'cell': cell.identity})
             with context_module.target_cell(context, cell) as cctxt:
                 if compute_uuids is None:
                     compute_nodes[cell.uuid].extend(
                         objects.ComputeNodeList.get_all(cctxt))
+                    cell_services = objects.ServiceList.get_by_binary(
+                        cctxt, 'nova-compute', include_disabled=True)
                 else:
-                    compute_nodes[cell.uuid].extend(
-                        objects.ComputeNodeList.get_all_by_uuids(
-                            cctxt, compute_uuids))
+                    cell_nodes = objects.ComputeNodeList.get_all_by_uuids(
+                        cctxt, list(compute_uuids))
+                    if not cell_nodes:
+                        continue
+                    compute_nodes[cell.uuid].extend(cell_nodes)
+                    compute_uuids -= {node.uuid for node in cell_nodes}
+                    # Only load the services of the hosts of the candidates
+                    cell_services = (
+                        objects.ServiceList.get_by_hosts_and_binary(
+                            cctxt, {node.host for node in cell_nodes},
+                            'nova-compute', include_disabled=True))
                 services.update(
-                    {service.host: service
-                     for service in objects.ServiceList.get_by_binary(
-                             cctxt, 'nova-compute',
-                             include_disabled=True)})
+                    {service.host: service for service in cell_services})
+        LOG.debug('Loaded %(nodes)d compute nodes and %(services)d services '
+                  'from %(cells)d cells',
+                  {'nodes': sum(len(nodes)
+                                for nodes in compute_nodes.values()),
+                   'services': len(services), 'cells': len(compute_nodes)})
         return compute_nodes, services
 
     def _load_cells(self, context):
@@ -695,10 +743,12 @@ class HostManager(object):
                 # new request comes in, because some changes on the
                 # aggregates could have been happening after setting
                 # this field for the first time
+                aggregates_metadata = self._get_aggregates_metadata(host)
                 host_state.update(compute,
                                   dict(service),
-                                  self._get_aggregates_info(host),
+                                  aggregates_metadata.aggregates,
                                   self._get_instance_info(context, compute))
+                host_state.aggregates_metadata = aggregates_metadata
 
                 seen_nodes.add(state_key)
 
@@ -716,6 +766,17 @@ class HostManager(object):
         return [self.aggs_by_id[agg_id] for agg_id in
                 self.host_aggregates_map[host]]
 
+    def _get_aggregates_metadata(self, host):
+        """Returns the cached index of the metadata of the aggregates of a
+        host, building it if the aggregates of the host changed.
+        """
+        index = self.host_aggregates_metadata.get(host)
+        if index is None:
+            index = filters_utils.AggregateMetadata(
+                self._get_aggregates_info(host))
+            self.host_aggregates_metadata[host] = index
+        return index
+
     def _get_instances_by_host(self, context, host_name):
         try:
             hm = objects.HostMapping.get_by_host(context, host_name)
@@ -753,6 +814,7 @@ class HostManager(object):
         """Get the InstanceList for the specified host, and store it in the
         _instance_info dict.
         """
+        self.instance_info_stats['recreate'] += 1
         inst_dict = self._get_instances_by_host(context, host_name)
         host_info = self._instance_info[host_name] = {}
         host_info["instances"] = inst_dict
@@ -766,6 +828,7 @@ class HostManager(object):
         or when its instances have changed, and updates its view of hosts and
         instances with it.
         """
+        self.instance_info_stats['update'] += 1
         host_info = self._instance_info.get(host_name)
         if host_info:
             inst_dict = host_info.get("instances")
@@ -793,6 +856,7 @@ class HostManager(object):
 
         The instance in the local view of the host's instances is removed.
         """
+        self.instance_info_stats['delete'] += 1
         host_info = self._instance_info.get(host_name)
         if host_info:
             inst_dict = host_info["instances"]
@@ -805,19 +869,27 @@ class HostManager(object):
                          "Re-created its InstanceList."), host_name)
 
     @utils.synchronized(HOST_INSTANCE_SEMAPHORE)
-    def sync_instance_info(self, context, host_name, instance_uuids):
+    def sync_instance_info(self, context, host_name, instance_uuids=None,
+                           checksum=None):
         """Receives the uuids of the instances on a host.
 
         This method is periodically called by the compute nodes, which send a
-        list of all the UUID values for the instances on that node. This is
-        used by the scheduler's HostManager to detect when its view of the
-        compute node's instances is out of sync.
+        list of all the UUID values for the instances on that node, or only a
+        checksum of them. This is used by the scheduler's HostManager to
+        detect when its view of the compute node's instances is out of sync.
         """
+        self.instance_info_stats['sync'] += 1
+        LOG.debug("Instance info messages received: %s",
+                  dict(self.instance_info_stats))
         host_info = self._instance_info.get(host_name)
         if host_info:
-            local_set = set(host_info["instances"].keys())
-            compute_set = set(instance_uuids)
-            if not local_set == compute_set:
+            local_uuids = host_info["instances"].keys()
+            if checksum is not None:
+                in_sync = checksum == scheduler_utils.instance_uuids_checksum(
+                    local_uuids)
+            else:
+                in_sync = set(local_uuids) == set(instance_uuids)
+            if not in_sync:
                 self._recreate_instance_info(context, host_name)
                 LOG.info(_LI("The instance sync for host '%s' did not match. "
                              "Re-created its InstanceList."), host_name)
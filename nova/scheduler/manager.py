@@ -35,6 +35,7 @@ from nova import objects
 from nova.objects import host_mapping as host_mapping_obj
 from nova import quota
 from nova.scheduler import client as scheduler_client
+from nova.scheduler import stats as scheduler_stats
 from nova.scheduler import utils
 
 
@@ -64,7 +65,7 @@ def _host_state_obj_to_dict(host_state):
 class SchedulerManager(manager.Manager):
     """Chooses a host to run instances on."""
 
-    target = messaging.Target(version='4.4')
+    target = messaging.Target(version='4.5')
 
     _sentinel = object()
 
@@ -97,6 +98,13 @@ class SchedulerManager(manager.Manager):
     def _run_periodic_tasks(self, context):
         self.driver.run_periodic_tasks(context)
 
+    @periodic_task.periodic_task(
+        spacing=CONF.scheduler.trace_report_interval)
+    def _report_scheduling_stats(self, context):
+        stats = scheduler_stats.STATS.get_stats()
+        if stats['sampled_requests']:
+            LOG.info('Scheduling trace statistics: %s', stats)
+
     @messaging.expected_exceptions(exception.NoValidHost)
     def select_destinations(self, ctxt,
                             request_spec=None, filter_properties=None,
@@ -107,7 +115,17 @@ class SchedulerManager(manager.Manager):
         'limits' as keys.
         """
         LOG.debug("Starting to schedule for instances: %s", instance_uuids)
-
+        scheduler_stats.start_trace()
+        try:
+            with scheduler_stats.timed('select_destinations'):
+                return self._select_destinations(ctxt, request_spec,
+                                                 filter_properties, spec_obj,
+                                                 instance_uuids)
+        finally:
+            scheduler_stats.end_trace()
+
+    def _select_destinations(self, ctxt, request_spec, filter_properties,
+                             spec_obj, instance_uuids):
         # TODO(sbauza): Change the method signature to only accept a spec_obj
         # argument once API v5 is provided.
         if spec_obj is self._sentinel:
@@ -117,7 +135,9 @@ class SchedulerManager(manager.Manager):
         resources = utils.resources_from_request_spec(spec_obj)
         alloc_reqs_by_rp_uuid, provider_summaries = None, None
         if self.driver.USES_ALLOCATION_CANDIDATES:
-            res = self.placement_client.get_allocation_candidates(resources)
+            with scheduler_stats.timed('placement'):
+                res = self.placement_client.get_allocation_candidates(
+                    resources)
             if res is None:
                 # We have to handle the case that we failed to connect to the
                 # Placement service and the safe_connect decorator on
@@ -179,9 +199,11 @@ class SchedulerManager(manager.Manager):
         self.driver.host_manager.delete_instance_info(context, host_name,
                                                       instance_uuid)
 
-    def sync_instance_info(self, context, host_name, instance_uuids):
+    def sync_instance_info(self, context, host_name, instance_uuids=None,
+                           checksum=None):
         """Receives a sync request from a host, and passes it on to the
         driver's HostManager.
         """
         self.driver.host_manager.sync_instance_info(context, host_name,
-                                                    instance_uuids)
+                                                    instance_uuids,
+                                                    checksum=checksum)
@@ -22,6 +22,7 @@ import nova.conf
 from nova.objects import base as objects_base
 from nova import profiler
 from nova import rpc
+from nova.scheduler import utils as scheduler_utils
 
 CONF = nova.conf.CONF
 RPC_TOPIC = "scheduler"
@@ -97,6 +98,8 @@ class SchedulerAPI(object):
 
         * 4.4 - Modify select_destinations() signature by providing the
                 instance_uuids for the request.
+        * 4.5 - Modify sync_instance_info() to accept the checksum of the
+                instance uuids instead of the uuids
     '''
 
     VERSION_ALIASES = {
@@ -158,6 +161,13 @@ class SchedulerAPI(object):
                           instance_uuid=instance_uuid)
 
     def sync_instance_info(self, ctxt, host_name, instance_uuids):
-        cctxt = self.client.prepare(version='4.2', fanout=True)
-        return cctxt.cast(ctxt, 'sync_instance_info', host_name=host_name,
-                          instance_uuids=instance_uuids)
+        version = '4.5'
+        msg_args = {'host_name': host_name,
+                    'checksum': scheduler_utils.instance_uuids_checksum(
+                        instance_uuids)}
+        if not self.client.can_send_version(version):
+            msg_args = {'host_name': host_name,
+                        'instance_uuids': instance_uuids}
+            version = '4.2'
+        cctxt = self.client.prepare(version=version, fanout=True)
+        return cctxt.cast(ctxt, 'sync_instance_info', **msg_args)
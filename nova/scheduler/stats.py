@@ -0,0 +1,135 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Sampled timing statistics of the scheduling requests.
+
+A sampled request gets a trace, holding the time spent in each step of its
+scheduling, such as the placement query, the loading of the host states, each
+filter and weigher, and the resource claims. The traces of all the sampled
+requests are aggregated into histograms, which are logged periodically and
+can be dumped with the Guru Meditation Report.
+"""
+
+import collections
+import contextlib
+import random
+import threading
+
+from oslo_log import log as logging
+from oslo_reports.models import with_default_views as mwdv
+from oslo_utils import timeutils
+
+import nova.conf
+from nova import stats
+
+CONF = nova.conf.CONF
+LOG = logging.getLogger(__name__)
+
+# NOTE: threading is monkey patched by eventlet, so this holds the trace of
+# the request scheduled by the current greenthread.
+_LOCAL = threading.local()
+
+
+class Trace(object):
+    """The durations of the steps of the scheduling of one request."""
+
+    def __init__(self):
+        self.steps = []
+
+    def add(self, name, seconds, hosts_in=None, hosts_out=None):
+        """Records a step, with the number of hosts it got and kept if it
+        filtered hosts.
+        """
+        self.steps.append((name, seconds, hosts_in, hosts_out))
+
+    def __str__(self):
+        return ', '.join('%s: %.3fms' % (name, seconds * 1000)
+                         for name, seconds, _in, _out in self.steps)
+
+
+class SchedulingStats(object):
+    """Aggregates the traces of the sampled scheduling requests."""
+
+    def __init__(self):
+        self.sampled = 0
+        self.histograms = collections.defaultdict(stats.Histogram)
+        # Total number of hosts got and kept by the filters, keyed by step
+        self.hosts = collections.defaultdict(lambda: [0, 0])
+
+    def add_trace(self, trace):
+        self.sampled += 1
+        for name, seconds, hosts_in, hosts_out in trace.steps:
+            self.histograms[name].add(seconds)
+            if hosts_in is not None:
+                hosts = self.hosts[name]
+                hosts[0] += hosts_in
+                hosts[1] += hosts_out
+
+    def get_stats(self):
+        steps = {}
+        for name, histogram in self.histograms.items():
+            steps[name] = histogram.to_dict()
+            if name in self.hosts:
+                steps[name]['hosts_in'], steps[name]['hosts_out'] = (
+                    self.hosts[name])
+        return {'sampled_requests': self.sampled, 'steps': steps}
+
+    def report(self):
+        """Guru Meditation Report section generator for the stats."""
+        return mwdv.ModelWithDefaultViews(data=self.get_stats())
+
+
+STATS = SchedulingStats()
+
+
+def start_trace():
+    """Starts the trace of the request scheduled by the current greenthread,
+    if it is sampled.
+
+    :returns: the Trace of the request, or None if it is not sampled
+    """
+    rate = CONF.scheduler.trace_sample_rate
+    _LOCAL.trace = Trace() if rate and random.random() < rate else None
+    return _LOCAL.trace
+
+
+def get_trace():
+    """Returns the Trace of the request scheduled by the current greenthread,
+    or None if it is not sampled.
+    """
+    return getattr(_LOCAL, 'trace', None)
+
+
+def end_trace():
+    """Ends the trace of the request scheduled by the current greenthread, and
+    adds it to the stats.
+    """
+    trace = get_trace()
+    _LOCAL.trace = None
+    if trace is not None:
+        STATS.add_trace(trace)
+        LOG.debug("Scheduling trace: %s", trace)
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Records the duration of a step in the trace of the current request."""
+    trace = get_trace()
+    if trace is None:
+        yield
+        return
+    timer = timeutils.StopWatch().start()
+    try:
+        yield
+    finally:
+        trace.add(name, timer.elapsed())
@@ -16,6 +16,7 @@
 
 import collections
 import functools
+import hashlib
 import sys
 
 from oslo_log import log as logging
@@ -593,6 +594,17 @@ def setup_instance_group(context, request_spec):
         request_spec.instance_group.members = group_info.members
 
 
+def instance_uuids_checksum(instance_uuids):
+    """Returns a checksum of the uuids of the instances of a host.
+
+    The checksum does not depend on the order of the uuids, so that compute
+    nodes can send it to the schedulers instead of the list of the uuids of
+    all their instances.
+    """
+    data = ','.join(sorted(instance_uuids)).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
 def retry_on_timeout(retries=1):
     """Retry the call in case a MessagingTimeout is raised.
 
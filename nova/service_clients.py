@@ -0,0 +1,206 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Sessions, clients and discovery shared by the clients of the other services.
+
+The keystoneauth session of a service keeps a bounded pool of keep-alive
+connections per endpoint. The endpoints and the versions discovered from the
+services are remembered for [DEFAULT]service_discovery_cache_ttl seconds, and
+the client objects of a request context are reused by its later calls. The
+statistics of the pools, the discoveries and the clients can be dumped with
+the Guru Meditation Report.
+
+The placement client is not concerned: the scheduler report client keeps a
+single adapter, and thus a single session and connection pool, for the life
+of the process, and does no discovery.
+"""
+
+import collections
+import weakref
+
+from keystoneauth1 import loading as ks_loading
+from keystoneauth1 import session as ks_session
+from oslo_reports.models import with_default_views as mwdv
+from oslo_utils import timeutils
+import requests
+
+import nova.conf
+
+CONF = nova.conf.CONF
+
+# The sessions loaded by load_session(), keyed by conf group
+_SESSIONS = {}
+
+
+def _new_stats():
+    return {'discovery_hits': 0, 'discovery_misses': 0,
+            'clients_created': 0, 'clients_reused': 0}
+
+
+# The statistics of the discoveries and the clients, keyed by service type
+_STATS = collections.defaultdict(_new_stats)
+
+
+class DiscoveryCache(object):
+    """Remembers the results of the discoveries of the services, such as
+    their endpoints or maximum microversions, for
+    [DEFAULT]service_discovery_cache_ttl seconds.
+    """
+
+    def __init__(self):
+        # (time of the discovery, result), keyed by (service, key)
+        self._entries = {}
+
+    def get(self, service, key, func):
+        """Returns the result of the supplied discovery of a service, calling
+        it unless it was called for the same key less than
+        [DEFAULT]service_discovery_cache_ttl seconds ago.
+
+        The exceptions raised by the discovery are not remembered.
+
+        :param service: The service type, such as 'volume'
+        :param key: Hashable identifying the discovery within the service,
+                    such as its region and interface
+        :param func: Callable doing the discovery
+        """
+        ttl = CONF.service_discovery_cache_ttl
+        now = timeutils.utcnow_ts(microsecond=True)
+        entry = self._entries.get((service, key))
+        if ttl and entry is not None and now - entry[0] < ttl:
+            _STATS[service]['discovery_hits'] += 1
+            return entry[1]
+
+        _STATS[service]['discovery_misses'] += 1
+        result = func()
+        if ttl:
+            # Forget the expired discoveries, which are otherwise only
+            # replaced when the same key is discovered again
+            for old_key, (discovered_at, _result) in list(
+                    self._entries.items()):
+                if now - discovered_at >= ttl:
+                    del self._entries[old_key]
+            self._entries[(service, key)] = (now, result)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+
+_DISCOVERY_CACHE = DiscoveryCache()
+
+# The clients created for each request context, keyed by (service, key). The
+# clients go away with their context.
+_CLIENTS = weakref.WeakKeyDictionary()
+
+
+def discover(service, key, func):
+    """Returns the result of a discovery of a service, remembered for
+    [DEFAULT]service_discovery_cache_ttl seconds.
+
+    See DiscoveryCache.get().
+    """
+    return _DISCOVERY_CACHE.get(service, key, func)
+
+
+def get_client(context, service, key, create):
+    """Returns the client of a service for a request context, created by the
+    supplied callable on the first call for the context and key.
+
+    The clients get the token and the global request ID of the context when
+    they are created, so they are only reused for the same context.
+
+    :param context: The nova request context the client is created for
+    :param service: The service type, such as 'volume'
+    :param key: Hashable identifying the client within the service, such as
+                its endpoint and version
+    :param create: Callable creating the client
+    """
+    stats = _STATS[service]
+    if context is None:
+        stats['clients_created'] += 1
+        return create()
+
+    clients = _CLIENTS.setdefault(context, {})
+    try:
+        client = clients[(service, key)]
+    except KeyError:
+        client = clients[(service, key)] = create()
+        stats['clients_created'] += 1
+    else:
+        stats['clients_reused'] += 1
+    return client
+
+
+def load_session(group):
+    """Loads the keystoneauth session of a conf group, whose connections to
+    each endpoint are kept alive and pooled, keeping at most
+    [DEFAULT]service_connection_pool_size idle ones.
+    """
+    http = requests.Session()
+    adapter = ks_session.TCPKeepAliveAdapter(
+        pool_maxsize=CONF.service_connection_pool_size)
+    for scheme in list(http.adapters):
+        http.mount(scheme, adapter)
+    session = ks_loading.load_session_from_conf_options(CONF, group,
+                                                        session=http)
+    _SESSIONS[group] = session
+    return session
+
+
+def _get_pool_stats(session):
+    """Returns the statistics of the connection pools of a session."""
+    stats = {'pools': 0, 'connections_opened': 0, 'requests': 0,
+             'idle_connections': 0}
+    http = getattr(session, 'session', None)
+    if not isinstance(http, requests.Session):
+        return stats
+    for adapter in set(http.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            stats['pools'] += 1
+            stats['connections_opened'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+            # NOTE: the pool is a queue filled with None until connections
+            # are put back into it
+            if pool.pool is not None:
+                stats['idle_connections'] += sum(
+                    1 for conn in list(pool.pool.queue) if conn is not None)
+    return stats
+
+
+def get_stats():
+    """Returns the statistics of the discoveries and the clients, keyed by
+    service type, and of the connection pools, keyed by conf group.
+    """
+    return {'services': {service: dict(stats)
+                         for service, stats in _STATS.items()},
+            'sessions': {group: _get_pool_stats(session)
+                         for group, session in _SESSIONS.items()}}
+
+
+def report():
+    """Guru Meditation Report section generator for the stats."""
+    return mwdv.ModelWithDefaultViews(data=get_stats())
+
+
+def reset():
+    """Forgets the sessions, the discoveries and the clients, for the
+    tests.
+    """
+    _SESSIONS.clear()
+    _STATS.clear()
+    _DISCOVERY_CACHE.clear()
+    _CLIENTS.clear()
@@ -0,0 +1,46 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Timing statistics shared by the services."""
+
+import collections
+
+
+class Histogram(object):
+    """Count, total, maximum and distribution of durations.
+
+    The durations are counted in buckets whose upper bounds are powers of two
+    milliseconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = collections.Counter()
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bound = 1
+        while bound < seconds * 1000:
+            bound *= 2
+        self.buckets[bound] += 1
+
+    def to_dict(self):
+        return {'count': self.count,
+                'total_ms': round(self.total * 1000, 3),
+                'avg_ms': round(self.total * 1000 / self.count, 3),
+                'max_ms': round(self.max * 1000, 3),
+                'buckets': {'<=%dms' % bound: count
+                            for bound, count in self.buckets.items()}}
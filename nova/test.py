@@ -49,6 +49,7 @@ from oslotest import moxstubout
 import six
 import testtools
 
+from nova.api.metadata import base as metadata_base
 from nova import context
 from nova import db
 from nova import exception
@@ -56,6 +57,7 @@ from nova.network import manager as network_manager
 from nova.network.security_group import openstack_driver
 from nova import objects
 from nova.objects import base as objects_base
+from nova import service_clients
 from nova.tests import fixtures as nova_fixtures
 from nova.tests.unit import conf_fixture
 from nova.tests.unit import policy_fixture
@@ -307,8 +309,16 @@ class TestCase(testtools.TestCase):
         # caching of that value.
         utils._IS_NEUTRON = None
 
-        # Reset the traits sync flag
+        # Reset the traits sync flag and the resource class and trait caches
         objects.resource_provider._TRAITS_SYNCED = False
+        objects.resource_provider._RC_CACHE = None
+        objects.resource_provider._TRAIT_CACHE = None
+        # Reset the capacity index of the placement service
+        objects.resource_provider._CAPACITY_INDEX.clear()
+        # Reset the network sections of the instance metadata
+        metadata_base._NETWORK_CACHE.clear()
+        # Reset the sessions, discoveries and clients of the other services
+        service_clients.reset()
         # Reset the global QEMU version flag.
         images.QEMU_VERSION = None
 
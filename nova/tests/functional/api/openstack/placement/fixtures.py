@@ -87,10 +87,11 @@ class APIFixture(fixture.GabbiFixture):
 
         # Since we clean up the DB, we need to reset the traits sync
         # flag to make sure the next run will recreate the traits and
-        # reset the _RC_CACHE so that any cached resource classes
-        # are flushed.
+        # reset the _RC_CACHE and _TRAIT_CACHE so that any cached resource
+        # classes and traits are flushed.
         objects.resource_provider._TRAITS_SYNCED = False
         objects.resource_provider._RC_CACHE = None
+        objects.resource_provider._TRAIT_CACHE = None
 
         self.output_stream_fixture.cleanUp()
         self.standard_logging_fixture.cleanUp()
@@ -12,6 +12,7 @@
 
 import mock
 
+from nova.db.sqlalchemy import lookup_cache
 from nova.db.sqlalchemy import resource_class_cache as rc_cache
 from nova import exception
 from nova.objects import fields
@@ -97,3 +98,104 @@ class TestResourceClassCache(test.TestCase):
                           cache.string_from_id, 99999999)
         self.assertRaises(exception.ResourceClassNotFound,
                           cache.id_from_string, 'UNKNOWN')
+
+    def test_rc_cache_batch(self):
+        """Test that the custom resource classes missing from the cache are
+        looked up at once, along with the standard resource classes.
+        """
+        cache = rc_cache.ResourceClassCache(self.context)
+        with self.context.session.connection() as conn:
+            conn.execute(rc_cache._RC_TBL.insert(), [
+                {'id': 1001, 'name': 'IRON_NFV'},
+                {'id': 1002, 'name': 'IRON_GOLD'}])
+
+        self.assertEqual({'VCPU': 0, 'IRON_NFV': 1001, 'IRON_GOLD': 1002},
+                         cache.ids_from_strings(
+                             ['VCPU', 'IRON_NFV', 'IRON_GOLD']))
+        # The cache is loaded before the first lookup
+        self.assertEqual(1, cache.loads)
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(0, cache.misses)
+        self.assertRaises(exception.ResourceClassNotFound,
+                          cache.ids_from_strings, ['IRON_NFV', 'UNKNOWN'])
+        self.assertEqual(1, cache.loads)
+        self.assertEqual(3, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_rc_cache_miss_not_reloaded(self):
+        """Test that a miss reloads the cache only if the table changed since
+        it was loaded.
+        """
+        cache = rc_cache.ResourceClassCache(self.context)
+        self.assertRaises(exception.ResourceClassNotFound,
+                          cache.id_from_string, 'IRON_NFV')
+        self.assertEqual(1, cache.loads)
+
+        with mock.patch.object(rc_cache.lookup_cache, '_get_all') as get_mock:
+            self.assertRaises(exception.ResourceClassNotFound,
+                              cache.id_from_string, 'IRON_NFV')
+            self.assertFalse(get_mock.called)
+
+    def test_rc_cache_checked(self):
+        """Test that the resource classes renamed or deleted by another
+        process are seen once the check interval expired.
+        """
+        cache = rc_cache.ResourceClassCache(self.context)
+        with self.context.session.connection() as conn:
+            conn.execute(rc_cache._RC_TBL.insert().values(
+                id=1001, name='IRON_NFV'))
+        self.assertEqual(1001, cache.id_from_string('IRON_NFV'))
+
+        with self.context.session.connection() as conn:
+            conn.execute(rc_cache._RC_TBL.update().where(
+                rc_cache._RC_TBL.c.id == 1001).values(name='IRON_GOLD'))
+        # Still within the check interval, so the cache is not checked
+        self.assertEqual(1001, cache.id_from_string('IRON_NFV'))
+        self.assertEqual('IRON_NFV', cache.string_from_id(1001))
+
+        self.flags(lookup_cache_check_interval=0, group='placement')
+        self.assertEqual('IRON_GOLD', cache.string_from_id(1001))
+        self.assertRaises(exception.ResourceClassNotFound,
+                          cache.id_from_string, 'IRON_NFV')
+
+        with self.context.session.connection() as conn:
+            conn.execute(rc_cache._RC_TBL.delete())
+        self.assertRaises(exception.ResourceClassNotFound,
+                          cache.string_from_id, 1001)
+
+
+class TestTraitCache(test.TestCase):
+
+    def setUp(self):
+        super(TestTraitCache, self).setUp()
+        self.db = self.useFixture(fixtures.Database(database='api'))
+        self.context = mock.Mock()
+        sess_mock = mock.Mock()
+        sess_mock.connection.side_effect = self.db.get_engine().connect
+        self.context.session = sess_mock
+
+    def test_trait_cache(self):
+        cache = lookup_cache.TraitCache(self.context)
+        self.assertRaises(exception.TraitNotFound,
+                          cache.ids_from_names, ['CUSTOM_GOLD'])
+
+        with self.context.session.connection() as conn:
+            conn.execute(lookup_cache._TRAIT_TBL.insert(), [
+                {'id': 1, 'name': 'CUSTOM_GOLD'},
+                {'id': 2, 'name': 'CUSTOM_SILVER'}])
+        self.assertEqual({'CUSTOM_GOLD': 1, 'CUSTOM_SILVER': 2},
+                         cache.ids_from_names(['CUSTOM_GOLD',
+                                               'CUSTOM_SILVER']))
+
+        # Try same again and verify we don't hit the DB.
+        with mock.patch('sqlalchemy.select') as sel_mock:
+            self.assertEqual({'CUSTOM_GOLD': 1},
+                             cache.ids_from_names(['CUSTOM_GOLD']))
+            self.assertFalse(sel_mock.called)
+
+        cache.clear()
+        with self.context.session.connection() as conn:
+            conn.execute(lookup_cache._TRAIT_TBL.delete().where(
+                lookup_cache._TRAIT_TBL.c.id == 2))
+        self.assertRaises(exception.TraitNotFound,
+                          cache.ids_from_names, ['CUSTOM_SILVER'])
@@ -14,10 +14,12 @@
 import mock
 import os_traits
 from oslo_db import exception as db_exc
+from oslo_utils import fixture as utils_fixture
 import sqlalchemy as sa
 
 import nova
 from nova import context
+from nova.db.sqlalchemy import capacity_index
 from nova import exception
 from nova.objects import fields
 from nova.objects import resource_provider as rp_obj
@@ -1050,6 +1052,38 @@ class TestAllocationListCreateDelete(ResourceProviderBaseCase):
         # If we are joining wrong, this will be a KeyError
         allocation_list.create_all()
 
+    def test_allocation_list_create_several_consumers(self):
+        rp = rp_obj.ResourceProvider(
+            self.ctx, name=uuidsentinel.rp_name, uuid=uuidsentinel.rp_uuid)
+        rp.create()
+        inv = rp_obj.Inventory(resource_provider=rp,
+                               resource_class=fields.ResourceClass.DISK_GB,
+                               total=100, max_unit=60)
+        inv.obj_set_defaults()
+        rp.set_inventory(rp_obj.InventoryList(objects=[inv]))
+
+        def _allocations(used1, used2):
+            return rp_obj.AllocationList(self.ctx, objects=[
+                rp_obj.Allocation(resource_provider=rp,
+                                  consumer_id=consumer_id,
+                                  resource_class=fields.ResourceClass.DISK_GB,
+                                  used=used)
+                for consumer_id, used in ((uuidsentinel.consumer1, used1),
+                                          (uuidsentinel.consumer2, used2))])
+
+        # Each allocation fits, but not both of them
+        self.assertRaises(exception.InvalidAllocationCapacityExceeded,
+                          _allocations(50, 60).create_all)
+        self.assertEqual(0, len(rp_obj.AllocationList.
+                                get_all_by_resource_provider(self.ctx, rp)))
+
+        _allocations(50, 40).create_all()
+        self.assertEqual(2, len(rp_obj.AllocationList.
+                                get_all_by_resource_provider(self.ctx, rp)))
+        # The generation of the provider is only incremented once
+        rp = rp_obj.ResourceProvider.get_by_uuid(self.ctx, rp.uuid)
+        self.assertEqual(2, rp.generation)
+
     def test_allocation_list_create(self):
         max_unit = 10
         consumer_uuid = uuidsentinel.consumer
@@ -3208,3 +3242,268 @@ class AllocationCandidatesTestCase(ResourceProviderBaseCase):
         self.assertEqual(sorted(expected_ar),
                          sorted([set([cn1.uuid, ss.uuid]),
                                  set([cn2.uuid, ss.uuid]), set([cn3.uuid])]))
+
+    def test_traits(self):
+        """Verify that only the providers having all the required traits and
+        none of the forbidden ones are returned, with their traits in the
+        provider summaries.
+        """
+        traits = {
+            uuidsentinel.cn1: ['HW_CPU_X86_AVX', 'HW_CPU_X86_SSE'],
+            uuidsentinel.cn2: ['HW_CPU_X86_AVX'],
+            uuidsentinel.cn3: [],
+        }
+        for cn_uuid, cn_traits in traits.items():
+            cn = rp_obj.ResourceProvider(self.ctx, name=cn_uuid, uuid=cn_uuid)
+            cn.create()
+            cn.set_inventory(rp_obj.InventoryList(objects=[
+                rp_obj.Inventory(resource_provider=cn, resource_class=rc,
+                                 total=2048, reserved=0, min_unit=1,
+                                 max_unit=2048, step_size=1,
+                                 allocation_ratio=1.0)
+                for rc in self._requested_resources()]))
+            cn.set_traits(rp_obj.TraitList.get_all(
+                self.ctx, filters={'name_in': cn_traits}))
+
+        def _get_candidates(required=(), forbidden=()):
+            p_alts = rp_obj.AllocationCandidates.get_by_filters(
+                self.ctx,
+                filters={
+                    'resources': self._requested_resources(),
+                    'required_traits': set(required),
+                    'forbidden_traits': set(forbidden),
+                },
+            )
+            self.assertEqual(len(p_alts.provider_summaries),
+                             len(p_alts.allocation_requests))
+            return {ps.resource_provider.uuid:
+                    sorted(t.name for t in ps.traits)
+                    for ps in p_alts.provider_summaries}
+
+        self.assertEqual(traits, _get_candidates())
+        self.assertEqual(
+            {uuidsentinel.cn1: traits[uuidsentinel.cn1],
+             uuidsentinel.cn2: traits[uuidsentinel.cn2]},
+            _get_candidates(required=['HW_CPU_X86_AVX']))
+        self.assertEqual(
+            {uuidsentinel.cn1: traits[uuidsentinel.cn1]},
+            _get_candidates(required=['HW_CPU_X86_AVX', 'HW_CPU_X86_SSE']))
+        self.assertEqual(
+            {uuidsentinel.cn2: traits[uuidsentinel.cn2],
+             uuidsentinel.cn3: traits[uuidsentinel.cn3]},
+            _get_candidates(forbidden=['HW_CPU_X86_SSE']))
+        self.assertEqual(
+            {uuidsentinel.cn2: traits[uuidsentinel.cn2]},
+            _get_candidates(required=['HW_CPU_X86_AVX'],
+                            forbidden=['HW_CPU_X86_SSE']))
+        self.assertEqual(
+            {}, _get_candidates(required=['HW_CPU_X86_AVX2']))
+        self.assertRaises(exception.TraitNotFound, _get_candidates,
+                          required=['CUSTOM_UNKNOWN'])
+
+    @mock.patch.object(rp_obj, '_get_traits_by_provider_ids')
+    def test_traits_not_included(self, mock_get_traits):
+        """Verify that the traits of the providers are not queried when they
+        are not wanted, as for microversions older than 1.13.
+        """
+        cn = rp_obj.ResourceProvider(self.ctx, name=uuidsentinel.cn1,
+                                     uuid=uuidsentinel.cn1)
+        cn.create()
+        cn.set_inventory(rp_obj.InventoryList(objects=[
+            rp_obj.Inventory(resource_provider=cn, resource_class=rc,
+                             total=2048, reserved=0, min_unit=1,
+                             max_unit=2048, step_size=1,
+                             allocation_ratio=1.0)
+            for rc in self._requested_resources()]))
+
+        p_alts = rp_obj.AllocationCandidates.get_by_filters(
+            self.ctx, filters={'resources': self._requested_resources()},
+            include_traits=False)
+
+        self.assertEqual([uuidsentinel.cn1],
+                         [ps.resource_provider.uuid
+                          for ps in p_alts.provider_summaries])
+        self.assertEqual([], p_alts.provider_summaries[0].traits)
+        mock_get_traits.assert_not_called()
+
+
+class AllocationCandidatesCapacityIndexTestCase(AllocationCandidatesTestCase):
+    """Runs the allocation candidates scenarios with the capacity index
+    enabled. The scenarios with shared resources are answered from the
+    database.
+    """
+
+    def setUp(self):
+        super(AllocationCandidatesCapacityIndexTestCase, self).setUp()
+        self.flags(capacity_index=True, group='placement')
+
+
+class CapacityIndexTestCase(ResourceProviderBaseCase):
+
+    def setUp(self):
+        super(CapacityIndexTestCase, self).setUp()
+        self.flags(capacity_index=True, group='placement')
+        self.time_fixture = self.useFixture(utils_fixture.TimeFixture())
+        self.cn1 = self._create_provider(uuidsentinel.cn1)
+        self.cn2 = self._create_provider(uuidsentinel.cn2)
+        patcher = mock.patch.object(rp_obj, '_get_all_with_shared',
+                                    side_effect=rp_obj._get_all_with_shared)
+        self.get_all_with_shared = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_provider(self, rp_uuid):
+        rp = rp_obj.ResourceProvider(self.ctx, name=rp_uuid, uuid=rp_uuid)
+        rp.create()
+        rp.set_inventory(rp_obj.InventoryList(objects=[
+            rp_obj.Inventory(resource_provider=rp,
+                             resource_class=fields.ResourceClass.VCPU,
+                             total=8, reserved=0, min_unit=1, max_unit=8,
+                             step_size=1, allocation_ratio=1.0)]))
+        return rp
+
+    def _allocate(self, rp, consumer_id, used):
+        rp_obj.AllocationList(self.ctx, objects=[
+            rp_obj.Allocation(self.ctx, resource_provider=rp,
+                              resource_class=fields.ResourceClass.VCPU,
+                              consumer_id=consumer_id, used=used,
+                              project_id=self.ctx.project_id,
+                              user_id=self.ctx.user_id)]).create_all()
+
+    def _get_candidates(self, vcpus):
+        p_alts = rp_obj.AllocationCandidates.get_by_filters(
+            self.ctx, filters={'resources': {'VCPU': vcpus}})
+        return {ps.resource_provider.uuid: ps.resources[0].used
+                for ps in p_alts.provider_summaries}
+
+    def test_refreshed_by_writes(self):
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                         self._get_candidates(4))
+        self._allocate(self.cn1, uuidsentinel.consumer1, 6)
+        self.assertEqual({self.cn2.uuid: 0}, self._get_candidates(4))
+        self.assertEqual({self.cn1.uuid: 6, self.cn2.uuid: 0},
+                         self._get_candidates(2))
+
+        # Moving the allocations of the consumer frees the first provider
+        self._allocate(self.cn2, uuidsentinel.consumer1, 6)
+        self.assertEqual({self.cn1.uuid: 0}, self._get_candidates(4))
+
+        rp_obj.AllocationList.get_all_by_consumer_id(
+            self.ctx, uuidsentinel.consumer1).delete_all()
+        cn3 = self._create_provider(uuidsentinel.cn3)
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0, cn3.uuid: 0},
+                         self._get_candidates(4))
+
+        cn3.set_inventory(rp_obj.InventoryList(objects=[]))
+        cn3.destroy()
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                         self._get_candidates(4))
+        self.get_all_with_shared.assert_not_called()
+
+    def test_stale(self):
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                         self._get_candidates(4))
+        # Simulate another process allocating from a provider
+        engine = self.api_db.get_engine()
+        engine.execute(rp_obj._ALLOC_TBL.insert().values(
+            resource_provider_id=self.cn1.id,
+            resource_class_id=fields.ResourceClass.STANDARD.index(
+                fields.ResourceClass.VCPU),
+            consumer_id=uuidsentinel.consumer1, used=6))
+        engine.execute(rp_obj._RP_TBL.update().where(
+            rp_obj._RP_TBL.c.id == self.cn1.id).values(generation=42))
+
+        with mock.patch.object(capacity_index, '_get_providers',
+                               side_effect=capacity_index._get_providers
+                               ) as mock_get_providers:
+            self.assertEqual({self.cn2.uuid: 0}, self._get_candidates(4))
+        # Only the stale provider is refreshed
+        mock_get_providers.assert_called_once_with(mock.ANY, [self.cn1.id])
+        self.assertEqual(42, rp_obj._CAPACITY_INDEX.providers[self.cn1.id][1])
+        self.assertEqual({self.cn1.uuid: 6, self.cn2.uuid: 0},
+                         self._get_candidates(2))
+        self.get_all_with_shared.assert_not_called()
+
+    def test_stale_allocations_deleted(self):
+        self._allocate(self.cn1, uuidsentinel.consumer1, 6)
+        self.assertEqual({self.cn2.uuid: 0}, self._get_candidates(4))
+        # Simulate another process deleting the allocations of a consumer,
+        # which does not increment the generation of the provider
+        self.api_db.get_engine().execute(rp_obj._ALLOC_TBL.delete().where(
+            rp_obj._ALLOC_TBL.c.consumer_id == uuidsentinel.consumer1))
+
+        # The freed provider is found once the index is reloaded
+        self.assertEqual({self.cn2.uuid: 0}, self._get_candidates(4))
+        self.time_fixture.advance_time_seconds(11)
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                         self._get_candidates(4))
+        self.get_all_with_shared.assert_not_called()
+
+    def test_stale_provider_deleted(self):
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                         self._get_candidates(4))
+        # Simulate another process deleting a provider
+        engine = self.api_db.get_engine()
+        engine.execute(rp_obj._INV_TBL.delete().where(
+            rp_obj._INV_TBL.c.resource_provider_id == self.cn2.id))
+        engine.execute(rp_obj._RP_TBL.delete().where(
+            rp_obj._RP_TBL.c.id == self.cn2.id))
+
+        self.assertEqual({self.cn1.uuid: 0}, self._get_candidates(4))
+        self.assertNotIn(self.cn2.id, rp_obj._CAPACITY_INDEX.providers)
+        self.get_all_with_shared.assert_not_called()
+
+    def test_generations_of_candidates_checked(self):
+        self._allocate(self.cn1, uuidsentinel.consumer1, 6)
+        with mock.patch.object(capacity_index, '_get_generations',
+                               side_effect=capacity_index._get_generations
+                               ) as mock_get_generations:
+            self.assertEqual({self.cn2.uuid: 0}, self._get_candidates(4))
+        mock_get_generations.assert_called_once_with(mock.ANY, [self.cn2.id])
+
+    def test_reload_does_not_block_requests(self):
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                         self._get_candidates(4))
+        self.time_fixture.advance_time_seconds(11)
+        get_providers = capacity_index._get_providers
+        during_reload = []
+
+        def _get_providers(ctx, rp_ids=None):
+            if rp_ids is None:
+                # Another request is answered from the current index while
+                # the index is being reloaded
+                during_reload.append(self._get_candidates(4))
+            return get_providers(ctx, rp_ids)
+
+        with mock.patch.object(capacity_index, '_get_providers',
+                               side_effect=_get_providers):
+            self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                             self._get_candidates(4))
+        self.assertEqual([{self.cn1.uuid: 0, self.cn2.uuid: 0}],
+                         during_reload)
+        self.get_all_with_shared.assert_not_called()
+
+    def test_sharing_provider(self):
+        self.cn2.set_traits(rp_obj.TraitList.get_all(
+            self.ctx, filters={'name_in': ['MISC_SHARES_VIA_AGGREGATE']}))
+
+        self.assertEqual({self.cn1.uuid: 0, self.cn2.uuid: 0},
+                         self._get_candidates(4))
+        self.assertEqual(1, self.get_all_with_shared.call_count)
+        self.assertEqual(set([self.cn2.id]), rp_obj._CAPACITY_INDEX.sharing)
+
+    def test_traits_refreshed_by_writes(self):
+        def _get_candidates(required):
+            p_alts = rp_obj.AllocationCandidates.get_by_filters(
+                self.ctx, filters={'resources': {'VCPU': 1},
+                                   'required_traits': set(required)})
+            return set(ps.resource_provider.uuid
+                       for ps in p_alts.provider_summaries)
+
+        self.assertEqual(set(), _get_candidates(['HW_CPU_X86_AVX']))
+        self.cn2.set_traits(rp_obj.TraitList.get_all(
+            self.ctx, filters={'name_in': ['HW_CPU_X86_AVX']}))
+        self.assertEqual(set([self.cn2.uuid]),
+                         _get_candidates(['HW_CPU_X86_AVX']))
+        self.cn2.set_traits(rp_obj.TraitList(objects=[]))
+        self.assertEqual(set(), _get_candidates(['HW_CPU_X86_AVX']))
+        self.get_all_with_shared.assert_not_called()
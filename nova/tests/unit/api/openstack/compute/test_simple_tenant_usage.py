@@ -15,6 +15,7 @@
 
 import datetime
 
+import iso8601
 import mock
 from oslo_policy import policy as oslo_policy
 from oslo_utils import timeutils
@@ -450,6 +451,106 @@ class SimpleTenantUsageLimitsTestV240(SimpleTenantUsageLimitsTestV21):
             webob.exc.HTTPBadRequest, self.controller.index, req)
 
 
+class SimpleTenantUsageRollupsTestV21(test.TestCase):
+    controller = simple_tenant_usage_v21.SimpleTenantUsageController()
+
+    def setUp(self):
+        super(SimpleTenantUsageRollupsTestV21, self).setUp()
+        self.flags(use_usage_rollups=True, group='api')
+        self.context = context.RequestContext('fakeadmin_0', 'faketenant_0',
+                                              is_admin=True)
+        self.num_cells = len(objects.CellMappingList.get_all(self.context))
+        self.start = datetime.datetime(2017, 1, 1, 12, tzinfo=iso8601.UTC)
+        self.stop = datetime.datetime(2017, 1, 4, 6, tzinfo=iso8601.UTC)
+        self.day2 = datetime.datetime(2017, 1, 2, tzinfo=iso8601.UTC)
+        self.day3 = datetime.datetime(2017, 1, 3, tzinfo=iso8601.UTC)
+
+    def test_unrolled_periods(self):
+        periods = self.controller._unrolled_periods(self.start, self.stop,
+                                                    set([self.day2]))
+        self.assertEqual([(self.start, self.day2), (self.day3, self.stop)],
+                         periods)
+        periods = self.controller._unrolled_periods(
+            self.start, self.stop, set([self.day2, self.day3]))
+        self.assertEqual([(self.start, self.day2),
+                          (self.day3 + datetime.timedelta(days=1),
+                           self.stop)], periods)
+        periods = self.controller._unrolled_periods(
+            self.day2, self.day3, set([self.day2]))
+        self.assertEqual([], periods)
+
+    def _index(self, detailed='', version='2.1', params=''):
+        req = fakes.HTTPRequest.blank(
+            '?start=%s&end=%s&detailed=%s%s' % (
+                self.start.strftime('%Y-%m-%dT%H:%M:%S'),
+                self.stop.strftime('%Y-%m-%dT%H:%M:%S'), detailed, params),
+            version=version)
+        req.environ['nova.context'] = self.context
+        return self.controller.index(req)
+
+    @mock.patch('nova.objects.InstanceList.get_active_by_window_joined')
+    @mock.patch('nova.objects.InstanceUsageRollupList.get_by_window')
+    def test_index(self, mock_get_rollups, mock_get_active):
+        mock_get_rollups.return_value = [
+            objects.InstanceUsageRollup(
+                period_start=self.day2, project_id=None, flavorid=None,
+                instances=1, hours=24, vcpus_hours=48,
+                memory_mb_hours=24 * 1024, local_gb_hours=24 * 30),
+            objects.InstanceUsageRollup(
+                period_start=self.day2, project_id='faketenant_0',
+                flavorid='foo', instances=1, hours=24, vcpus_hours=48,
+                memory_mb_hours=24 * 1024, local_gb_hours=24 * 30)]
+        mock_get_active.return_value = objects.InstanceList(objects=[
+            _fake_instance(self.start - datetime.timedelta(days=1), None, 1,
+                           'faketenant_0')])
+
+        res_dict = self._index()
+
+        mock_get_rollups.assert_called_with(
+            mock.ANY, self.start + datetime.timedelta(hours=12),
+            self.stop - datetime.timedelta(hours=6))
+        self.assertEqual(self.num_cells, mock_get_rollups.call_count)
+        mock_get_active.assert_has_calls([
+            mock.call(mock.ANY, self.start, self.day2,
+                      expected_attrs=['flavor']),
+            mock.call(mock.ANY, self.day3, self.stop,
+                      expected_attrs=['flavor'])])
+        self.assertNotIn('tenant_usages_links', res_dict)
+        usages = res_dict['tenant_usages']
+        self.assertEqual(1, len(usages))
+        # 12 hours on the first day, 24 from the rollup and 30 hours after
+        hours = (12 + 24 + 30) * self.num_cells
+        self.assertEqual({'tenant_id': 'faketenant_0',
+                          'total_hours': hours,
+                          'total_vcpus_usage': VCPUS * hours,
+                          'total_memory_mb_usage': MEMORY_MB * hours,
+                          'total_local_gb_usage':
+                              (ROOT_GB + EPHEMERAL_GB) * hours,
+                          'start': timeutils.normalize_time(self.start),
+                          'stop': timeutils.normalize_time(self.stop)},
+                         usages[0])
+
+    @mock.patch('nova.objects.InstanceList.get_active_by_window_joined',
+                fake_get_active_by_window_joined)
+    @mock.patch('nova.objects.InstanceUsageRollupList.get_by_window')
+    def test_index_detailed(self, mock_get_rollups):
+        res_dict = self._index(detailed='1')
+        self.assertFalse(mock_get_rollups.called)
+        self.assertTrue(res_dict['tenant_usages'][0]['server_usages'])
+
+    @mock.patch('nova.objects.InstanceList.get_active_by_window_joined')
+    @mock.patch('nova.objects.InstanceUsageRollupList.get_by_window')
+    def test_index_v240(self, mock_get_rollups, mock_get_active):
+        # The responses of 2.40 are paginated by instance, which the rollups
+        # cannot do
+        mock_get_active.return_value = objects.InstanceList(objects=[])
+        self._index(version='2.40', params='&limit=3&marker=some-marker')
+        self.assertFalse(mock_get_rollups.called)
+        mock_get_active.assert_any_call(
+            mock.ANY, self.start, self.stop, None, expected_attrs=['flavor'],
+            limit=3, marker='some-marker')
+
+
 class SimpleTenantUsageControllerTestV21(test.TestCase):
     controller = simple_tenant_usage_v21.SimpleTenantUsageController()
 
@@ -10665,6 +10665,8 @@ class ComputeAPITestCase(BaseTestCase):
             instance.host = kwargs['host'] or 'fake_dest_host'
             instance.save()
 
+        @mock.patch.object(self.compute_api.consoleauth_rpcapi,
+                           'delete_tokens_for_instance')
         @mock.patch.object(objects.Service, 'get_by_compute_host')
         @mock.patch.object(self.compute_api.compute_task_api,
                            'rebuild_instance')
@@ -10673,7 +10675,7 @@ class ComputeAPITestCase(BaseTestCase):
                            'get_by_instance_uuid')
         @mock.patch.object(self.compute_api.servicegroup_api, 'service_is_up')
         def do_test(service_is_up, get_by_instance_uuid, get_all_by_host,
-                    rebuild_instance, get_service):
+                    rebuild_instance, get_service, delete_tokens_for_instance):
             service_is_up.return_value = False
             get_by_instance_uuid.return_value = fake_spec
             rebuild_instance.side_effect = fake_rebuild_instance
@@ -10707,6 +10709,8 @@ class ComputeAPITestCase(BaseTestCase):
                 on_shared_storage=True,
                 request_spec=fake_spec,
                 host=host)
+            delete_tokens_for_instance.assert_called_once_with(
+                ctxt, instance.uuid)
         do_test()
 
         instance.refresh()
@@ -1647,6 +1647,8 @@ class _ComputeAPIUnitTestMixIn(object):
                                  'limit_check_project_and_user')
         self.mox.StubOutWithMock(self.compute_api, '_record_action_start')
         self.mox.StubOutWithMock(objects.RequestSpec, 'get_by_instance_uuid')
+        self.mox.StubOutWithMock(self.compute_api.consoleauth_rpcapi,
+                                 'delete_tokens_for_instance')
         self.mox.StubOutWithMock(self.compute_api.compute_task_api,
                                  'resize_instance')
 
@@ -1742,6 +1744,8 @@ class _ComputeAPIUnitTestMixIn(object):
 
             scheduler_hint = {'filter_properties': filter_properties}
 
+            self.compute_api.consoleauth_rpcapi.delete_tokens_for_instance(
+                self.context, fake_inst.uuid)
             self.compute_api.compute_task_api.resize_instance(
                     self.context, fake_inst, extra_kwargs,
                     scheduler_hint=scheduler_hint,
@@ -126,6 +126,67 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             event_pwr_state=power_state.SHUTDOWN,
             current_pwr_state=power_state.RUNNING)
 
+    @mock.patch.object(manager.ComputeManager, '_get_power_state',
+                       return_value=power_state.RUNNING)
+    @mock.patch.object(manager.ComputeManager, '_sync_instance_power_state')
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_handle_events_batch(self, mock_get, mock_get_filters,
+                                 mock_sync, mock_get_power_state):
+        inst1 = fake_instance.fake_instance_obj(self.context,
+                                                uuid=uuids.instance1)
+        inst2 = fake_instance.fake_instance_obj(self.context,
+                                                uuid=uuids.instance2)
+        mock_get_filters.return_value = [inst1, inst2]
+        # The second instance is deleted while its event is handled
+        mock_sync.side_effect = [
+            None, exception.InstanceNotFound(instance_id=uuids.instance2)]
+        events = [
+            virtevent.LifecycleEvent(uuids.instance1,
+                                     virtevent.EVENT_LIFECYCLE_STARTED),
+            virtevent.LifecycleEvent(uuids.deleted,
+                                     virtevent.EVENT_LIFECYCLE_STARTED),
+            virtevent.LifecycleEvent(uuids.instance2,
+                                     virtevent.EVENT_LIFECYCLE_RESUMED),
+            virtevent.Event(),
+        ]
+
+        self.compute.handle_events(events)
+
+        mock_get.assert_not_called()
+        mock_get_filters.assert_called_once_with(
+            mock.ANY, {'uuid': [uuids.instance1, uuids.deleted,
+                                uuids.instance2]},
+            expected_attrs=[])
+        self.assertEqual('yes',
+                         mock_get_filters.call_args[0][0].read_deleted)
+        mock_sync.assert_has_calls([
+            mock.call(mock.ANY, inst1, power_state.RUNNING),
+            mock.call(mock.ANY, inst2, power_state.RUNNING)])
+
+    @mock.patch.object(manager.ComputeManager, '_sync_instance_power_state',
+                       side_effect=test.TestingException)
+    @mock.patch.object(manager.ComputeManager, '_get_power_state',
+                       return_value=power_state.RUNNING)
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_handle_events_batch_error(self, mock_get_filters,
+                                       mock_get_power_state, mock_sync):
+        inst1 = fake_instance.fake_instance_obj(self.context,
+                                                uuid=uuids.instance1)
+        inst2 = fake_instance.fake_instance_obj(self.context,
+                                                uuid=uuids.instance2)
+        mock_get_filters.return_value = [inst1, inst2]
+        events = [
+            virtevent.LifecycleEvent(uuids.instance1,
+                                     virtevent.EVENT_LIFECYCLE_STARTED),
+            virtevent.LifecycleEvent(uuids.instance2,
+                                     virtevent.EVENT_LIFECYCLE_STARTED),
+        ]
+
+        # An error handling one event does not prevent handling the others
+        self.compute.handle_events(events)
+        self.assertEqual(2, mock_sync.call_count)
+
     @mock.patch('nova.compute.utils.notify_about_instance_action')
     def test_delete_instance_info_cache_delete_ordering(self, mock_notify):
         call_tracker = mock.Mock()
@@ -248,6 +309,44 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             else:
                 self.assertFalse(db_node.destroy.called)
 
+    @mock.patch.object(manager.ComputeManager, '_get_resource_tracker')
+    @mock.patch.object(manager.ComputeManager,
+                       'update_available_resource_for_node')
+    @mock.patch.object(fake_driver.FakeDriver, 'get_available_nodes')
+    @mock.patch.object(manager.ComputeManager, '_get_compute_nodes_in_db',
+                       return_value=[])
+    def _test_update_available_resource_order(self, get_db_nodes,
+                                              get_avail_nodes, update_mock,
+                                              get_rt):
+        get_avail_nodes.return_value = set(['node%s' % i for i in range(8)])
+        get_rt.return_value.changed_nodes = set(['node3', 'node6'])
+        self.compute.update_available_resource(self.context)
+        updated = [c[0][1] for c in update_mock.call_args_list]
+        self.assertEqual(set(['node3', 'node6']), set(updated[:2]))
+        self.assertEqual(get_avail_nodes.return_value, set(updated))
+        self.assertEqual(8, len(updated))
+
+    def test_update_available_resource_changed_nodes_first(self):
+        self._test_update_available_resource_order()
+
+    @mock.patch.object(manager.eventlet, 'GreenPool')
+    def test_update_available_resource_concurrent(self, mock_pool):
+        self.flags(resource_update_workers=4, group='compute')
+        pool = mock_pool.return_value
+        pool.spawn_n.side_effect = lambda f, *args: f(*args)
+        self._test_update_available_resource_order()
+        mock_pool.assert_called_once_with(4)
+        self.assertEqual(8, pool.spawn_n.call_count)
+        pool.waitall.assert_called_once_with()
+
+    @mock.patch.object(manager.time, 'time', side_effect=[0, 100])
+    @mock.patch('nova.compute.manager.LOG')
+    def test_update_available_resource_overrun(self, mock_log, mock_time):
+        self.flags(update_resources_interval=60)
+        self._test_update_available_resource_order()
+        mock_log.warning.assert_called_once_with(mock.ANY, {
+            'nodes': 8, 'duration': 100, 'rate': 0.08})
+
     @mock.patch('nova.context.get_admin_context')
     def test_pre_start_hook(self, get_admin_context):
         """Very simple test just to make sure update_available_resource is
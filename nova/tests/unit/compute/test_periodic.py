@@ -0,0 +1,188 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import eventlet
+from eventlet import event
+import mock
+from oslo_service import periodic_task
+
+from nova.compute import manager
+from nova.compute import periodic
+import nova.conf
+from nova import context
+from nova import test
+
+CONF = nova.conf.CONF
+
+
+class FakeManager(periodic_task.PeriodicTasks):
+
+    def __init__(self):
+        super(FakeManager, self).__init__(CONF)
+        self.started = []
+        self.release = event.Event()
+
+    def _task(self, name):
+        self.started.append(name)
+        self.release.wait()
+
+    @periodic.priority(periodic.LOW)
+    @periodic_task.periodic_task(spacing=10)
+    def a_low(self, context):
+        self._task('a_low')
+
+    @periodic.priority(periodic.LOW)
+    @periodic_task.periodic_task(spacing=10)
+    def b_low(self, context):
+        self._task('b_low')
+
+    @periodic_task.periodic_task(spacing=10)
+    def c_normal(self, context):
+        self._task('c_normal')
+
+    @periodic.priority(periodic.HIGH)
+    @periodic_task.periodic_task(spacing=10)
+    def d_high(self, context):
+        self._task('d_high')
+
+
+class PeriodicTaskExecutorTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(PeriodicTaskExecutorTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.manager = FakeManager()
+        self.addCleanup(self._release)
+
+    def _release(self):
+        if not self.manager.release.ready():
+            self.manager.release.send()
+        eventlet.sleep(0)
+
+    def _run(self, executor):
+        idle_for = executor.run_periodic_tasks(self.context)
+        # Let the spawned greenthreads start.
+        eventlet.sleep(0)
+        return idle_for
+
+    def test_priority_order_and_low_limit(self):
+        executor = periodic.PeriodicTaskExecutor(self.manager, 3)
+        idle_for = self._run(executor)
+        # The HIGH and NORMAL tasks start first, and only one LOW task
+        # may occupy the workers.
+        self.assertEqual(['d_high', 'c_normal', 'a_low'],
+                         self.manager.started)
+        self.assertEqual(periodic._RETRY_INTERVAL, idle_for)
+        self._release()
+        self._run(executor)
+        self.assertEqual(['d_high', 'c_normal', 'a_low', 'b_low'],
+                         self.manager.started)
+
+    def test_all_workers_busy(self):
+        executor = periodic.PeriodicTaskExecutor(self.manager, 1)
+        self._run(executor)
+        self.assertEqual(['d_high'], self.manager.started)
+        self._run(executor)
+        self.assertEqual(['d_high'], self.manager.started)
+
+    def test_single_worker_runs_low(self):
+        executor = periodic.PeriodicTaskExecutor(self.manager, 1)
+        for name in ('c_normal', 'd_high'):
+            self.manager._periodic_last_run[name] = time.time()
+        self._run(executor)
+        self.assertEqual(['a_low'], self.manager.started)
+
+    def test_overrun_is_skipped(self):
+        executor = periodic.PeriodicTaskExecutor(self.manager, 4)
+        self._run(executor)
+        self.assertEqual(4, len(self.manager.started))
+        for name in self.manager._periodic_last_run:
+            self.manager._periodic_last_run[name] -= 10
+        with mock.patch.object(periodic.LOG, 'warning') as mock_warn:
+            self._run(executor)
+        self.assertEqual(4, len(self.manager.started))
+        self.assertEqual(4, mock_warn.call_count)
+        stats = executor.get_stats()
+        self.assertEqual(1, stats['d_high']['overruns'])
+        self.assertTrue(stats['d_high']['running'])
+        self.assertEqual('high', stats['d_high']['priority'])
+
+    def test_not_due(self):
+        executor = periodic.PeriodicTaskExecutor(self.manager, 4)
+        self._run(executor)
+        self._release()
+        self.manager.started = []
+        idle_for = self._run(executor)
+        self.assertEqual([], self.manager.started)
+        self.assertGreater(idle_for, 9)
+
+    def test_stats(self):
+        executor = periodic.PeriodicTaskExecutor(self.manager, 4)
+        self.manager.release.send()
+        with mock.patch.object(self.manager, '_task',
+                               side_effect=[None, None, None, ValueError]):
+            self._run(executor)
+            eventlet.sleep(0)
+        stats = executor.get_stats()
+        self.assertEqual(4, sum(s['runs'] for s in stats.values()))
+        self.assertEqual(1, sum(s['errors'] for s in stats.values()))
+        self.assertFalse(any(s['running'] for s in stats.values()))
+        self.assertIsNotNone(stats['c_normal']['last_duration'])
+        self.assertEqual(stats, executor.report().data)
+
+    @mock.patch.object(periodic.random, 'uniform', return_value=5)
+    @mock.patch.object(periodic.eventlet, 'spawn_after')
+    def test_jitter(self, mock_spawn_after, mock_uniform):
+        executor = periodic.PeriodicTaskExecutor(self.manager, 1, jitter=30)
+        self._run(executor)
+        mock_uniform.assert_called_with(0, 30)
+        mock_spawn_after.assert_called_once_with(
+            5, executor._start_delayed, self.context, 'd_high', mock.ANY)
+        # The delayed task does not occupy the pool, but reserves its worker
+        self.assertEqual([], self.manager.started)
+        self.assertEqual(1, executor._pool.free())
+        self._run(executor)
+        self.assertEqual(1, mock_spawn_after.call_count)
+        # Start the task as if the delay had passed
+        mock_spawn_after.call_args[0][1](*mock_spawn_after.call_args[0][2:])
+        eventlet.sleep(0)
+        self.assertEqual(['d_high'], self.manager.started)
+        self.assertEqual(0, executor._delayed)
+
+
+class ComputeManagerPeriodicTasksTestCase(test.NoDBTestCase):
+
+    def test_sequential_by_default(self):
+        compute = manager.ComputeManager()
+        self.assertIsNone(compute.periodic_executor)
+
+    def test_executor(self):
+        self.flags(periodic_task_workers=4, periodic_task_jitter=10,
+                   group='compute')
+        compute = manager.ComputeManager()
+        executor = compute.periodic_executor
+        self.assertEqual(4, executor.workers)
+        self.assertEqual(10, executor.jitter)
+        stats = executor.get_stats()
+        self.assertEqual('high',
+                         stats['update_available_resource']['priority'])
+        self.assertEqual('low',
+                         stats['_run_image_cache_manager_pass']['priority'])
+        self.assertEqual('normal',
+                         stats['_heal_instance_info_cache']['priority'])
+        ctxt = context.get_admin_context()
+        with mock.patch.object(executor, 'run_periodic_tasks',
+                               return_value=1) as mock_run:
+            self.assertEqual(1, compute.periodic_tasks(ctxt))
+        mock_run.assert_called_once_with(ctxt)
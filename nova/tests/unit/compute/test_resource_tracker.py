@@ -513,6 +513,25 @@ class TestUpdateAvailableResources(BaseTestCase):
 
         self.assertFalse(get_mock.called)
 
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance',
+                return_value=objects.InstancePCIRequests(requests=[]))
+    @mock.patch('nova.objects.PciDeviceList.get_by_compute_node',
+                return_value=objects.PciDeviceList())
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node',
+                return_value=[])
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node',
+                return_value=[])
+    def test_changed_node_updated(self, get_mock, migr_mock, get_cn_mock,
+                                  pci_mock, instance_pci_mock):
+        self._setup_rt()
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+        self.rt.changed_nodes.update([_NODENAME, 'other-node'])
+
+        self._update_available_resources()
+
+        self.assertEqual(set(['other-node']), self.rt.changed_nodes)
+
     @mock.patch('nova.objects.InstancePCIRequests.get_by_instance',
                 return_value=objects.InstancePCIRequests(requests=[]))
     @mock.patch('nova.objects.PciDeviceList.get_by_compute_node',
@@ -965,6 +984,100 @@ class TestUpdateAvailableResources(BaseTestCase):
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  actual_resources))
 
+    @mock.patch('nova.compute.resource_tracker.LOG')
+    @mock.patch('time.time')
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance',
+                return_value=objects.InstancePCIRequests(requests=[]))
+    @mock.patch('nova.objects.PciDeviceList.get_by_compute_node',
+                return_value=objects.PciDeviceList())
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_incremental_audit(self, get_mock, migr_mock, get_cn_mock,
+                               pci_mock, instance_pci_mock, mock_time,
+                               mock_log):
+        self.flags(resource_audit_interval=600)
+        self._setup_rt()
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+        mock_time.return_value = 1000
+
+        # The first pass always audits the node
+        self._update_available_resources()
+        self.assertEqual(1, get_mock.call_count)
+        self.assertEqual(1000, self.rt.last_audit[_NODENAME])
+
+        # Usage maintained by claims survives until the next audit, while
+        # values reported by the driver are refreshed.
+        cn = self.rt.compute_nodes[_NODENAME]
+        cn.memory_mb_used = 128
+        self.driver_mock.get_available_resource.return_value['memory_mb'] = (
+            1024)
+        mock_time.return_value = 1599
+        update_mock = self._update_available_resources()
+        self.assertEqual(1, get_mock.call_count)
+        actual = update_mock.call_args[0][1]
+        self.assertEqual(128, actual.memory_mb_used)
+        self.assertEqual(1024, actual.memory_mb)
+        self.assertEqual(1024 - 128, actual.free_ram_mb)
+        mock_log.warning.assert_not_called()
+
+        # Once the interval has passed the node is audited again and the
+        # drift of the tracked usage is reported.
+        mock_time.return_value = 1600
+        update_mock = self._update_available_resources()
+        self.assertEqual(2, get_mock.call_count)
+        self.assertEqual(0, update_mock.call_args[0][1].memory_mb_used)
+        self.assertEqual(1600, self.rt.last_audit[_NODENAME])
+        self.assertEqual(1, mock_log.warning.call_count)
+        self.assertEqual({'memory_mb_used': (128, 0)},
+                         mock_log.warning.call_args[0][1]['drift'])
+
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance',
+                return_value=objects.InstancePCIRequests(requests=[]))
+    @mock.patch('nova.objects.PciDeviceList.get_by_compute_node',
+                return_value=objects.PciDeviceList())
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_audit_every_pass_by_default(self, get_mock, migr_mock,
+                                         get_cn_mock, pci_mock,
+                                         instance_pci_mock):
+        self._setup_rt()
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+
+        self._update_available_resources()
+        self._update_available_resources()
+        self.assertEqual(2, get_mock.call_count)
+
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance',
+                return_value=objects.InstancePCIRequests(requests=[]))
+    @mock.patch('nova.objects.PciDeviceList.get_by_compute_node',
+                return_value=objects.PciDeviceList())
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_semaphore_stats(self, get_mock, migr_mock, get_cn_mock,
+                             pci_mock, instance_pci_mock):
+        self._setup_rt()
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+
+        with mock.patch.object(self.rt,
+                               '_report_semaphore_stats') as report_mock:
+            self._update_available_resources()
+        report_mock.assert_called_once_with()
+        stats = self.rt.semaphore_stats['_update_available_resource']
+        self.assertEqual(1, stats['count'])
+        self.assertEqual(stats['max'], stats['total'])
+
+        self.rt._report_semaphore_stats()
+        self.assertEqual({}, self.rt.semaphore_stats)
+
 
 class TestInitComputeNode(BaseTestCase):
 
@@ -1164,6 +1277,7 @@ class TestUpdateComputeNode(BaseTestCase):
         self.rt._update(mock.sentinel.ctx, new_compute)
         save_mock.assert_called_once_with()
         ucn_mock.assert_called_once_with(new_compute)
+        self.assertEqual(set([_NODENAME]), self.rt.changed_nodes)
 
     @mock.patch('nova.compute.resource_tracker.'
                 '_normalize_inventory_from_cn_obj')
@@ -473,3 +473,34 @@ class NovaWebsocketSecurityProxyTestCase(test.NoDBTestCase):
         self.assertEqual(len(self.wh.do_proxy.calls), 0)
         mock_close.assert_called_with()
         self.assertEqual(len(mock_finish.calls), 0)
+
+
+class TenantSockTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TenantSockTestCase, self).setUp()
+        self.reqhandler = mock.Mock()
+        self.sock = websocketproxy.TenantSock(self.reqhandler)
+
+    def test_recv_across_frames(self):
+        self.reqhandler.recv_frames.side_effect = [
+            ([b'RFB ', b'003.'], False), ([b'008\nabc'], False)]
+
+        self.assertEqual(b'RFB 003.008\n', self.sock.recv(12))
+        self.assertEqual(b'ab', self.sock.recv(2))
+        self.assertEqual(2, self.reqhandler.recv_frames.call_count)
+
+    def test_recv_closed(self):
+        self.reqhandler.recv_frames.return_value = (
+            [b'RFB'], {'code': 1000, 'reason': 'closed'})
+
+        self.assertEqual(b'RFB', self.sock.recv(12))
+
+    def test_finish_up(self):
+        self.reqhandler.recv_frames.return_value = ([b'abcdef'], False)
+        self.sock.recv(2)
+
+        self.sock.finish_up()
+
+        self.reqhandler.send_frames.assert_called_once_with([b'cdef'])
+        self.assertEqual(bytearray(), self.sock.queue)
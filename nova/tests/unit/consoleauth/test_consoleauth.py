@@ -134,6 +134,94 @@ class ConsoleauthTestCase(test.NoDBTestCase):
                                         instance_uuid=self.instance_uuid)
         self.assertIsNone(self.manager_api.check_token(self.context, token))
 
+    def _authorize_tokens(self, ports):
+        tokens = [u'token%d' % index for index in range(len(ports))]
+        for token, port in zip(tokens, ports):
+            self.manager_api.authorize_console(self.context, token, 'novnc',
+                                               '127.0.0.1', port, 'host',
+                                               self.instance_uuid)
+        return tokens
+
+    def _stub_validate_console_port_mock(self, result):
+        validate = mock.Mock(return_value=result)
+        self.stub_out(self.rpcapi + 'validate_console_port',
+                      lambda _self, *args: validate(*args))
+        return validate
+
+    @mock.patch('nova.objects.instance.Instance.get_by_uuid')
+    def test_check_token_remembers_validation(self, mock_get):
+        mock_get.return_value = None
+        self.useFixture(test.TimeOverride())
+        self.flags(validation_cache_ttl=10, group='consoleauth')
+        validate = self._stub_validate_console_port_mock(True)
+        tokens = self._authorize_tokens(['8080', '8080', '8081'])
+
+        self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                          tokens[0]))
+        self.assertEqual(1, validate.call_count)
+        # The validation of the first token applies to the other token of
+        # the same console, but not to the token of another console
+        self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                          tokens[0]))
+        self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                          tokens[1]))
+        self.assertEqual(1, validate.call_count)
+        self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                          tokens[2]))
+        self.assertEqual(2, validate.call_count)
+
+        timeutils.advance_time_seconds(10)
+        self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                          tokens[1]))
+        self.assertEqual(3, validate.call_count)
+        self.assertEqual(
+            {'cached': 2, 'validated': 3},
+            {outcome: histogram.count for outcome, histogram in
+             self.manager.check_token_timings.items()})
+
+    @mock.patch('nova.objects.instance.Instance.get_by_uuid')
+    def test_check_token_validation_not_remembered(self, mock_get):
+        mock_get.return_value = None
+        validate = self._stub_validate_console_port_mock(True)
+        tokens = self._authorize_tokens(['8080'])
+
+        for i in range(2):
+            self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                              tokens[0]))
+        self.assertEqual(2, validate.call_count)
+
+    @mock.patch('nova.objects.instance.Instance.get_by_uuid')
+    def test_check_token_invalid_not_remembered(self, mock_get):
+        mock_get.return_value = None
+        self.flags(validation_cache_ttl=10, group='consoleauth')
+        validate = self._stub_validate_console_port_mock(False)
+        tokens = self._authorize_tokens(['8080'])
+
+        for i in range(2):
+            self.assertIsNone(self.manager_api.check_token(self.context,
+                                                           tokens[0]))
+        self.assertEqual(2, validate.call_count)
+        self.assertEqual(
+            2, self.manager.check_token_timings['invalid'].count)
+
+    @mock.patch('nova.objects.instance.Instance.get_by_uuid')
+    def test_delete_tokens_for_instance_forgets_validation(self, mock_get):
+        mock_get.return_value = None
+        self.flags(validation_cache_ttl=10, group='consoleauth')
+        validate = self._stub_validate_console_port_mock(True)
+        tokens = self._authorize_tokens(['8080'])
+        self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                          tokens[0]))
+
+        self.manager_api.delete_tokens_for_instance(self.context,
+                                                    self.instance_uuid)
+        self.assertIsNone(self.manager_api.check_token(self.context,
+                                                       tokens[0]))
+        tokens = self._authorize_tokens(['8080'])
+        self.assertIsNotNone(self.manager_api.check_token(self.context,
+                                                          tokens[0]))
+        self.assertEqual(2, validate.call_count)
+
     def test_delete_expired_tokens(self):
         self.useFixture(test.TimeOverride())
         token = u'mytok'
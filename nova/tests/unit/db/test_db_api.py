@@ -3706,6 +3706,21 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                             include_disabled=True)
         self._assertEqualListsOfObjects(expected, real)
 
+    def test_service_get_all_by_binary_and_hosts(self):
+        values = [
+            {'host': 'host1', 'binary': 'b1'},
+            {'host': 'host2', 'binary': 'b1'},
+            {'host': 'host3', 'binary': 'b1', 'disabled': True},
+            {'host': 'host1', 'binary': 'b2', 'topic': 'b2'}
+        ]
+        services = [self._create_service(vals) for vals in values]
+        real = db.service_get_all_by_binary(self.ctxt, 'b1',
+                                            include_disabled=True,
+                                            hosts=['host1', 'host3'])
+        self._assertEqualListsOfObjects([services[0], services[2]], real)
+        self.assertEqual([], db.service_get_all_by_binary(self.ctxt, 'b1',
+                                                          hosts=[]))
+
     def test_service_get_all_computes_by_hv_type(self):
         values = [
             {'host': 'host1', 'binary': 'nova-compute'},
@@ -6389,6 +6404,64 @@ class TaskLogTestCase(test.TestCase):
                           message=self.message)
 
 
+class InstanceUsageRollupTestCase(test.TestCase):
+
+    def setUp(self):
+        super(InstanceUsageRollupTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.day1 = datetime.datetime(2017, 1, 1)
+        self.day2 = datetime.datetime(2017, 1, 2)
+        self._replace(self.day1, ['p1', 'p2'])
+        self._replace(self.day2, ['p1'])
+
+    def _replace(self, period_start, project_ids):
+        values = [dict(project_id=None, flavorid=None, instances=2,
+                       hours=48.0, vcpus_hours=96.0, memory_mb_hours=1024.0,
+                       local_gb_hours=480.0)]
+        for project_id in project_ids:
+            values.append(dict(values[0], project_id=project_id,
+                               flavorid='1', instances=1, hours=24.0))
+        return db.instance_usage_rollup_replace(self.context, period_start,
+                                                values)
+
+    def test_instance_usage_rollup_get_all(self):
+        rollups = db.instance_usage_rollup_get_all(
+            self.context, self.day1, self.day2)
+        self.assertEqual(3, len(rollups))
+        self.assertEqual(set([None, 'p1', 'p2']),
+                         set(r['project_id'] for r in rollups))
+        rollups = db.instance_usage_rollup_get_all(
+            self.context, self.day1, self.day2 + datetime.timedelta(days=1),
+            project_id='p2')
+        self.assertEqual([(self.day1, None), (self.day1, 'p2'),
+                          (self.day2, None)],
+                         sorted(((r['period_start'], r['project_id'])
+                                 for r in rollups),
+                                key=lambda r: (r[0], r[1] or '')))
+
+    def test_instance_usage_rollup_replace(self):
+        rollups = self._replace(self.day1, ['p3'])
+        self.assertEqual(2, len(rollups))
+        rollups = db.instance_usage_rollup_get_all(
+            self.context, self.day1, self.day2)
+        self.assertEqual(set([None, 'p3']),
+                         set(r['project_id'] for r in rollups))
+
+    def test_instance_usage_rollup_get_last_period_start(self):
+        self.assertEqual(
+            self.day2,
+            db.instance_usage_rollup_get_last_period_start(self.context))
+
+    def test_instance_get_earliest_launched_at(self):
+        self.assertIsNone(db.instance_get_earliest_launched_at(self.context))
+        db.instance_create(self.context, {'launched_at': self.day2})
+        instance = db.instance_create(self.context,
+                                      {'launched_at': self.day1})
+        db.instance_destroy(self.context, instance['uuid'])
+        self.assertEqual(self.day1,
+                         db.instance_get_earliest_launched_at(self.context))
+
+
 class BlockDeviceMappingTestCase(test.TestCase):
     def setUp(self):
         super(BlockDeviceMappingTestCase, self).setUp()
@@ -9210,9 +9283,12 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             # with no shadow table and it's OK, so skip.
             # 318 adds one more: 'resource_provider_aggregates'.
             # NOTE(PaulMurray): migration 333 adds 'console_auth_tokens'
+            # Migration 374 adds 'instance_usage_rollups', whose rows are
+            # never soft-deleted.
             if table_name in ['tags', 'resource_providers', 'allocations',
                               'inventories', 'resource_provider_aggregates',
-                              'console_auth_tokens']:
+                              'console_auth_tokens',
+                              'instance_usage_rollups']:
                 continue
 
             if table_name.startswith("shadow_"):
@@ -9444,6 +9520,75 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             'shadow_migrations'
         )
 
+    def test_archive_deleted_rows_marks_only_one_batch(self):
+        # instance_actions of deleted instances are soft-deleted before
+        # being archived, but only as many as can be archived in one go.
+        instance_actions = models.InstanceAction.__table__
+        ins_stmt = self.instances.insert().values(uuid=uuidsentinel.instance,
+                                                  deleted=1)
+        self.conn.execute(ins_stmt)
+        for _ in range(3):
+            ins_stmt = instance_actions.insert().values(
+                instance_uuid=uuidsentinel.instance, action='create')
+            self.conn.execute(ins_stmt)
+
+        num = sqlalchemy_api._archive_deleted_rows_for_table(
+            "instance_actions", max_rows=2)
+        self.assertEqual(2, num)
+        rows = self.conn.execute(sql.select([instance_actions])).fetchall()
+        self.assertEqual(1, len(rows))
+        self.assertEqual(0, rows[0].deleted)
+
+        num = sqlalchemy_api._archive_deleted_rows_for_table(
+            "instance_actions", max_rows=2)
+        self.assertEqual(1, num)
+        self._assert_shadow_tables_empty_except('shadow_instance_actions')
+
+    def test_purge_shadow_tables(self):
+        now = timeutils.utcnow()
+        old = now - datetime.timedelta(days=30)
+        for uuidstr, deleted_at in zip(self.uuidstrs[:3], (old, old, now)):
+            ins_stmt = self.shadow_instance_id_mappings.insert().values(
+                uuid=uuidstr, deleted=1, deleted_at=deleted_at)
+            self.conn.execute(ins_stmt)
+        # A row archived without being soft-deleted first
+        ins_stmt = self.shadow_instances.insert().values(
+            uuid=self.uuidstrs[3], created_at=old)
+        self.conn.execute(ins_stmt)
+
+        results = db.purge_shadow_tables(
+            before=now - datetime.timedelta(days=1))
+        self.assertEqual({'shadow_instance_id_mappings': 2,
+                          'shadow_instances': 1}, results)
+        rows = self.conn.execute(
+            sql.select([self.shadow_instance_id_mappings])).fetchall()
+        self.assertEqual([self.uuidstrs[2]], [row.uuid for row in rows])
+
+        results = db.purge_shadow_tables()
+        self.assertEqual({'shadow_instance_id_mappings': 1}, results)
+        self._assert_shadow_tables_empty_except()
+
+    def test_purge_shadow_tables_in_batches(self):
+        old = timeutils.utcnow() - datetime.timedelta(days=30)
+        for uuidstr in self.uuidstrs[:5]:
+            ins_stmt = self.shadow_instance_id_mappings.insert().values(
+                uuid=uuidstr, deleted=1, deleted_at=old)
+            self.conn.execute(ins_stmt)
+
+        elapsed = {}
+        with mock.patch.object(sqlalchemy_api, '_archive_upper_bound',
+                               side_effect=sqlalchemy_api.
+                               _archive_upper_bound) as mock_upper:
+            results = db.purge_shadow_tables(before=timeutils.utcnow(),
+                                             max_rows=2, elapsed=elapsed)
+        self.assertEqual({'shadow_instance_id_mappings': 5}, results)
+        self.assertEqual(['shadow_instance_id_mappings'], list(elapsed))
+        # Three batches and a last query finding no rows left
+        self.assertEqual(4, len([
+            c for c in mock_upper.call_args_list
+            if c[0][1].table.name == 'shadow_instance_id_mappings']))
+        self._assert_shadow_tables_empty_except()
+
     def test_archive_deleted_rows_2_tables(self):
         # Add 6 rows to each table
         for uuidstr in self.uuidstrs:
@@ -968,6 +968,14 @@ class NovaMigrationsCheckers(test_migrations.ModelsMigrationsSync,
     def _check_373(self, engine, data):
         self.assertColumnExists(engine, 'migrations', 'uuid')
 
+    def _check_374(self, engine, data):
+        self.assertColumnExists(engine, 'instance_usage_rollups',
+                                'period_start')
+        self.assertIndexMembers(
+            engine, 'instance_usage_rollups',
+            'instance_usage_rollups_period_start_project_id_idx',
+            ['period_start', 'project_id'])
+
 
 class TestNovaMigrationsSQLite(NovaMigrationsCheckers,
                                test_base.DbTestCase,
@@ -0,0 +1,95 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-memory iptables-save, iptables-restore and ipset."""
+
+# The tables and built-in chains nova adds rules to
+DEFAULT_TABLES = [('filter', ['INPUT', 'FORWARD', 'OUTPUT']),
+                  ('nat', ['PREROUTING', 'OUTPUT', 'POSTROUTING']),
+                  ('mangle', ['POSTROUTING'])]
+
+
+def empty_ruleset():
+    """Returns the lines saved by iptables-save when no rules are loaded."""
+    lines = []
+    for table, chains in DEFAULT_TABLES:
+        lines += (['# Generated by iptables-save', '*' + table] +
+                  [':%s ACCEPT [0:0]' % chain for chain in chains] +
+                  ['COMMIT', '# Completed'])
+    return lines
+
+
+class FakeIptables(object):
+    """An execute function keeping the rules restored by iptables-restore
+    and ip6tables-restore, and returning them from iptables-save and
+    ip6tables-save.
+
+    The commands run, other than iptables-save and ip6tables-save, are
+    recorded in calls with the lines fed to them.
+    """
+
+    def __init__(self, lines=None):
+        # The IPv4 and IPv6 rules
+        self.lines = empty_ruleset() if lines is None else lines
+        self.ipv6_lines = empty_ruleset()
+        self.calls = []
+
+    def __call__(self, *cmd, **kwargs):
+        ipv6 = cmd[0].startswith('ip6tables')
+        if cmd[0].endswith('-save'):
+            return '\n'.join(self.ipv6_lines if ipv6 else self.lines), ''
+        lines = kwargs.get('process_input', b'').decode('utf-8').split('\n')
+        self.calls.append((cmd, lines))
+        if cmd[0].endswith('-restore'):
+            if '--noflush' in cmd:
+                self._restore_chains(
+                    self.ipv6_lines if ipv6 else self.lines, lines)
+            elif ipv6:
+                self.ipv6_lines = lines
+            else:
+                self.lines = lines
+        return '', ''
+
+    @staticmethod
+    def _restore_chains(saved_lines, lines):
+        """Replaces the rules of the chains declared in each table restored
+        without flushing the tables.
+        """
+        start = 0
+        while 'COMMIT' in lines[start:]:
+            end = lines.index('COMMIT', start)
+            table_name = lines[start][1:]
+            chains = set(line.split(' ')[0][1:]
+                         for line in lines[start:end]
+                         if line.startswith(':'))
+            rules = [line for line in lines[start:end]
+                     if line.startswith('[')]
+            saved_start = saved_lines.index('*%s' % table_name)
+            saved_end = saved_lines.index('COMMIT', saved_start)
+            saved = saved_lines[saved_start:saved_end]
+            declared = set(line.split(' ')[0][1:] for line in saved
+                           if line.startswith(':'))
+            declarations = [line for line in saved
+                            if not line.startswith('[')]
+            declarations += [line for line in lines[start:end]
+                             if line.startswith(':') and
+                             line.split(' ')[0][1:] not in declared]
+            kept = [line for line in saved
+                    if line.startswith('[') and
+                    line.split(' ')[2] not in chains]
+            saved_lines[saved_start:saved_end] = declarations + kept + rules
+            start = end + 1
+
+    def lines_fed_to(self, command):
+        """Returns the number of lines fed to a command."""
+        return sum(len(lines) for cmd, lines in self.calls
+                   if cmd[0] == command)
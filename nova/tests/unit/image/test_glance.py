@@ -363,7 +363,8 @@ class TestCreateGlanceClient(test.NoDBTestCase):
         result2 = glance._glanceclient_from_endpoint(ctx, endpoint, 2)
 
         # Ensure that session is only loaded once.
-        mock_load.assert_called_once_with(glance.CONF, "glance")
+        mock_load.assert_called_once_with(glance.CONF, "glance",
+                                          session=mock.ANY)
         self.assertEqual(session, glance._SESSION)
         # Ensure new client created every time
         client_call = mock.call(2, auth="fake_auth",
@@ -491,6 +492,22 @@ class TestGlanceClientWrapperRetries(test.NoDBTestCase):
         self.assertEqual(str(client.api_server), 'https://host2:9293')
         self.assertFalse(sleep_mock.called)
 
+    @mock.patch('nova.image.glance._glanceclient_from_endpoint')
+    def test_default_client_reused_for_context(self, create_client_mock):
+        self.flags(api_servers=['http://host1:9292'], group='glance')
+        client = glance.GlanceClientWrapper()
+        client.call(self.ctx, 2, 'get', 'meow')
+        glance.GlanceClientWrapper().call(self.ctx, 2, 'get', 'woof')
+
+        create_client_mock.assert_called_once_with(
+            self.ctx, 'http://host1:9292', 2)
+        create_client_mock.return_value.images.get.assert_has_calls(
+            [mock.call('meow'), mock.call('woof')])
+
+        # Another context gets another client
+        client.call(context.RequestContext('fake', 'fake'), 2, 'get', 'meow')
+        self.assertEqual(2, create_client_mock.call_count)
+
     def _get_static_client(self, create_client_mock):
         version = 2
         url = 'http://host4:9295'
@@ -1595,6 +1612,11 @@ class TestGlanceApiServers(test.NoDBTestCase):
         self.assertEqual(mock_epd.return_value.catalog_url, next(api_servers))
         mock_epd.assert_called_once_with()
 
+        # The endpoint is discovered once
+        api_servers = glance.get_api_servers()
+        self.assertEqual(mock_epd.return_value.catalog_url, next(api_servers))
+        mock_epd.assert_called_once_with()
+
         # Now test with endpoint_override - get_endpoint_data is not called.
         mock_epd.reset_mock()
         self.flags(endpoint_override='foo', group='glance')
@@ -21,6 +21,7 @@ import time
 
 import mock
 import netifaces
+from oslo_concurrency.fixture import lockutils as lock_fixture
 from oslo_concurrency import processutils
 from oslo_serialization import jsonutils
 from oslo_utils import fileutils
@@ -1412,3 +1413,90 @@ class LinuxNetworkTestCase(test.NoDBTestCase):
         self.assertRaises(processutils.ProcessExecutionError,
                           linux_net.create_tap_dev,
                           'tap42', multiqueue=True)
+
+
+class IpsetManagerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.useFixture(lock_fixture.ExternalLockFixture())
+        self.execute = mock.Mock(return_value=('', ''))
+        self.manager = linux_net.IpsetManager(execute=self.execute)
+        self.name = '%s-sg1-v4' % linux_net.binary_name
+        self.tmp_name = '%s-swap' % linux_net.binary_name
+
+    def _restore_call(self, lines):
+        return mock.call('ipset', '-exist', 'restore',
+                         process_input=('\n'.join(lines + [''])).encode(),
+                         run_as_root=True)
+
+    def test_set_members_creates_set(self):
+        name = self.manager.set_members('sg1-v4', ['10.0.0.2', '10.0.0.1'])
+
+        self.assertEqual(self.name, name)
+        self.assertEqual([
+            self._restore_call(['create %s hash:ip family inet' % name,
+                                'create %s hash:ip family inet' %
+                                self.tmp_name,
+                                'flush %s' % self.tmp_name,
+                                'add %s 10.0.0.1' % self.tmp_name,
+                                'add %s 10.0.0.2' % self.tmp_name]),
+            mock.call('ipset', 'swap', self.tmp_name, name,
+                      run_as_root=True),
+            mock.call('ipset', 'destroy', self.tmp_name, run_as_root=True),
+        ], self.execute.call_args_list)
+        self.assertEqual({name: {'10.0.0.1', '10.0.0.2'}},
+                         self.manager.sets)
+
+    def test_set_members_ipv6(self):
+        self.manager.set_members('sg1-v6', ['fe80::1'], 'inet6')
+
+        self.assertIn('create %s-sg1-v6 hash:ip family inet6' %
+                      linux_net.binary_name,
+                      self.execute.call_args_list[0][1]['process_input']
+                      .decode())
+
+    def test_set_members_writes_changes(self):
+        self.manager.set_members('sg1-v4', ['10.0.0.1', '10.0.0.2'])
+        self.execute.reset_mock()
+
+        self.manager.set_members('sg1-v4', ['10.0.0.2', '10.0.0.3'])
+
+        self.assertEqual([
+            self._restore_call(['add %s 10.0.0.3' % self.name,
+                                'del %s 10.0.0.1' % self.name]),
+        ], self.execute.call_args_list)
+        self.assertEqual({'10.0.0.2', '10.0.0.3'},
+                         self.manager.sets[self.name])
+
+    def test_set_members_unchanged(self):
+        self.manager.set_members('sg1-v4', ['10.0.0.1'])
+        self.execute.reset_mock()
+
+        self.manager.set_members('sg1-v4', ['10.0.0.1'])
+
+        self.execute.assert_not_called()
+
+    def test_destroy_unused(self):
+        self.manager.set_members('sg1-v4', ['10.0.0.1'])
+        self.manager.set_members('sg2-v4', ['10.0.0.2'])
+        self.execute.reset_mock()
+
+        self.manager.destroy_unused([self.name])
+
+        self.execute.assert_called_once_with(
+            'ipset', 'destroy', '%s-sg2-v4' % linux_net.binary_name,
+            run_as_root=True)
+        self.assertEqual([self.name], list(self.manager.sets))
+
+    def test_destroy_unused_fails(self):
+        self.manager.set_members('sg1-v4', ['10.0.0.1'])
+        self.execute.side_effect = processutils.ProcessExecutionError
+
+        self.manager.destroy_unused([])
+
+        # The set is kept to be destroyed later
+        self.assertEqual([self.name], list(self.manager.sets))
+        self.execute.side_effect = None
+        self.manager.destroy_unused([])
+        self.assertEqual({}, self.manager.sets)
@@ -18,6 +18,8 @@ import mock
 
 from nova import context as nova_context
 from nova.notifications import base
+from nova import objects
+from nova import rpc
 from nova import test
 from nova.tests import uuidsentinel as uuids
 from nova import utils
@@ -81,6 +83,46 @@ class TestSendInstanceUpdateNotification(test.NoDBTestCase):
         mock_get_notifier.return_value.info.assert_called_once_with(
             mock.sentinel.ctxt, 'compute.instance.update', mock.ANY)
 
+    @mock.patch.object(base, '_send_instance_update_notification')
+    def test_send_instance_update_notification_async(self, mock_send):
+        """Tests that building the payload is deferred to the notification
+        queue, with a copy of the instance.
+        """
+        queue = rpc.NotificationQueue(10)
+        queue._ensure_worker = mock.Mock()
+        self.stub_out('nova.rpc.NOTIFICATION_QUEUE', queue)
+        instance = objects.Instance(uuid=uuids.instance, vm_state='active')
+
+        base.send_instance_update_notification(mock.sentinel.ctxt, instance,
+                                               old_vm_state='building')
+
+        self.assertFalse(mock_send.called)
+        instance.vm_state = 'error'
+        queue.flush()
+        mock_send.assert_called_once_with(
+            mock.sentinel.ctxt, mock.ANY, old_vm_state='building',
+            old_task_state=None, new_vm_state=None, new_task_state=None,
+            service='compute', host=None, old_display_name=None)
+        sent_instance = mock_send.call_args[0][1]
+        self.assertIsNot(instance, sent_instance)
+        self.assertEqual('active', sent_instance.vm_state)
+
+    @mock.patch.object(objects.Instance, 'obj_clone')
+    @mock.patch.object(base, '_send_instance_update_notification')
+    def test_send_instance_update_notification_not_copied(self, mock_send,
+                                                          mock_clone):
+        """Tests that the instance is only copied when the notification is
+        queued.
+        """
+        instance = objects.Instance(uuid=uuids.instance)
+        base.send_instance_update_notification(mock.sentinel.ctxt, instance)
+
+        mock_send.assert_called_once_with(
+            mock.sentinel.ctxt, instance, old_vm_state=None,
+            old_task_state=None, new_vm_state=None, new_task_state=None,
+            service='compute', host=None, old_display_name=None)
+        self.assertFalse(mock_clone.called)
+
 
 class TestBandwidthUsage(test.NoDBTestCase):
     @mock.patch('nova.context.RequestContext.elevated')
@@ -0,0 +1,148 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import iso8601
+import mock
+
+from nova import exception
+from nova import objects
+from nova.objects import instance_usage_rollup
+from nova.tests.unit import fake_instance
+from nova.tests.unit.objects import test_objects
+from nova.tests import uuidsentinel as uuids
+
+DAY = datetime.datetime(2017, 1, 2)
+AWARE_DAY = DAY.replace(tzinfo=iso8601.UTC)
+
+fake_rollup = {
+    'created_at': DAY,
+    'updated_at': None,
+    'id': 1,
+    'period_start': DAY,
+    'project_id': 'fake-project',
+    'flavorid': '1',
+    'instances': 1,
+    'hours': 24.0,
+    'vcpus_hours': 48.0,
+    'memory_mb_hours': 12288.0,
+    'local_gb_hours': 240.0,
+    }
+
+
+def _fake_instance(ctxt, project_id, launched_at, terminated_at=None):
+    flavor = objects.Flavor(flavorid='1', vcpus=2, memory_mb=512, root_gb=10,
+                            ephemeral_gb=0)
+    return fake_instance.fake_instance_obj(
+        ctxt, uuid=getattr(uuids, '%s_%s' % (project_id, launched_at.hour)),
+        project_id=project_id, launched_at=launched_at,
+        terminated_at=terminated_at, flavor=flavor)
+
+
+class UsageHoursTestCase(test_objects._LocalTest):
+
+    def test_usage_hours(self):
+        stop = AWARE_DAY + instance_usage_rollup.ROLLUP_PERIOD
+        before = AWARE_DAY - datetime.timedelta(hours=6)
+        for launched_at, terminated_at, hours in (
+                (None, None, 0),
+                (before, None, 24),
+                (before, before, 0),
+                (stop, None, 0),
+                (AWARE_DAY + datetime.timedelta(hours=6),
+                 AWARE_DAY + datetime.timedelta(hours=9), 3)):
+            instance = objects.Instance(launched_at=launched_at,
+                                        terminated_at=terminated_at)
+            self.assertEqual(hours, instance_usage_rollup.usage_hours(
+                instance, AWARE_DAY, stop))
+
+
+class _TestInstanceUsageRollupList(object):
+    @mock.patch('nova.db.instance_usage_rollup_get_all',
+                return_value=[fake_rollup])
+    def test_get_by_window(self, mock_get_all):
+        rollups = objects.InstanceUsageRollupList.get_by_window(
+            self.context, AWARE_DAY,
+            AWARE_DAY + datetime.timedelta(days=1), project_id='fake-project')
+        mock_get_all.assert_called_once_with(
+            self.context, DAY, DAY + datetime.timedelta(days=1),
+            project_id='fake-project')
+        self.assertEqual(1, len(rollups))
+        self.compare_obj(rollups[0], fake_rollup)
+
+    @mock.patch('nova.db.instance_usage_rollup_replace')
+    @mock.patch('nova.objects.InstanceList.get_active_by_window_joined')
+    def test_rollup_day(self, mock_get_active, mock_replace):
+        mock_get_active.return_value = objects.InstanceList(objects=[
+            _fake_instance(self.context, 'p1',
+                           AWARE_DAY - datetime.timedelta(hours=1)),
+            _fake_instance(self.context, 'p1',
+                           AWARE_DAY + datetime.timedelta(hours=12),
+                           AWARE_DAY + datetime.timedelta(hours=18)),
+            _fake_instance(self.context, 'p2',
+                           AWARE_DAY + datetime.timedelta(hours=20)),
+            # Launched after the end of the day
+            _fake_instance(self.context, 'p3',
+                           AWARE_DAY + datetime.timedelta(hours=25)),
+        ])
+        mock_replace.side_effect = lambda ctxt, day, values: [
+            dict(fake_rollup, period_start=day, **v) for v in values]
+
+        rollups = objects.InstanceUsageRollupList.rollup_day(self.context,
+                                                             AWARE_DAY)
+
+        mock_get_active.assert_called_once_with(
+            self.context, DAY, DAY + instance_usage_rollup.ROLLUP_PERIOD,
+            expected_attrs=['flavor'])
+        self.assertEqual(DAY, mock_replace.call_args[0][1])
+        by_project = {r.project_id: r for r in rollups}
+        self.assertEqual(set([None, 'p1', 'p2']), set(by_project))
+        self.assertEqual(2, by_project['p1'].instances)
+        self.assertEqual(30, by_project['p1'].hours)
+        self.assertEqual(60, by_project['p1'].vcpus_hours)
+        self.assertEqual(4, by_project['p2'].hours)
+        self.assertEqual(2048, by_project['p2'].memory_mb_hours)
+        self.assertEqual(3, by_project[None].instances)
+        self.assertEqual(34, by_project[None].hours)
+        self.assertEqual(340, by_project[None].local_gb_hours)
+
+    @mock.patch('nova.db.instance_usage_rollup_replace', return_value=[])
+    @mock.patch('nova.objects.Flavor.get_by_id',
+                side_effect=exception.FlavorNotFound(flavor_id=1))
+    @mock.patch('nova.objects.Instance.get_flavor',
+                side_effect=exception.NotFound)
+    @mock.patch('nova.objects.InstanceList.get_active_by_window_joined')
+    def test_rollup_day_no_flavor(self, mock_get_active, mock_get_flavor,
+                                  mock_get_by_id, mock_replace):
+        mock_get_active.return_value = objects.InstanceList(objects=[
+            _fake_instance(self.context, 'p1', AWARE_DAY),
+            _fake_instance(self.context, 'p2', AWARE_DAY)])
+        objects.InstanceUsageRollupList.rollup_day(self.context, AWARE_DAY)
+        # The flavor is only looked up once, and the day is still marked as
+        # rolled up.
+        self.assertEqual(1, mock_get_by_id.call_count)
+        mock_replace.assert_called_once_with(
+            self.context, DAY,
+            [{'project_id': None, 'flavorid': None, 'instances': 0,
+              'hours': 0, 'vcpus_hours': 0, 'memory_mb_hours': 0,
+              'local_gb_hours': 0}])
+
+
+class TestInstanceUsageRollupList(test_objects._LocalTest,
+                                  _TestInstanceUsageRollupList):
+    pass
+
+
+class TestRemoteInstanceUsageRollupList(test_objects._RemoteTest,
+                                        _TestInstanceUsageRollupList):
+    pass
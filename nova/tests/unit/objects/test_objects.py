@@ -1117,6 +1117,8 @@ object_data = {
     'InstanceNUMATopology': '1.3-ec0030cb0402a49c96da7051c037082a',
     'InstancePCIRequest': '1.1-b1d75ebc716cb12906d9d513890092bf',
     'InstancePCIRequests': '1.1-65e38083177726d806684cb1cc0136d2',
+    'InstanceUsageRollup': '1.0-2c07089d497a7113714fe45ee79679d6',
+    'InstanceUsageRollupList': '1.0-251013b07f64ff0e126383bc41c8c308',
     'LibvirtLiveMigrateBDMInfo': '1.0-252aabb723ca79d5469fa56f64b57811',
     'LibvirtLiveMigrateData': '1.4-ae5f344e7f78d3b45c259a0f80ea69f5',
     'KeyPair': '1.4-1244e8d1b103cc69d038ed78ab3a8cc6',
@@ -1155,7 +1157,7 @@ object_data = {
     'SecurityGroupRule': '1.1-ae1da17b79970012e8536f88cb3c6b29',
     'SecurityGroupRuleList': '1.2-0005c47fcd0fb78dd6d7fd32a1409f5b',
     'Service': '1.22-8a740459ab9bf258a19c8fcb875c2d9a',
-    'ServiceList': '1.19-5325bce13eebcbf22edc9678285270cc',
+    'ServiceList': '1.20-8076fda3e333fabac971b97753a3dbce',
     'TaskLog': '1.0-78b0534366f29aa3eebb01860fbe18fe',
     'TaskLogList': '1.0-cc8cce1af8a283b9d28b55fcd682e777',
     'Tag': '1.1-8b8d7d5b48887651a0e01241672e2963',
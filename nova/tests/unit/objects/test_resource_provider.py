@@ -68,6 +68,8 @@ def _fake_ensure_cache(ctxt):
     cache = resource_provider._RC_CACHE = mock.MagicMock()
     cache.string_from_id.return_value = _RESOURCE_CLASS_NAME
     cache.id_from_string.return_value = _RESOURCE_CLASS_ID
+    cache.ids_from_strings.side_effect = lambda rc_strs: {
+        rc_str: _RESOURCE_CLASS_ID for rc_str in rc_strs}
 
 
 class TestResourceProviderNoDB(test_objects._LocalTest):
@@ -235,6 +235,17 @@ class _TestServiceObject(object):
                                          'fake-binary',
                                          include_disabled=True)
 
+    @mock.patch('nova.db.service_get_all_by_binary')
+    def test_get_by_hosts_and_binary(self, mock_get):
+        mock_get.return_value = [fake_service]
+        services = service.ServiceList.get_by_hosts_and_binary(
+            self.context, ['fake-host'], 'fake-binary')
+        self.assertEqual(1, len(services))
+        mock_get.assert_called_once_with(self.context,
+                                         'fake-binary',
+                                         include_disabled=False,
+                                         hosts=['fake-host'])
+
     @mock.patch.object(db, 'service_get_all_by_host',
                        return_value=[fake_service])
     def test_get_by_host(self, mock_service_get):
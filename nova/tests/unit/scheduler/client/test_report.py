@@ -798,6 +798,70 @@ class TestPutAllocations(SchedulerReportClientTestCase):
         self.assertFalse(res)
         self.assertTrue(mock_log.called)
 
+    def _test_claim_resources_for_consumers(self, responses):
+        self.ks_adap_mock.post.side_effect = responses
+        alloc_req = {
+            'allocations': [
+                {
+                    'resource_provider': {
+                        'uuid': uuids.cn1,
+                    },
+                    'resources': {
+                        'VCPU': 1,
+                        'MEMORY_MB': 1024,
+                    },
+                },
+            ],
+        }
+        alloc_reqs = {uuids.consumer1: alloc_req, uuids.consumer2: alloc_req}
+
+        res = self.client.claim_resources_for_consumers(
+            alloc_reqs, uuids.project_id, uuids.user_id)
+
+        expected_payload = {}
+        for consumer_uuid in alloc_reqs:
+            expected_payload[consumer_uuid] = copy.deepcopy(alloc_req)
+            expected_payload[consumer_uuid]['project_id'] = uuids.project_id
+            expected_payload[consumer_uuid]['user_id'] = uuids.user_id
+        expected_calls = [
+            mock.call('/allocations', microversion='1.12',
+                      json=expected_payload, raise_exc=False)
+        ] * len(responses)
+        self.assertEqual(expected_calls, self.ks_adap_mock.post.mock_calls)
+        # The allocation requests are not modified
+        self.assertNotIn('project_id', alloc_req)
+        return res
+
+    def test_claim_resources_for_consumers_success(self):
+        res = self._test_claim_resources_for_consumers(
+            [mock.Mock(status_code=204)])
+        self.assertTrue(res)
+
+    def test_claim_resources_for_consumers_fail_retry_success(self):
+        res = self._test_claim_resources_for_consumers([
+            mock.Mock(
+                status_code=409,
+                text='Inventory changed while attempting to allocate: '
+                     'Another thread concurrently updated the data. '
+                     'Please retry your update'),
+            mock.Mock(status_code=204),
+        ])
+        self.assertTrue(res)
+
+    @mock.patch.object(report.LOG, 'warning')
+    def test_claim_resources_for_consumers_failure(self, mock_log):
+        res = self._test_claim_resources_for_consumers(
+            [mock.Mock(status_code=409, text='Unable to allocate')])
+        self.assertFalse(res)
+        self.assertTrue(mock_log.called)
+
+    @mock.patch.object(report.LOG, 'warning')
+    def test_claim_resources_for_consumers_old_placement(self, mock_log):
+        res = self._test_claim_resources_for_consumers(
+            [mock.Mock(status_code=406)])
+        self.assertFalse(res)
+        self.assertFalse(mock_log.called)
+
     def test_remove_provider_from_inst_alloc_no_shared(self):
         """Tests that the method which manipulates an existing doubled-up
         allocation for a move operation to remove the source host results in
@@ -86,6 +86,54 @@ class TestUtils(test.NoDBTestCase):
 
         self.assertEqual({}, metadata)
 
+    def test_aggregate_metadata_uses_host_state_index(self):
+        host_state = fakes.FakeHostState(
+            'fake', 'node', {'aggregates': _AGGREGATE_FIXTURES})
+        host_state.aggregates_metadata = utils.AggregateMetadata(
+            host_state.aggregates)
+
+        values = utils.aggregate_values_from_key(host_state, 'k1')
+        metadata = utils.aggregate_metadata_get_by_host(host_state, 'k1')
+
+        self.assertEqual(set(['1', '3', '6,7']), values)
+        self.assertEqual(set(['1', '3', '7', '6']), metadata['k1'])
+        # The lookups are memoized by the index
+        self.assertIs(values,
+                      utils.aggregate_values_from_key(host_state, 'k1'))
+        self.assertIs(metadata['k1'], utils.aggregate_metadata_get_by_host(
+            host_state, 'k1')['k1'])
+
+    def test_aggregate_metadata_index_not_modified_by_callers(self):
+        host_state = fakes.FakeHostState(
+            'fake', 'node', {'aggregates': _AGGREGATE_FIXTURES})
+        host_state.aggregates_metadata = utils.AggregateMetadata(
+            host_state.aggregates)
+
+        values = utils.aggregate_values_from_key(host_state, 'k1')
+        metadata = utils.aggregate_metadata_get_by_host(host_state, 'k1')
+        self.assertIsInstance(values, frozenset)
+        self.assertIsInstance(metadata['k1'], frozenset)
+        metadata['k1'] = set(['8'])
+        metadata['k4'].add('8')
+
+        self.assertEqual(set(['1', '3', '6,7']),
+                         utils.aggregate_values_from_key(host_state, 'k1'))
+        self.assertEqual(
+            {'k1': set(['1', '3', '7', '6']),
+             'k2': set(['2', '4', '8', '9'])},
+            utils.aggregate_metadata_get_by_host(host_state, 'k1'))
+
+    def test_aggregate_metadata_ignores_stale_index(self):
+        host_state = fakes.FakeHostState(
+            'fake', 'node', {'aggregates': _AGGREGATE_FIXTURES})
+        host_state.aggregates_metadata = utils.AggregateMetadata(
+            host_state.aggregates)
+        host_state.aggregates = _AGGREGATE_FIXTURES[:1]
+
+        values = utils.aggregate_values_from_key(host_state, 'k1')
+
+        self.assertEqual(set(['1']), values)
+
     def test_validate_num_values(self):
         f = utils.validate_num_values
 
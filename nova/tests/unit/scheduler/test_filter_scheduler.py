@@ -260,8 +260,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 '_get_sorted_hosts')
     def test_schedule_not_all_instance_clean_claimed(self, mock_get_hosts,
             mock_get_all_states, mock_claim, mock_cleanup):
-        """Tests that we clean up previously-allocated instances if not all
-        instances could be scheduled
+        """Tests that we do not claim the resources of any instance if not
+        all instances could be scheduled
         """
         spec_obj = objects.RequestSpec(
             num_instances=2,
@@ -292,8 +292,197 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.driver._schedule(ctx, spec_obj, instance_uuids,
             alloc_reqs_by_rp_uuid, mock.sentinel.provider_summaries)
 
-        # Ensure we cleaned up the first successfully-claimed instance
-        mock_cleanup.assert_called_once_with([uuids.instance1])
+        # Ensure we never claimed the resources of the first instance
+        self.assertFalse(mock_cleanup.called)
+        self.assertFalse(mock_claim.called)
+        self.assertFalse(
+            self.placement_client.claim_resources_for_consumers.called)
+
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_cleanup_allocations')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_claim_resources')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_get_all_host_states')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_get_sorted_hosts')
+    def test_schedule_batch_claim_fails(self, mock_get_hosts,
+            mock_get_all_states, mock_claim, mock_cleanup):
+        """Tests that the resources of the instances are claimed one at a
+        time if claiming them in a single request fails, and that another
+        host is selected for an instance whose selected host cannot be
+        claimed against
+        """
+        spec_obj = objects.RequestSpec(
+            num_instances=2,
+            flavor=objects.Flavor(memory_mb=512,
+                                  root_gb=512,
+                                  ephemeral_gb=0,
+                                  swap=0,
+                                  vcpus=1),
+            project_id=uuids.project_id,
+            instance_group=None,
+            numa_topology=None,
+            pci_requests=None)
+
+        hs1 = host_manager.HostState('host1', 'node1', uuids.cell1)
+        hs1.uuid = uuids.cn1
+        hs2 = host_manager.HostState('host2', 'node2', uuids.cell1)
+        hs2.uuid = uuids.cn2
+        for hs in (hs1, hs2):
+            hs.free_ram_mb = 4096
+        all_host_states = [hs1, hs2]
+        mock_get_all_states.return_value = all_host_states
+        mock_get_hosts.side_effect = lambda spec_obj, hosts, index: hosts
+        self.placement_client.claim_resources_for_consumers.return_value = (
+            False)
+        # The second instance cannot be claimed against host1
+        mock_claim.side_effect = [True, False, True]
+
+        alloc_reqs_by_rp_uuid = {
+            uuids.cn1: [mock.sentinel.alloc_req_cn1],
+            uuids.cn2: [mock.sentinel.alloc_req_cn2],
+        }
+        instance_uuids = [uuids.instance0, uuids.instance1]
+        ctx = mock.Mock()
+        selections = self.driver._schedule(ctx, spec_obj, instance_uuids,
+            alloc_reqs_by_rp_uuid, mock.sentinel.provider_summaries)
+
+        pc = self.placement_client
+        pc.claim_resources_for_consumers.assert_called_once_with(
+            {uuids.instance0: mock.sentinel.alloc_req_cn1,
+             uuids.instance1: mock.sentinel.alloc_req_cn1},
+            uuids.project_id, ctx.elevated.return_value.user_id)
+        claim_calls = [
+            mock.call(ctx.elevated.return_value, spec_obj,
+                uuids.instance0, [mock.sentinel.alloc_req_cn1]),
+            mock.call(ctx.elevated.return_value, spec_obj,
+                uuids.instance1, [mock.sentinel.alloc_req_cn1]),
+            mock.call(ctx.elevated.return_value, spec_obj,
+                uuids.instance1, [mock.sentinel.alloc_req_cn2]),
+        ]
+        mock_claim.assert_has_calls(claim_calls)
+        self.assertEqual([hs1, hs2], [s[0] for s in selections])
+        self.assertFalse(mock_cleanup.called)
+        # Each host is only consumed by the instance claimed against it
+        for hs in (hs1, hs2):
+            self.assertEqual(1, hs.num_instances)
+            self.assertEqual(1, hs.vcpus_used)
+            self.assertEqual(3584, hs.free_ram_mb)
+
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_cleanup_allocations')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_claim_resources')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_get_all_host_states')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_get_sorted_hosts')
+    def test_schedule_batch_claim_and_serial_claim_fail(self,
+            mock_get_hosts, mock_get_all_states, mock_claim, mock_cleanup):
+        """Tests that the allocations claimed one at a time are removed if
+        the resources of an instance cannot be claimed against any host
+        """
+        spec_obj = objects.RequestSpec(
+            num_instances=2,
+            flavor=objects.Flavor(memory_mb=512,
+                                  root_gb=512,
+                                  ephemeral_gb=0,
+                                  swap=0,
+                                  vcpus=1),
+            project_id=uuids.project_id,
+            instance_group=None)
+
+        host_state = mock.Mock(spec=host_manager.HostState,
+            host=mock.sentinel.host, uuid=uuids.cn1, cell_uuid=uuids.cell1)
+        all_host_states = [host_state]
+        mock_get_all_states.return_value = all_host_states
+        mock_get_hosts.return_value = all_host_states
+        self.placement_client.claim_resources_for_consumers.return_value = (
+            False)
+        mock_claim.side_effect = [True, False]
+
+        alloc_reqs_by_rp_uuid = {
+            uuids.cn1: [mock.sentinel.alloc_req],
+        }
+        instance_uuids = [uuids.instance0, uuids.instance1]
+        ctx = mock.Mock()
+        selections = self.driver._schedule(ctx, spec_obj, instance_uuids,
+            alloc_reqs_by_rp_uuid, mock.sentinel.provider_summaries)
+
+        self.assertEqual([], selections)
+        self.assertEqual(2, mock_claim.call_count)
+        mock_cleanup.assert_called_once_with([uuids.instance0])
+
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_claim_resources')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_get_all_host_states')
+    @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
+                '_get_sorted_hosts')
+    def test_schedule_batch_claim_fails_anti_affinity(self, mock_get_hosts,
+            mock_get_all_states, mock_claim):
+        """Tests that the hosts are selected again when claiming the
+        resources of the instances one at a time, so that an instance claimed
+        against another host than the one selected for it in the batch does
+        not break the anti-affinity of the instance group
+        """
+        ig = objects.InstanceGroup(hosts=[], policies=['anti-affinity'])
+        spec_obj = objects.RequestSpec(
+            num_instances=2,
+            flavor=objects.Flavor(memory_mb=512,
+                                  root_gb=512,
+                                  ephemeral_gb=0,
+                                  swap=0,
+                                  vcpus=1),
+            project_id=uuids.project_id,
+            instance_group=ig,
+            numa_topology=None,
+            pci_requests=None)
+
+        hs1 = host_manager.HostState('host1', 'node1', uuids.cell1)
+        hs1.uuid = uuids.cn1
+        hs2 = host_manager.HostState('host2', 'node2', uuids.cell1)
+        hs2.uuid = uuids.cn2
+        hs3 = host_manager.HostState('host3', 'node3', uuids.cell1)
+        hs3.uuid = uuids.cn3
+        for hs in (hs1, hs2, hs3):
+            hs.free_ram_mb = 4096
+        mock_get_all_states.return_value = [hs1, hs2, hs3]
+        # Act as the anti-affinity filter
+        mock_get_hosts.side_effect = lambda spec_obj, hosts, index: [
+            hs for hs in hosts if hs.host not in ig.hosts]
+        self.placement_client.claim_resources_for_consumers.return_value = (
+            False)
+        # The first instance cannot be claimed against host1
+        mock_claim.side_effect = lambda ctx, spec_obj, instance_uuid, reqs: (
+            (instance_uuid, reqs) !=
+            (uuids.instance0, [mock.sentinel.alloc_req_cn1]))
+
+        alloc_reqs_by_rp_uuid = {
+            uuids.cn1: [mock.sentinel.alloc_req_cn1],
+            uuids.cn2: [mock.sentinel.alloc_req_cn2],
+            uuids.cn3: [mock.sentinel.alloc_req_cn3],
+        }
+        instance_uuids = [uuids.instance0, uuids.instance1]
+        ctx = mock.Mock()
+        selections = self.driver._schedule(ctx, spec_obj, instance_uuids,
+            alloc_reqs_by_rp_uuid, mock.sentinel.provider_summaries)
+
+        # The batch selected host1 and host2, but the first instance was
+        # claimed against host2, so the second one was claimed against host1
+        # instead of the host2 selected for it in the batch
+        pc = self.placement_client
+        pc.claim_resources_for_consumers.assert_called_once_with(
+            {uuids.instance0: mock.sentinel.alloc_req_cn1,
+             uuids.instance1: mock.sentinel.alloc_req_cn2},
+            uuids.project_id, ctx.elevated.return_value.user_id)
+        self.assertEqual([hs2, hs1], [s[0] for s in selections])
+        self.assertEqual(['host2', 'host1'], ig.hosts)
+        self.assertEqual({}, ig.obj_get_changes())
+        for hs in (hs1, hs2):
+            self.assertEqual(1, hs.num_instances)
+        self.assertEqual(0, hs3.num_instances)
 
     @mock.patch('nova.scheduler.filter_scheduler.FilterScheduler.'
                 '_claim_resources')
@@ -323,6 +512,10 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
             uuid=uuids.cn1, cell_uuid=uuids.cell1)
         hs2 = mock.Mock(spec=host_manager.HostState, host='host2',
             uuid=uuids.cn2, cell_uuid=uuids.cell2)
+        # The copies of the host states consumed when selecting them would
+        # otherwise be mocks without a host name
+        hs1.copy.return_value = hs1
+        hs2.copy.return_value = hs2
         all_host_states = [hs1, hs2]
         mock_get_all_states.return_value = all_host_states
         mock_claim.return_value = True
@@ -344,15 +537,14 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.driver._schedule(ctx, spec_obj, instance_uuids,
             alloc_reqs_by_rp_uuid, mock.sentinel.provider_summaries)
 
-        # Check that we called _claim_resources() for both the first and second
-        # host state
-        claim_calls = [
-            mock.call(ctx.elevated.return_value, spec_obj,
-                uuids.instance0, [mock.sentinel.alloc_req_cn2]),
-            mock.call(ctx.elevated.return_value, spec_obj,
-                uuids.instance1, [mock.sentinel.alloc_req_cn1]),
-        ]
-        mock_claim.assert_has_calls(claim_calls)
+        # Check that we claimed the resources of both instances against the
+        # first and second host state in a single request
+        pc = self.placement_client
+        pc.claim_resources_for_consumers.assert_called_once_with(
+            {uuids.instance0: mock.sentinel.alloc_req_cn2,
+             uuids.instance1: mock.sentinel.alloc_req_cn1},
+            uuids.project_id, ctx.elevated.return_value.user_id)
+        self.assertFalse(mock_claim.called)
 
         # Check that _get_sorted_hosts() is called twice and that the
         # second time, we pass it the hosts that were returned from
@@ -635,7 +827,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                     uuids.cell)
             hs.uuid = getattr(uuids, host_name)
             all_host_states.append(hs)
-            alloc_reqs[hs.uuid] = {}
+            alloc_reqs[hs.uuid] = [{}]
 
         mock_get_all_hosts.return_value = all_host_states
         mock_sorted.return_value = all_host_states
@@ -701,7 +893,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                     cell_uuid)
             hs.uuid = getattr(uuids, host_name)
             all_host_states.append(hs)
-            alloc_reqs[hs.uuid] = {}
+            alloc_reqs[hs.uuid] = [{}]
 
         mock_get_all_hosts.return_value = all_host_states
         # There are two instances so _get_sorted_hosts is called once per
@@ -755,7 +947,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                     uuids.cell)
             hs.uuid = getattr(uuids, host_name)
             all_host_states.append(hs)
-            alloc_reqs[hs.uuid] = {}
+            alloc_reqs[hs.uuid] = [{}]
 
         mock_get_all_hosts.return_value = all_host_states
         mock_sorted.return_value = all_host_states
@@ -150,6 +150,33 @@ class FiltersTestCase(test.NoDBTestCase):
                                                       spec_obj)
         filt2_mock.filter_all.assert_not_called()
 
+    def test_get_filtered_objects_traced(self):
+        filter_objs_initial = ['initial', 'filter1', 'objects1']
+        filter_objs_second = ['second', 'filter2']
+        spec_obj = objects.RequestSpec()
+
+        def _fake_base_loader_init(*args, **kwargs):
+            pass
+
+        self.stub_out('nova.loadables.BaseLoader.__init__',
+                      _fake_base_loader_init)
+
+        filt1_mock = mock.Mock(Filter1)
+        filt1_mock.run_filter_for_index.return_value = True
+        filt1_mock.filter_all.return_value = filter_objs_second
+        filt2_mock = mock.Mock(Filter2)
+        filt2_mock.run_filter_for_index.return_value = False
+        trace = mock.Mock()
+
+        filter_handler = filters.BaseFilterHandler(filters.BaseFilter)
+        filter_mocks = [filt1_mock, filt2_mock]
+        result = filter_handler.get_filtered_objects(filter_mocks,
+                                                     filter_objs_initial,
+                                                     spec_obj, trace=trace)
+        self.assertEqual(filter_objs_second, result)
+        # Only the filters which were run are traced
+        trace.add.assert_called_once_with('filter.Filter1', mock.ANY, 3, 2)
+
     def test_get_filtered_objects_none_response(self):
         filter_objs_initial = ['initial', 'filter1', 'objects1']
         spec_obj = objects.RequestSpec()
@@ -35,6 +35,7 @@ from nova.objects import base as obj_base
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
 from nova.scheduler import host_manager
+from nova.scheduler import utils as scheduler_utils
 from nova import test
 from nova.tests import fixtures
 from nova.tests.unit import fake_instance
@@ -203,6 +204,57 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual({'fake-host': set([])},
                          self.host_manager.host_aggregates_map)
 
+    def test_get_aggregates_metadata_cached(self):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                     metadata={'k1': '1'})
+        self.host_manager.update_aggregates([fake_agg])
+
+        index = self.host_manager._get_aggregates_metadata('fake-host')
+
+        self.assertEqual([fake_agg], index.aggregates)
+        self.assertIs(index,
+                      self.host_manager._get_aggregates_metadata('fake-host'))
+
+    def test_update_aggregates_invalidates_aggregates_metadata(self):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                     metadata={'k1': '1'})
+        self.host_manager.update_aggregates([fake_agg])
+        index = self.host_manager._get_aggregates_metadata('fake-host')
+        other_index = self.host_manager._get_aggregates_metadata('other')
+
+        new_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                    metadata={'k1': '2'})
+        self.host_manager.update_aggregates([new_agg])
+
+        new_index = self.host_manager._get_aggregates_metadata('fake-host')
+        self.assertIsNot(index, new_index)
+        self.assertEqual({'2'}, new_index.values_from_key('k1'))
+        self.assertIs(other_index,
+                      self.host_manager._get_aggregates_metadata('other'))
+
+    def test_update_aggregates_remove_hosts_invalidates_metadata(self):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                     metadata={'k1': '1'})
+        self.host_manager.update_aggregates([fake_agg])
+        self.host_manager._get_aggregates_metadata('fake-host')
+
+        self.host_manager.update_aggregates(
+            [objects.Aggregate(id=1, hosts=[], metadata={'k1': '1'})])
+
+        index = self.host_manager._get_aggregates_metadata('fake-host')
+        self.assertEqual([], index.aggregates)
+
+    def test_delete_aggregate_invalidates_aggregates_metadata(self):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                     metadata={'k1': '1'})
+        self.host_manager.update_aggregates([fake_agg])
+        self.host_manager._get_aggregates_metadata('fake-host')
+
+        self.host_manager.delete_aggregate(fake_agg)
+
+        index = self.host_manager._get_aggregates_metadata('fake-host')
+        self.assertEqual([], index.aggregates)
+
     def test_choose_host_filters_not_found(self):
         self.assertRaises(exception.SchedulerHostFilterNotFound,
                           self.host_manager._choose_host_filters,
@@ -584,6 +636,8 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.host_manager.get_all_host_states('fake-context')
         host_state = self.host_manager.host_state_map[('fake', 'fake')]
         self.assertEqual([fake_agg], host_state.aggregates)
+        self.assertIs(host_state.aggregates,
+                      host_state.aggregates_metadata.aggregates)
 
     @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
     @mock.patch.object(host_manager.HostState, '_update_from_compute_node')
@@ -875,6 +929,39 @@ class HostManagerTestCase(test.NoDBTestCase):
                 'fake_context', host_name)
         self.assertFalse(new_info['updated'])
 
+    def _test_sync_instance_info_checksum(self, instance_uuids):
+        self.host_manager._recreate_instance_info = mock.MagicMock()
+        host_name = 'fake_host'
+        inst1 = fake_instance.fake_instance_obj('fake_context',
+                                                uuid=uuids.instance_1,
+                                                host=host_name)
+        inst2 = fake_instance.fake_instance_obj('fake_context',
+                                                uuid=uuids.instance_2,
+                                                host=host_name)
+        self.host_manager._instance_info = {
+                host_name: {
+                    'instances': {inst1.uuid: inst1, inst2.uuid: inst2},
+                    'updated': False,
+                }}
+        checksum = scheduler_utils.instance_uuids_checksum(instance_uuids)
+        self.host_manager.sync_instance_info('fake_context', host_name,
+                                             checksum=checksum)
+        return self.host_manager._instance_info[host_name]
+
+    def test_sync_instance_info_checksum(self):
+        new_info = self._test_sync_instance_info_checksum(
+            [uuids.instance_2, uuids.instance_1])
+        self.assertFalse(self.host_manager._recreate_instance_info.called)
+        self.assertTrue(new_info['updated'])
+        self.assertEqual(1, self.host_manager.instance_info_stats['sync'])
+
+    def test_sync_instance_info_checksum_fail(self):
+        new_info = self._test_sync_instance_info_checksum(
+            [uuids.instance_2])
+        self.host_manager._recreate_instance_info.assert_called_once_with(
+                'fake_context', 'fake_host')
+        self.assertFalse(new_info['updated'])
+
     @mock.patch('nova.objects.CellMappingList.get_all')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
     @mock.patch('nova.objects.ServiceList.get_by_binary')
@@ -906,7 +993,7 @@ class HostManagerTestCase(test.NoDBTestCase):
 
     @mock.patch('nova.objects.CellMappingList.get_all')
     @mock.patch('nova.objects.ComputeNodeList.get_all_by_uuids')
-    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ServiceList.get_by_hosts_and_binary')
     def test_get_computes_for_cells_uuid(self, mock_sl, mock_cn, mock_cm):
         cells = [
             objects.CellMapping(uuid=uuids.cell1,
@@ -918,21 +1005,77 @@ class HostManagerTestCase(test.NoDBTestCase):
         ]
         mock_cm.return_value = cells
         mock_sl.side_effect = [
-            [objects.ServiceList(host='foo')],
-            [objects.ServiceList(host='bar')],
+            [objects.Service(host='foo')],
+            [objects.Service(host='bar')],
         ]
         mock_cn.side_effect = [
-            [objects.ComputeNode(host='foo')],
-            [objects.ComputeNode(host='bar')],
+            [objects.ComputeNode(host='foo', uuid=uuids.cn1)],
+            [objects.ComputeNode(host='bar', uuid=uuids.cn2)],
         ]
         context = nova_context.RequestContext('fake', 'fake')
-        cns, srv = self.host_manager._get_computes_for_cells(context, cells,
-                                                             [])
+        cns, srv = self.host_manager._get_computes_for_cells(
+            context, cells, [uuids.cn1, uuids.cn2])
         self.assertEqual({uuids.cell1: ['foo'],
                           uuids.cell2: ['bar']},
                          {cell: [cn.host for cn in computes]
                           for cell, computes in cns.items()})
         self.assertEqual(['bar', 'foo'], sorted(list(srv.keys())))
+        # Only the services of the hosts of the candidates are loaded, and
+        # the second cell is only asked for the candidates not found yet
+        mock_sl.assert_has_calls([
+            mock.call(mock.ANY, {'foo'}, 'nova-compute',
+                      include_disabled=True),
+            mock.call(mock.ANY, {'bar'}, 'nova-compute',
+                      include_disabled=True)])
+        self.assertEqual([uuids.cn2], mock_cn.call_args_list[1][0][1])
+
+    @mock.patch('nova.objects.ComputeNodeList.get_all_by_uuids')
+    @mock.patch('nova.objects.ServiceList.get_by_hosts_and_binary')
+    def test_get_computes_for_cells_uuid_skips_cells(self, mock_sl, mock_cn):
+        cells = [
+            objects.CellMapping(uuid=uuids.cell1,
+                                db_connection='none://1',
+                                transport_url='none://'),
+            objects.CellMapping(uuid=uuids.cell2,
+                                db_connection='none://2',
+                                transport_url='none://'),
+            objects.CellMapping(uuid=uuids.cell3,
+                                db_connection='none://3',
+                                transport_url='none://'),
+        ]
+        mock_sl.return_value = [objects.Service(host='foo')]
+        mock_cn.side_effect = [
+            [],
+            [objects.ComputeNode(host='foo', uuid=uuids.cn1)],
+        ]
+        context = nova_context.RequestContext('fake', 'fake')
+        cns, srv = self.host_manager._get_computes_for_cells(
+            context, cells, [uuids.cn1])
+        self.assertEqual({uuids.cell2: ['foo']},
+                         {cell: [cn.host for cn in computes]
+                          for cell, computes in cns.items()})
+        self.assertEqual(['foo'], list(srv.keys()))
+        # The services are not loaded from the cell without candidates, and
+        # nothing is loaded from the cell after all the candidates were found
+        self.assertEqual(2, mock_cn.call_count)
+        mock_sl.assert_called_once_with(mock.ANY, {'foo'}, 'nova-compute',
+                                        include_disabled=True)
+
+    @mock.patch('nova.objects.ComputeNodeList.get_all_by_uuids')
+    @mock.patch('nova.objects.ServiceList.get_by_hosts_and_binary')
+    def test_get_computes_for_cells_no_uuids(self, mock_sl, mock_cn):
+        cells = [
+            objects.CellMapping(uuid=uuids.cell1,
+                                db_connection='none://1',
+                                transport_url='none://'),
+        ]
+        context = nova_context.RequestContext('fake', 'fake')
+        cns, srv = self.host_manager._get_computes_for_cells(context, cells,
+                                                             [])
+        self.assertEqual({}, cns)
+        self.assertEqual({}, srv)
+        mock_cn.assert_not_called()
+        mock_sl.assert_not_called()
 
     @mock.patch('nova.context.target_cell')
     @mock.patch('nova.objects.CellMappingList.get_all')
@@ -1237,6 +1380,27 @@ class HostStateTestCase(test.NoDBTestCase):
         self.assertEqual(second_host_numa_topology, host.numa_topology)
         self.assertIsNotNone(host.updated)
 
+    def test_copy_consumed(self):
+        spec_obj = objects.RequestSpec(
+            instance_uuid=uuids.instance,
+            flavor=objects.Flavor(root_gb=1, ephemeral_gb=0, memory_mb=512,
+                                  vcpus=1),
+            numa_topology=None,
+            pci_requests=None)
+        host = host_manager.HostState("fakehost", "fakenode", uuids.cell)
+        host.free_ram_mb = 2048
+        host.pci_stats = pci_stats.PciDeviceStats()
+
+        host_copy = host.copy()
+        host_copy.consume_from_request(spec_obj)
+
+        self.assertEqual("fakehost", host_copy.host)
+        self.assertEqual(1536, host_copy.free_ram_mb)
+        self.assertEqual(1, host_copy.num_instances)
+        self.assertEqual(2048, host.free_ram_mb)
+        self.assertEqual(0, host.num_instances)
+        self.assertIsNot(host.pci_stats, host_copy.pci_stats)
+
     def test_stat_consumption_from_instance_pci(self):
 
         inst_topology = objects.InstanceNUMATopology(
@@ -22,6 +22,7 @@ from oslo_config import cfg
 from nova import context
 from nova import objects
 from nova.scheduler import rpcapi as scheduler_rpcapi
+from nova.scheduler import utils as scheduler_utils
 from nova import test
 from nova.tests import uuidsentinel as uuids
 
@@ -129,6 +130,18 @@ class SchedulerRpcAPITestCase(test.NoDBTestCase):
                 version='4.2')
 
     def test_sync_instance_info(self):
+        self._test_scheduler_api('sync_instance_info', rpc_method='cast',
+                expected_args={'host_name': 'fake_host',
+                               'checksum': scheduler_utils.
+                                   instance_uuids_checksum(['fake1',
+                                                            'fake2'])},
+                host_name='fake_host',
+                instance_uuids=['fake1', 'fake2'],
+                fanout=True,
+                version='4.5')
+
+    def test_sync_instance_info_4_2(self):
+        self.flags(scheduler='4.2', group='upgrade_levels')
         self._test_scheduler_api('sync_instance_info', rpc_method='cast',
                 host_name='fake_host',
                 instance_uuids=['fake1', 'fake2'],
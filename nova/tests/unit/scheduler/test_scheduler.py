@@ -29,6 +29,7 @@ from nova.scheduler import filter_scheduler
 from nova.scheduler import host_manager
 from nova.scheduler import ironic_host_manager
 from nova.scheduler import manager
+from nova.scheduler import stats as scheduler_stats
 from nova import servicegroup
 from nova import test
 from nova.tests.unit import fake_server_actions
@@ -125,6 +126,24 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                 mock.sentinel.p_sums)
             mock_get_ac.assert_called_once_with(mock_rfrs.return_value)
 
+    @mock.patch('nova.scheduler.stats.STATS.add_trace')
+    @mock.patch('nova.scheduler.utils.resources_from_request_spec')
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocation_candidates')
+    def test_select_destination_traced(self, mock_get_ac, mock_rfrs,
+                                       mock_add_trace):
+        self.flags(trace_sample_rate=1.0, group='scheduler')
+        fake_spec = objects.RequestSpec()
+        fake_spec.instance_uuid = uuids.instance
+        mock_get_ac.return_value = (fakes.ALLOC_REQS, mock.sentinel.p_sums)
+        with mock.patch.object(self.manager.driver, 'select_destinations'):
+            self.manager.select_destinations(None, spec_obj=fake_spec,
+                    instance_uuids=[fake_spec.instance_uuid])
+        trace = mock_add_trace.call_args[0][0]
+        self.assertEqual(['placement', 'select_destinations'],
+                         [step[0] for step in trace.steps])
+        self.assertIsNone(scheduler_stats.get_trace())
+
     @mock.patch('nova.scheduler.utils.resources_from_request_spec')
     @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
                 'get_allocation_candidates')
@@ -254,7 +273,19 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                                             mock.sentinel.instance_uuids)
             mock_sync.assert_called_once_with(mock.sentinel.context,
                                               mock.sentinel.host_name,
-                                              mock.sentinel.instance_uuids)
+                                              mock.sentinel.instance_uuids,
+                                              checksum=None)
+
+    def test_sync_instance_info_checksum(self):
+        with mock.patch.object(self.manager.driver.host_manager,
+                               'sync_instance_info') as mock_sync:
+            self.manager.sync_instance_info(mock.sentinel.context,
+                                            mock.sentinel.host_name,
+                                            checksum=mock.sentinel.checksum)
+            mock_sync.assert_called_once_with(mock.sentinel.context,
+                                              mock.sentinel.host_name,
+                                              None,
+                                              checksum=mock.sentinel.checksum)
 
     @mock.patch('nova.objects.host_mapping.discover_hosts')
     def test_discover_hosts(self, mock_discover):
@@ -400,3 +400,13 @@ class SchedulerUtilsTestCase(test.NoDBTestCase):
         self.assertRaises(exception.NoValidHost,
                           scheduler_utils.setup_instance_group,
                           self.context, spec)
+
+    def test_instance_uuids_checksum(self):
+        checksum = scheduler_utils.instance_uuids_checksum(
+            [uuids.instance_1, uuids.instance_2])
+        self.assertEqual(checksum, scheduler_utils.instance_uuids_checksum(
+            [uuids.instance_2, uuids.instance_1]))
+        self.assertNotEqual(checksum, scheduler_utils.instance_uuids_checksum(
+            [uuids.instance_1]))
+        self.assertNotEqual(checksum, scheduler_utils.instance_uuids_checksum(
+            []))
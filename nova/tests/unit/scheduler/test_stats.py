@@ -0,0 +1,69 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import fixtures
+import mock
+
+from nova.scheduler import stats
+from nova import test
+
+
+class TraceTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(TraceTestCase, self).setUp()
+        self.addCleanup(stats.end_trace)
+        self.stats = stats.SchedulingStats()
+        self.useFixture(fixtures.MockPatchObject(stats, 'STATS', self.stats))
+
+    def test_start_trace_not_sampled(self):
+        self.assertIsNone(stats.start_trace())
+        self.assertIsNone(stats.get_trace())
+        with stats.timed('step'):
+            pass
+        stats.end_trace()
+        self.assertEqual({'sampled_requests': 0, 'steps': {}},
+                         self.stats.get_stats())
+
+    @mock.patch('random.random', return_value=0.2)
+    def test_start_trace_sampling(self, mock_random):
+        self.flags(trace_sample_rate=0.1, group='scheduler')
+        self.assertIsNone(stats.start_trace())
+        self.flags(trace_sample_rate=0.3, group='scheduler')
+        self.assertIsNotNone(stats.start_trace())
+
+    def test_trace(self):
+        self.flags(trace_sample_rate=1.0, group='scheduler')
+        trace = stats.start_trace()
+        self.assertIs(trace, stats.get_trace())
+        with stats.timed('step'):
+            pass
+        trace.add('filter', 0.002, 10, 4)
+        stats.end_trace()
+
+        self.assertIsNone(stats.get_trace())
+        result = self.stats.get_stats()
+        self.assertEqual(1, result['sampled_requests'])
+        self.assertEqual(1, result['steps']['step']['count'])
+        self.assertNotIn('hosts_in', result['steps']['step'])
+        self.assertEqual(10, result['steps']['filter']['hosts_in'])
+        self.assertEqual(4, result['steps']['filter']['hosts_out'])
+
+    def test_timed_records_failed_step(self):
+        self.flags(trace_sample_rate=1.0, group='scheduler')
+        trace = stats.start_trace()
+
+        def fail():
+            with stats.timed('step'):
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(['step'], [step[0] for step in trace.steps])
@@ -16,10 +16,12 @@
 """Unit Tests for network code."""
 
 import mock
+from oslo_concurrency.fixture import lockutils as lock_fixture
 import six
 
 from nova.network import linux_net
 from nova import test
+from nova.tests.unit import fake_iptables
 
 
 class IptablesManagerTestCase(test.NoDBTestCase):
@@ -274,3 +276,105 @@ class IptablesManagerTestCase(test.NoDBTestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def test_remove_unwrapped_rules_and_chains(self):
+        table = self.manager.ipv4['filter']
+        table.add_chain('shared', wrap=False)
+        table.add_rule('shared', '-s 1.2.3.4 -j DROP', wrap=False)
+        table.add_rule('FORWARD', '-j shared', wrap=False)
+        current_lines = self.manager._modify_rules(self.sample_filter,
+                                                   table, 'filter')
+        self.assertIn(':shared - [0:0]', current_lines)
+        # The rules restored by iptables-save have non-zero counts
+        current_lines = [line.replace('[0:0] -A shared', '[12:34] -A shared')
+                         for line in current_lines]
+
+        table.remove_chain('shared', wrap=False)
+        new_lines = self.manager._modify_rules(current_lines, table,
+                                               'filter')
+        self.assertNotIn(':shared - [0:0]', new_lines)
+        self.assertNotIn('[12:34] -A shared -s 1.2.3.4 -j DROP', new_lines)
+        self.assertNotIn('[0:0] -A FORWARD -j shared', new_lines)
+        self.assertEqual(set(), table.remove_chains)
+        self.assertEqual([], table.remove_rules)
+
+    def test_top_rules_keep_counts(self):
+        current_lines = list(self.sample_filter)
+        current_lines[12] = '[5:10] -A FORWARD -j nova-filter-top'
+        new_lines = self.manager._modify_rules(current_lines,
+                                               self.manager.ipv4['filter'],
+                                               'filter')
+        self.assertIn('[5:10] -A FORWARD -j nova-filter-top', new_lines)
+        self.assertNotIn('[0:0] -A FORWARD -j nova-filter-top', new_lines)
+
+
+class IptablesManagerApplyTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(IptablesManagerApplyTestCase, self).setUp()
+        self.useFixture(lock_fixture.ExternalLockFixture())
+        self.flags(use_ipv6=False)
+        self.execute = fake_iptables.FakeIptables()
+        self.manager = linux_net.IptablesManager(execute=self.execute)
+        self.table = self.manager.ipv4['filter']
+        self.table.add_chain('inst-1')
+        self.table.add_chain('inst-2')
+        self.table.add_rule('inst-1', '-p tcp --dport 22 -j ACCEPT')
+        self.table.add_rule('inst-2', '-p tcp --dport 80 -j ACCEPT')
+        self.manager.apply()
+        self.assertEqual([('iptables-restore', '-c')],
+                         [cmd for cmd, lines in self.execute.calls])
+        self.execute.calls = []
+
+    def _wrap(self, chain):
+        return '%s-%s' % (linux_net.binary_name, chain)
+
+    def test_apply_changed_chain(self):
+        self.table.empty_chain('inst-1')
+        self.table.add_rule('inst-1', '-p tcp --dport 443 -j ACCEPT')
+        self.manager.apply()
+
+        self.assertEqual(
+            [(('iptables-restore', '-c', '--noflush'),
+              ['*filter',
+               ':%s - [0:0]' % self._wrap('inst-1'),
+               '[0:0] -A %s -p tcp --dport 443 -j ACCEPT' % self._wrap(
+                   'inst-1'),
+               'COMMIT',
+               ''])],
+            self.execute.calls)
+
+    def test_apply_removed_chain(self):
+        self.table.remove_chain('inst-2')
+        self.manager.apply()
+
+        self.assertEqual(1, len(self.execute.calls))
+        cmd, lines = self.execute.calls[0]
+        self.assertEqual(('iptables-restore', '-c'), cmd)
+        self.assertNotIn(':%s - [0:0]' % self._wrap('inst-2'), lines)
+
+    def test_apply_changed_unwrapped_rule(self):
+        self.table.add_rule('nova-filter-top', '-s 1.2.3.4 -j DROP',
+                            wrap=False)
+        self.manager.apply()
+
+        self.assertEqual(1, len(self.execute.calls))
+        cmd, lines = self.execute.calls[0]
+        self.assertEqual(('iptables-restore', '-c'), cmd)
+        self.assertIn('[0:0] -A nova-filter-top -s 1.2.3.4 -j DROP', lines)
+
+    def test_apply_unchanged(self):
+        self.table.add_rule('inst-1', '-p tcp --dport 443 -j ACCEPT')
+        self.table.remove_rule('inst-1', '-p tcp --dport 443 -j ACCEPT')
+        self.assertTrue(self.manager.dirty())
+        self.manager.apply()
+
+        self.assertEqual([], self.execute.calls)
+
+    def test_apply_not_differential(self):
+        self.flags(iptables_differential_apply=False)
+        self.table.empty_chain('inst-1')
+        self.manager.apply()
+
+        self.assertEqual([('iptables-restore', '-c')],
+                         [cmd for cmd, lines in self.execute.calls])
@@ -435,8 +435,10 @@ class MetadataTestCase(test.TestCase):
         network_info = []
         mock_get.return_value = False
 
-        base.InstanceMetadata(fake_inst_obj(self.context),
-                              network_info=network_info)
+        md = base.InstanceMetadata(fake_inst_obj(self.context),
+                                   network_info=network_info)
+        mock_get.assert_not_called()
+        self.assertIsNone(md.network_config)
         mock_get.assert_called_once_with(network_info)
 
     @mock.patch.object(netutils, "get_network_metadata", autospec=True)
@@ -447,6 +449,64 @@ class MetadataTestCase(test.TestCase):
         md = base.InstanceMetadata(fake_inst_obj(self.context))
         self.assertEqual(network_data, md.network_metadata)
 
+    @mock.patch.object(base, '_format_instance_mapping')
+    def test_InstanceMetadata_builds_sections_on_first_access(
+            self, mock_mapping):
+        mock_mapping.return_value = {}
+        md = fake_InstanceMetadata(self, self.instance.obj_clone())
+        secgroup_api = mock.Mock()
+        secgroup_api.get_instance_security_groups.return_value = [
+            {'name': 'default'}]
+
+        with mock.patch('nova.network.security_group.openstack_driver.'
+                        'get_openstack_security_group_driver',
+                        return_value=secgroup_api):
+            md.lookup('/openstack/latest/meta_data.json')
+            secgroup_api.get_instance_security_groups.assert_not_called()
+            mock_mapping.assert_not_called()
+            self.assertNotIn('vendordata_providers', md._sections)
+
+            count = base.section_timings['security_groups'].count
+            for i in range(2):
+                data = md.get_ec2_metadata(version='2009-04-04')
+                self.assertEqual(['default'],
+                                 data['meta-data']['security-groups'])
+
+        self.assertEqual(
+            1, secgroup_api.get_instance_security_groups.call_count)
+        mock_mapping.assert_called_once_with(mock.ANY, md.instance)
+        self.assertEqual(count + 1,
+                         base.section_timings['security_groups'].count)
+
+    @mock.patch.object(netutils, 'get_network_metadata')
+    def test_InstanceMetadata_reuses_network_sections(self, mock_get):
+        mock_get.return_value = {'links': [], 'networks': [], 'services': []}
+        nw_info = fake_network.fake_get_instance_nw_info(self,
+                                                         num_networks=2)
+        for i in range(2):
+            md = base.InstanceMetadata(self.instance.obj_clone(),
+                                       network_info=nw_info)
+            self.assertEqual(mock_get.return_value, md.network_metadata)
+        mock_get.assert_called_once_with(nw_info)
+
+        # The network info of the instance changed
+        md = base.InstanceMetadata(
+            self.instance.obj_clone(),
+            network_info=fake_network.fake_get_instance_nw_info(
+                self, num_networks=1))
+        md.network_metadata
+        self.assertEqual(2, mock_get.call_count)
+
+    def test_network_section_cache_evicts_least_recently_used(self):
+        cache = base.NetworkSectionCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
     def test_InstanceMetadata_invoke_metadata_for_config_drive(self):
         fakes.stub_out_key_pair_funcs(self)
         inst = self.instance.obj_clone()
@@ -498,7 +558,8 @@ class MetadataTestCase(test.TestCase):
         network_info_from_api = []
 
         mock_get.return_value = False
-        base.InstanceMetadata(fake_inst_obj(self.context))
+        md = base.InstanceMetadata(fake_inst_obj(self.context))
+        self.assertEqual({}, md.content)
         mock_get.assert_called_once_with(network_info_from_api)
 
     def test_local_ipv4(self):
@@ -1386,6 +1447,28 @@ class MetadataHandlerTestCase(test.TestCase):
         self._metadata_handler_with_instance_id(hnd)
         self.assertEqual(2, get_by_uuid.call_count)
 
+    @mock.patch.object(base, 'get_metadata_by_address')
+    def test_metadata_handler_caches_built_sections(self, get_by_address):
+        get_by_address.return_value = self.mdinst
+        self.flags(metadata_cache_expiration=15, group='api')
+        hnd = handler.MetadataRequestHandler()
+        cached = []
+        hnd._cache = mock.Mock()
+        hnd._cache.get.return_value = None
+        hnd._cache.set.side_effect = lambda key, data: cached.append(
+            (key, set(data._sections)))
+
+        response = fake_request(
+            None, self.mdinst,
+            relpath="/2009-04-04/meta-data/security-groups",
+            address="192.192.192.2", fake_get_metadata=False, app=hnd)
+
+        self.assertEqual(200, response.status_int)
+        # The metadata is cached with the sections built by the request
+        self.assertEqual([('metadata-192.192.192.2',
+                           {'security_groups', 'mappings',
+                            'network_sections'})], cached)
+
     def _metadata_handler_with_remote_address(self, hnd):
         response = fake_request(
             None, self.mdinst,
@@ -13,12 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import sys
 
 import ddt
 import fixtures
 import mock
 from oslo_db import exception as db_exc
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 from six.moves import StringIO
 
@@ -405,20 +407,24 @@ class DBCommandsTestCase(test.NoDBTestCase):
         large_number = '1' * 100
         self.assertEqual(2, self.commands.archive_deleted_rows(large_number))
 
-    @mock.patch.object(db, 'archive_deleted_rows',
-                       return_value=dict(instances=10, consoles=5))
+    @mock.patch.object(db, 'archive_deleted_rows')
     def _test_archive_deleted_rows(self, mock_db_archive, verbose=False):
+        def fake_archive(max_rows, elapsed):
+            elapsed.update(instances=2.0, consoles=0.5)
+            return dict(instances=10, consoles=5)
+
+        mock_db_archive.side_effect = fake_archive
         result = self.commands.archive_deleted_rows(20, verbose=verbose)
-        mock_db_archive.assert_called_once_with(20)
+        mock_db_archive.assert_called_once_with(20, elapsed=mock.ANY)
         output = self.output.getvalue()
         if verbose:
             expected = '''\
-+-----------+-------------------------+
-| Table     | Number of Rows Archived |
-+-----------+-------------------------+
-| consoles  | 5                       |
-| instances | 10                      |
-+-----------+-------------------------+
++-----------+-------------------------+-----------------+
+| Table     | Number of Rows Archived | Rows per Second |
++-----------+-------------------------+-----------------+
+| consoles  | 5                       | 10              |
+| instances | 10                      | 5               |
++-----------+-------------------------+-----------------+
 '''
             self.assertEqual(expected, output)
         else:
@@ -446,21 +452,21 @@ class DBCommandsTestCase(test.NoDBTestCase):
         if verbose:
             expected = """\
 Archiving.....complete
-+-----------------+-------------------------+
-| Table           | Number of Rows Archived |
-+-----------------+-------------------------+
-| instance_extra  | 5                       |
-| instance_faults | 1                       |
-| instances       | 15                      |
-+-----------------+-------------------------+
++-----------------+-------------------------+-----------------+
+| Table           | Number of Rows Archived | Rows per Second |
++-----------------+-------------------------+-----------------+
+| instance_extra  | 5                       | -               |
+| instance_faults | 1                       | -               |
+| instances       | 15                      | -               |
++-----------------+-------------------------+-----------------+
 """
         else:
             expected = ''
 
         self.assertEqual(expected, self.output.getvalue())
-        mock_db_archive.assert_has_calls([mock.call(20),
-                                          mock.call(20),
-                                          mock.call(20)])
+        mock_db_archive.assert_has_calls([mock.call(20, elapsed=mock.ANY),
+                                          mock.call(20, elapsed=mock.ANY),
+                                          mock.call(20, elapsed=mock.ANY)])
 
     def test_archive_deleted_rows_until_complete_quiet(self):
         self.test_archive_deleted_rows_until_complete(verbose=False)
@@ -478,21 +484,21 @@ Archiving.....complete
         if verbose:
             expected = """\
 Archiving.....stopped
-+-----------------+-------------------------+
-| Table           | Number of Rows Archived |
-+-----------------+-------------------------+
-| instance_extra  | 5                       |
-| instance_faults | 1                       |
-| instances       | 15                      |
-+-----------------+-------------------------+
++-----------------+-------------------------+-----------------+
+| Table           | Number of Rows Archived | Rows per Second |
++-----------------+-------------------------+-----------------+
+| instance_extra  | 5                       | -               |
+| instance_faults | 1                       | -               |
+| instances       | 15                      | -               |
++-----------------+-------------------------+-----------------+
 """
         else:
             expected = ''
 
         self.assertEqual(expected, self.output.getvalue())
-        mock_db_archive.assert_has_calls([mock.call(20),
-                                          mock.call(20),
-                                          mock.call(20)])
+        mock_db_archive.assert_has_calls([mock.call(20, elapsed=mock.ANY),
+                                          mock.call(20, elapsed=mock.ANY),
+                                          mock.call(20, elapsed=mock.ANY)])
 
     def test_archive_deleted_rows_until_stopped_quiet(self):
         self.test_archive_deleted_rows_until_stopped(verbose=False)
@@ -500,11 +506,98 @@ Archiving.....stopped
     @mock.patch.object(db, 'archive_deleted_rows', return_value={})
     def test_archive_deleted_rows_verbose_no_results(self, mock_db_archive):
         result = self.commands.archive_deleted_rows(20, verbose=True)
-        mock_db_archive.assert_called_once_with(20)
+        mock_db_archive.assert_called_once_with(20, elapsed=mock.ANY)
         output = self.output.getvalue()
         self.assertIn('Nothing was archived.', output)
         self.assertEqual(0, result)
 
+    def test_purge_invalid_arguments(self):
+        self.assertEqual(2, self.commands.purge())
+        self.assertEqual(2, self.commands.purge(before='2017-01-01',
+                                                purge_all=True))
+        self.assertEqual(2, self.commands.purge(before='yesterday'))
+        self.assertIn('Invalid value for --before', self.output.getvalue())
+        self.assertEqual(2, self.commands.purge(purge_all=True, max_rows=0))
+        self.assertEqual(2, self.commands.purge(purge_all=True,
+                                                max_rows='1' * 100))
+
+    @mock.patch.object(db, 'purge_shadow_tables')
+    def test_purge_before(self, mock_purge):
+        def fake_purge(before, max_rows, elapsed):
+            elapsed['shadow_instances'] = 0.002
+            return {'shadow_instances': 3, 'shadow_consoles': 1}
+
+        mock_purge.side_effect = fake_purge
+        result = self.commands.purge(before='2017-12-31T12:00:00+01:00',
+                                     max_rows=10, verbose=True)
+        self.assertEqual(1, result)
+        mock_purge.assert_called_once_with(
+            before=datetime.datetime(2017, 12, 31, 11, 0, 0), max_rows=10,
+            elapsed=mock.ANY)
+        expected = '''\
++------------------+-----------------------+-----------------+
+| Table            | Number of Rows Purged | Rows per Second |
++------------------+-----------------------+-----------------+
+| shadow_consoles  | 1                     | -               |
+| shadow_instances | 3                     | 1500            |
++------------------+-----------------------+-----------------+
+'''
+        self.assertEqual(expected, self.output.getvalue())
+
+    @mock.patch.object(db, 'purge_shadow_tables', return_value={})
+    def test_purge_all_nothing_purged(self, mock_purge):
+        result = self.commands.purge(purge_all=True, verbose=True)
+        self.assertEqual(0, result)
+        mock_purge.assert_called_once_with(before=None, max_rows=1000,
+                                           elapsed=mock.ANY)
+        self.assertIn('Nothing was purged.', self.output.getvalue())
+
+    def test_rollup_usage_invalid_arguments(self):
+        self.assertEqual(2, self.commands.rollup_usage(max_days=0))
+        self.assertEqual(2, self.commands.rollup_usage(start='yesterday'))
+        self.assertIn('Invalid value for --start', self.output.getvalue())
+
+    @mock.patch.object(objects.InstanceUsageRollupList, 'rollup_day')
+    @mock.patch.object(db, 'instance_usage_rollup_get_last_period_start',
+                       return_value=datetime.datetime(2017, 1, 1))
+    def test_rollup_usage_resumes(self, mock_last, mock_rollup):
+        mock_rollup.return_value = [objects.InstanceUsageRollup(
+            project_id=None, instances=3, hours=42.0)]
+        with mock.patch.object(timeutils, 'utcnow',
+                               return_value=datetime.datetime(2017, 1, 4, 1)):
+            result = self.commands.rollup_usage(verbose=True)
+        self.assertEqual(1, result)
+        self.assertEqual([datetime.datetime(2017, 1, 2),
+                          datetime.datetime(2017, 1, 3)],
+                         [c[0][1] for c in mock_rollup.call_args_list])
+        self.assertIn('2017-01-03: 3 instances, 42.00 hours',
+                      self.output.getvalue())
+
+    @mock.patch.object(objects.InstanceUsageRollupList, 'rollup_day')
+    @mock.patch.object(db, 'instance_get_earliest_launched_at',
+                       return_value=datetime.datetime(2017, 1, 1, 12))
+    @mock.patch.object(db, 'instance_usage_rollup_get_last_period_start',
+                       return_value=None)
+    def test_rollup_usage_first_run(self, mock_last, mock_earliest,
+                                    mock_rollup):
+        with mock.patch.object(timeutils, 'utcnow',
+                               return_value=datetime.datetime(2017, 2, 1)):
+            result = self.commands.rollup_usage(max_days=2)
+        self.assertEqual(1, result)
+        self.assertEqual([datetime.datetime(2017, 1, 1),
+                          datetime.datetime(2017, 1, 2)],
+                         [c[0][1] for c in mock_rollup.call_args_list])
+
+    @mock.patch.object(objects.InstanceUsageRollupList, 'rollup_day')
+    def test_rollup_usage_nothing_to_roll_up(self, mock_rollup):
+        with mock.patch.object(timeutils, 'utcnow',
+                               return_value=datetime.datetime(2017, 1, 2, 1)):
+            result = self.commands.rollup_usage(start='2017-01-02',
+                                                verbose=True)
+        self.assertEqual(0, result)
+        self.assertFalse(mock_rollup.called)
+        self.assertIn('Nothing to roll up.', self.output.getvalue())
+
     @mock.patch.object(migration, 'db_null_instance_uuid_scan',
                        return_value={'foo': 0})
     def test_null_instance_uuid_scan_no_records_found(self, mock_scan):
@@ -13,6 +13,7 @@
 #    under the License.
 import copy
 
+import eventlet
 import fixtures
 import mock
 import oslo_messaging as messaging
@@ -30,6 +31,8 @@ class RPCResetFixture(fixtures.Fixture):
         self.trans = copy.copy(rpc.TRANSPORT)
         self.noti_trans = copy.copy(rpc.NOTIFICATION_TRANSPORT)
         self.noti = copy.copy(rpc.NOTIFIER)
+        self.noti_queue = rpc.NOTIFICATION_QUEUE
+        self.noti_queue_reported = rpc._NOTIFICATION_QUEUE_REPORTED
         self.all_mods = copy.copy(rpc.ALLOWED_EXMODS)
         self.ext_mods = copy.copy(rpc.EXTRA_EXMODS)
         self.conf = copy.copy(rpc.CONF)
@@ -39,6 +42,8 @@ class RPCResetFixture(fixtures.Fixture):
         rpc.TRANSPORT = self.trans
         rpc.NOTIFICATION_TRANSPORT = self.noti_trans
         rpc.NOTIFIER = self.noti
+        rpc.NOTIFICATION_QUEUE = self.noti_queue
+        rpc._NOTIFICATION_QUEUE_REPORTED = self.noti_queue_reported
         rpc.ALLOWED_EXMODS = self.all_mods
         rpc.EXTRA_EXMODS = self.ext_mods
         rpc.CONF = self.conf
@@ -138,6 +143,19 @@ class TestRPC(test.NoDBTestCase):
         not_trans_cleanup.assert_called_once_with()
         self.assertIsNone(rpc.TRANSPORT)
         self.assertIsNone(rpc.NOTIFICATION_TRANSPORT)
+
+    def test_cleanup_flushes_notification_queue(self):
+        rpc.LEGACY_NOTIFIER = mock.Mock()
+        rpc.NOTIFIER = mock.Mock()
+        rpc.NOTIFICATION_TRANSPORT = mock.Mock()
+        rpc.TRANSPORT = mock.Mock()
+        queue = mock.Mock()
+        rpc.NOTIFICATION_QUEUE = queue
+
+        rpc.cleanup()
+
+        queue.flush.assert_called_once_with()
+        self.assertIsNone(rpc.NOTIFICATION_QUEUE)
         self.assertIsNone(rpc.LEGACY_NOTIFIER)
         self.assertIsNone(rpc.NOTIFIER)
 
@@ -304,6 +322,74 @@ class TestRPC(test.NoDBTestCase):
         mock_prep.assert_called_once_with(publisher_id='service.foo')
         self.assertEqual('notifier', notifier)
 
+    def test_get_notifier_async(self):
+        rpc.LEGACY_NOTIFIER = mock.Mock()
+        rpc.NOTIFICATION_QUEUE = mock.sentinel.queue
+
+        notifier = rpc.get_notifier('service', publisher_id='foo')
+
+        self.assertIsInstance(notifier, rpc.LegacyValidatingNotifier)
+        self.assertIsInstance(notifier.notifier, rpc.AsyncNotifier)
+        self.assertEqual(rpc.LEGACY_NOTIFIER.prepare.return_value,
+                         notifier.notifier.notifier)
+        self.assertEqual(mock.sentinel.queue, notifier.notifier.queue)
+
+    def test_get_versioned_notifier_async(self):
+        rpc.NOTIFIER = mock.Mock()
+        rpc.NOTIFICATION_QUEUE = mock.sentinel.queue
+
+        notifier = rpc.get_versioned_notifier('service.foo')
+
+        self.assertIsInstance(notifier, rpc.AsyncNotifier)
+        self.assertEqual(rpc.NOTIFIER.prepare.return_value, notifier.notifier)
+
+    @mock.patch.object(rpc.gmr.TextGuruMeditation, 'register_section')
+    @mock.patch.object(messaging, 'Notifier')
+    @mock.patch.object(messaging, 'get_notification_transport')
+    @mock.patch.object(rpc, 'create_transport')
+    @mock.patch.object(rpc, 'get_transport_url')
+    def test_init_async(self, mock_url, mock_trans, mock_noti_trans,
+                        mock_notif, mock_register):
+        self.flags(async_emit=True, async_queue_size=10,
+                   async_queue_overflow='drop', async_batch_size=5,
+                   group='notifications')
+        rpc._NOTIFICATION_QUEUE_REPORTED = False
+
+        rpc.init(rpc.CONF)
+
+        queue = rpc.NOTIFICATION_QUEUE
+        self.assertIsInstance(queue, rpc.NotificationQueue)
+        self.assertEqual(10, queue.size)
+        self.assertEqual('drop', queue.overflow)
+        self.assertEqual(5, queue.batch_size)
+        self.assertEqual(queue.get_stats(),
+                         rpc.report_notification_queue().data)
+
+        # The section is only registered once, and reports the new queue
+        rpc.init(rpc.CONF)
+
+        mock_register.assert_called_once_with('Notification Queue',
+                                              rpc.report_notification_queue)
+        self.assertIsNot(queue, rpc.NOTIFICATION_QUEUE)
+        rpc.NOTIFICATION_QUEUE.dropped = 1
+        self.assertEqual(1, rpc.report_notification_queue().data['dropped'])
+
+    def test_report_notification_queue_disabled(self):
+        rpc.NOTIFICATION_QUEUE = None
+        self.assertEqual({}, rpc.report_notification_queue().data)
+
+    def test_send_notification(self):
+        send = mock.Mock()
+        rpc.send_notification(send, 1, foo='bar')
+        send.assert_called_once_with(1, foo='bar')
+
+    def test_send_notification_async(self):
+        send = mock.Mock()
+        rpc.NOTIFICATION_QUEUE = mock.Mock()
+        rpc.send_notification(send, 1, foo='bar')
+        self.assertFalse(send.called)
+        rpc.NOTIFICATION_QUEUE.put.assert_called_once_with(send, 1, foo='bar')
+
     @mock.patch.object(rpc, 'get_allowed_exmods')
     @mock.patch.object(messaging, 'get_rpc_transport')
     def test_create_transport(self, mock_transport, mock_exmods):
@@ -329,6 +415,7 @@ class TestRPC(test.NoDBTestCase):
         conf.notifications.notification_format = notif_format
         conf.notifications.versioned_notifications_topics = (
             versioned_notification_topics)
+        conf.notifications.async_emit = False
         mock_exmods.return_value = ['foo']
         mock_noti_trans.return_value = notif_transport
         mock_ser.return_value = serializer
@@ -362,6 +449,151 @@ class TestRPC(test.NoDBTestCase):
                          "the legacy and versioned notifiers properly.")
 
 
+class TestNotificationQueue(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestNotificationQueue, self).setUp()
+        self.notifier = mock.Mock()
+        self.queue = rpc.NotificationQueue(2)
+        self.async_notifier = rpc.AsyncNotifier(self.notifier, self.queue)
+        self.addCleanup(self._kill_worker)
+
+    def _kill_worker(self):
+        if self.async_notifier.queue._worker is not None:
+            self.async_notifier.queue._worker.kill()
+
+    def test_send(self):
+        self.async_notifier.info(mock.sentinel.ctxt, 'event', 'payload')
+        self.assertFalse(self.notifier.info.called)
+        eventlet.sleep(0)
+        self.notifier.info.assert_called_once_with(mock.sentinel.ctxt,
+                                                   'event', 'payload')
+        self.assertEqual(1, self.queue.get_stats()['sent'])
+
+    def test_block(self):
+        for i in range(3):
+            # The third notification waits for the worker to make room.
+            self.async_notifier.info(mock.sentinel.ctxt, 'event', i)
+        eventlet.sleep(0)
+        self.assertEqual(3, self.notifier.info.call_count)
+        stats = self.queue.get_stats()
+        self.assertEqual(0, stats['depth'])
+        self.assertEqual(2, stats['max_depth'])
+        self.assertEqual(0, stats['dropped'])
+
+    @mock.patch.object(rpc.LOG, 'warning')
+    def test_drop(self, mock_warn):
+        self.queue.overflow = 'drop'
+        for i in range(4):
+            self.async_notifier.info(mock.sentinel.ctxt, 'event', i)
+        self.assertEqual(2, self.queue.get_stats()['dropped'])
+        self.assertEqual(1, mock_warn.call_count)
+        eventlet.sleep(0)
+        self.assertEqual([mock.call(mock.sentinel.ctxt, 'event', 0),
+                          mock.call(mock.sentinel.ctxt, 'event', 1)],
+                         self.notifier.info.call_args_list)
+
+    def test_batch_size(self):
+        self.queue = rpc.NotificationQueue(10, batch_size=2)
+        self.async_notifier.queue = self.queue
+        for i in range(3):
+            self.async_notifier.info(mock.sentinel.ctxt, 'event', i)
+        eventlet.sleep(0)
+        self.assertEqual(2, self.notifier.info.call_count)
+        eventlet.sleep(0)
+        self.assertEqual(3, self.notifier.info.call_count)
+
+    def test_nested_notification_sent_directly(self):
+        def send():
+            self.async_notifier.info(mock.sentinel.ctxt, 'nested', None)
+        self.queue.put(send)
+        eventlet.sleep(0)
+        self.notifier.info.assert_called_once_with(mock.sentinel.ctxt,
+                                                   'nested', None)
+
+    @mock.patch.object(rpc.LOG, 'exception')
+    def test_error(self, mock_log):
+        self.notifier.info.side_effect = ValueError
+        self.async_notifier.info(mock.sentinel.ctxt, 'event', 'payload')
+        eventlet.sleep(0)
+        self.assertEqual(1, self.queue.get_stats()['errors'])
+        self.assertTrue(mock_log.called)
+
+    def test_flush(self):
+        self.queue._ensure_worker = mock.Mock()
+        self.async_notifier.error(mock.sentinel.ctxt, 'event', 'payload')
+        self.queue.flush()
+        self.notifier.error.assert_called_once_with(mock.sentinel.ctxt,
+                                                    'event', 'payload')
+        self.assertEqual(self.queue.get_stats(), self.queue.report().data)
+
+    def test_objects_copied_when_queued(self):
+        self.queue._ensure_worker = mock.Mock()
+        send = mock.Mock()
+        obj = mock.Mock()
+        self.queue.put(send, obj, 'arg', kwarg=obj)
+        self.queue.flush()
+        send.assert_called_once_with(obj.obj_clone.return_value, 'arg',
+                                     kwarg=obj.obj_clone.return_value)
+
+    @mock.patch.object(rpc.LOG, 'warning')
+    def test_objects_not_copied_when_dropped(self, mock_warn):
+        self.queue._ensure_worker = mock.Mock()
+        self.queue.overflow = 'drop'
+        obj = mock.Mock()
+        for i in range(3):
+            self.queue.put(mock.Mock(), obj)
+        self.assertEqual(2, obj.obj_clone.call_count)
+        self.assertEqual(1, self.queue.get_stats()['dropped'])
+
+    def test_objects_not_copied_when_sent_directly(self):
+        obj = mock.Mock()
+        nested = mock.Mock()
+
+        def send():
+            self.queue.put(nested, obj)
+        self.queue.put(send)
+        eventlet.sleep(0)
+        nested.assert_called_once_with(obj)
+        self.assertFalse(obj.obj_clone.called)
+
+
+class TestNativeNotificationQueue(test.NoDBTestCase):
+    """Tests the queue in a process not monkey patched by eventlet, such as
+    nova-api running under a WSGI server.
+    """
+
+    def setUp(self):
+        super(TestNativeNotificationQueue, self).setUp()
+        self.useFixture(fixtures.MockPatch(
+            'nova.rpc.patcher.is_monkey_patched', return_value=False))
+        self.notifier = mock.Mock()
+        self.sent = rpc.native_threading.Event()
+        self.notifier.info.side_effect = lambda *args: self.sent.set()
+
+    def test_send(self):
+        queue = rpc.NotificationQueue(2)
+        rpc.AsyncNotifier(self.notifier, queue).info(mock.sentinel.ctxt,
+                                                     'event', 'payload')
+        self.assertIsInstance(queue._worker, rpc.native_threading.Thread)
+        self.assertTrue(queue._worker.daemon)
+        self.assertTrue(self.sent.wait(10))
+        self.notifier.info.assert_called_once_with(mock.sentinel.ctxt,
+                                                   'event', 'payload')
+
+    @mock.patch.object(rpc.LOG, 'warning')
+    def test_drop(self, mock_warn):
+        queue = rpc.NotificationQueue(1, overflow='drop')
+        queue._ensure_worker = mock.Mock()
+        async_notifier = rpc.AsyncNotifier(self.notifier, queue)
+        for i in range(2):
+            async_notifier.info(mock.sentinel.ctxt, 'event', i)
+        self.assertEqual(1, queue.get_stats()['dropped'])
+        queue.flush()
+        self.notifier.info.assert_called_once_with(mock.sentinel.ctxt,
+                                                   'event', 0)
+
+
 class TestJsonPayloadSerializer(test.NoDBTestCase):
     def test_serialize_entity(self):
         with mock.patch.object(jsonutils, 'to_primitive') as mock_prim:
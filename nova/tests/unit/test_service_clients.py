@@ -0,0 +1,114 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from keystoneauth1 import loading as ks_loading
+import mock
+from oslo_utils import timeutils
+
+import nova.conf
+from nova import context
+from nova import service_clients
+from nova import test
+
+
+CONF = nova.conf.CONF
+
+
+class DiscoveryTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DiscoveryTestCase, self).setUp()
+        self.flags(service_discovery_cache_ttl=60)
+        self.useFixture(test.TimeOverride())
+        self.func = mock.Mock(side_effect=['3.44', '3.50'])
+
+    def test_discover_cached(self):
+        for i in range(2):
+            self.assertEqual('3.44', service_clients.discover(
+                'volume', ('RegionOne',), self.func))
+        self.func.assert_called_once_with()
+
+        # Another key is discovered
+        self.assertEqual('3.50', service_clients.discover(
+            'volume', ('RegionTwo',), self.func))
+        self.assertEqual(
+            {'discovery_hits': 1, 'discovery_misses': 2,
+             'clients_created': 0, 'clients_reused': 0},
+            service_clients.get_stats()['services']['volume'])
+
+    def test_discover_expired(self):
+        service_clients.discover('volume', ('RegionOne',), self.func)
+        timeutils.advance_time_seconds(60)
+
+        self.assertEqual('3.50', service_clients.discover(
+            'volume', ('RegionOne',), self.func))
+        self.assertEqual(2, self.func.call_count)
+
+    def test_discover_without_ttl(self):
+        self.flags(service_discovery_cache_ttl=0)
+        service_clients.discover('volume', ('RegionOne',), self.func)
+        service_clients.discover('volume', ('RegionOne',), self.func)
+        self.assertEqual(2, self.func.call_count)
+
+    def test_discover_error_not_cached(self):
+        self.func.side_effect = [test.TestingException, '3.44']
+        self.assertRaises(test.TestingException, service_clients.discover,
+                          'volume', ('RegionOne',), self.func)
+        self.assertEqual('3.44', service_clients.discover(
+            'volume', ('RegionOne',), self.func))
+
+
+class ClientTestCase(test.NoDBTestCase):
+
+    def test_get_client_reused_for_context(self):
+        ctxt = context.RequestContext('fake', 'fake')
+        create = mock.Mock(side_effect=['client1', 'client2', 'client3'])
+
+        for i in range(2):
+            self.assertEqual('client1', service_clients.get_client(
+                ctxt, 'image', ('http://glance', 2), create))
+        self.assertEqual('client2', service_clients.get_client(
+            ctxt, 'image', ('http://glance2', 2), create))
+        self.assertEqual('client3', service_clients.get_client(
+            context.RequestContext('fake', 'fake'), 'image',
+            ('http://glance', 2), create))
+        self.assertEqual(
+            {'discovery_hits': 0, 'discovery_misses': 0,
+             'clients_created': 3, 'clients_reused': 1},
+            service_clients.get_stats()['services']['image'])
+
+    def test_get_client_without_context(self):
+        create = mock.Mock(side_effect=['client1', 'client2'])
+        service_clients.get_client(None, 'image', ('http://glance', 2),
+                                   create)
+        self.assertEqual('client2', service_clients.get_client(
+            None, 'image', ('http://glance', 2), create))
+
+    @mock.patch.object(ks_loading, 'load_session_from_conf_options')
+    def test_load_session(self, mock_load):
+        self.flags(service_connection_pool_size=4)
+
+        session = service_clients.load_session('cinder')
+
+        self.assertEqual(mock_load.return_value, session)
+        http = mock_load.call_args[1]['session']
+        mock_load.assert_called_once_with(CONF, 'cinder', session=http)
+        for adapter in http.adapters.values():
+            self.assertEqual(4, adapter._pool_maxsize)
+
+        session.session = http
+        http.adapters['http://'].poolmanager.connection_from_url(
+            'http://cinder:8776')
+        self.assertEqual(
+            {'cinder': {'pools': 1, 'connections_opened': 0, 'requests': 0,
+                        'idle_connections': 0}},
+            service_clients.get_stats()['sessions'])
@@ -0,0 +1,30 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import stats
+from nova import test
+
+
+class HistogramTestCase(test.NoDBTestCase):
+    def test_add(self):
+        histogram = stats.Histogram()
+        histogram.add(0.0005)
+        histogram.add(0.003)
+        histogram.add(0.004)
+        histogram.add(0.1)
+        self.assertEqual({'count': 4,
+                          'total_ms': 107.5,
+                          'avg_ms': 26.875,
+                          'max_ms': 100.0,
+                          'buckets': {'<=1ms': 1, '<=4ms': 2,
+                                      '<=128ms': 1}},
+                         histogram.to_dict())
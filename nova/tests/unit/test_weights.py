@@ -72,3 +72,18 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def test_weighers_traced(self):
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512}),
+            ('host2', 'node2', {'free_ram_mb': 1024}),
+        ]
+        hostinfo = [fakes.FakeHostState(host, node, values)
+                    for host, node, values in host_values]
+        trace = mock.Mock()
+
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighed_hosts = weight_handler.get_weighed_objects(
+            [ram.RAMWeigher()], hostinfo, {}, trace=trace)
+        self.assertEqual('host2', weighed_hosts[0].obj.host)
+        trace.add.assert_called_once_with('weigher.RAMWeigher', mock.ANY)
@@ -0,0 +1,229 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import struct
+
+import fixtures
+import mock
+from oslo_concurrency import processutils
+from oslo_utils import imageutils
+from oslo_utils import units
+
+from nova import test
+from nova import utils
+from nova.virt.image import header
+from nova.virt import images
+
+
+def make_qcow2(path, virtual_size, version=3, cluster_bits=16,
+               backing_file=None, backing_fmt=None, crypt_method=0,
+               nb_snapshots=0, incompatible=0):
+    """Write a minimal qcow2 header, laid out the way qemu-img does."""
+    hdr = struct.pack('>4sIQIIQIIQQIIQ', b'QFI\xfb', version, 0, 0,
+                      cluster_bits, virtual_size, crypt_method, 1,
+                      3 * (1 << cluster_bits), 1 << cluster_bits, 1,
+                      nb_snapshots, 0)
+    if version == 3:
+        hdr += struct.pack('>QQQII', incompatible, 0, 0, 4, 104)
+    exts = b''
+    if backing_fmt:
+        fmt = backing_fmt.encode('utf-8')
+        exts += struct.pack('>II', 0xE2792ACA, len(fmt))
+        exts += fmt + b'\0' * ((8 - len(fmt) % 8) % 8)
+    exts += struct.pack('>II', 0, 0)
+    data = hdr + exts
+    if backing_file:
+        name = backing_file.encode('utf-8')
+        offset = len(data)
+        data = (data[:8] + struct.pack('>QI', offset, len(name)) +
+                data[20:] + name)
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.truncate(4 * (1 << cluster_bits))
+
+
+class HeaderTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HeaderTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+
+    def _path(self, name='disk'):
+        return os.path.join(self.tmpdir, name)
+
+    def test_qcow2_v3(self):
+        path = self._path()
+        make_qcow2(path, 20 * units.Gi)
+        info = header.get_info(path)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(20 * units.Gi, info.virtual_size)
+        self.assertEqual(65536, info.cluster_size)
+        self.assertIsNone(info.backing_file)
+        self.assertEqual(os.stat(path).st_blocks * 512, info.disk_size)
+        self.assertEqual([], info.snapshots)
+
+    def test_qcow2_v2_backing_file(self):
+        path = self._path()
+        make_qcow2(path, units.Gi, version=2,
+                   backing_file='/var/lib/nova/instances/_base/abc')
+        info = header.get_info(path, 'qcow2')
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual('/var/lib/nova/instances/_base/abc',
+                         info.backing_file)
+        self.assertIsNone(info.backing_file_format)
+
+    def test_qcow2_backing_format_extension(self):
+        path = self._path()
+        make_qcow2(path, units.Gi, backing_file='base', backing_fmt='raw')
+        info = header.get_info(path)
+        self.assertEqual(self._path('base'), info.backing_file)
+        self.assertEqual('raw', info.backing_file_format)
+
+    def test_qcow2_backing_file_protocol(self):
+        path = self._path()
+        make_qcow2(path, units.Gi, backing_file='nbd:localhost:10809')
+        self.assertIsNone(header.get_info(path))
+
+    def test_qcow2_dirty_is_supported(self):
+        path = self._path()
+        make_qcow2(path, units.Gi, incompatible=1)
+        self.assertIsNotNone(header.get_info(path))
+
+    def test_qcow2_unsupported_features(self):
+        for kwargs in ({'crypt_method': 1}, {'nb_snapshots': 1},
+                       {'incompatible': 2}, {'incompatible': 4},
+                       {'cluster_bits': 30}, {'version': 4}):
+            path = self._path()
+            make_qcow2(path, units.Gi, **kwargs)
+            self.assertIsNone(header.get_info(path), kwargs)
+
+    def test_qcow2_truncated(self):
+        path = self._path()
+        with open(path, 'wb') as f:
+            f.write(b'QFI\xfb\x00\x00\x00\x03')
+        self.assertIsNone(header.get_info(path))
+
+    def test_raw_requires_explicit_format(self):
+        path = self._path()
+        with open(path, 'wb') as f:
+            f.truncate(units.Gi)
+        self.assertIsNone(header.get_info(path))
+        info = header.get_info(path, 'raw')
+        self.assertEqual('raw', info.file_format)
+        self.assertEqual(units.Gi, info.virtual_size)
+        self.assertEqual(os.stat(path).st_blocks * 512, info.disk_size)
+
+    def test_other_formats_not_handled(self):
+        path = self._path()
+        make_qcow2(path, units.Gi)
+        self.assertIsNone(header.get_info(path, 'vmdk'))
+        self.assertIsNone(header.get_info(path, 'ploop'))
+
+    def test_missing_file(self):
+        self.assertIsNone(header.get_info(self._path('missing'), 'raw'))
+        self.assertIsNone(header.get_info(self._path('missing')))
+
+    def test_not_a_regular_file(self):
+        self.assertIsNone(header.get_info(self.tmpdir, 'raw'))
+
+    def test_parity_with_qemu_img_output(self):
+        path = self._path()
+        make_qcow2(path, 10 * units.Gi, backing_file='/base/abc')
+        # Output of qemu-img info for an image created with
+        # qemu-img create -f qcow2 -b /base/abc disk 10G
+        out = ("image: %s\n"
+               "file format: qcow2\n"
+               "virtual size: 10G (10737418240 bytes)\n"
+               "disk size: 196K\n"
+               "cluster_size: 65536\n"
+               "backing file: /base/abc\n"
+               "Format specific information:\n"
+               "    compat: 1.1\n"
+               "    lazy refcounts: false\n"
+               "    refcount bits: 16\n"
+               "    corrupt: false\n" % path)
+        expected = imageutils.QemuImgInfo(out)
+        actual = header.get_info(path)
+        for attr in ('image', 'file_format', 'virtual_size',
+                     'cluster_size', 'backing_file', 'snapshots'):
+            self.assertEqual(getattr(expected, attr), getattr(actual, attr),
+                             attr)
+
+    def test_parity_with_qemu_img_output_relative_backing_file(self):
+        path = self._path()
+        make_qcow2(path, 10 * units.Gi, backing_file='_base/abc')
+        # Output of qemu-img info for an image created with
+        # qemu-img create -f qcow2 -b _base/abc disk 10G
+        out = ("image: %s\n"
+               "file format: qcow2\n"
+               "virtual size: 10G (10737418240 bytes)\n"
+               "disk size: 196K\n"
+               "cluster_size: 65536\n"
+               "backing file: _base/abc (actual path: %s)\n"
+               "Format specific information:\n"
+               "    compat: 1.1\n"
+               "    lazy refcounts: false\n"
+               "    refcount bits: 16\n"
+               "    corrupt: false\n" % (path, self._path('_base/abc')))
+        expected = imageutils.QemuImgInfo(out)
+        actual = header.get_info(path)
+        self.assertEqual(self._path('_base/abc'), expected.backing_file)
+        self.assertEqual(expected.backing_file, actual.backing_file)
+
+    def test_parity_with_qemu_img(self):
+        path = self._path()
+        try:
+            utils.execute('qemu-img', 'create', '-f', 'qcow2', '-o',
+                          'backing_file=/base/abc,backing_fmt=raw', path,
+                          '1G')
+        except (OSError, processutils.ProcessExecutionError):
+            self.skipTest('qemu-img is not available')
+        out, _err = utils.execute('env', 'LC_ALL=C', 'LANG=C', 'qemu-img',
+                                  'info', path)
+        expected = imageutils.QemuImgInfo(out)
+        actual = header.get_info(path)
+        for attr in ('file_format', 'virtual_size', 'cluster_size',
+                     'backing_file'):
+            self.assertEqual(getattr(expected, attr), getattr(actual, attr),
+                             attr)
+
+
+class QemuImgInfoHeaderTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(QemuImgInfoHeaderTestCase, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'disk')
+        make_qcow2(self.path, units.Gi)
+
+    @mock.patch.object(utils, 'execute')
+    def test_qemu_img_info_uses_header(self, mock_execute):
+        info = images.qemu_img_info(self.path)
+        self.assertEqual(units.Gi, info.virtual_size)
+        mock_execute.assert_not_called()
+
+    @mock.patch.object(utils, 'execute',
+                       return_value=('virtual size: 1G (1073741824 bytes)',
+                                     ''))
+    def test_qemu_img_info_falls_back(self, mock_execute):
+        images.qemu_img_info(self.path, 'vmdk')
+        self.assertTrue(mock_execute.called)
+
+    @mock.patch.object(utils, 'execute',
+                       return_value=('virtual size: 1G (1073741824 bytes)',
+                                     ''))
+    def test_qemu_img_info_header_disabled(self, mock_execute):
+        self.flags(inspect_image_headers=False)
+        images.qemu_img_info(self.path)
+        self.assertTrue(mock_execute.called)
@@ -539,8 +539,8 @@ class IronicDriverTestCase(test.NoDBTestCase):
                                           fields=ironic_driver._NODE_FIELDS)
 
     @mock.patch.object(cw.IronicClientWrapper, 'call')
-    @mock.patch.object(objects.Instance, 'get_by_uuid')
-    def test_list_instances(self, mock_inst_by_uuid, mock_call):
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_list_instances(self, mock_inst_by_filters, mock_call):
         nodes = []
         instances = []
         for i in range(2):
@@ -550,24 +550,27 @@ class IronicDriverTestCase(test.NoDBTestCase):
                                                              uuid=uuid))
             nodes.append(ironic_utils.get_test_node(instance_uuid=uuid))
 
-        mock_inst_by_uuid.side_effect = instances
+        mock_inst_by_filters.return_value = objects.InstanceList(
+            objects=instances)
         mock_call.return_value = nodes
 
         response = self.driver.list_instances()
-        mock_call.assert_called_with("node.list", associated=True, limit=0)
-        expected_calls = [mock.call(mock.ANY, instances[0].uuid),
-                          mock.call(mock.ANY, instances[1].uuid)]
-        mock_inst_by_uuid.assert_has_calls(expected_calls)
+        mock_call.assert_called_with("node.list", associated=True,
+                                     fields=('instance_uuid',), limit=0)
+        mock_inst_by_filters.assert_called_once_with(
+            mock.ANY, {'uuid': [instances[0].uuid, instances[1].uuid]},
+            expected_attrs=[])
         self.assertEqual(['instance-00000000', 'instance-00000001'],
                           sorted(response))
 
     @mock.patch.object(cw.IronicClientWrapper, 'call')
-    @mock.patch.object(objects.Instance, 'get_by_uuid')
-    def test_list_instances_fail(self, mock_inst_by_uuid, mock_call):
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_list_instances_fail(self, mock_inst_by_filters, mock_call):
         mock_call.side_effect = exception.NovaException
         response = self.driver.list_instances()
-        mock_call.assert_called_with("node.list", associated=True, limit=0)
-        self.assertFalse(mock_inst_by_uuid.called)
+        mock_call.assert_called_with("node.list", associated=True,
+                                     fields=('instance_uuid',), limit=0)
+        self.assertFalse(mock_inst_by_filters.called)
         self.assertThat(response, matchers.HasLength(0))
 
     @mock.patch.object(cw.IronicClientWrapper, 'call')
@@ -580,7 +583,8 @@ class IronicDriverTestCase(test.NoDBTestCase):
 
         mock_call.return_value = nodes
         uuids = self.driver.list_instance_uuids()
-        mock_call.assert_called_with('node.list', associated=True, limit=0)
+        mock_call.assert_called_with('node.list', associated=True,
+                                     fields=('instance_uuid',), limit=0)
         expected = [n.instance_uuid for n in nodes]
         self.assertEqual(sorted(expected), sorted(uuids))
 
@@ -597,7 +601,8 @@ class IronicDriverTestCase(test.NoDBTestCase):
         self.assertTrue(self.driver.node_is_available(node.uuid))
         mock_get.assert_called_with(node.uuid,
                                     fields=ironic_driver._NODE_FIELDS)
-        mock_list.assert_called_with(detail=True, limit=0)
+        mock_list.assert_called_with(fields=ironic_driver._NODE_FIELDS,
+                                     limit=0)
 
         mock_get.side_effect = ironic_exception.NotFound
         self.assertFalse(self.driver.node_is_available(node.uuid))
@@ -612,7 +617,8 @@ class IronicDriverTestCase(test.NoDBTestCase):
         mock_get.return_value = node
         mock_list.return_value = [node]
         self.assertTrue(self.driver.node_is_available(node.uuid))
-        mock_list.assert_called_with(detail=True, limit=0)
+        mock_list.assert_called_with(fields=ironic_driver._NODE_FIELDS,
+                                     limit=0)
         self.assertEqual(0, mock_get.call_count)
 
     @mock.patch.object(FAKE_CLIENT.node, 'list')
@@ -2748,6 +2754,27 @@ class HashRingTestCase(test.NoDBTestCase):
         self.mock_is_up.side_effect = [True, True, False, True]
         self._test__refresh_hash_ring(services, expected_hosts)
 
+    @mock.patch.object(objects.ServiceList, 'get_all_computes_by_hv_type')
+    def test__refresh_hash_ring_unchanged_services(self, mock_services):
+        self.flags(host='host1')
+        self.mock_is_up.return_value = True
+        mock_services.return_value = [_make_compute_service('host2')]
+        self.driver._refresh_hash_ring(self.ctx)
+        ring = self.driver.hash_ring
+        node_uuid = uuidutils.generate_uuid()
+        mapped = self.driver._node_maps_to_us(node_uuid)
+        self.assertEqual({node_uuid: mapped}, self.driver._hash_ring_nodes)
+
+        # The ring and the node mappings are kept while the services are
+        # the same, and dropped when they change.
+        self.driver._refresh_hash_ring(self.ctx)
+        self.assertIs(ring, self.driver.hash_ring)
+        self.assertEqual({node_uuid: mapped}, self.driver._hash_ring_nodes)
+        mock_services.return_value = [_make_compute_service('host3')]
+        self.driver._refresh_hash_ring(self.ctx)
+        self.assertIsNot(ring, self.driver.hash_ring)
+        self.assertEqual({}, self.driver._hash_ring_nodes)
+
 
 class NodeCacheTestCase(test.NoDBTestCase):
 
@@ -2779,7 +2806,8 @@ class NodeCacheTestCase(test.NoDBTestCase):
 
         mock_hash_ring.assert_called_once_with(mock.ANY)
         mock_instances.assert_called_once_with(mock.ANY, self.host)
-        mock_nodes.assert_called_once_with(detail=True, limit=0)
+        mock_nodes.assert_called_once_with(fields=ironic_driver._NODE_FIELDS,
+                                           limit=0)
         self.assertIsNotNone(self.driver.node_cache_time)
 
     def test__refresh_cache(self):
@@ -2858,6 +2886,33 @@ class NodeCacheTestCase(test.NoDBTestCase):
         expected_cache = {n.uuid: n for n in nodes[1:]}
         self.assertEqual(expected_cache, self.driver.node_cache)
 
+    @mock.patch.object(ironic_driver.IronicDriver, '_refresh_hash_ring')
+    @mock.patch.object(hash_ring.HashRing, 'get_nodes')
+    @mock.patch.object(ironic_driver.IronicDriver, '_get_node_list')
+    @mock.patch.object(objects.InstanceList, 'get_uuids_by_host',
+                       return_value=[])
+    def test__refresh_cache_hash_ring_mapping_cached(
+            self, mock_instances, mock_nodes, mock_get_nodes, mock_hash_ring):
+        nodes = [ironic_utils.get_test_node(uuid=uuidutils.generate_uuid(),
+                                            instance_uuid=None)
+                 for i in range(100)]
+        mock_get_nodes.side_effect = lambda uuid: (
+            {self.host} if uuid.decode('utf-8') in
+            (nodes[0].uuid, nodes[-1].uuid) else {'host2'})
+        mock_nodes.return_value = nodes[:50]
+        self.driver._refresh_cache()
+        self.assertEqual(50, mock_get_nodes.call_count)
+        self.assertEqual([nodes[0].uuid], list(self.driver.node_cache))
+
+        # Only the nodes added since the last refresh are hashed, and the
+        # nodes removed from Ironic are forgotten.
+        mock_nodes.return_value = nodes[25:]
+        self.driver._refresh_cache()
+        self.assertEqual(100, mock_get_nodes.call_count)
+        self.assertEqual([nodes[-1].uuid], list(self.driver.node_cache))
+        self.assertEqual(set(n.uuid for n in nodes[25:]),
+                         set(self.driver._hash_ring_nodes))
+
 
 @mock.patch.object(FAKE_CLIENT, 'node')
 class IronicDriverConsoleTestCase(test.NoDBTestCase):
@@ -0,0 +1,81 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+
+import fixtures
+
+from nova import test
+from nova.tests import uuidsentinel as uuids
+from nova.virt.libvirt import diskusage
+
+
+class DiskUsageCacheTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DiskUsageCacheTestCase, self).setUp()
+        tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.path = os.path.join(tmpdir, 'disk')
+        with open(self.path, 'wb') as f:
+            f.write(b'x' * 512)
+        self.cache = diskusage.DiskUsageCache()
+
+    def _populate(self, instance_uuid=uuids.instance):
+        stamp, value = self.cache.get(self.path, 'qcow2')
+        self.assertIsNone(value)
+        self.cache.put(instance_uuid, self.path, 'qcow2', stamp, 'value')
+
+    def test_hit(self):
+        self._populate()
+        self.assertEqual('value', self.cache.get(self.path, 'qcow2')[1])
+        self.assertEqual({'disks': 1, 'hits': 1, 'misses': 1},
+                         self.cache.stats())
+        self.assertEqual({'disks': 1, 'hits': 0, 'misses': 0},
+                         self.cache.stats())
+
+    def test_miss_on_change(self):
+        self._populate()
+        with open(self.path, 'ab') as f:
+            f.write(b'x' * 512)
+        self.assertIsNone(self.cache.get(self.path, 'qcow2')[1])
+
+    def test_miss_on_format_change(self):
+        self._populate()
+        self.assertIsNone(self.cache.get(self.path, 'raw')[1])
+
+    def test_missing_file_not_cached(self):
+        path = self.path + '.missing'
+        stamp, value = self.cache.get(path, 'qcow2')
+        self.assertIsNone(stamp)
+        self.cache.put(uuids.instance, path, 'qcow2', stamp, 'value')
+        self.assertEqual(0, self.cache.stats()['disks'])
+
+    def test_invalidate(self):
+        self._populate()
+        self.cache.invalidate(uuids.other)
+        self.assertEqual('value', self.cache.get(self.path, 'qcow2')[1])
+        self.cache.invalidate(uuids.instance)
+        self.assertIsNone(self.cache.get(self.path, 'qcow2')[1])
+
+    def test_retain(self):
+        self._populate()
+        self.cache.retain([uuids.instance])
+        self.assertEqual('value', self.cache.get(self.path, 'qcow2')[1])
+        self.cache.retain([uuids.other])
+        self.assertIsNone(self.cache.get(self.path, 'qcow2')[1])
+
+    def test_put_moves_disk_between_instances(self):
+        self._populate(uuids.instance)
+        stamp, _value = self.cache.get(self.path, 'qcow2')
+        self.cache.put(uuids.other, self.path, 'qcow2', stamp, 'value')
+        self.cache.invalidate(uuids.instance)
+        self.assertEqual('value', self.cache.get(self.path, 'qcow2')[1])
@@ -98,6 +98,7 @@ from nova.virt.image import model as imgmodel
 from nova.virt import images
 from nova.virt.libvirt import blockinfo
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import diskusage
 from nova.virt.libvirt import driver as libvirt_driver
 from nova.virt.libvirt import firewall
 from nova.virt.libvirt import guest as libvirt_guest
@@ -10430,6 +10431,46 @@ class LibvirtConnTestCase(test.NoDBTestCase,
         self.assertEqual(info[1]['backing_file'], "file")
         self.assertEqual(info[1]['over_committed_disk_size'], 18146236825)
 
+    @mock.patch('nova.virt.disk.api.get_disk_size', return_value=20 * units.Gi)
+    @mock.patch('nova.virt.libvirt.driver.libvirt_utils.get_disk_backing_file',
+                return_value='base')
+    @mock.patch('os.path.getsize', return_value=units.Gi)
+    @mock.patch.object(diskusage.DiskUsageCache, '_stamp',
+                       return_value=(1234.5, units.Gi))
+    def test_get_instance_disk_info_from_config_cached(self, mock_stamp,
+                                                       mock_getsize,
+                                                       mock_backing,
+                                                       mock_disk_size):
+        xml = ("<domain type='kvm'><uuid>%s</uuid>"
+               "<name>instance-0000000a</name>"
+               "<devices>"
+               "<disk type='file'><driver name='qemu' type='qcow2'/>"
+               "<source file='/test/disk'/>"
+               "<target dev='vda' bus='virtio'/></disk>"
+               "</devices></domain>" % uuids.instance)
+        guest_config = vconfig.LibvirtConfigGuest()
+        guest_config.parse_str(xml)
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        for _ in range(2):
+            info = drvr._get_instance_disk_info_from_config(guest_config,
+                                                            None)
+            self.assertEqual(19 * units.Gi,
+                             info[0]['over_committed_disk_size'])
+            self.assertEqual('base', info[0]['backing_file'])
+        self.assertEqual(1, mock_disk_size.call_count)
+        self.assertEqual(1, mock_backing.call_count)
+
+        # A disk which changed on disk is inspected again
+        mock_stamp.return_value = (1235.5, units.Gi)
+        drvr._get_instance_disk_info_from_config(guest_config, None)
+        self.assertEqual(2, mock_disk_size.call_count)
+
+        # Operations on the instance drop its cached disks
+        drvr._disk_usage.invalidate(uuids.instance)
+        drvr._get_instance_disk_info_from_config(guest_config, None)
+        self.assertEqual(3, mock_disk_size.call_count)
+
     def test_post_live_migration(self):
         vol = {'block_device_mapping': [
                   {'attachment_id': None,
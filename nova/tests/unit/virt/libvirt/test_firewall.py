@@ -359,15 +359,15 @@ class IptablesFirewallTestCase(test.NoDBTestCase):
              mock_add_filters, mock_instance_rules):
         instance_ref = self._create_instance_ref()
 
-        mock_instance_rules.return_value = (None, None)
+        mock_instance_rules.side_effect = [(['rule1'], []), (['rule2'], [])]
         mock_has_chain.return_value = True
 
         self.fw.prepare_instance_filter(instance_ref, mock.ANY)
         self.fw.instance_info[instance_ref['id']] = (instance_ref, None)
         self.fw.do_refresh_security_group_rules("fake")
 
-        expected_rules_calls = [mock.call(instance_ref, None),
-                                  mock.call(instance_ref, None)]
+        expected_rules_calls = [mock.call(instance_ref, mock.ANY),
+                                  mock.call(instance_ref, None, {})]
         expected_filter_calls = [mock.call(instance_ref, mock.ANY, mock.ANY,
                                 mock.ANY),
                                 mock.call(instance_ref, mock.ANY, mock.ANY,
@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 import eventlet
 from eventlet import greenthread
 import mock
@@ -113,8 +115,8 @@ class HostTestCase(test.NoDBTestCase):
     def test_event_dispatch(self, mock_spawn_after):
         # Validate that the libvirt self-pipe for forwarding
         # events between threads is working sanely
-        def handler(event):
-            got_events.append(event)
+        def handler(events):
+            got_events.append(events)
 
         hostimpl = host.Host("qemu:///system",
                              lifecycle_event_handler=handler)
@@ -128,43 +130,66 @@ class HostTestCase(test.NoDBTestCase):
         event2 = event.LifecycleEvent(
             "cef19ce0-0ca2-11df-855d-b19fbce37686",
             event.EVENT_LIFECYCLE_PAUSED)
+        event3 = event.LifecycleEvent(
+            "e0a3c5d8-0ca2-11df-855d-b19fbce37686",
+            event.EVENT_LIFECYCLE_STARTED)
         hostimpl._queue_event(event1)
         hostimpl._queue_event(event2)
+        hostimpl._queue_event(event3)
         hostimpl._dispatch_events()
 
-        want_events = [event1, event2]
-        self.assertEqual(want_events, got_events)
+        # event2 supersedes event1, and the rest is emitted as one batch
+        self.assertEqual([[event2, event3]], got_events)
 
-        event3 = event.LifecycleEvent(
-            "cef19ce0-0ca2-11df-855d-b19fbce37686",
-            event.EVENT_LIFECYCLE_RESUMED)
         event4 = event.LifecycleEvent(
             "cef19ce0-0ca2-11df-855d-b19fbce37686",
+            event.EVENT_LIFECYCLE_RESUMED)
+        event5 = event.LifecycleEvent(
+            "e0a3c5d8-0ca2-11df-855d-b19fbce37686",
             event.EVENT_LIFECYCLE_STOPPED)
 
-        hostimpl._queue_event(event3)
         hostimpl._queue_event(event4)
+        hostimpl._queue_event(event5)
         hostimpl._dispatch_events()
 
-        want_events = [event1, event2, event3]
-        self.assertEqual(want_events, got_events)
+        self.assertEqual([[event2, event3], [event4]], got_events)
 
         # STOPPED is delayed so it's handled separately
         mock_spawn_after.assert_called_once_with(
-            hostimpl._lifecycle_delay, hostimpl._event_emit, event4)
+            hostimpl._lifecycle_delay, hostimpl._event_emit_expired)
+        _deadline, delayed = hostimpl._events_delayed[
+            "e0a3c5d8-0ca2-11df-855d-b19fbce37686"]
+        self.assertEqual(event5, delayed)
+
+        self.assertEqual({'received': 5, 'coalesced': 1, 'emitted': 3,
+                          'batches': 2, 'max_queue_depth': 3},
+                         {k: v for k, v in hostimpl._event_stats.items()
+                          if k != 'max_latency'})
+        self.assertGreaterEqual(hostimpl._event_stats['max_latency'], 0)
+
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_event_dispatch_close_event(self, mock_spawn_after):
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=lambda e: None)
+        hostimpl._init_events_pipe()
+        conn = mock.sentinel.conn
+        hostimpl._wrapped_conn = conn
+        hostimpl._close_callback(conn, 1, None)
+        with mock.patch.object(hostimpl,
+                               '_queue_conn_event_handler') as mock_handler:
+            hostimpl._dispatch_events()
+        mock_handler.assert_called_once_with(
+            False, 'Connection to libvirt lost: 1')
+        self.assertIsNone(hostimpl._wrapped_conn)
 
     def test_event_lifecycle(self):
         got_events = []
 
         # Validate that libvirt events are correctly translated
         # to Nova events
-        def spawn_after(seconds, func, *args, **kwargs):
-            got_events.append(args[0])
-            return mock.Mock(spec=greenthread.GreenThread)
-
-        greenthread.spawn_after = mock.Mock(side_effect=spawn_after)
+        greenthread.spawn_after = mock.Mock()
         hostimpl = host.Host("qemu:///system",
-                             lifecycle_event_handler=lambda e: None)
+                             lifecycle_event_handler=got_events.extend)
         conn = hostimpl.get_connection()
 
         hostimpl._init_events_pipe()
@@ -185,6 +210,10 @@ class HostTestCase(test.NoDBTestCase):
         hostimpl._event_lifecycle_callback(
             conn, dom, fakelibvirt.VIR_DOMAIN_EVENT_STOPPED, 0, hostimpl)
         hostimpl._dispatch_events()
+        self.assertEqual([], got_events)
+        with mock.patch.object(time, 'time',
+                               return_value=time.time() + 15):
+            hostimpl._event_emit_expired()
         self.assertEqual(len(got_events), 1)
         self.assertIsInstance(got_events[0], event.LifecycleEvent)
         self.assertEqual(got_events[0].uuid,
@@ -201,9 +230,40 @@ class HostTestCase(test.NoDBTestCase):
             greenthread.spawn_after = spawn_after_mock
             hostimpl = host.Host(uri,
                                  lifecycle_event_handler=lambda e: None)
-            hostimpl._event_emit_delayed(ev)
+            hostimpl._event_emit_delayed([ev])
             spawn_after_mock.assert_called_once_with(
-                15, hostimpl._event_emit, ev)
+                15, hostimpl._event_emit_expired)
+
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_event_emit_delayed_single_timer(self, spawn_after_mock):
+        got_events = []
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=got_events.append)
+        ev1 = event.LifecycleEvent(
+            "cef19ce0-0ca2-11df-855d-b19fbce37686",
+            event.EVENT_LIFECYCLE_STOPPED)
+        ev2 = event.LifecycleEvent(
+            "e0a3c5d8-0ca2-11df-855d-b19fbce37686",
+            event.EVENT_LIFECYCLE_STOPPED)
+        now = time.time()
+        with mock.patch.object(time, 'time', return_value=now):
+            hostimpl._event_emit_delayed([ev1])
+        with mock.patch.object(time, 'time', return_value=now + 5):
+            hostimpl._event_emit_delayed([ev2])
+        spawn_after_mock.assert_called_once_with(
+            15, hostimpl._event_emit_expired)
+
+        # The timer fires for ev1 and is rescheduled for ev2
+        with mock.patch.object(time, 'time', return_value=now + 15):
+            hostimpl._event_emit_expired()
+        self.assertEqual([[ev1]], got_events)
+        spawn_after_mock.assert_called_with(5, hostimpl._event_emit_expired)
+
+        with mock.patch.object(time, 'time', return_value=now + 20):
+            hostimpl._event_emit_expired()
+        self.assertEqual([[ev1], [ev2]], got_events)
+        self.assertEqual(2, spawn_after_mock.call_count)
+        self.assertIsNone(hostimpl._events_delayed_timer)
 
     @mock.patch.object(greenthread, 'spawn_after')
     def test_event_emit_delayed_call_delayed_pending(self, spawn_after_mock):
@@ -211,25 +271,34 @@ class HostTestCase(test.NoDBTestCase):
                              lifecycle_event_handler=lambda e: None)
 
         uuid = "cef19ce0-0ca2-11df-855d-b19fbce37686"
-        gt_mock = mock.Mock()
-        hostimpl._events_delayed[uuid] = gt_mock
+        old = event.LifecycleEvent(
+            uuid, event.EVENT_LIFECYCLE_STOPPED)
+        hostimpl._events_delayed[uuid] = (time.time(), old)
+        hostimpl._events_delayed_timer = mock.sentinel.timer
         ev = event.LifecycleEvent(
             uuid, event.EVENT_LIFECYCLE_STOPPED)
-        hostimpl._event_emit_delayed(ev)
-        gt_mock.cancel.assert_called_once_with()
-        self.assertTrue(spawn_after_mock.called)
+        hostimpl._event_emit_delayed([ev])
+        self.assertEqual(ev, hostimpl._events_delayed[uuid][1])
+        # The pending timer is reused
+        self.assertFalse(spawn_after_mock.called)
 
     def test_event_delayed_cleanup(self):
+        got_events = []
         hostimpl = host.Host("xen:///",
-                             lifecycle_event_handler=lambda e: None)
+                             lifecycle_event_handler=got_events.append)
         uuid = "cef19ce0-0ca2-11df-855d-b19fbce37686"
+        old = event.LifecycleEvent(
+            uuid, event.EVENT_LIFECYCLE_STOPPED)
+        hostimpl._events_delayed[uuid] = (time.time(), old)
         ev = event.LifecycleEvent(
             uuid, event.EVENT_LIFECYCLE_STARTED)
-        gt_mock = mock.Mock()
-        hostimpl._events_delayed[uuid] = gt_mock
-        hostimpl._event_emit_delayed(ev)
-        gt_mock.cancel.assert_called_once_with()
+        hostimpl._event_emit_delayed([ev])
         self.assertNotIn(uuid, hostimpl._events_delayed.keys())
+        self.assertEqual([[ev]], got_events)
+
+        # The timer firing later has nothing left to emit
+        hostimpl._event_emit_expired()
+        self.assertEqual([[ev]], got_events)
 
     @mock.patch.object(fakelibvirt.virConnect, "domainEventRegisterAny")
     @mock.patch.object(host.Host, "_connect")
@@ -11,11 +11,17 @@
 #    under the License.
 
 
+import fixtures
 import mock
+from oslo_concurrency.fixture import lockutils as lock_fixture
 
 from nova import exception
+from nova.network import linux_net
+from nova.network import model as network_model
 from nova import objects
 from nova import test
+from nova.tests.unit import fake_iptables
+from nova.tests import uuidsentinel as uuids
 from nova.virt import firewall
 
 _IPT_DRIVER_CLS = firewall.IptablesFirewallDriver
@@ -565,8 +571,14 @@ class TestIptablesFirewallDriver(test.NoDBTestCase):
             mock.Mock(return_value=['myipv4rules', 'myipv6rules'])
         self.driver._inner_do_refresh_rules = mock.Mock()
         self.driver.do_refresh_security_group_rules('mysecgroup')
-        self.driver.instance_rules.assert_any_call('myinstance1', 'netinfo1')
-        self.driver.instance_rules.assert_any_call('myinstance2', 'netinfo2')
+        self.driver.instance_rules.assert_any_call('myinstance1', 'netinfo1',
+                                                   {})
+        self.driver.instance_rules.assert_any_call('myinstance2', 'netinfo2',
+                                                   {})
+        # The IPs of the members of the groups are shared by the instances
+        group_ips = [call[1][2]
+                     for call in self.driver.instance_rules.mock_calls]
+        self.assertIs(group_ips[0], group_ips[1])
         self.driver._inner_do_refresh_rules.assert_any_call(
             'myinstance1', 'netinfo1',
             'myipv4rules', 'myipv6rules')
@@ -585,3 +597,130 @@ class TestIptablesFirewallDriver(test.NoDBTestCase):
         self.driver.instance_rules.assert_called_with(instance, 'mynetinfo')
         self.driver._inner_do_refresh_rules.assert_called_with(
             instance, 'mynetinfo', 'myipv4rules', 'myipv6rules')
+
+
+class TestIptablesFirewallDriverIpset(test.NoDBTestCase):
+    """Tests the rules of the security groups granting access to the members
+    of another group, against an in-memory iptables and ipset.
+    """
+
+    def setUp(self):
+        super(TestIptablesFirewallDriverIpset, self).setUp()
+        self.useFixture(lock_fixture.ExternalLockFixture())
+        self.flags(use_ipv6=False, enable_ipset=True)
+        self.execute = fake_iptables.FakeIptables()
+        self.stub_out('nova.network.linux_net.iptables_manager',
+                      linux_net.IptablesManager(execute=self.execute))
+        self.driver = self._create_driver()
+
+        self.group = objects.SecurityGroup(id=5)
+        rule = objects.SecurityGroupRule(
+            protocol='tcp', from_port=22, to_port=22, cidr=None,
+            grantee_group=self.group)
+        self.useFixture(fixtures.MockPatch(
+            'nova.objects.SecurityGroupRuleList.get_by_instance',
+            return_value=[rule]))
+        self.members = []
+        self.useFixture(fixtures.MockPatch(
+            'nova.objects.InstanceList.get_by_security_group',
+            side_effect=lambda ctxt, group: self.members))
+
+        self.instances = [self._create_instance(index)
+                          for index in range(1, 4)]
+        self.members = [inst for inst, nw_info in self.instances[:2]]
+        self.set_name = '%s-sg5-v4' % linux_net.binary_name
+        self.match_rule = ('-j ACCEPT -p tcp --dport 22 -m set --match-set '
+                           '%s src' % self.set_name)
+
+    def _create_driver(self):
+        driver = firewall.IptablesFirewallDriver()
+        if driver.ipset is not None:
+            self.assertIsInstance(driver.ipset, linux_net.IpsetManager)
+            driver.ipset = linux_net.IpsetManager(execute=self.execute)
+        return driver
+
+    def _create_instance(self, index):
+        address = '10.0.0.%d' % index
+        subnet = network_model.Subnet(
+            cidr='10.0.0.0/24', ips=[network_model.FixedIP(address=address)])
+        nw_info = network_model.NetworkInfo([network_model.VIF(
+            id=getattr(uuids, 'vif%d' % index), address=address,
+            network=network_model.Network(subnets=[subnet]))])
+        instance = objects.Instance(
+            id=index, uuid=getattr(uuids, 'instance%d' % index),
+            info_cache=objects.InstanceInfoCache(network_info=nw_info,
+                                                 deleted=False))
+        return instance, nw_info
+
+    def _chain_rules(self, instance):
+        chain = 'inst-%s' % instance.id
+        return [rule.rule for rule in self.driver.iptables.ipv4['filter'].rules
+                if rule.chain == chain]
+
+    def _commands(self):
+        return [cmd[:2] for cmd, lines in self.execute.calls]
+
+    def _prepare_instances(self):
+        for instance, nw_info in self.instances[:2]:
+            self.driver.prepare_instance_filter(instance, nw_info)
+        self.execute.calls = []
+
+    def test_grantee_group_rules_match_set(self):
+        self._prepare_instances()
+
+        for instance, nw_info in self.instances[:2]:
+            rules = self._chain_rules(instance)
+            self.assertIn(self.match_rule, rules)
+            self.assertFalse([rule for rule in rules
+                              if rule.endswith('-s 10.0.0.2')])
+        self.assertEqual({self.set_name: {'10.0.0.1', '10.0.0.2'}},
+                         self.driver.ipset.sets)
+
+    def test_refresh_updates_only_set(self):
+        self._prepare_instances()
+        self.members.append(self.instances[2][0])
+
+        self.driver.refresh_security_group_rules(self.group.id)
+
+        # The members are written to the set, and the unchanged chains of
+        # the instances are not rebuilt nor restored
+        self.assertEqual(
+            [(('ipset', '-exist', 'restore'),
+              ['add %s 10.0.0.3' % self.set_name, ''])],
+            [(cmd[:3], lines) for cmd, lines in self.execute.calls])
+        self.assertFalse(self.driver.iptables.dirty())
+
+    def test_refresh_updates_rules_without_ipset(self):
+        self.flags(enable_ipset=False)
+        self.driver = self._create_driver()
+        self._prepare_instances()
+        self.members.append(self.instances[2][0])
+
+        self.driver.refresh_security_group_rules(self.group.id)
+
+        self.assertEqual([('iptables-restore', '-c')], self._commands())
+        self.assertIn('-j ACCEPT -p tcp --dport 22 -s 10.0.0.3',
+                      self._chain_rules(self.instances[0][0]))
+
+    def test_unfilter_instance_destroys_unused_set(self):
+        self._prepare_instances()
+
+        self.driver.unfilter_instance(*self.instances[0])
+        self.assertNotIn(('ipset', 'destroy'), self._commands())
+
+        self.driver.unfilter_instance(*self.instances[1])
+        self.assertIn((('ipset', 'destroy', self.set_name), ['']),
+                      self.execute.calls)
+        self.assertEqual({}, self.driver.ipset.sets)
+
+    def test_destroy_unused_ipsets_deferred(self):
+        self._prepare_instances()
+        self.driver.filter_defer_apply_on()
+        self.driver.unfilter_instance(*self.instances[0])
+        self.driver.unfilter_instance(*self.instances[1])
+        self.assertEqual([], self.execute.calls)
+
+        self.driver.filter_defer_apply_off()
+
+        self.assertEqual((('ipset', 'destroy', self.set_name), ['']),
+                         self.execute.calls[-1])
@@ -765,6 +765,24 @@ class _VirtDriverTestCase(_FakeDriverBackendTestCase):
         want_events = [event1, event2, event3, event4]
         self.assertEqual(want_events, got_events)
 
+    def test_emit_events(self):
+        got_events = []
+        self.connection.register_event_listener(got_events.append)
+
+        event1 = virtevent.LifecycleEvent(
+            "cef19ce0-0ca2-11df-855d-b19fbce37686",
+            virtevent.EVENT_LIFECYCLE_STARTED)
+        event2 = virtevent.LifecycleEvent(
+            "e0a3c5d8-0ca2-11df-855d-b19fbce37686",
+            virtevent.EVENT_LIFECYCLE_PAUSED)
+
+        self.connection.emit_events([event1, event2])
+        self.assertEqual([[event1, event2]], got_events)
+
+        self.assertRaises(ValueError,
+                          self.connection.emit_events,
+                          [event1, {"foo": "bar"}])
+
     def test_event_bad_object(self):
         # Passing in something which does not inherit
         # from virtevent.Event
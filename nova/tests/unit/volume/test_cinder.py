@@ -919,6 +919,27 @@ class CinderClientTestCase(test.NoDBTestCase):
         get_highest_version.assert_called_once_with(
             self.mock_session.get_endpoint.return_value)
 
+    @mock.patch('cinderclient.client.get_highest_client_server_version',
+                return_value=cinder_api_versions.MAX_VERSION)
+    @mock.patch('cinderclient.client.get_volume_api_from_url',
+                return_value='3')
+    def test_create_v3_client_reuses_discovery_and_client(
+            self, get_volume_api, get_highest_version):
+        """Tests that the microversion of the server is discovered once, and
+        that the client of a context is reused by its later calls.
+        """
+        client = cinder.cinderclient(self.ctxt, microversion='3.44')
+        self.assertIs(client,
+                      cinder.cinderclient(self.ctxt, microversion='3.44'))
+
+        other_ctxt = context.RequestContext('fake-user', 'other-project')
+        other_client = cinder.cinderclient(other_ctxt, microversion='3.44')
+        self.assertIsNot(client, other_client)
+        self.assertEqual(cinder_api_versions.APIVersion('3.44'),
+                         other_client.api_version)
+        get_highest_version.assert_called_once_with(
+            self.mock_session.get_endpoint.return_value)
+
     @mock.patch('cinderclient.client.get_highest_client_server_version',
                 new_callable=mock.NonCallableMock)  # asserts not called
     @mock.patch('cinderclient.client.get_volume_api_from_url',
@@ -1415,7 +1415,9 @@ class ComputeDriver(object):
         Register a callback to receive asynchronous event
         notifications from hypervisors. The callback will
         be invoked with a single parameter, which will be
-        an instance of the nova.virt.event.Event class.
+        an instance of the nova.virt.event.Event class, or
+        a list of such instances for events dispatched with
+        emit_events().
         """
 
         self._compute_event_callback = callback
@@ -1443,6 +1445,30 @@ class ComputeDriver(object):
             LOG.error("Exception dispatching event %(event)s: %(ex)s",
                       {'event': event, 'ex': ex})
 
+    def emit_events(self, events):
+        """Dispatches a batch of events to the compute manager.
+
+        Like emit_event(), but hands all the events to the compute
+        manager in one call so that it can process them together. This
+        must only be invoked from a green thread.
+        """
+
+        if not self._compute_event_callback:
+            LOG.debug("Discarding %d events", len(events))
+            return
+
+        for event in events:
+            if not isinstance(event, virtevent.Event):
+                raise ValueError(
+                    _("Event must be an instance of nova.virt.event.Event"))
+
+        try:
+            LOG.debug("Emitting %d events", len(events))
+            self._compute_event_callback(events)
+        except Exception as ex:
+            LOG.error("Exception dispatching %(count)d events: %(ex)s",
+                      {'count': len(events), 'ex': ex})
+
     def delete_instance_files(self, instance):
         """Delete any lingering instance files for an instance.
 
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import re
+
 from oslo_log import log as logging
 from oslo_utils import importutils
 
@@ -29,6 +31,8 @@ LOG = logging.getLogger(__name__)
 
 CONF = nova.conf.CONF
 
+_MATCH_SET_RE = re.compile(r'--match-set (\S+) ')
+
 
 def load_driver(default, *args, **kwargs):
     fw_class = importutils.import_class(CONF.firewall_driver or default)
@@ -106,7 +110,13 @@ class IptablesFirewallDriver(FirewallDriver):
 
     def __init__(self, **kwargs):
         self.iptables = linux_net.iptables_manager
+        self.ipset = None
+        if CONF.enable_ipset:
+            self.ipset = linux_net.IpsetManager()
         self.instance_info = {}
+        # Dict, keyed by instance ID, of the ipv4 and ipv6 rules of the chain
+        # of the instance
+        self.instance_chain_rules = {}
 
         # Flags for DHCP request rule
         self.dhcp_create = False
@@ -129,11 +139,29 @@ class IptablesFirewallDriver(FirewallDriver):
 
     def filter_defer_apply_off(self):
         self.iptables.defer_apply_off()
+        self._destroy_unused_ipsets()
+
+    def _destroy_unused_ipsets(self):
+        """Destroys the ipsets of the security groups which are not granted
+        access by the rules of any instance anymore, once these rules have
+        been applied.
+        """
+        if self.ipset is None or self.iptables.iptables_apply_deferred:
+            return
+        used_names = set()
+        for ipv4_rules, ipv6_rules in self.instance_chain_rules.values():
+            for rule in ipv4_rules + ipv6_rules:
+                match = _MATCH_SET_RE.search(rule)
+                if match:
+                    used_names.add(match.group(1))
+        self.ipset.destroy_unused(used_names)
 
     def unfilter_instance(self, instance, network_info):
         if self.instance_info.pop(instance.id, None):
+            self.instance_chain_rules.pop(instance.id, None)
             self.remove_filters_for_instance(instance)
             self.iptables.apply()
+            self._destroy_unused_ipsets()
         else:
             LOG.info('Attempted to unfilter instance which is not filtered',
                      instance=instance)
@@ -143,6 +171,7 @@ class IptablesFirewallDriver(FirewallDriver):
         ipv4_rules, ipv6_rules = self.instance_rules(instance, network_info)
         self.add_filters_for_instance(instance, network_info, ipv4_rules,
                                       ipv6_rules)
+        self.instance_chain_rules[instance.id] = (ipv4_rules, ipv6_rules)
         LOG.debug('Filters added to instance: %s', instance.id,
                   instance=instance)
         # Ensure that DHCP request rule is updated if necessary
@@ -285,8 +314,42 @@ class IptablesFirewallDriver(FirewallDriver):
                     '--dports', '%s:%s' % (rule.from_port,
                                            rule.to_port)]
 
-    def instance_rules(self, instance, network_info):
+    def _get_grantee_ips(self, ctxt, grantee_group, version, group_ips):
+        """Returns the fixed IPs of the given version of the members of a
+        security group.
+
+        :param group_ips: Dict, keyed by security group ID, of the versions
+                          and addresses of the fixed IPs of the members of
+                          the security groups already looked up
+        """
+        if grantee_group.id not in group_ips:
+            group_ips[grantee_group.id] = []
+            insts = objects.InstanceList.get_by_security_group(
+                    ctxt, grantee_group)
+            for inst in insts:
+                if inst.info_cache.deleted:
+                    LOG.debug('ignoring deleted cache')
+                    continue
+                nw_info = inst.get_network_info()
+
+                ips = [(ip['version'], ip['address'])
+                       for ip in nw_info.fixed_ips()]
+
+                LOG.debug('ips: %r', ips, instance=inst)
+                group_ips[grantee_group.id] += ips
+        return [address for ip_version, address in group_ips[grantee_group.id]
+                if ip_version == version]
+
+    def instance_rules(self, instance, network_info, group_ips=None):
+        """Returns the ipv4 and ipv6 rules of the chain of an instance.
+
+        :param group_ips: Dict in which the fixed IPs of the members of the
+                          security groups granted access are looked up and
+                          stored, to share them between the instances
+        """
         ctxt = context.get_admin_context()
+        if group_ips is None:
+            group_ips = {}
         if isinstance(instance, dict):
             # NOTE(danms): allow old-world instance objects from
             # unconverted callers; all we need is instance.uuid below
@@ -347,18 +410,17 @@ class IptablesFirewallDriver(FirewallDriver):
                 fw_rules += [' '.join(args)]
             else:
                 if rule.grantee_group:
-                    insts = objects.InstanceList.get_by_security_group(
-                            ctxt, rule.grantee_group)
-                    for inst in insts:
-                        if inst.info_cache.deleted:
-                            LOG.debug('ignoring deleted cache')
-                            continue
-                        nw_info = inst.get_network_info()
-
-                        ips = [ip['address'] for ip in nw_info.fixed_ips()
-                               if ip['version'] == version]
-
-                        LOG.debug('ips: %r', ips, instance=inst)
+                    ips = self._get_grantee_ips(ctxt, rule.grantee_group,
+                                                version, group_ips)
+                    if self.ipset is not None:
+                        # Match the set of the members of the group, which
+                        # is updated without changing the rule
+                        name = self.ipset.set_members(
+                            'sg%s-v%s' % (rule.grantee_group.id, version),
+                            ips, 'inet' if version == 4 else 'inet6')
+                        subrule = args + ['-m set --match-set %s src' % name]
+                        fw_rules += [' '.join(subrule)]
+                    else:
                         for ip in ips:
                             subrule = args + ['-s %s' % ip]
                             fw_rules += [' '.join(subrule)]
@@ -376,10 +438,12 @@ class IptablesFirewallDriver(FirewallDriver):
     def refresh_security_group_rules(self, security_group):
         self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
+        self._destroy_unused_ipsets()
 
     def refresh_instance_security_rules(self, instance):
         self.do_refresh_instance_rules(instance)
         self.iptables.apply()
+        self._destroy_unused_ipsets()
 
     @utils.synchronized('iptables', external=True)
     def _inner_do_refresh_rules(self, instance, network_info, ipv4_rules,
@@ -389,11 +453,21 @@ class IptablesFirewallDriver(FirewallDriver):
             LOG.info('instance chain %s disappeared during refresh, skipping',
                      chain_name, instance=instance)
             return
+        if (self.instance_chain_rules.get(instance.id) ==
+                (ipv4_rules, ipv6_rules)):
+            # Only the members of the ipsets changed, if anything
+            LOG.debug('instance chain %s unchanged during refresh, skipping',
+                      chain_name, instance=instance)
+            return
         self.remove_filters_for_instance(instance)
         self.add_filters_for_instance(instance, network_info, ipv4_rules,
                                       ipv6_rules)
+        self.instance_chain_rules[instance.id] = (ipv4_rules, ipv6_rules)
 
     def do_refresh_security_group_rules(self, security_group):
+        # Look up the members of each security group granted access once for
+        # all the instances
+        group_ips = {}
         id_list = self.instance_info.keys()
         for instance_id in id_list:
             try:
@@ -403,7 +477,8 @@ class IptablesFirewallDriver(FirewallDriver):
                 # ignore this deleted instance and move on
                 continue
             ipv4_rules, ipv6_rules = self.instance_rules(instance,
-                                                         network_info)
+                                                         network_info,
+                                                         group_ips)
             self._inner_do_refresh_rules(instance, network_info, ipv4_rules,
                                          ipv6_rules)
 
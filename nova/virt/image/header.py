@@ -0,0 +1,268 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+In-process, read-only inspection of local disk image headers.
+
+Running ``qemu-img info`` costs a fork and exec (under prlimit) per call,
+which adds up on hot paths such as spawn, resize and the periodic disk
+accounting. For the simple and common cases, a qcow2 image whose header
+uses no features we do not understand or a file which is already known to
+be raw, the information we need can be read directly from the file.
+
+Every function here returns None when it cannot answer with the same
+confidence as qemu-img, in which case the caller must fall back to running
+qemu-img.
+"""
+
+import os
+import stat
+import struct
+
+from oslo_log import log as logging
+from oslo_utils import imageutils
+
+from nova.virt.image import model as imgmodel
+
+LOG = logging.getLogger(__name__)
+
+QCOW2_MAGIC = b'QFI\xfb'
+
+# Big-endian qcow2 header, version 2 fields:
+# magic, version, backing_file_offset, backing_file_size, cluster_bits,
+# size, crypt_method, l1_size, l1_table_offset, refcount_table_offset,
+# refcount_table_clusters, nb_snapshots, snapshots_offset
+_QCOW2_V2_HEADER = struct.Struct('>4sIQIIQIIQQIIQ')
+# Version 3 appends incompatible_features, compatible_features,
+# autoclear_features, refcount_order and header_length.
+_QCOW2_V3_HEADER_EXT = struct.Struct('>QQQII')
+_QCOW2_EXT_HEADER = struct.Struct('>II')
+
+_QCOW2_EXT_END = 0x00000000
+_QCOW2_EXT_BACKING_FORMAT = 0xE2792ACA
+
+# The only incompatible feature we can safely ignore is the dirty bit,
+# which only means that refcounts need to be rebuilt on the next
+# read-write open. Anything else (corrupt bit, external data file, ...)
+# is left to qemu-img.
+_QCOW2_INCOMPAT_DIRTY = 1 << 0
+
+# Same limits as qemu's block/qcow2.h.
+_QCOW2_MIN_CLUSTER_BITS = 9
+_QCOW2_MAX_CLUSTER_BITS = 21
+_QCOW2_MAX_BACKING_FILE_NAME = 1023
+_QCOW2_MAX_HEADER_EXT_BYTES = 64 * 1024
+
+# The amount of data read up front covers the fixed header, the header
+# extensions and the backing file name for any image qemu-img creates.
+_HEADER_READ_SIZE = 4096
+
+
+def _make_info(path, file_format, virtual_size, disk_size,
+               cluster_size=None, backing_file=None):
+    info = imageutils.QemuImgInfo()
+    info.image = path
+    info.file_format = file_format
+    info.virtual_size = virtual_size
+    info.disk_size = disk_size
+    info.cluster_size = cluster_size
+    info.backing_file = backing_file
+    info.snapshots = []
+    info.encrypted = None
+    return info
+
+
+def _allocated_size(st):
+    # This is what qemu-img reports as 'disk size' for files, and unlike
+    # st_size it accounts for holes in sparse images.
+    return st.st_blocks * 512
+
+
+def _read_at(f, offset, length):
+    f.seek(offset)
+    data = f.read(length)
+    if len(data) != length:
+        return None
+    return data
+
+
+def _backing_file_path(path, name):
+    """Resolve a backing file name the way qemu-img reports it.
+
+    qemu-img reports the "actual path" of a relative backing file, which is
+    the name joined to the directory of the image, and QemuImgInfo returns
+    that path rather than the name stored in the header.
+
+    :returns: the path, or None if the name has a protocol prefix.
+    """
+    # Same test as qemu's path_has_protocol()
+    if ':' in name.split('/', 1)[0]:
+        return None
+    if os.path.isabs(name):
+        return name
+    return os.path.join(os.path.dirname(path), name)
+
+
+def _qcow2_backing_format(f, header, offset, end):
+    """Walk the header extensions looking for the backing file format.
+
+    :returns: a (found, format) tuple; found is False if the extension
+              area could not be parsed.
+    """
+    backing_fmt = None
+    while offset + _QCOW2_EXT_HEADER.size <= end:
+        data = _read_at(f, offset, _QCOW2_EXT_HEADER.size)
+        if data is None:
+            return False, None
+        ext_type, ext_len = _QCOW2_EXT_HEADER.unpack(data)
+        offset += _QCOW2_EXT_HEADER.size
+        if ext_type == _QCOW2_EXT_END:
+            return True, backing_fmt
+        if offset + ext_len > end:
+            return False, None
+        if ext_type == _QCOW2_EXT_BACKING_FORMAT:
+            data = _read_at(f, offset, ext_len)
+            if data is None:
+                return False, None
+            backing_fmt = data.decode('utf-8', 'replace')
+        # Extension data is padded to a multiple of 8 bytes
+        offset += (ext_len + 7) & ~7
+    return False, None
+
+
+def qcow2_info(path):
+    """Return image info for a qcow2 image by reading its header.
+
+    :param path: path to a regular file
+    :returns: an oslo_utils.imageutils.QemuImgInfo, or None if the file is
+              not a qcow2 image or uses features not handled here.
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        data = f.read(_HEADER_READ_SIZE)
+        if len(data) < _QCOW2_V2_HEADER.size:
+            return None
+
+        (magic, version, backing_file_offset, backing_file_size,
+         cluster_bits, size, crypt_method, _l1_size, _l1_table_offset,
+         _refcount_table_offset, _refcount_table_clusters, nb_snapshots,
+         _snapshots_offset) = _QCOW2_V2_HEADER.unpack_from(data)
+
+        if magic != QCOW2_MAGIC:
+            return None
+
+        if version not in (2, 3):
+            LOG.debug('Unsupported qcow2 version %(version)d in %(path)s',
+                      {'version': version, 'path': path})
+            return None
+
+        if not (_QCOW2_MIN_CLUSTER_BITS <= cluster_bits <=
+                _QCOW2_MAX_CLUSTER_BITS):
+            return None
+
+        # Encrypted images and images with internal snapshots produce
+        # extra qemu-img output which callers may rely on.
+        if crypt_method != 0 or nb_snapshots != 0:
+            return None
+
+        cluster_size = 1 << cluster_bits
+        header_length = _QCOW2_V2_HEADER.size
+        if version == 3:
+            if len(data) < (_QCOW2_V2_HEADER.size +
+                            _QCOW2_V3_HEADER_EXT.size):
+                return None
+            (incompatible, _compatible, _autoclear, _refcount_order,
+             header_length) = _QCOW2_V3_HEADER_EXT.unpack_from(
+                data, _QCOW2_V2_HEADER.size)
+            if incompatible & ~_QCOW2_INCOMPAT_DIRTY:
+                return None
+            if (header_length < _QCOW2_V2_HEADER.size +
+                    _QCOW2_V3_HEADER_EXT.size or
+                    header_length > cluster_size):
+                return None
+
+        backing_file = None
+        backing_fmt = None
+        if backing_file_offset:
+            if (backing_file_size == 0 or
+                    backing_file_size > _QCOW2_MAX_BACKING_FILE_NAME or
+                    backing_file_offset + backing_file_size > cluster_size):
+                return None
+            name = _read_at(f, backing_file_offset, backing_file_size)
+            if name is None:
+                return None
+            backing_file = _backing_file_path(path, name.decode('utf-8'))
+            if backing_file is None:
+                return None
+
+            # Header extensions live between the end of the header and the
+            # backing file name (or the end of the first cluster).
+            ext_end = backing_file_offset
+        else:
+            ext_end = cluster_size
+
+        ext_end = min(ext_end, header_length + _QCOW2_MAX_HEADER_EXT_BYTES)
+        found, backing_fmt = _qcow2_backing_format(f, data, header_length,
+                                                   ext_end)
+        if not found:
+            return None
+
+    info = _make_info(path, imgmodel.FORMAT_QCOW2, size,
+                      _allocated_size(st), cluster_size=cluster_size,
+                      backing_file=backing_file)
+    info.backing_file_format = backing_fmt
+    return info
+
+
+def raw_info(path):
+    """Return image info for a file which is known to be a raw image.
+
+    The caller must already know the image is raw: this does not (and
+    cannot safely) probe the format.
+
+    :param path: path to a regular file
+    :returns: an oslo_utils.imageutils.QemuImgInfo, or None if path is not
+              a regular file.
+    """
+    st = os.stat(path)
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return _make_info(path, imgmodel.FORMAT_RAW, st.st_size,
+                      _allocated_size(st))
+
+
+def get_info(path, format=None):
+    """Return image info for path without running qemu-img, if possible.
+
+    A qcow2 image is recognised by its header regardless of format, as
+    qemu itself would do. A raw image is only handled when the caller
+    explicitly says the image is raw, because an arbitrary file can only
+    be identified as raw by ruling out every other format qemu supports.
+
+    :param path: path to the image
+    :param format: the on-disk format of path, if known
+    :returns: an oslo_utils.imageutils.QemuImgInfo, or None if the caller
+              must fall back to qemu-img.
+    """
+    try:
+        if format == imgmodel.FORMAT_RAW:
+            return raw_info(path)
+        if format in (None, imgmodel.FORMAT_QCOW2):
+            return qcow2_info(path)
+    except (IOError, OSError, UnicodeDecodeError, struct.error) as e:
+        LOG.debug('Unable to inspect image header of %(path)s: %(err)s',
+                  {'path': path, 'err': e})
+    return None
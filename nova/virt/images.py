@@ -33,6 +33,7 @@ from nova import exception
 from nova.i18n import _
 from nova import image
 from nova import utils
+from nova.virt.image import header as image_header
 
 LOG = logging.getLogger(__name__)
 
@@ -63,6 +64,11 @@ def qemu_img_info(path, format=None):
             os.path.exists(os.path.join(path, "DiskDescriptor.xml"))):
             path = os.path.join(path, "root.hds")
 
+        if CONF.inspect_image_headers:
+            info = image_header.get_info(path, format)
+            if info is not None:
+                return info
+
         cmd = ('env', 'LC_ALL=C', 'LANG=C', 'qemu-img', 'info', path)
         if format is not None:
             cmd = cmd + ('-f', format)
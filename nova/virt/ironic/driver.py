@@ -76,7 +76,7 @@ _UNPROVISION_STATES = (ironic_states.ACTIVE, ironic_states.DEPLOYFAIL,
 
 _NODE_FIELDS = ('uuid', 'power_state', 'target_power_state', 'provision_state',
                 'target_provision_state', 'last_error', 'maintenance',
-                'properties', 'instance_uuid')
+                'properties', 'instance_uuid', 'resource_class')
 
 # Console state checking interval in seconds
 _CONSOLE_STATE_CHECKING_INTERVAL = 1
@@ -157,6 +157,11 @@ class IronicDriver(virt_driver.ComputeDriver):
             default='nova.virt.firewall.NoopFirewallDriver')
         self.node_cache = {}
         self.node_cache_time = 0
+        self.hash_ring = None
+        self._hash_ring_hosts = None
+        # Whether each node maps to this service on the current hash ring,
+        # keyed by node UUID.
+        self._hash_ring_nodes = {}
         self.servicegroup_api = servicegroup.API()
 
         self.ironicclient = client_wrapper.IronicClientWrapper()
@@ -619,11 +624,15 @@ class IronicDriver(virt_driver.ComputeDriver):
         """
         # NOTE(lucasagomes): limit == 0 is an indicator to continue
         # pagination until there're no more values to be returned.
-        node_list = self._get_node_list(associated=True, limit=0)
+        node_list = self._get_node_list(associated=True,
+                                        fields=('instance_uuid',), limit=0)
+        if not node_list:
+            return []
         context = nova_context.get_admin_context()
-        return [objects.Instance.get_by_uuid(context,
-                                             i.instance_uuid).name
-                for i in node_list]
+        instances = objects.InstanceList.get_by_filters(
+            context, {'uuid': [node.instance_uuid for node in node_list]},
+            expected_attrs=[])
+        return [instance.name for instance in instances]
 
     def list_instance_uuids(self):
         """Return the UUIDs of all the instances provisioned.
@@ -634,7 +643,9 @@ class IronicDriver(virt_driver.ComputeDriver):
         # NOTE(lucasagomes): limit == 0 is an indicator to continue
         # pagination until there're no more values to be returned.
         return list(n.instance_uuid
-                    for n in self._get_node_list(associated=True, limit=0))
+                    for n in self._get_node_list(associated=True,
+                                                 fields=('instance_uuid',),
+                                                 limit=0))
 
     def node_is_available(self, nodename):
         """Confirms a Nova hypervisor node exists in the Ironic inventory.
@@ -681,8 +692,24 @@ class IronicDriver(virt_driver.ComputeDriver):
         # table will be here so far, and we might be brand new.
         services.add(CONF.host)
 
-        self.hash_ring = hash_ring.HashRing(services,
-                                            partitions=_HASH_RING_PARTITIONS)
+        # NOTE: The nodes are only mapped to the services again when the set
+        # of services changes, as hashing every node of a large inventory on
+        # each refresh is expensive.
+        if services != self._hash_ring_hosts:
+            self.hash_ring = hash_ring.HashRing(
+                services, partitions=_HASH_RING_PARTITIONS)
+            self._hash_ring_hosts = services
+            self._hash_ring_nodes = {}
+
+    def _node_maps_to_us(self, node_uuid):
+        """Whether a node maps to this service on the hash ring."""
+        try:
+            return self._hash_ring_nodes[node_uuid]
+        except KeyError:
+            mine = CONF.host in self.hash_ring.get_nodes(
+                node_uuid.encode('utf-8'))
+            self._hash_ring_nodes[node_uuid] = mine
+            return mine
 
     def _refresh_cache(self):
         # NOTE(lucasagomes): limit == 0 is an indicator to continue
@@ -691,8 +718,13 @@ class IronicDriver(virt_driver.ComputeDriver):
         self._refresh_hash_ring(ctxt)
         instances = objects.InstanceList.get_uuids_by_host(ctxt, CONF.host)
         node_cache = {}
+        node_uuids = set()
 
-        for node in self._get_node_list(detail=True, limit=0):
+        # NOTE: Only the fields used by the driver are requested, which makes
+        # the response for large inventories much smaller and cheaper to
+        # build and parse.
+        for node in self._get_node_list(fields=_NODE_FIELDS, limit=0):
+            node_uuids.add(node.uuid)
             # NOTE(jroll): we always manage the nodes for instances we manage
             if node.instance_uuid in instances:
                 node_cache[node.uuid] = node
@@ -704,10 +736,12 @@ class IronicDriver(virt_driver.ComputeDriver):
             # nova while the service was down, and not yet reaped, will not be
             # reported until the periodic task cleans it up.
             elif (node.instance_uuid is None and
-                  CONF.host in
-                  self.hash_ring.get_nodes(node.uuid.encode('utf-8'))):
+                  self._node_maps_to_us(node.uuid)):
                 node_cache[node.uuid] = node
 
+        # Forget the hash ring mapping of the nodes removed from Ironic.
+        for node_uuid in set(self._hash_ring_nodes) - node_uuids:
+            del self._hash_ring_nodes[node_uuid]
         self.node_cache = node_cache
         self.node_cache_time = time.time()
         # For Pike, we need to ensure that all instances have their flavor
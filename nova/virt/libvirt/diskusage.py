@@ -0,0 +1,111 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import collections
+import os
+
+from oslo_log import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+_Entry = collections.namedtuple('_Entry', ['instance_uuid', 'driver_type',
+                                           'stamp', 'value'])
+
+
+class DiskUsageCache(object):
+    """Per-instance cache of the expensive parts of local disk usage.
+
+    Working out the virtual size and backing file of a qcow2 disk means
+    inspecting the image, which the periodic resource update used to do
+    for every local disk of every domain on the host. Entries are keyed on
+    the disk path and stamped with the mtime and size of the file, so the
+    periodic task only re-inspects disks which have changed since the
+    last pass. Entries are also dropped explicitly by the driver whenever
+    an operation (spawn, resize, migration, snapshot, delete) may have
+    replaced the disks of an instance.
+    """
+
+    def __init__(self):
+        self._disks = {}
+        self._instances = collections.defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def get(self, path, driver_type):
+        """Look up the cached value for a disk.
+
+        :param path: path of the disk file
+        :param driver_type: the disk format, e.g. 'qcow2'
+        :returns: a (stamp, value) tuple. value is None if the disk is not
+                  cached or has changed since it was cached, in which case
+                  stamp should be passed to put() along with the freshly
+                  computed value.
+        """
+        stamp = self._stamp(path)
+        entry = self._disks.get(path)
+        if (stamp is not None and entry is not None and
+                entry.stamp == stamp and entry.driver_type == driver_type):
+            self.hits += 1
+            return stamp, entry.value
+        self.misses += 1
+        return stamp, None
+
+    def put(self, instance_uuid, path, driver_type, stamp, value):
+        """Cache the value computed for a disk.
+
+        :param instance_uuid: uuid of the instance owning the disk
+        :param path: path of the disk file
+        :param driver_type: the disk format, e.g. 'qcow2'
+        :param stamp: the stamp returned by get() before value was computed
+        :param value: the value to cache
+        """
+        if stamp is None:
+            return
+        old = self._disks.get(path)
+        if old is not None and old.instance_uuid != instance_uuid:
+            self._instances[old.instance_uuid].discard(path)
+        self._disks[path] = _Entry(instance_uuid, driver_type, stamp, value)
+        self._instances[instance_uuid].add(path)
+
+    def invalidate(self, instance_uuid):
+        """Drop all cached disks of an instance.
+
+        :param instance_uuid: uuid of the instance
+        """
+        for path in self._instances.pop(instance_uuid, ()):
+            self._disks.pop(path, None)
+
+    def retain(self, instance_uuids):
+        """Drop cached disks of all instances not in instance_uuids.
+
+        :param instance_uuids: iterable of uuids of instances on the host
+        """
+        keep = set(instance_uuids)
+        for instance_uuid in set(self._instances) - keep:
+            self.invalidate(instance_uuid)
+
+    def stats(self):
+        """Return and reset the hit and miss counters."""
+        stats = {'disks': len(self._disks), 'hits': self.hits,
+                 'misses': self.misses}
+        self.hits = self.misses = 0
+        return stats
@@ -97,6 +97,7 @@ from nova.virt.image import model as imgmodel
 from nova.virt import images
 from nova.virt.libvirt import blockinfo
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import diskusage
 from nova.virt.libvirt import firewall as libvirt_firewall
 from nova.virt.libvirt import guest as libvirt_guest
 from nova.virt.libvirt import host
@@ -317,7 +318,7 @@ class LibvirtDriver(driver.ComputeDriver):
             libvirt_migrate.libvirt = libvirt
 
         self._host = host.Host(self._uri(), read_only,
-                               lifecycle_event_handler=self.emit_event,
+                               lifecycle_event_handler=self.emit_events,
                                conn_event_handler=self._handle_conn_event)
         self._initiator = None
         self._fc_wwnns = None
@@ -375,6 +376,7 @@ class LibvirtDriver(driver.ComputeDriver):
             CONF.libvirt.sysinfo_serial)
 
         self.job_tracker = instancejobtracker.InstanceJobTracker()
+        self._disk_usage = diskusage.DiskUsageCache()
         self._remotefs = remotefs.RemoteFilesystem()
 
         self._live_migration_flags = self._block_migration_flags = 0
@@ -1016,6 +1018,7 @@ class LibvirtDriver(driver.ComputeDriver):
         if migrate_data and 'is_shared_block_storage' in migrate_data:
             is_shared_block_storage = migrate_data.is_shared_block_storage
         if destroy_disks or is_shared_block_storage:
+            self._disk_usage.invalidate(instance.uuid)
             attempts = int(instance.system_metadata.get('clean_attempts',
                                                         '0'))
             success = self.delete_instance_files(instance)
@@ -1125,6 +1128,7 @@ class LibvirtDriver(driver.ComputeDriver):
             host=CONF.host)
 
     def _cleanup_resize(self, instance, network_info):
+        self._disk_usage.invalidate(instance.uuid)
         inst_base = libvirt_utils.get_instance_path(instance)
         target = inst_base + '_resize'
 
@@ -1612,6 +1616,7 @@ class LibvirtDriver(driver.ComputeDriver):
         except exception.InstanceNotFound:
             raise exception.InstanceNotRunning(instance_id=instance.uuid)
 
+        self._disk_usage.invalidate(instance.uuid)
         snapshot = self._image_api.get(context, image_id)
 
         # source_format is an on-disk format
@@ -2786,6 +2791,7 @@ class LibvirtDriver(driver.ComputeDriver):
     def spawn(self, context, instance, image_meta, injected_files,
               admin_password, allocations, network_info=None,
               block_device_info=None):
+        self._disk_usage.invalidate(instance.uuid)
         disk_info = blockinfo.get_disk_info(CONF.libvirt.virt_type,
                                             instance,
                                             image_meta,
@@ -7228,8 +7234,21 @@ class LibvirtDriver(driver.ComputeDriver):
                 continue
 
             if driver_type in ("qcow2", "ploop"):
-                backing_file = libvirt_utils.get_disk_backing_file(path)
-                virt_size = disk_api.get_disk_size(path)
+                # NOTE: Inspecting the image is the expensive part, so the
+                # result is cached for qcow2 disks until the file changes.
+                # Ploop disks are directories whose mtime does not track
+                # changes to the image inside them.
+                stamp, cached = None, None
+                if driver_type == "qcow2":
+                    stamp, cached = self._disk_usage.get(path, driver_type)
+                if cached is not None:
+                    backing_file, virt_size = cached
+                else:
+                    backing_file = libvirt_utils.get_disk_backing_file(path)
+                    virt_size = disk_api.get_disk_size(path)
+                    self._disk_usage.put(guest_config.uuid, path,
+                                         driver_type, stamp,
+                                         (backing_file, virt_size))
                 over_commit_size = int(virt_size) - dk_size
             else:
                 backing_file = ""
@@ -7272,11 +7291,13 @@ class LibvirtDriver(driver.ComputeDriver):
         # Disk size that all instance uses : virtual_size - disk_size
         disk_over_committed_size = 0
         instance_domains = self._host.list_instance_domains(only_running=False)
+        # Get all instance uuids
+        instance_uuids = [dom.UUIDString() for dom in instance_domains]
+        # Forget about the disks of domains which are no longer on the host
+        self._disk_usage.retain(instance_uuids)
         if not instance_domains:
             return disk_over_committed_size
 
-        # Get all instance uuids
-        instance_uuids = [dom.UUIDString() for dom in instance_domains]
         ctx = nova_context.get_admin_context()
         # Get instance object list by uuid filter
         filters = {'uuid': instance_uuids}
@@ -7350,6 +7371,7 @@ class LibvirtDriver(driver.ComputeDriver):
                             {'i_name': guest.name, 'error': e})
             # NOTE(gtt116): give other tasks a chance.
             greenthread.sleep(0)
+        LOG.debug('Disk usage cache statistics: %s', self._disk_usage.stats())
         return disk_over_committed_size
 
     def unfilter_instance(self, instance, network_info):
@@ -7416,6 +7438,7 @@ class LibvirtDriver(driver.ComputeDriver):
                                    timeout=0, retry_interval=0):
         LOG.debug("Starting migrate_disk_and_power_off",
                    instance=instance)
+        self._disk_usage.invalidate(instance.uuid)
 
         ephemerals = driver.block_device_info_get_ephemerals(block_device_info)
 
@@ -7550,6 +7573,7 @@ class LibvirtDriver(driver.ComputeDriver):
                          network_info, image_meta, resize_instance,
                          block_device_info=None, power_on=True):
         LOG.debug("Starting finish_migration", instance=instance)
+        self._disk_usage.invalidate(instance.uuid)
 
         block_disk_info = blockinfo.get_disk_info(CONF.libvirt.virt_type,
                                                   instance,
@@ -7656,6 +7680,7 @@ class LibvirtDriver(driver.ComputeDriver):
                                 block_device_info=None, power_on=True):
         LOG.debug("Starting finish_revert_migration",
                   instance=instance)
+        self._disk_usage.invalidate(instance.uuid)
 
         inst_base = libvirt_utils.get_instance_path(instance)
         inst_base_resize = inst_base + "_resize"
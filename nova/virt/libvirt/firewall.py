@@ -341,8 +341,10 @@ class IptablesFirewallDriver(base_firewall.IptablesFirewallDriver):
         # NOTE(salvatore-orlando):
         # Overriding base class method for applying nwfilter operation
         if self.instance_info.pop(instance.id, None):
+            self.instance_chain_rules.pop(instance.id, None)
             self.remove_filters_for_instance(instance)
             self.iptables.apply()
+            self._destroy_unused_ipsets()
             self.nwfilter.unfilter_instance(instance, network_info)
         else:
             LOG.info('Attempted to unfilter instance which is not filtered',
@@ -27,11 +27,13 @@ the raw libvirt API. These APIs are then used by all
 the other libvirt related classes
 """
 
+import collections
 import operator
 import os
 import socket
 import sys
 import threading
+import time
 
 from eventlet import greenio
 from eventlet import greenthread
@@ -86,6 +88,7 @@ class Host(object):
         self._initial_connection = True
         self._conn_event_handler = conn_event_handler
         self._conn_event_handler_queue = six.moves.queue.Queue()
+        # Called with a list of nova.virt.event.LifecycleEvent
         self._lifecycle_event_handler = lifecycle_event_handler
         self._caps = None
         self._hostname = None
@@ -94,12 +97,18 @@ class Host(object):
         self._wrapped_conn_lock = threading.Lock()
         self._event_queue = None
 
-        self._events_delayed = {}
+        # Maps instance uuids to (deadline, event) for delayed events, in
+        # deadline order. They are all emitted by a single timer.
+        self._events_delayed = collections.OrderedDict()
+        self._events_delayed_timer = None
         # Note(toabctl): During a reboot of a domain, STOPPED and
         #                STARTED events are sent. To prevent shutting
         #                down the domain during a reboot, delay the
         #                STOPPED lifecycle event some seconds.
         self._lifecycle_delay = 15
+        self._event_stats = {'received': 0, 'coalesced': 0, 'emitted': 0,
+                             'batches': 0, 'max_queue_depth': 0,
+                             'max_latency': 0.0}
 
         self._initialized = False
 
@@ -234,8 +243,9 @@ class Host(object):
         if self._event_queue is None:
             return
 
-        # Queue the event...
-        self._event_queue.put(event)
+        # Queue the event, with the time it was received so that the
+        # dispatch latency can be measured...
+        self._event_queue.put((time.time(), event))
 
         # ...then wakeup the green thread to dispatch it
         c = ' '.encode()
@@ -258,19 +268,32 @@ class Host(object):
             return  # will be raised when pipe is closed
 
         # Process as many events as possible without
-        # blocking
+        # blocking. Only the last lifecycle event of each domain matters,
+        # so superseded events queued during a burst are dropped.
+        depth = self._event_queue.qsize()
         last_close_event = None
+        lifecycle_events = collections.OrderedDict()
+        received = 0
+        max_latency = 0.0
+        now = time.time()
         while not self._event_queue.empty():
             try:
-                event = self._event_queue.get(block=False)
+                queued_at, event = self._event_queue.get(block=False)
                 if isinstance(event, virtevent.LifecycleEvent):
-                    # call possibly with delay
-                    self._event_emit_delayed(event)
+                    received += 1
+                    max_latency = max(max_latency, now - queued_at)
+                    lifecycle_events.pop(event.uuid, None)
+                    lifecycle_events[event.uuid] = event
 
                 elif 'conn' in event and 'reason' in event:
                     last_close_event = event
             except native_Queue.Empty:
                 pass
+        if lifecycle_events:
+            self._update_event_stats(depth, received, len(lifecycle_events),
+                                     max_latency)
+            # call possibly with delay
+            self._event_emit_delayed(list(lifecycle_events.values()))
         if last_close_event is None:
             return
         conn = last_close_event['conn']
@@ -283,38 +306,71 @@ class Host(object):
                 self._wrapped_conn = None
                 self._queue_conn_event_handler(False, msg)
 
-    def _event_emit_delayed(self, event):
+    def _update_event_stats(self, depth, received, emitted, latency):
+        stats = self._event_stats
+        stats['received'] += received
+        stats['coalesced'] += received - emitted
+        stats['batches'] += 1
+        stats['max_queue_depth'] = max(stats['max_queue_depth'], depth)
+        stats['max_latency'] = max(stats['max_latency'], latency)
+        if received > 1:
+            LOG.debug("Dispatching %(emitted)d lifecycle events out of "
+                      "%(received)d received (queue depth %(depth)d, "
+                      "latency %(latency).3fs); totals: %(stats)s",
+                      {'emitted': emitted, 'received': received,
+                       'depth': depth, 'latency': latency, 'stats': stats})
+
+    def _event_emit_delayed(self, events):
         """Emit events - possibly delayed."""
-        def event_cleanup(gt, *args, **kwargs):
-            """Callback function for greenthread. Called
-            to cleanup the _events_delayed dictionary when an event
-            was called.
-            """
-            event = args[0]
-            self._events_delayed.pop(event.uuid, None)
-
-        # Cleanup possible delayed stop events.
-        if event.uuid in self._events_delayed.keys():
-            self._events_delayed[event.uuid].cancel()
-            self._events_delayed.pop(event.uuid, None)
-            LOG.debug("Removed pending event for %s due to "
-                      "lifecycle event", event.uuid)
-
-        if event.transition == virtevent.EVENT_LIFECYCLE_STOPPED:
-            # Delay STOPPED event, as they may be followed by a STARTED
-            # event in case the instance is rebooting
-            id_ = greenthread.spawn_after(self._lifecycle_delay,
-                                          self._event_emit, event)
-            self._events_delayed[event.uuid] = id_
-            # add callback to cleanup self._events_delayed dict after
-            # event was called
-            id_.link(event_cleanup, event)
-        else:
-            self._event_emit(event)
-
-    def _event_emit(self, event):
+        immediate = []
+        for event in events:
+            # Cleanup possible delayed stop events.
+            if self._events_delayed.pop(event.uuid, None) is not None:
+                LOG.debug("Removed pending event for %s due to "
+                          "lifecycle event", event.uuid)
+
+            if event.transition == virtevent.EVENT_LIFECYCLE_STOPPED:
+                # Delay STOPPED event, as they may be followed by a STARTED
+                # event in case the instance is rebooting
+                self._events_delayed[event.uuid] = (
+                    time.time() + self._lifecycle_delay, event)
+            else:
+                immediate.append(event)
+
+        if self._events_delayed and self._events_delayed_timer is None:
+            self._events_delayed_timer = greenthread.spawn_after(
+                self._lifecycle_delay, self._event_emit_expired)
+        if immediate:
+            self._event_emit(immediate)
+
+    def _event_emit_expired(self):
+        """Emit the delayed events whose delay has expired.
+
+        Called by the delayed events timer, which is rescheduled for the
+        next deadline if any delayed events remain.
+        """
+        self._events_delayed_timer = None
+        now = time.time()
+        expired = []
+        while self._events_delayed:
+            uuid, (deadline, event) = next(
+                six.iteritems(self._events_delayed))
+            if deadline > now:
+                break
+            del self._events_delayed[uuid]
+            expired.append(event)
+
+        if self._events_delayed:
+            deadline = next(six.itervalues(self._events_delayed))[0]
+            self._events_delayed_timer = greenthread.spawn_after(
+                max(0, deadline - now), self._event_emit_expired)
+        if expired:
+            self._event_emit(expired)
+
+    def _event_emit(self, events):
         if self._lifecycle_event_handler is not None:
-            self._lifecycle_event_handler(event)
+            self._event_stats['emitted'] += len(events)
+            self._lifecycle_event_handler(events)
 
     def _init_events_pipe(self):
         """Create a self-pipe for the native thread to synchronize on.
@@ -27,7 +27,6 @@ from cinderclient import api_versions as cinder_api_versions
 from cinderclient import client as cinder_client
 from cinderclient import exceptions as cinder_exception
 from keystoneauth1 import exceptions as keystone_exception
-from keystoneauth1 import loading as ks_loading
 from oslo_log import log as logging
 from oslo_utils import encodeutils
 from oslo_utils import excutils
@@ -41,6 +40,7 @@ from nova.i18n import _
 from nova.i18n import _LE
 from nova.i18n import _LW
 from nova import service_auth
+from nova import service_clients
 
 
 CONF = nova.conf.CONF
@@ -68,7 +68,14 @@ def _check_microversion(url, microversion):
         construct the cinder v3 client object.
     :raises: CinderAPIVersionNotAvailable if the microversion is not available.
     """
-    max_api_version = cinder_client.get_highest_client_server_version(url)
+    # NOTE: the endpoints of the projects in the catalog, or built from the
+    # endpoint template, are the same volume service, so its version is
+    # discovered once for all of them
+    max_api_version = service_clients.discover(
+        'volume',
+        (CONF.cinder.endpoint_template or CONF.cinder.catalog_info,
+         CONF.cinder.os_region_name),
+        lambda: cinder_client.get_highest_client_server_version(url))
     # get_highest_client_server_version returns a float which we need to cast
     # to a str and create an APIVersion object to do our version comparison.
     max_api_version = cinder_api_versions.APIVersion(str(max_api_version))
@@ -95,8 +102,8 @@ def cinderclient(context, microversion=None, skip_version_check=False):
     global _SESSION
 
     if not _SESSION:
-        _SESSION = ks_loading.load_session_from_conf_options(
-            CONF, nova.conf.cinder.cinder_group.name)
+        _SESSION = service_clients.load_session(
+            nova.conf.cinder.cinder_group.name)
 
     url = None
     endpoint_override = None
@@ -132,13 +139,17 @@ def cinderclient(context, microversion=None, skip_version_check=False):
         else:
             version = _check_microversion(url, microversion)
 
-    return cinder_client.Client(version,
-                                session=_SESSION,
-                                auth=auth,
-                                endpoint_override=endpoint_override,
-                                connect_retries=CONF.cinder.http_retries,
-                                global_request_id=context.global_id,
-                                **service_parameters)
+    def create():
+        return cinder_client.Client(version,
+                                    session=_SESSION,
+                                    auth=auth,
+                                    endpoint_override=endpoint_override,
+                                    connect_retries=CONF.cinder.http_retries,
+                                    global_request_id=context.global_id,
+                                    **service_parameters)
+
+    return service_clients.get_client(context, 'volume', (url, version),
+                                      create)
 
 
 def _untranslate_volume_summary_view(context, vol):
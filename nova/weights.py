@@ -19,6 +19,7 @@ Pluggable Weighing support
 
 import abc
 
+from oslo_utils import timeutils
 import six
 
 from nova import loadables
@@ -121,14 +122,20 @@ class BaseWeigher(object):
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
-    def get_weighed_objects(self, weighers, obj_list, weighing_properties):
-        """Return a sorted (descending), normalized list of WeighedObjects."""
+    def get_weighed_objects(self, weighers, obj_list, weighing_properties,
+                            trace=None):
+        """Return a sorted (descending), normalized list of WeighedObjects.
+
+        If a trace is given, the duration of each weigher is added to it.
+        """
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
 
         if len(weighed_objs) <= 1:
             return weighed_objs
 
         for weigher in weighers:
+            if trace is not None:
+                timer = timeutils.StopWatch().start()
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -139,5 +146,8 @@ class BaseWeightHandler(loadables.BaseLoader):
             for i, weight in enumerate(weights):
                 obj = weighed_objs[i]
                 obj.weight += weigher.weight_multiplier() * weight
+            if trace is not None:
+                trace.add('weigher.%s' % weigher.__class__.__name__,
+                          timer.elapsed())
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
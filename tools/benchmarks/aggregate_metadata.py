@@ -0,0 +1,149 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Measure the aggregate filters of the scheduler with and without the index of
+the aggregate metadata of the hosts.
+
+Each host belongs to an availability zone aggregate and to a few other
+aggregates restricting them to some tenants, overcommitting their CPUs and
+exposing some image properties and flavor extra specs. The aggregate filters
+are run on all the hosts for each request, once with the metadata of the
+aggregates of each host scanned for each lookup, like the filters did
+before, and once with the index the host manager keeps for each host.
+
+Usage:
+
+    python tools/benchmarks/aggregate_metadata.py [--hosts N]
+        [--aggregates N] [--aggregates-per-host N] [--requests N]
+        [--seed N]
+"""
+import argparse
+import random
+import time
+
+import nova.conf
+from nova import objects
+from nova.scheduler.filters import aggregate_image_properties_isolation
+from nova.scheduler.filters import aggregate_instance_extra_specs
+from nova.scheduler.filters import aggregate_multitenancy_isolation
+from nova.scheduler.filters import availability_zone_filter
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import utils as filters_utils
+from nova.scheduler import host_manager
+from nova.tests.unit import conf_fixture
+
+CONF = nova.conf.CONF
+
+ZONES = 10
+TENANTS = 50
+
+
+def create_aggregates(args):
+    aggregates = []
+    for index in range(args.aggregates):
+        if index < ZONES:
+            metadata = {'availability_zone': 'az-%d' % index}
+        else:
+            metadata = {
+                'filter_tenant_id': ','.join(
+                    'tenant-%d' % ((index + offset) % TENANTS)
+                    for offset in range(3)),
+                'cpu_allocation_ratio': str(float(index % 4 + 1)),
+                'hw_vendor': 'vendor-%d' % (index % 5),
+                'ssd': str(index % 2 == 0).lower()}
+        aggregates.append(objects.Aggregate(id=index, name='agg-%d' % index,
+                                            metadata=metadata))
+    return aggregates
+
+
+def create_hosts(args, aggregates):
+    hosts = []
+    for index in range(args.hosts):
+        host = host_manager.HostState('host-%d' % index, 'node-%d' % index,
+                                      None)
+        host.aggregates = [aggregates[index % ZONES]] + random.sample(
+            aggregates[ZONES:], args.aggregates_per_host - 1)
+        host.vcpus_total = 32
+        host.vcpus_used = 16
+        hosts.append(host)
+    return hosts
+
+
+def create_request(index):
+    return objects.RequestSpec(
+        project_id='tenant-%d' % (index % TENANTS),
+        availability_zone='az-%d' % (index % ZONES),
+        flavor=objects.Flavor(vcpus=2, memory_mb=2048, root_gb=20,
+                              ephemeral_gb=0, swap=0,
+                              extra_specs={'ssd': 'true'}),
+        image=objects.ImageMeta(properties=objects.ImageMetaProps()))
+
+
+def run(args, name, hosts, indexed):
+    filters = [availability_zone_filter.AvailabilityZoneFilter(),
+               aggregate_multitenancy_isolation.
+               AggregateMultiTenancyIsolation(),
+               aggregate_instance_extra_specs.
+               AggregateInstanceExtraSpecsFilter(),
+               aggregate_image_properties_isolation.
+               AggregateImagePropertiesIsolation(),
+               core_filter.AggregateCoreFilter()]
+    for host in hosts:
+        host.aggregates_metadata = (
+            filters_utils.AggregateMetadata(host.aggregates)
+            if indexed else None)
+
+    passed = 0
+    timings = []
+    for index in range(args.requests):
+        spec_obj = create_request(index)
+        start = time.time()
+        for host in hosts:
+            if all([f.host_passes(host, spec_obj) for f in filters]):
+                passed += 1
+        timings.append(time.time() - start)
+
+    timings.sort()
+    print('%-7s p50: %8.1f ms  max: %8.1f ms  hosts passing: %d' % (
+        name, timings[len(timings) // 2] * 1000, timings[-1] * 1000,
+        passed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hosts', type=int, default=10000,
+                        help='number of hosts')
+    parser.add_argument('--aggregates', type=int, default=500,
+                        help='number of aggregates, including the '
+                             'availability zones')
+    parser.add_argument('--aggregates-per-host', type=int, default=5,
+                        help='number of aggregates of each host, including '
+                             'its availability zone')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='number of scheduling requests')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random aggregates of the hosts')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    conf_fixture.ConfFixture(CONF).setUp()
+    aggregates = create_aggregates(args)
+    hosts = create_hosts(args, aggregates)
+    print('%d hosts in %d aggregates, %d aggregates per host' % (
+        args.hosts, args.aggregates, args.aggregates_per_host))
+    run(args, 'legacy', hosts, indexed=False)
+    run(args, 'indexed', hosts, indexed=True)
+
+
+if __name__ == '__main__':
+    main()
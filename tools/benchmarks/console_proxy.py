@@ -0,0 +1,171 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Measure the relay of the console traffic by the websocket console proxy.
+
+A fake VNC server streams framebuffer updates to the proxy, which relays them
+to a fake websocket client sending pointer events back, like a console whose
+screen keeps changing. The throughput of the relay is reported, along with
+the number of such sessions a core could relay.
+
+Usage:
+
+    python tools/benchmarks/console_proxy.py [--megabytes N]
+        [--update-size N] [--events N] [--client-read-size N]
+        [--session-rate N]
+
+The fake server and client run in their own processes, so the CPU time
+reported is the one of the proxy only.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import struct
+import time
+
+import websockify
+
+from nova.console import websocketproxy
+
+
+class FakeServer(object):
+    heartbeat = None
+    target_host = 'fake-vnc-server'
+    target_port = 5900
+
+
+def serve_updates(sock, args, inherited):
+    """Streams framebuffer updates, then reads the events of the client until
+    the proxy closes the connection.
+    """
+    for other in inherited:
+        other.close()
+    update = os.urandom(args.update_size)
+    for index in range(args.megabytes * 1024 * 1024 // args.update_size):
+        sock.sendall(update)
+    sock.shutdown(socket.SHUT_WR)
+    while sock.recv(65536):
+        pass
+    sock.close()
+
+
+def pointer_event(index):
+    """Returns a masked websocket frame of an RFB pointer event."""
+    payload = struct.pack('>BBHH', 5, 0, index % 1024, index % 768)
+    mask = os.urandom(4)
+    masked = bytes(bytearray(
+        byte ^ mask[i % 4] for i, byte in enumerate(bytearray(payload))))
+    mask = bytearray(mask)
+    return struct.pack('>BB', 0x82, 0x80 | len(payload)) + bytes(mask) + masked
+
+
+def read_frames(sock, args, inherited):
+    """Reads the frames of the proxy until it closes, sending a pointer
+    event after each of the first reads.
+    """
+    for other in inherited:
+        other.close()
+    try:
+        for index in range(args.events):
+            sock.sendall(pointer_event(index))
+            if not sock.recv(args.client_read_size):
+                break
+    except socket.error:
+        # The proxy closed the connection once the server was done
+        pass
+    while sock.recv(args.client_read_size):
+        pass
+    sock.close()
+
+
+def create_handler(client_sock):
+    handler = websocketproxy.NovaProxyRequestHandler.__new__(
+        websocketproxy.NovaProxyRequestHandler)
+    handler.server = FakeServer()
+    handler.request = client_sock
+    handler.base64 = False
+    handler.rec = None
+    handler.send_parts = []
+    handler.recv_part = None
+    handler.start_time = int(time.time() * 1000)
+    handler.traffic = False
+    handler.verbose = False
+    handler.auto_pong = False
+    handler.strict_mode = True
+    handler.logger = logging.getLogger(__name__)
+    handler.buffer_size = 65536
+    return handler
+
+
+def run(args):
+    proxy_target, server_sock = socket.socketpair()
+    proxy_client, client_sock = socket.socketpair()
+    # The processes close the sockets they inherit but do not use, so that
+    # the sockets get closed when their only user closes them
+    server = multiprocessing.Process(
+        target=serve_updates,
+        args=(server_sock, args, [proxy_target, proxy_client, client_sock]))
+    client = multiprocessing.Process(
+        target=read_frames,
+        args=(client_sock, args,
+              [proxy_target, proxy_client, server_sock]))
+    server.start()
+    client.start()
+    server_sock.close()
+    client_sock.close()
+
+    handler = create_handler(proxy_client)
+    start = time.time()
+    cpu_start = time.process_time()
+    try:
+        handler.do_proxy(proxy_target)
+    except websockify.ProxyRequestHandler.CClose:
+        pass
+    elapsed = time.time() - start
+    cpu = time.process_time() - cpu_start
+    proxy_target.close()
+    proxy_client.close()
+    server.join()
+    client.join()
+
+    megabytes = float(args.megabytes)
+    print('%8.1f MB/s  %8.1f MB/s per core  %6d sessions per core'
+          % (megabytes / elapsed, megabytes / cpu,
+             megabytes / cpu / args.session_rate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--megabytes', type=int, default=200,
+                        help='amount of data sent by the fake VNC server')
+    parser.add_argument('--update-size', type=int, default=16384,
+                        help='size in bytes of each framebuffer update')
+    parser.add_argument('--events', type=int, default=1000,
+                        help='number of pointer events sent by the client')
+    parser.add_argument('--client-read-size', type=int, default=65536,
+                        help='size of the reads of the client, which is '
+                             'slower than the server when smaller than the '
+                             'updates')
+    parser.add_argument('--session-rate', type=float, default=1.0,
+                        help='MB/s relayed by a busy console session')
+    args = parser.parse_args()
+
+    print('%d MB in framebuffer updates of %d bytes' % (
+        args.megabytes, args.update_size))
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Measure the refresh of the rules of a security group granting access to its
+own members in the iptables firewall driver, with and without ipsets.
+
+The instances of a compute host are all members of a security group allowing
+SSH from the members of the group, which has other members on other hosts.
+A member is then added to the group, and the rules of the instances of the
+host are refreshed, like when nova-compute is told that the members of the
+group changed.
+
+Usage:
+
+    python tools/benchmarks/firewall.py [--instances N] [--members N]
+
+The security groups and the instances are looked up in memory, and
+iptables-save, iptables-restore and ipset are simulated in memory, so the
+time they take is not measured: the number of rules of the instances and the
+number of lines written to iptables-restore and ipset are reported instead.
+"""
+import argparse
+import time
+
+import mock
+from oslo_concurrency.fixture import lockutils as lock_fixture
+from oslo_utils import uuidutils
+
+import nova.conf
+from nova.network import linux_net
+from nova.network import model as network_model
+from nova import objects
+from nova.tests.unit import conf_fixture
+from nova.tests.unit import fake_iptables
+from nova.virt import firewall
+
+CONF = nova.conf.CONF
+
+
+def create_instance(index):
+    address = '10.%d.%d.%d' % (index // 65536, index // 256 % 256,
+                               index % 256)
+    subnet = network_model.Subnet(
+        cidr='10.0.0.0/8', ips=[network_model.FixedIP(address=address)])
+    nw_info = network_model.NetworkInfo([network_model.VIF(
+        id=uuidutils.generate_uuid(), address=address,
+        network=network_model.Network(subnets=[subnet]))])
+    instance = objects.Instance(
+        id=index, uuid=uuidutils.generate_uuid(),
+        info_cache=objects.InstanceInfoCache(network_info=nw_info,
+                                             deleted=False))
+    return instance, nw_info
+
+
+def run(args, ipset):
+    CONF.set_override('enable_ipset', ipset)
+    execute = fake_iptables.FakeIptables()
+    group = objects.SecurityGroup(id=1)
+    rule = objects.SecurityGroupRule(protocol='tcp', from_port=22,
+                                     to_port=22, cidr=None,
+                                     grantee_group=group)
+    instances = [create_instance(index)
+                 for index in range(1, args.members + 2)]
+    members = [instance for instance, nw_info in instances[:args.members]]
+
+    with mock.patch.object(linux_net, 'iptables_manager',
+                           linux_net.IptablesManager(execute=execute)), \
+            mock.patch.object(linux_net, '_execute', execute), \
+            mock.patch.object(objects.SecurityGroupRuleList,
+                              'get_by_instance', return_value=[rule]), \
+            mock.patch.object(objects.InstanceList, 'get_by_security_group',
+                              side_effect=lambda ctxt, group: members):
+        driver = firewall.IptablesFirewallDriver()
+        driver.filter_defer_apply_on()
+        for instance, nw_info in instances[:args.instances]:
+            driver.prepare_instance_filter(instance, nw_info)
+        driver.filter_defer_apply_off()
+        rules = sum(len(ipv4_rules) for ipv4_rules, ipv6_rules in
+                    driver.instance_chain_rules.values())
+
+        members.append(instances[-1][0])
+        execute.calls = []
+        start = time.time()
+        driver.refresh_security_group_rules(group.id)
+        elapsed = time.time() - start
+
+    print('%-7s rules/instance: %6.1f  refresh: %8.1f ms  '
+          'iptables-restore lines: %6d  ipset lines: %d' % (
+              'ipset' if ipset else 'legacy', rules / float(args.instances),
+              elapsed * 1000, execute.lines_fed_to('iptables-restore'),
+              execute.lines_fed_to('ipset')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--instances', type=int, default=20,
+                        help='number of instances of the compute host')
+    parser.add_argument('--members', type=int, default=250,
+                        help='number of members of the security group, '
+                             'including the instances of the host')
+    args = parser.parse_args()
+    args.members = max(args.members, args.instances)
+
+    objects.register_all()
+    conf_fixture.ConfFixture(CONF).setUp()
+    lock_fixture.ExternalLockFixture().setUp()
+    CONF.set_override('use_ipv6', False)
+    print('%d instances in a security group of %d members' % (
+        args.instances, args.members))
+    run(args, ipset=False)
+    run(args, ipset=True)
+
+
+if __name__ == '__main__':
+    main()
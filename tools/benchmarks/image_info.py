@@ -0,0 +1,79 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Compare the number of image inspections per second achieved by the
+in-process header parser and by running ``qemu-img info``.
+
+Usage:
+
+    python tools/benchmarks/image_info.py [--iterations N]
+
+The qemu-img measurement is skipped if qemu-img is not installed.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from nova.virt.image import header
+
+
+def make_images(tmpdir):
+    qcow2 = os.path.join(tmpdir, 'disk.qcow2')
+    raw = os.path.join(tmpdir, 'disk.raw')
+    try:
+        subprocess.check_call(['qemu-img', 'create', '-q', '-f', 'qcow2',
+                               qcow2, '10G'])
+        have_qemu_img = True
+    except OSError:
+        from nova.tests.unit.virt.image import test_header
+        test_header.make_qcow2(qcow2, 10 * 1024 ** 3)
+        have_qemu_img = False
+    with open(raw, 'wb') as f:
+        f.truncate(10 * 1024 ** 3)
+    return have_qemu_img, {'qcow2': qcow2, 'raw': raw}
+
+
+def rate(func, iterations):
+    start = time.time()
+    for _ in range(iterations):
+        func()
+    elapsed = time.time() - start
+    return iterations / elapsed if elapsed else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        have_qemu_img, paths = make_images(tmpdir)
+        for fmt, path in sorted(paths.items()):
+            print('%-6s header parser: %10.1f calls/s' %
+                  (fmt, rate(lambda: header.get_info(path, fmt),
+                             args.iterations)))
+            if have_qemu_img:
+                cmd = ['qemu-img', 'info', '-f', fmt, path]
+                print('%-6s qemu-img info: %10.1f calls/s' %
+                      (fmt, rate(lambda: subprocess.check_output(cmd),
+                                 max(1, args.iterations // 10))))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Measure the apply of the iptables rules of nova on a generated ruleset.
+
+The filter table gets a wrapped chain per instance, with its rules and the
+jump to it, like the ones of the iptables firewall driver, and rules not
+managed by nova, some of them kept at the top by iptables_top_regex. The
+rules of random instances are then replaced, and the time nova spends in each
+apply is measured, with and without iptables_differential_apply, along with
+the number of lines fed to iptables-restore.
+
+Usage:
+
+    python tools/benchmarks/iptables.py [--instances N] [--rules N]
+        [--foreign N] [--updates N] [--seed N]
+
+iptables-save and iptables-restore are simulated in memory, so the time
+iptables-restore takes to load the rules is not measured: the number of
+restored lines is reported instead.
+"""
+import argparse
+import random
+import time
+
+from oslo_concurrency.fixture import lockutils as lock_fixture
+
+import nova.conf
+from nova.network import linux_net
+from nova.tests.unit import conf_fixture
+from nova.tests.unit import fake_iptables
+
+CONF = nova.conf.CONF
+
+
+class FakeIptables(fake_iptables.FakeIptables):
+    """Counts the time spent in the simulated iptables-save and
+    iptables-restore.
+    """
+
+    def __init__(self, lines):
+        super(FakeIptables, self).__init__(lines)
+        self.elapsed = 0
+
+    def __call__(self, *cmd, **kwargs):
+        start = time.time()
+        try:
+            return super(FakeIptables, self).__call__(*cmd, **kwargs)
+        finally:
+            self.elapsed += time.time() - start
+
+
+def instance_rules(rules, port):
+    """Returns the rules of an instance, allowing a range of ports."""
+    return (['-m state --state INVALID -j DROP',
+             '-m state --state ESTABLISHED,RELATED -j ACCEPT'] +
+            ['-p tcp -m tcp --dport %d -j ACCEPT' % (port + offset)
+             for offset in range(rules - 3)] +
+            ['-j %s-sg-fallback' % linux_net.binary_name])
+
+
+def set_instance_rules(table, index, rules, port):
+    chain = 'inst-%d' % index
+    table.empty_chain(chain)
+    for rule in instance_rules(rules, port):
+        table.add_rule(chain, rule)
+
+
+def create_manager(args, fake):
+    manager = linux_net.IptablesManager(execute=fake)
+    table = manager.ipv4['filter']
+    table.add_chain('sg-fallback')
+    table.add_rule('sg-fallback', '-j DROP')
+    # add_rule() looks for a duplicate among all the rules of the table, so
+    # the rules of the instances are appended directly to build the table
+    # faster
+    for index in range(args.instances):
+        chain = 'inst-%d' % index
+        table.add_chain(chain)
+        table.rules.append(linux_net.IptablesRule(
+            'local', '-d 10.%d.%d.%d -j %s-%s' % (
+                index // 65536, index // 256 % 256, index % 256,
+                linux_net.binary_name, chain)))
+        table.rules.extend(linux_net.IptablesRule(chain, rule)
+                           for rule in instance_rules(args.rules, 1000))
+    return manager
+
+
+def run(args, differential):
+    CONF.set_override('iptables_differential_apply', differential)
+    rand = random.Random(args.seed)
+
+    lines = ['# Generated by iptables-save', '*filter',
+             ':INPUT ACCEPT [0:0]', ':FORWARD ACCEPT [0:0]',
+             ':OUTPUT ACCEPT [0:0]', ':foreign-top - [0:0]']
+    lines += ['[0:0] -A FORWARD -s 172.16.%d.%d/32 -j foreign-top' % (
+        index // 256 % 256, index % 256) for index in range(args.foreign)]
+    lines += ['[0:0] -A INPUT -s 172.17.%d.%d/32 -j ACCEPT' % (
+        index // 256 % 256, index % 256) for index in range(args.foreign)]
+    lines += ['COMMIT', '# Completed']
+    for table_name in ('nat', 'mangle'):
+        lines += ['# Generated by iptables-save', '*' + table_name,
+                  ':POSTROUTING ACCEPT [0:0]', 'COMMIT', '# Completed']
+    fake = FakeIptables(lines)
+    manager = create_manager(args, fake)
+    start = time.time()
+    manager.apply()
+    print('%d lines restored in %.1f ms by the first apply' % (
+        fake.lines_fed_to('iptables-restore'), (time.time() - start) * 1000))
+
+    latencies = []
+    fake.calls = []
+    for update in range(args.updates):
+        set_instance_rules(manager.ipv4['filter'],
+                           rand.randrange(args.instances), args.rules,
+                           rand.randrange(2000, 60000))
+        start = time.time()
+        elapsed = fake.elapsed
+        manager.apply()
+        latencies.append(time.time() - start - (fake.elapsed - elapsed))
+    latencies.sort()
+    print('%-13s p50: %8.1f ms  p99: %8.1f ms  restored lines/apply: %.1f'
+          % ('differential' if differential else 'full',
+             latencies[len(latencies) // 2] * 1000,
+             latencies[min(len(latencies) - 1,
+                           int(len(latencies) * 0.99))] * 1000,
+             fake.lines_fed_to('iptables-restore') /
+             float(len(latencies))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--instances', type=int, default=2000)
+    parser.add_argument('--rules', type=int, default=10,
+                        help='number of rules per instance')
+    parser.add_argument('--foreign', type=int, default=1000,
+                        help='number of rules not managed by nova kept at '
+                             'the top of the FORWARD chain, and in the INPUT '
+                             'chain')
+    parser.add_argument('--updates', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    conf_fixture.ConfFixture(CONF).setUp()
+    lock_fixture.ExternalLockFixture().setUp()
+    CONF.set_override('use_ipv6', False)
+    CONF.set_override('iptables_top_regex', '-j foreign-top')
+    print('%d instances with %d rules each, and %d rules not managed by '
+          'nova' % (args.instances, args.rules, args.foreign * 2))
+    run(args, differential=False)
+    run(args, differential=True)
+
+
+if __name__ == '__main__':
+    main()
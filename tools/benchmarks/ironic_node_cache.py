@@ -0,0 +1,157 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Measure the refresh of the node cache of the ironic driver for several
+inventory sizes.
+
+The nodes of a fake Ironic API are listed by the driver of one of several
+nova-compute services, which refreshes its node cache a few times. Each
+refresh is done once like the driver did before, listing the nodes in
+detail and mapping every node to the services on a new hash ring, and once
+like it does now, listing only the fields used by the driver and mapping
+only the nodes it has not seen on the current hash ring.
+
+Usage:
+
+    python tools/benchmarks/ironic_node_cache.py [--nodes N [N ...]]
+        [--services N] [--refreshes N]
+
+The fake Ironic API serializes the nodes to JSON and the driver side parses
+them, so the time spent building and parsing the responses is included, but
+not the time spent by Ironic querying its database.
+"""
+import argparse
+import json
+import time
+
+import mock
+from oslo_utils import uuidutils
+
+import nova.conf
+from nova import objects
+from nova.tests.unit import conf_fixture
+from nova.tests.unit.virt.ironic import utils as ironic_utils
+from nova.virt.ironic import driver as ironic_driver
+
+CONF = nova.conf.CONF
+
+# The fields of a node returned by the Ironic API with detail=True
+DETAIL_FIELDS = ('uuid', 'chassis_uuid', 'power_state', 'target_power_state',
+                 'provision_state', 'target_provision_state', 'last_error',
+                 'instance_uuid', 'instance_info', 'driver', 'driver_info',
+                 'properties', 'reservation', 'maintenance',
+                 'network_interface', 'resource_class', 'extra', 'updated_at',
+                 'created_at')
+
+
+class Node(object):
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+
+class FakeIronicClient(object):
+    """Serves node.list from an inventory of nodes, and counts the bytes of
+    the responses.
+    """
+
+    def __init__(self, num_nodes):
+        self.nodes = []
+        for index in range(num_nodes):
+            node = ironic_utils.get_test_node(
+                uuid=uuidutils.generate_uuid(),
+                driver_info={'ipmi_address': '10.0.%d.%d' % (
+                    index // 256 % 256, index % 256),
+                    'ipmi_username': 'admin', 'ipmi_password': '******'},
+                properties={'cpus': 32, 'memory_mb': 131072,
+                            'local_gb': 1000, 'cpu_arch': 'x86_64',
+                            'capabilities': 'boot_mode:uefi'},
+                instance_info={}, extra={}, resource_class='BAREMETAL',
+                provision_state='available')
+            self.nodes.append({field: getattr(node, field)
+                               for field in DETAIL_FIELDS})
+        self.bytes = 0
+
+    def call(self, method, detail=False, fields=None, **kwargs):
+        fields = DETAIL_FIELDS if detail else fields or ('uuid',)
+        body = json.dumps({'nodes': [{field: node[field] for field in fields}
+                                     for node in self.nodes]})
+        self.bytes += len(body)
+        return [Node(node) for node in json.loads(body)['nodes']]
+
+
+class LegacyIronicDriver(ironic_driver.IronicDriver):
+    """Lists the nodes in detail and maps every node to the services on a
+    new hash ring on each refresh, like the driver did before.
+    """
+
+    def _get_node_list(self, **kwargs):
+        kwargs.pop('fields', None)
+        return super(LegacyIronicDriver, self)._get_node_list(detail=True,
+                                                              **kwargs)
+
+    def _refresh_hash_ring(self, ctxt):
+        self._hash_ring_hosts = None
+        super(LegacyIronicDriver, self)._refresh_hash_ring(ctxt)
+
+
+def run(args, name, driver_class, client, services):
+    driver = driver_class(None)
+    driver.ironicclient = client
+    driver.servicegroup_api = mock.Mock()
+    driver.servicegroup_api.service_is_up.return_value = True
+    client.bytes = 0
+
+    with mock.patch.object(objects.ServiceList, 'get_all_computes_by_hv_type',
+                           return_value=services), \
+            mock.patch.object(objects.InstanceList, 'get_uuids_by_host',
+                              return_value=[]):
+        timings = []
+        for index in range(args.refreshes):
+            start = time.time()
+            driver._refresh_cache()
+            timings.append(time.time() - start)
+
+    print('%-6s %6d nodes  first: %8.1f ms  next: %8.1f ms  '
+          'KB/refresh: %8.1f  nodes managed: %d' % (
+              name, len(client.nodes), timings[0] * 1000,
+              sum(timings[1:]) / max(len(timings) - 1, 1) * 1000,
+              client.bytes / 1024.0 / args.refreshes,
+              len(driver.node_cache)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', type=int, nargs='+',
+                        default=[1000, 5000, 20000],
+                        help='numbers of nodes of the Ironic inventory')
+    parser.add_argument('--services', type=int, default=3,
+                        help='number of nova-compute services using the '
+                             'ironic driver')
+    parser.add_argument('--refreshes', type=int, default=5,
+                        help='number of refreshes of the node cache')
+    args = parser.parse_args()
+
+    conf_fixture.ConfFixture(CONF).setUp()
+    CONF.set_override('host', 'compute-0')
+    services = [objects.Service(host='compute-%d' % index)
+                for index in range(args.services)]
+    print('%d nova-compute services, %d refreshes' % (args.services,
+                                                     args.refreshes))
+    for num_nodes in args.nodes:
+        client = FakeIronicClient(num_nodes)
+        run(args, 'legacy', LegacyIronicDriver, client, services)
+        run(args, 'nova', ironic_driver.IronicDriver, client, services)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Compare the allocation candidate queries with and without the capacity index.
+
+The resource providers, their inventories of VCPU, MEMORY_MB and DISK_GB, their
+custom traits and the allocations of existing consumers are inserted in bulk in
+an in-memory sqlite database. The allocation candidates of a mix of requests,
+each requiring some of the traits and forbidding another one, are then queried
+from the database, and from the capacity index of the placement service.
+
+Usage:
+
+    python tools/benchmarks/placement.py [--providers N] [--allocations N]
+        [--traits N] [--requests N] [--seed N]
+"""
+import argparse
+import random
+import time
+
+from oslo_utils import uuidutils
+
+import nova.conf
+from nova import context
+from nova.db.sqlalchemy import api_models as models
+from nova import objects
+from nova.objects import fields
+from nova.objects import resource_provider as rp_obj
+from nova.tests import fixtures as nova_fixtures
+from nova.tests.unit import conf_fixture
+
+CONF = nova.conf.CONF
+
+# resource class, total, allocation ratio, amounts of the allocations
+RESOURCES = [(fields.ResourceClass.VCPU, 32, 16.0, (1, 2, 4, 8)),
+             (fields.ResourceClass.MEMORY_MB, 131072, 1.5,
+              (512, 2048, 4096, 8192, 16384)),
+             (fields.ResourceClass.DISK_GB, 2000, 1.0, (1, 20, 40, 80, 160))]
+
+
+def create_traits(engine, args):
+    """Inserts the custom traits, and returns their IDs."""
+    with engine.begin() as conn:
+        conn.execute(models.Trait.__table__.insert(),
+                     [{'name': 'CUSTOM_TRAIT_%d' % index}
+                      for index in range(args.traits)])
+        sel = models.Trait.__table__.select().where(
+            models.Trait.__table__.c.name.like('CUSTOM_TRAIT_%'))
+        return [r['id'] for r in conn.execute(sel)]
+
+
+def create_providers(engine, args, rand, trait_ids):
+    """Inserts the providers, their inventories, traits and allocations in
+    bulk.
+    """
+    rc_ids = {rc: fields.ResourceClass.STANDARD.index(rc)
+              for rc, _total, _ratio, _amounts in RESOURCES}
+    providers = []
+    inventories = []
+    traits = []
+    allocations = []
+    for rp_id in range(1, args.providers + 1):
+        rp_uuid = uuidutils.generate_uuid()
+        providers.append({'id': rp_id, 'uuid': rp_uuid, 'name': rp_uuid,
+                          'generation': 1})
+        # Each trait is held by half of the providers
+        traits.extend({'resource_provider_id': rp_id, 'trait_id': trait_id}
+                      for trait_id in trait_ids if rand.random() < 0.5)
+        for rc, total, ratio, amounts in RESOURCES:
+            inventories.append({'resource_provider_id': rp_id,
+                                'resource_class_id': rc_ids[rc],
+                                'total': total, 'reserved': 0,
+                                'min_unit': 1, 'max_unit': total,
+                                'step_size': 1, 'allocation_ratio': ratio})
+        for index in range(rand.randrange(args.allocations * 2 + 1)):
+            consumer_id = uuidutils.generate_uuid()
+            for rc, total, ratio, amounts in RESOURCES:
+                allocations.append({'resource_provider_id': rp_id,
+                                    'resource_class_id': rc_ids[rc],
+                                    'consumer_id': consumer_id,
+                                    'used': rand.choice(amounts)})
+    with engine.begin() as conn:
+        conn.execute(models.ResourceProvider.__table__.insert(), providers)
+        conn.execute(models.Inventory.__table__.insert(), inventories)
+        if traits:
+            conn.execute(models.ResourceProviderTrait.__table__.insert(),
+                         traits)
+        conn.execute(models.Allocation.__table__.insert(), allocations)
+    return len(allocations) // len(RESOURCES)
+
+
+def _find_in_database(ctxt, resources, required, forbidden):
+    roots = [r[0] for r in rp_obj._get_all_with_shared(
+        ctxt, resources, required, forbidden)]
+    return roots, rp_obj._get_usages_by_provider_and_rc(
+        ctxt, roots, list(resources))
+
+
+def _find_in_index(ctxt, resources, required, forbidden):
+    return rp_obj._CAPACITY_INDEX.get_candidates(
+        ctxt, resources, required, forbidden)
+
+
+def run(ctxt, name, find, requests):
+    """Times the lookup of the providers having the capacity for each
+    request and of their usages, without building the AllocationCandidates
+    objects, whose cost is the same for the database and the index.
+    """
+    latencies = []
+    candidates = 0
+    for resources, required, forbidden in requests:
+        start = time.time()
+        roots, usages = find(ctxt, resources, required, forbidden)
+        latencies.append(time.time() - start)
+        candidates += len(roots)
+    latencies.sort()
+    print('%-8s p50: %8.1f ms  p99: %8.1f ms  max: %8.1f ms  '
+          'candidates/request: %.1f' % (
+              name,
+              latencies[len(latencies) // 2] * 1000,
+              latencies[min(len(latencies) - 1,
+                            int(len(latencies) * 0.99))] * 1000,
+              latencies[-1] * 1000,
+              candidates / float(len(latencies))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--providers', type=int, default=50000)
+    parser.add_argument('--allocations', type=int, default=10,
+                        help='average number of consumers per provider')
+    parser.add_argument('--traits', type=int, default=20,
+                        help='number of custom traits, each held by half '
+                             'of the providers')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rand = random.Random(args.seed)
+
+    objects.register_all()
+    # NOTE: the database fixture configures the database engines when it is
+    # created, so the defaults of the configuration fixture must be set first
+    conf_fixture.ConfFixture(CONF).setUp()
+    api_db = nova_fixtures.Database(database='api')
+    api_db.setUp()
+    ctxt = context.get_admin_context()
+
+    start = time.time()
+    trait_ids = create_traits(api_db.get_engine(), args)
+    consumers = create_providers(api_db.get_engine(), args, rand, trait_ids)
+    print('%d providers with %d traits and %d consumers created in %.1fs' %
+          (args.providers, len(trait_ids), consumers, time.time() - start))
+
+    requests = []
+    for index in range(args.requests):
+        resources = {
+            fields.ResourceClass.STANDARD.index(rc): rand.choice(amounts)
+            for rc, _total, _ratio, amounts in RESOURCES}
+        # Require one to three traits and forbid another one
+        traits = rand.sample(trait_ids, min(len(trait_ids),
+                                            rand.randint(2, 4)))
+        requests.append((resources, set(traits[1:]), set(traits[:1])))
+    rp_obj._ensure_rc_cache(ctxt)
+    run(ctxt, 'database', _find_in_database, requests)
+
+    CONF.set_override('capacity_index', True, group='placement')
+    CONF.set_override('capacity_index_resync_interval', 3600,
+                      group='placement')
+    start = time.time()
+    _find_in_index(ctxt, *requests[0])
+    print('capacity index loaded in %.1fs' % (time.time() - start))
+    run(ctxt, 'index', _find_in_index, requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Measure the throughput of the filter scheduler on a synthetic cloud.
+
+The cloud is built in in-memory sqlite databases: compute services and nodes
+spread over cells, availability zone and tenant isolation aggregates, and
+resource providers in placement with the allocations of existing instances.
+The compute nodes can also have NUMA topologies and PCI devices. The
+scheduler is then asked for destinations with a mix of flavors, availability
+zones and tenants, and the requests per second, the latency percentiles and
+the number of database queries per request are reported.
+
+Usage:
+
+    python tools/benchmarks/scheduler.py [--cells N] [--computes N]
+        [--aggregates N] [--instances N] [--numa] [--pci]
+        [--requests N] [--seed N]
+
+The allocation candidates are queried from the placement database through
+the placement objects, without the REST API, and they are not claimed. Use
+the same --seed to compare the results of two trees.
+"""
+import argparse
+import random
+import time
+
+import eventlet
+from oslo_utils import uuidutils
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import nova.conf
+from nova import context
+from nova import exception
+from nova import objects
+from nova.objects import fields
+from nova.objects import resource_provider as rp_obj
+from nova.pci import request as pci_request
+from nova.scheduler import filter_scheduler
+from nova.scheduler import utils as scheduler_utils
+from nova.tests import fixtures as nova_fixtures
+from nova.tests.unit import conf_fixture
+from nova.virt import hardware
+
+CONF = nova.conf.CONF
+
+PCI_ALIAS = {'name': 'nic', 'vendor_id': '8086', 'product_id': '1520',
+             'device_type': 'type-VF'}
+
+# name, vcpus, memory_mb, root_gb, share of the requests
+FLAVORS = [('tiny', 1, 512, 1, 30),
+           ('small', 1, 2048, 20, 30),
+           ('medium', 2, 4096, 40, 25),
+           ('large', 4, 8192, 80, 10),
+           ('xlarge', 8, 16384, 160, 5)]
+
+FILTERS = ['RetryFilter', 'AvailabilityZoneFilter', 'ComputeFilter',
+           'ComputeCapabilitiesFilter', 'ImagePropertiesFilter',
+           'ServerGroupAntiAffinityFilter', 'ServerGroupAffinityFilter',
+           'AggregateMultiTenancyIsolation', 'NUMATopologyFilter',
+           'PciPassthroughFilter']
+
+
+class QueryCounter(object):
+    """Counts the statements run by all the database engines."""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+
+def setup_databases(args):
+    # NOTE: the database fixture configures the database engines when it is
+    # created, so the defaults of the configuration fixture must be set first
+    conf_fixture.ConfFixture(CONF).setUp()
+    nova_fixtures.RPCFixture('nova.test').setUp()
+    nova_fixtures.Database(database='api').setUp()
+    CONF.set_override('enabled_filters', FILTERS, group='filter_scheduler')
+    CONF.set_override('alias', [str(PCI_ALIAS).replace("'", '"')],
+                      group='pci')
+    # The services are never updated, so do not let them go down
+    CONF.set_override('service_down_time', 24 * 3600)
+
+    ctxt = context.get_admin_context()
+    celldbs = nova_fixtures.CellDatabases()
+    cells = []
+    for index in range(args.cells):
+        cell = objects.CellMapping(context=ctxt,
+                                   uuid=uuidutils.generate_uuid(),
+                                   name='cell%d' % index,
+                                   transport_url='fake://',
+                                   database_connection='cell%d' % index)
+        cell.create()
+        celldbs.add_cell_database(cell.database_connection,
+                                  default=(index == 0))
+        cells.append(cell)
+    celldbs.setUp()
+    return ctxt, cells
+
+
+def numa_topology(args):
+    cpus_per_node = args.vcpus // 2
+    return objects.NUMATopology(cells=[
+        objects.NUMACell(
+            id=node,
+            cpuset=set(range(node * cpus_per_node,
+                             (node + 1) * cpus_per_node)),
+            memory=args.memory_mb // 2, cpu_usage=0, memory_usage=0,
+            mempages=[], siblings=[], pinned_cpus=set())
+        for node in range(2)])
+
+
+def pci_device_pools():
+    return objects.PciDevicePoolList(objects=[
+        objects.PciDevicePool(product_id=PCI_ALIAS['product_id'],
+                              vendor_id=PCI_ALIAS['vendor_id'],
+                              numa_node=0, tags={'dev_type': 'type-VF'},
+                              count=8)])
+
+
+def create_cloud(ctxt, cells, flavors, args, rand):
+    """Creates the compute nodes, aggregates, providers and instances."""
+    hosts = []
+    for cell in cells:
+        with context.target_cell(ctxt, cell) as cctxt:
+            for index in range(args.computes // args.cells):
+                host = 'compute%d' % len(hosts)
+                objects.Service(cctxt, host=host, binary='nova-compute',
+                                topic='compute', report_count=0).create()
+                node = objects.ComputeNode(
+                    cctxt, host=host, hypervisor_hostname=host,
+                    uuid=uuidutils.generate_uuid(), vcpus=args.vcpus,
+                    memory_mb=args.memory_mb, local_gb=args.local_gb,
+                    vcpus_used=0, memory_mb_used=0, local_gb_used=0,
+                    free_ram_mb=args.memory_mb, free_disk_gb=args.local_gb,
+                    current_workload=0, running_vms=0,
+                    disk_available_least=args.local_gb,
+                    hypervisor_type='fake', hypervisor_version=1000,
+                    cpu_info='{}', host_ip='192.168.0.1',
+                    supported_hv_specs=[objects.HVSpec(
+                        arch=fields.Architecture.X86_64,
+                        hv_type=fields.HVType.KVM,
+                        vm_mode=fields.VMMode.HVM)],
+                    numa_topology=(numa_topology(args)._to_json()
+                                   if args.numa else None),
+                    pci_device_pools=(pci_device_pools() if args.pci
+                                      else objects.PciDevicePoolList()),
+                    stats={}, cpu_allocation_ratio=16.0,
+                    ram_allocation_ratio=1.5, disk_allocation_ratio=1.0)
+                node.create()
+                objects.HostMapping(ctxt, host=host,
+                                    cell_mapping=cell).create()
+                hosts.append((cell, node))
+
+    # Spread the hosts over availability zones, and isolate some of them for
+    # a few tenants
+    for index in range(args.aggregates):
+        metadata = {'availability_zone': 'az%d' % index}
+        if index % 4 == 3:
+            metadata['filter_tenant_id'] = 'tenant%d' % index
+        aggregate = objects.Aggregate(ctxt, name='agg%d' % index,
+                                      metadata=metadata)
+        aggregate.create()
+        for cell, node in hosts[index::args.aggregates]:
+            aggregate.add_host(node.host)
+
+    # Create the resource providers and the allocations of the instances
+    for cell, node in hosts:
+        rp = rp_obj.ResourceProvider(ctxt, uuid=node.uuid, name=node.host)
+        rp.create()
+        rp.set_inventory(rp_obj.InventoryList(objects=[
+            rp_obj.Inventory(ctxt, resource_provider=rp, resource_class=rc,
+                             total=total, reserved=0, min_unit=1,
+                             max_unit=total, step_size=1,
+                             allocation_ratio=ratio)
+            for rc, total, ratio in [
+                (fields.ResourceClass.VCPU, args.vcpus, 16.0),
+                (fields.ResourceClass.MEMORY_MB, args.memory_mb, 1.5),
+                (fields.ResourceClass.DISK_GB, args.local_gb, 1.0)]]))
+        with context.target_cell(ctxt, cell) as cctxt:
+            for index in range(args.instances):
+                flavor = rand.choice(flavors)
+                instance = objects.Instance(
+                    cctxt, uuid=uuidutils.generate_uuid(), host=node.host,
+                    node=node.hypervisor_hostname,
+                    project_id='tenant%d' % rand.randrange(10),
+                    user_id='user', vm_state='active',
+                    instance_type_id=flavor.id, vcpus=flavor.vcpus,
+                    memory_mb=flavor.memory_mb, root_gb=flavor.root_gb)
+                instance.create()
+                rp_obj.AllocationList(ctxt, objects=[
+                    rp_obj.Allocation(ctxt, resource_provider=rp,
+                                      consumer_id=instance.uuid,
+                                      resource_class=rc, used=used,
+                                      project_id=instance.project_id,
+                                      user_id='user')
+                    for rc, used in [
+                        (fields.ResourceClass.VCPU, flavor.vcpus),
+                        (fields.ResourceClass.MEMORY_MB, flavor.memory_mb),
+                        (fields.ResourceClass.DISK_GB, flavor.root_gb)]
+                ]).create_all()
+    return hosts
+
+
+def create_flavors(ctxt, args):
+    flavors = []
+    for name, vcpus, memory_mb, root_gb, weight in FLAVORS:
+        extra_specs = {}
+        if args.numa and vcpus > 1:
+            extra_specs['hw:numa_nodes'] = '1'
+        if args.pci and name == 'medium':
+            extra_specs['pci_passthrough:alias'] = 'nic:1'
+        flavor = objects.Flavor(ctxt, name=name, flavorid=name, vcpus=vcpus,
+                                memory_mb=memory_mb, root_gb=root_gb,
+                                ephemeral_gb=0, swap=0,
+                                extra_specs=extra_specs)
+        flavor.create()
+        flavors.append(flavor)
+    return flavors
+
+
+def request_specs(ctxt, flavors, args, rand):
+    """Yields the request specs of a mix of boot requests."""
+    image = objects.ImageMeta.from_dict({'properties': {}})
+    weights = [flavor[4] for flavor in FLAVORS]
+    for index in range(args.requests):
+        flavor = weighted_choice(rand, flavors, weights)
+        availability_zone = None
+        if args.aggregates and rand.random() < 0.5:
+            availability_zone = 'az%d' % rand.randrange(args.aggregates)
+        spec = objects.RequestSpec.from_components(
+            ctxt, uuidutils.generate_uuid(), image, flavor,
+            hardware.numa_get_constraints(flavor, image),
+            pci_request.get_pci_requests_from_flavor(flavor), {}, None,
+            availability_zone)
+        spec.project_id = 'tenant%d' % rand.randrange(args.aggregates or 1)
+        yield spec
+
+
+def weighted_choice(rand, items, weights):
+    point = rand.uniform(0, sum(weights))
+    for item, weight in zip(items, weights):
+        point -= weight
+        if point <= 0:
+            return item
+    return items[-1]
+
+
+def percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def run(ctxt, scheduler, flavors, args, rand, queries):
+    latencies = []
+    placement_latencies = []
+    failures = 0
+    start_queries = queries.count
+    start = time.time()
+    for spec in request_specs(ctxt, flavors, args, rand):
+        request_start = time.time()
+        candidates = rp_obj.AllocationCandidates.get_by_filters(
+            ctxt, {'resources': scheduler_utils.resources_from_request_spec(
+                spec)})
+        placement_latencies.append(time.time() - request_start)
+        provider_summaries = {summary.resource_provider.uuid: summary
+                              for summary in candidates.provider_summaries}
+        try:
+            scheduler.select_destinations(ctxt, spec, [spec.instance_uuid],
+                                          None, provider_summaries)
+        except exception.NoValidHost:
+            failures += 1
+        latencies.append(time.time() - request_start)
+    elapsed = time.time() - start
+
+    latencies.sort()
+    placement_latencies.sort()
+    print('requests:           %10d (%d without a valid host)' %
+          (len(latencies), failures))
+    print('requests/s:         %10.1f' % (len(latencies) / elapsed))
+    print('latency p50:        %10.1f ms' % (percentile(latencies, 50) * 1000))
+    print('latency p99:        %10.1f ms' % (percentile(latencies, 99) * 1000))
+    print('placement p50:      %10.1f ms' %
+          (percentile(placement_latencies, 50) * 1000))
+    print('placement p99:      %10.1f ms' %
+          (percentile(placement_latencies, 99) * 1000))
+    print('db queries/request: %10.1f' %
+          ((queries.count - start_queries) / float(len(latencies))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cells', type=int, default=1)
+    parser.add_argument('--computes', type=int, default=100,
+                        help='number of compute nodes over all the cells')
+    parser.add_argument('--aggregates', type=int, default=4,
+                        help='number of availability zones, every fourth '
+                             'one being isolated for a tenant')
+    parser.add_argument('--instances', type=int, default=5,
+                        help='number of existing instances per compute node')
+    parser.add_argument('--vcpus', type=int, default=32)
+    parser.add_argument('--memory-mb', type=int, default=131072)
+    parser.add_argument('--local-gb', type=int, default=2000)
+    parser.add_argument('--numa', action='store_true',
+                        help='give two NUMA nodes to the compute nodes, and '
+                             'request one for the flavors with more than '
+                             'one vCPU')
+    parser.add_argument('--pci', action='store_true',
+                        help='give PCI devices to the compute nodes, and '
+                             'request one for the medium flavor')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rand = random.Random(args.seed)
+
+    objects.register_all()
+    ctxt, cells = setup_databases(args)
+    setup_start = time.time()
+    flavors = create_flavors(ctxt, args)
+    create_cloud(ctxt, cells, flavors, args, rand)
+    scheduler = filter_scheduler.FilterScheduler()
+    # Let the scheduler load the instances of the hosts in the background, and
+    # then simulate the compute nodes sending the list of their instances, so
+    # that they are tracked in memory
+    eventlet.sleep()
+    for cell in cells:
+        with context.target_cell(ctxt, cell) as cctxt:
+            for instance_list in _instances_by_host(cctxt):
+                scheduler.host_manager.update_instance_info(
+                    ctxt, instance_list[0].host, instance_list)
+    print('cloud created in %.1fs: %d cells, %d computes, %d aggregates, '
+          '%d instances' % (time.time() - setup_start, args.cells,
+                            args.computes // args.cells * args.cells,
+                            args.aggregates,
+                            args.computes // args.cells * args.cells *
+                            args.instances))
+
+    run(ctxt, scheduler, flavors, args, rand, QueryCounter())
+
+
+def _instances_by_host(cctxt):
+    instances = {}
+    for instance in objects.InstanceList.get_by_filters(cctxt, {}):
+        instances.setdefault(instance.host, []).append(instance)
+    for host_instances in instances.values():
+        yield objects.InstanceList(objects=host_instances)
+
+
+if __name__ == '__main__':
+    main()
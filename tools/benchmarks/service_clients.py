@@ -0,0 +1,166 @@
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+"""
+Measure a storm of volume attachments with and without the discovery cache.
+
+Each attachment creates, updates and completes a volume attachment in a fake
+cinder API served locally, with its own request context, like nova-compute
+attaching volumes to many instances. The attachments are done once with
+[DEFAULT]service_discovery_cache_ttl set to 0, which discovers the version of
+the volume API before each attachment like nova did, and once with the cache.
+
+Usage:
+
+    python tools/benchmarks/service_clients.py [--attachments N]
+
+The attachments per second are reported, along with the number of requests,
+of requests of the version document and of connections accepted by the fake
+cinder API.
+"""
+import argparse
+import json
+import threading
+import time
+
+from oslo_utils import uuidutils
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+import nova.conf
+from nova import context
+from nova import service_clients
+from nova.tests.unit import conf_fixture
+from nova.volume import cinder
+
+CONF = nova.conf.CONF
+
+VERSIONS = {'versions': [{'id': 'v3.0', 'status': 'CURRENT',
+                          'version': '3.50', 'min_version': '3.0',
+                          'links': []}]}
+
+
+class FakeCinderHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+
+    def _attachment(self, body):
+        attachment = body.get('attachment') or {}
+        return {'attachment': {
+            'id': uuidutils.generate_uuid(), 'status': 'reserved',
+            'instance': attachment.get('instance_uuid'),
+            'volume_id': attachment.get('volume_uuid'),
+            'attach_mode': 'rw', 'attached_at': None, 'detached_at': None,
+            'connection_info': {'driver_volume_type': 'iscsi',
+                                'target_lun': 1}}}
+
+    def do_GET(self):
+        self.server.counts['versions'] += 1
+        self._reply(300, VERSIONS)
+
+    def do_POST(self):
+        self.server.counts['requests'] += 1
+        body = self._read_body()
+        if self.path.endswith('/action'):
+            self._reply(200, {})
+        else:
+            self._reply(200, self._attachment(body))
+
+    def do_PUT(self):
+        self.server.counts['requests'] += 1
+        self._reply(200, self._attachment(self._read_body()))
+
+
+class FakeCinder(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakeCinderHandler)
+        self.counts = {'versions': 0, 'requests': 0, 'connections': 0}
+
+    def get_request(self):
+        self.counts['connections'] += 1
+        return BaseHTTPServer.HTTPServer.get_request(self)
+
+
+def create_context(endpoint):
+    project_id = uuidutils.generate_uuid(dashed=False)
+    catalog = [{'type': 'volumev3', 'name': 'cinderv3',
+                'endpoints': [{'publicURL': '%s/v3/%s' % (endpoint,
+                                                           project_id)}]}]
+    return context.RequestContext('fake-user', project_id,
+                                  auth_token='fake-token',
+                                  service_catalog=catalog)
+
+
+def run(args, endpoint, server, ttl):
+    CONF.set_override('service_discovery_cache_ttl', ttl)
+    service_clients.reset()
+    cinder.reset_globals()
+    api = cinder.API()
+    for key in server.counts:
+        server.counts[key] = 0
+
+    start = time.time()
+    for index in range(args.attachments):
+        ctxt = create_context(endpoint)
+        attachment = api.attachment_create(
+            ctxt, uuidutils.generate_uuid(), uuidutils.generate_uuid())
+        api.attachment_update(ctxt, attachment['id'],
+                              {'host': 'compute-%d' % index})
+        api.attachment_complete(ctxt, attachment['id'])
+    elapsed = time.time() - start
+
+    print('ttl %-4d %7.1f attachments/s  requests: %5d  '
+          'version documents: %5d  connections: %5d' % (
+              ttl, args.attachments / elapsed,
+              server.counts['requests'] + server.counts['versions'],
+              server.counts['versions'], server.counts['connections']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--attachments', type=int, default=500,
+                        help='number of volume attachments')
+    args = parser.parse_args()
+
+    conf_fixture.ConfFixture(CONF).setUp()
+    server = FakeCinder()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    endpoint = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    print('%d volume attachments' % args.attachments)
+    run(args, endpoint, server, ttl=0)
+    run(args, endpoint, server, ttl=300)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()